@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分块增量更新基准测试
+用发布工具生成两个版本的项目包（第二版修改少量源码文件、在大文件中间插入数据），
+通过本地镜像先完整安装第一版，再增量升级到第二版，对比下载量和耗时，并校验组装结果；
+最后破坏分块包，确认安装器回退到下载完整ZIP
+
+镜像服务器运行在独立进程中
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+BENCHMARK_DIR = Path(os.path.abspath(__file__)).parent
+PROJECT_ROOT = BENCHMARK_DIR.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(BENCHMARK_DIR))
+
+from mirror_server import MirrorProcess, MirrorProfile  # noqa: E402
+
+# 项目中的源码文件数
+SOURCE_FILES = 2000
+
+# 第二版修改的源码文件数
+CHANGED_FILES = 5
+
+
+def _source(i: int, version: int) -> bytes:
+    """模拟源码文件内容"""
+    body = f"# KouriChat module {i}\n".encode() + b"def handler(message):\n    return message\n" * 40
+    if version > 1 and i < CHANGED_FILES:
+        body += f"\n# patched in release {version}\n".encode()
+    return body
+
+
+def build_releases(root: Path, model_mb: float):
+    """
+    生成两个版本的项目ZIP
+
+    Returns:
+        (第一版路径, 第二版路径)
+    """
+    model = os.urandom(int(model_mb * 1024 * 1024))
+    # 第二版在模型文件中间插入数据，其后的内容整体偏移
+    middle = len(model) // 2
+    releases = {1: model, 2: model[:middle] + os.urandom(300) + model[middle:]}
+
+    paths = []
+    for version, model_data in releases.items():
+        path = root / f"kourichat-{version}.zip"
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("kourichat/run.bat", b"@echo off\r\npython run.py\r\n")
+            for i in range(SOURCE_FILES):
+                zf.writestr(f"kourichat/src/module_{i // 100:02d}/file_{i:04d}.py", _source(i, version))
+            if version > 1:
+                zf.writestr("kourichat/src/new_feature.py", b"FEATURE = True\n")
+            zf.writestr(zipfile.ZipInfo("kourichat/data/model.bin"), model_data, compress_type=zipfile.ZIP_STORED)
+        paths.append(path)
+    return paths
+
+
+class _Quiet:
+    """收集下载器日志，不输出到控制台"""
+
+    def __init__(self, verbose: bool):
+        self.verbose = verbose
+
+    def __call__(self, msg_type, data):
+        if self.verbose and msg_type == 'detail':
+            print(f"    {data}")
+
+
+def _downloaded_bytes() -> dict:
+    """按数据类型汇总下载字节数"""
+    from core.metrics import get_registry
+    totals = {}
+    for value in get_registry().counter("download_bytes_total", "").to_dict():
+        kind = value['labels'].get('kind', '')
+        totals[kind] = totals.get(kind, 0) + value['value']
+    return totals
+
+
+def install(work_dir: Path, config: dict, verbose: bool) -> dict:
+    """用给定配置运行一次下载流程"""
+    from core.cloud_downloader import CloudDownloader
+    from core.install_manifest import InstallManifest
+
+    downloader = CloudDownloader(_Quiet(verbose))
+    downloader.app_path = work_dir
+    downloader.download_dir = work_dir / "downloads"
+    downloader.download_dir.mkdir(exist_ok=True)
+    downloader.manifest = InstallManifest(work_dir)
+    downloader.config = config
+
+    before = _downloaded_bytes()
+    start = time.perf_counter()
+    items = downloader.download_packages()
+    elapsed = time.perf_counter() - start
+    downloader.manifest.close()
+
+    after = _downloaded_bytes()
+    delta = {kind: after[kind] - before.get(kind, 0) for kind in after if after[kind] - before.get(kind, 0)}
+    return {'success': len(items) == 1 and Path(items[0]).is_dir(), 'wall_seconds': round(elapsed, 3),
+            'downloaded_bytes': delta, 'total_downloaded_mb': round(sum(delta.values()) / 1024 / 1024, 2)}
+
+
+def verify_tree(target_dir: Path, zip_path: Path) -> bool:
+    """校验解压目录中的文件与ZIP内容一致"""
+    with zipfile.ZipFile(zip_path) as zf:
+        for info in zf.infolist():
+            if info.is_dir():
+                continue
+            path = target_dir / info.filename
+            if not path.is_file() or path.read_bytes() != zf.read(info):
+                return False
+    return True
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="测试分块增量更新的下载量和耗时")
+    parser.add_argument("--model-mb", type=float, default=60, help="项目包中大文件的大小(MB)")
+    parser.add_argument("--latency-ms", type=float, default=20, help="镜像首字节延迟(毫秒)")
+    parser.add_argument("--bandwidth-mb", type=float, default=0, help="每个连接的带宽(MB/s)，0为不限速")
+    parser.add_argument("--output", help="报告JSON的保存路径")
+    parser.add_argument("--verbose", action="store_true", help="输出下载器日志")
+    args = parser.parse_args()
+
+    from cloud_config_manager import PackagePublisher
+
+    mirror_dir = Path(tempfile.mkdtemp(prefix="kouri_delta_mirror_"))
+    build_dir = Path(tempfile.mkdtemp(prefix="kouri_delta_build_"))
+    work_root = Path(tempfile.mkdtemp(prefix="kouri_delta_bench_"))
+    profile = MirrorProfile(latency=args.latency_ms / 1000, bandwidth=args.bandwidth_mb * 1024 * 1024)
+    try:
+        release_paths = build_releases(build_dir, args.model_mb)
+        with MirrorProcess(str(mirror_dir), {"oss": profile}) as mirror:
+            configs = []
+            publish_seconds = []
+            for version, path in enumerate(release_paths, 1):
+                release_dir = mirror_dir / f"v{version}"
+                start = time.perf_counter()
+                config = PackagePublisher(progress_callback=lambda *a: None).publish(
+                    [path], {"version": str(version), "packages": []}, release_dir,
+                    base_url=f"{mirror.urls['oss']}/v{version}/")
+                publish_seconds.append(round(time.perf_counter() - start, 3))
+                shutil.copyfile(path, release_dir / path.name)
+                for package in config["packages"]:
+                    package["extract_to"] = "project"
+                configs.append(config)
+
+            work_dir = work_root / "upgrade"
+            work_dir.mkdir()
+            full = install(work_dir, configs[0], args.verbose)
+            full['tree_ok'] = verify_tree(work_dir / "project", release_paths[0])
+            delta = install(work_dir, configs[1], args.verbose)
+            delta['tree_ok'] = verify_tree(work_dir / "project", release_paths[1])
+
+            # 破坏第二版分块包中的数据，增量更新应校验失败并回退到完整下载
+            fallback_dir = work_root / "fallback"
+            fallback_dir.mkdir()
+            install(fallback_dir, configs[0], args.verbose)
+            pack_path = next((mirror_dir / "v2").glob("*.chunks.pack"))
+            with open(pack_path, 'r+b') as f:
+                data = bytearray(f.read())
+                for offset in range(0, len(data), 4096):
+                    data[offset] ^= 0xFF
+                f.seek(0)
+                f.write(data)
+            fallback = install(fallback_dir, configs[1], args.verbose)
+            fallback['tree_ok'] = verify_tree(fallback_dir / "project", release_paths[1])
+    finally:
+        shutil.rmtree(mirror_dir, ignore_errors=True)
+        shutil.rmtree(build_dir, ignore_errors=True)
+        shutil.rmtree(work_root, ignore_errors=True)
+
+    report = {
+        'model_mb': args.model_mb,
+        'source_files': SOURCE_FILES,
+        'changed_files': CHANGED_FILES,
+        'publish_seconds': publish_seconds,
+        'full_install': full,
+        'delta_upgrade': delta,
+        'corrupt_pack_fallback': fallback,
+        'delta_download_ratio': round(delta['total_downloaded_mb'] / full['total_downloaded_mb'], 4)
+        if full['total_downloaded_mb'] else None,
+    }
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
+    ok = all(r['success'] and r['tree_ok'] for r in (full, delta, fallback))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
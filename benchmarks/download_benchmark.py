@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+下载路径基准测试
+使用本地镜像服务器替代OSS、GitHub和python.org，端到端运行配置下载、安装包下载和ZIP解压，
+输出吞吐量、耗时、CPU时间和内存峰值
+
+镜像服务器运行在独立进程中，每个场景也在独立进程中运行，CPU时间和内存峰值只统计下载端
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+BENCHMARK_DIR = Path(os.path.abspath(__file__)).parent
+PROJECT_ROOT = BENCHMARK_DIR.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(BENCHMARK_DIR))
+
+from mirror_server import FAIL_RESET, FAIL_STATUS, MirrorProcess, MirrorProfile  # noqa: E402
+
+# 模拟安装包（名称 -> 真实大小MB）
+PYTHON_PACKAGE = "python-3.11.9-amd64.exe"
+WECHAT_PACKAGE = "WeChatSetup.exe"
+PROJECT_PACKAGE = "1.4.2fix.zip"
+PACKAGE_SIZES_MB = {PYTHON_PACKAGE: 26, WECHAT_PACKAGE: 150, PROJECT_PACKAGE: 100}
+
+# 项目ZIP中的小文件数量（模拟源码文件）
+PROJECT_SMALL_FILES = 2000
+
+# 场景
+SCENARIOS = ("cloud_config", "download_packages", "download_failover", "extract_zip")
+
+
+def get_peak_rss_mb() -> float:
+    """当前进程的内存峰值(MB)"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS以字节为单位，Linux以KB为单位
+        return round(peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024, 1)
+    except ImportError:
+        pass
+
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD),
+                        ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t),
+                        ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t),
+                        ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb)
+        return round(counters.PeakWorkingSetSize / 1024 / 1024, 1)
+    except:
+        return 0.0
+
+
+def _file_md5(path: Path) -> str:
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_random(path: Path, size: int):
+    with open(path, 'wb') as f:
+        remaining = size
+        while remaining > 0:
+            chunk = min(remaining, 4 * 1024 * 1024)
+            f.write(os.urandom(chunk))
+            remaining -= chunk
+
+
+def build_fixtures(root: Path, scale: float) -> dict:
+    """
+    在镜像目录中生成模拟安装包和云端配置
+
+    Returns:
+        包名称 -> (大小, MD5)
+    """
+    _write_random(root / PYTHON_PACKAGE, int(PACKAGE_SIZES_MB[PYTHON_PACKAGE] * 1024 * 1024 * scale))
+    _write_random(root / WECHAT_PACKAGE, int(PACKAGE_SIZES_MB[WECHAT_PACKAGE] * 1024 * 1024 * scale))
+
+    # 项目包：大量可压缩的小文件 + 一个不可压缩的大文件，总大小接近目标
+    zip_size = int(PACKAGE_SIZES_MB[PROJECT_PACKAGE] * 1024 * 1024 * scale)
+    small_file = b"# KouriChat module\n" * 200
+    with zipfile.ZipFile(root / PROJECT_PACKAGE, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("kourichat/run.bat", b"@echo off\r\npython run.py\r\n")
+        for i in range(PROJECT_SMALL_FILES):
+            zf.writestr(f"kourichat/src/module_{i // 100:02d}/file_{i:04d}.py", small_file)
+        zf.writestr(zipfile.ZipInfo("kourichat/data/model.bin"), os.urandom(max(0, zip_size - 256 * 1024)),
+                    compress_type=zipfile.ZIP_STORED)
+
+    return {name: ((root / name).stat().st_size, _file_md5(root / name)) for name in PACKAGE_SIZES_MB}
+
+
+def build_cloud_config(urls: dict, packages: dict, primary: str) -> dict:
+    """生成指向本地镜像的云端配置，primary为主源镜像名称"""
+    fallbacks = [name for name in ("github", "python_org") if name != primary]
+    return {
+        "version": "bench",
+        "packages": [
+            {"name": name, "url": f"{urls[primary]}/{name}", "size": size, "md5": md5,
+             **({"extract_to": "project", "post_download": "extract"} if name.endswith(".zip") else {})}
+            for name, (size, md5) in packages.items()
+        ],
+        "fallback_urls": {name: [f"{urls[mirror]}/{name}" for mirror in fallbacks] for name in packages},
+    }
+
+
+class _Quiet:
+    """收集下载器日志，不输出到控制台"""
+
+    def __init__(self, verbose: bool):
+        self.verbose = verbose
+
+    def __call__(self, msg_type, data):
+        if self.verbose and msg_type == 'detail':
+            print(f"    {data}")
+
+
+def _create_downloader(work_dir: Path, config: dict, verbose: bool):
+    from core.cloud_downloader import CloudDownloader
+    from core.install_manifest import InstallManifest
+
+    downloader = CloudDownloader(_Quiet(verbose))
+    downloader.app_path = work_dir
+    downloader.download_dir = work_dir / "downloads"
+    downloader.download_dir.mkdir(exist_ok=True)
+    downloader.manifest = InstallManifest(work_dir)
+    downloader.config = config
+    return downloader
+
+
+def _run_scenario(name: str, urls: dict, packages: dict, fixture_dir: str, verbose: bool) -> dict:
+    """在当前（子）进程中运行一个场景"""
+    work_dir = Path(tempfile.mkdtemp(prefix="kouri_dl_bench_"))
+    try:
+        result = {'scenario': name}
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+
+        if name == "cloud_config":
+            from core.hot_updater import HotUpdater
+            config_path = Path(fixture_dir) / "cloud_config.json"
+            updater = HotUpdater(_Quiet(verbose))
+            updater.config_path = work_dir / "cloud_config.json"
+            updater.cloud_config_url = f"{urls['oss_flaky']}/cloud_config.json"
+            updater.fallback_config_urls = [f"{urls['github']}/cloud_config.json"]
+            if not verbose:
+                # HotUpdater直接print日志，基准测试时屏蔽
+                updater._log = lambda message: None
+            result['success'] = updater.download_cloud_config()
+            result['bytes'] = config_path.stat().st_size
+
+        elif name in ("download_packages", "download_failover"):
+            primary = "oss" if name == "download_packages" else "oss_flaky"
+            config = build_cloud_config(urls, packages, primary)
+            downloader = _create_downloader(work_dir, config, verbose)
+            items = downloader.download_packages()
+            downloader.manifest.close()
+            result['success'] = len(items) == len(packages)
+            result['bytes'] = sum(size for size, _ in packages.values())
+
+        elif name == "extract_zip":
+            config = build_cloud_config(urls, packages, "oss")
+            downloader = _create_downloader(work_dir, config, verbose)
+            zip_path = downloader.download_dir / PROJECT_PACKAGE
+            shutil.copyfile(Path(fixture_dir) / PROJECT_PACKAGE, zip_path)
+            with zipfile.ZipFile(zip_path) as zf:
+                result['files'] = len(zf.namelist())
+                result['bytes'] = sum(info.file_size for info in zf.infolist())
+            # 复制文件不计入解压耗时
+            cpu_start = time.process_time()
+            start = time.perf_counter()
+            result['success'] = downloader.extract_zip_file(zip_path, "project")
+            downloader.manifest.close()
+
+        else:
+            raise ValueError(f"未知场景: {name}")
+
+        wall = time.perf_counter() - start
+        result['wall_seconds'] = round(wall, 3)
+        result['cpu_seconds'] = round(time.process_time() - cpu_start, 3)
+        result['throughput_mb_s'] = round(result['bytes'] / 1024 / 1024 / wall, 1) if wall else None
+        if 'files' in result and wall:
+            result['files_per_second'] = round(result['files'] / wall, 1)
+        result['peak_rss_mb'] = get_peak_rss_mb()
+        return result
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def run_isolated(ctx, name: str, urls: dict, packages: dict, fixture_dir: str, verbose: bool) -> dict:
+    """在独立进程中运行场景，内存峰值互不影响"""
+    with ctx.Pool(1) as pool:
+        return pool.apply(_run_scenario, (name, urls, packages, fixture_dir, verbose))
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="使用本地镜像测试下载、校验和解压路径的性能")
+    parser.add_argument("--scale", type=float, default=1.0, help="安装包大小缩放比例（1为真实大小）")
+    parser.add_argument("--latency-ms", type=float, default=20, help="镜像首字节延迟(毫秒)")
+    parser.add_argument("--bandwidth-mb", type=float, default=0, help="每个连接的带宽(MB/s)，0为不限速")
+    parser.add_argument("--fail-mode", choices=(FAIL_STATUS, FAIL_RESET), default=FAIL_RESET,
+                        help="故障镜像的失败方式：返回503或传输一半后断开")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS), help="要运行的场景")
+    parser.add_argument("--output", help="报告JSON的保存路径")
+    parser.add_argument("--verbose", action="store_true", help="输出下载器日志")
+    args = parser.parse_args()
+
+    fixture_dir = Path(tempfile.mkdtemp(prefix="kouri_mirror_"))
+    ctx = multiprocessing.get_context("spawn")
+    mirror = None
+    try:
+        packages = build_fixtures(fixture_dir, args.scale)
+
+        latency = args.latency_ms / 1000
+        bandwidth = args.bandwidth_mb * 1024 * 1024
+        profiles = {
+            "oss": MirrorProfile(latency=latency, bandwidth=bandwidth),
+            "oss_flaky": MirrorProfile(latency=latency, bandwidth=bandwidth, fail_rate=1.0, fail_mode=args.fail_mode),
+            "github": MirrorProfile(latency=latency * 5, bandwidth=bandwidth),
+            "python_org": MirrorProfile(latency=latency * 3, bandwidth=bandwidth),
+        }
+
+        mirror = MirrorProcess(str(fixture_dir), profiles)
+        urls = mirror.start()
+
+        with open(fixture_dir / "cloud_config.json", 'w', encoding='utf-8') as f:
+            json.dump(build_cloud_config(urls, packages, "oss"), f, indent=2)
+
+        results = [run_isolated(ctx, name, urls, packages, str(fixture_dir), args.verbose)
+                   for name in args.scenarios]
+    finally:
+        mirror_stats = mirror.stop() if mirror else {}
+        shutil.rmtree(fixture_dir, ignore_errors=True)
+
+    report = {
+        'scale': args.scale,
+        'latency_ms': args.latency_ms,
+        'bandwidth_mb_s': args.bandwidth_mb or None,
+        'fail_mode': args.fail_mode,
+        'payload_mb': {name: round(size / 1024 / 1024, 1) for name, (size, _) in packages.items()},
+        'scenarios': results,
+        'mirrors': mirror_stats,
+    }
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
+    return 0 if all(r.get('success') for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+压缩传输基准测试
+用发布工具为文本较多的安装包生成.gz/.xz预压缩文件，通过本地镜像对比：
+未压缩下载、gzip传输压缩（Content-Encoding）、预压缩文件下载的传输量、耗时和CPU，
+并验证预压缩文件损坏时回退到未压缩文件、配置文件压缩传输
+
+镜像服务器运行在独立进程中，每个场景也在独立进程中运行
+"""
+
+import argparse
+import gzip
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCHMARK_DIR = Path(os.path.abspath(__file__)).parent
+PROJECT_ROOT = BENCHMARK_DIR.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(BENCHMARK_DIR))
+
+from download_benchmark import get_peak_rss_mb  # noqa: E402
+from mirror_server import MirrorProcess, MirrorProfile  # noqa: E402
+
+PACKAGE_NAME = "kourichat-src.tar"
+
+# 场景：(镜像, 是否使用配置中的预压缩文件)
+SCENARIOS = {
+    "plain": ("plain", False),
+    "transfer_gzip": ("gzip", False),
+    "variant": ("plain", True),
+    "corrupt_variant": ("plain", True),
+}
+
+
+def build_payload(path: Path, size_mb: float):
+    """生成文本较多的安装包（源码、配置和少量二进制数据）"""
+    rng = random.Random(1)
+    words = ["def", "return", "message", "self", "config", "import", "class", "async", "await", "None",
+             "logger", "handler", "context", "response", "reply", "user", "memory", "prompt", "model"]
+    target = int(size_mb * 1024 * 1024)
+    with open(path, 'wb') as f:
+        written = 0
+        while written < target:
+            if rng.random() < 0.05:
+                block = os.urandom(16 * 1024)
+            else:
+                lines = (" ".join(rng.choice(words) for _ in range(rng.randint(3, 12))) for _ in range(400))
+                block = "\n".join(lines).encode()
+            f.write(block)
+            written += len(block)
+
+
+class _Quiet:
+    """收集下载器日志，不输出到控制台"""
+
+    def __init__(self, verbose: bool):
+        self.verbose = verbose
+
+    def __call__(self, msg_type, data):
+        if self.verbose and msg_type == 'detail':
+            print(f"    {data}")
+
+
+def _run_scenario(name: str, config: dict, verbose: bool) -> dict:
+    """在当前（子）进程中运行一个场景"""
+    from core.cloud_downloader import CloudDownloader
+    from core.install_manifest import InstallManifest
+    from core.metrics import get_registry
+
+    work_dir = Path(tempfile.mkdtemp(prefix="kouri_encoding_bench_"))
+    try:
+        downloader = CloudDownloader(_Quiet(verbose))
+        downloader.app_path = work_dir
+        downloader.download_dir = work_dir / "downloads"
+        downloader.download_dir.mkdir(exist_ok=True)
+        downloader.manifest = InstallManifest(work_dir)
+        downloader.config = config
+
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        items = downloader.download_packages()
+        wall = time.perf_counter() - start
+        downloader.manifest.close()
+
+        transferred = {}
+        for value in get_registry().counter("download_bytes_total", "").to_dict():
+            kind = value['labels'].get('kind', '')
+            transferred[kind] = transferred.get(kind, 0) + value['value']
+        hashed = sum(value['value'] for value in get_registry().counter("hash_bytes_total", "").to_dict())
+        outcomes = {f"{value['labels']['encoding']}:{value['labels']['outcome']}": value['value']
+                    for value in get_registry().counter("variant_downloads_total", "").to_dict()}
+        local_path = downloader.download_dir / PACKAGE_NAME
+        return {
+            'scenario': name,
+            'success': len(items) == 1 and downloader.file_md5(local_path) == config["packages"][0]["md5"],
+            'variant_outcomes': outcomes,
+            'transferred_mb': round(sum(transferred.values()) / 1024 / 1024, 2),
+            'transferred_by_kind': transferred,
+            'hashed_mb': round(hashed / 1024 / 1024, 2),
+            'wall_seconds': round(wall, 3),
+            'cpu_seconds': round(time.process_time() - cpu_start, 3),
+            'peak_rss_mb': get_peak_rss_mb(),
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _fetch_config(url: str) -> dict:
+    """用热更新器下载配置文件，返回传输字节数"""
+    from core.hot_updater import HotUpdater
+    from core.metrics import get_registry
+
+    work_dir = Path(tempfile.mkdtemp(prefix="kouri_encoding_config_"))
+    try:
+        updater = HotUpdater(lambda *a: None)
+        updater.config_path = work_dir / "cloud_config.json"
+        updater.cloud_config_url = url
+        updater.fallback_config_urls = []
+        ok = updater.download_cloud_config()
+        transferred = sum(value['value'] for value in get_registry().counter("download_bytes_total", "").to_dict())
+        return {'success': ok and updater.config_path.is_file(), 'transferred_bytes': transferred,
+                'saved_bytes': updater.config_path.stat().st_size if ok else 0}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="测试压缩传输和预压缩文件的传输量和耗时")
+    parser.add_argument("--size-mb", type=float, default=40, help="安装包大小(MB)")
+    parser.add_argument("--latency-ms", type=float, default=20, help="镜像首字节延迟(毫秒)")
+    parser.add_argument("--bandwidth-mb", type=float, default=10, help="每个连接的带宽(MB/s)，0为不限速")
+    parser.add_argument("--compress", nargs="+", default=["xz", "gzip"], choices=["gzip", "xz"],
+                        help="发布的预压缩格式")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS),
+                        help="要运行的场景")
+    parser.add_argument("--output", help="报告JSON的保存路径")
+    parser.add_argument("--verbose", action="store_true", help="输出下载器日志")
+    args = parser.parse_args()
+
+    from cloud_config_manager import PackagePublisher
+
+    build_dir = Path(tempfile.mkdtemp(prefix="kouri_encoding_build_"))
+    mirror_dir = Path(tempfile.mkdtemp(prefix="kouri_encoding_mirror_"))
+    ctx = multiprocessing.get_context("spawn")
+    profiles = {
+        name: MirrorProfile(latency=args.latency_ms / 1000, bandwidth=args.bandwidth_mb * 1024 * 1024,
+                            gzip_static=name == "gzip")
+        for name in ("plain", "gzip")
+    }
+    pools = {name: ctx.Pool(1) for name in args.scenarios + ["config_plain", "config_gzip"]}
+    try:
+        source = build_dir / PACKAGE_NAME
+        build_payload(source, args.size_mb)
+        with MirrorProcess(str(mirror_dir), profiles) as mirror:
+            start = time.perf_counter()
+            config = PackagePublisher(progress_callback=lambda *a: None).publish(
+                [source], {"version": "1", "packages": []}, mirror_dir,
+                base_url="/", compress=args.compress)
+            publish_seconds = round(time.perf_counter() - start, 3)
+            shutil.copyfile(source, mirror_dir / PACKAGE_NAME)
+            package = config["packages"][0]
+            variants = {variant['encoding']: variant['size'] for variant in package.get("variants", [])}
+
+            # 镜像的gzip_static使用同目录下的.gz文件
+            if "gzip" not in variants:
+                with open(source, 'rb') as f, gzip.open(mirror_dir / (PACKAGE_NAME + ".gz"), 'wb') as out:
+                    shutil.copyfileobj(f, out, 1024 * 1024)
+            config_text = (mirror_dir / "cloud_config.json").read_bytes()
+            with gzip.open(mirror_dir / "cloud_config.json.gz", 'wb') as out:
+                out.write(config_text)
+
+            results = []
+            for name in args.scenarios:
+                mirror_name, use_variants = SCENARIOS[name]
+                base = mirror.urls[mirror_name]
+                scenario_config = json.loads(json.dumps(config))
+                scenario_package = scenario_config["packages"][0]
+                scenario_package["url"] = f"{base}/{PACKAGE_NAME}"
+                if use_variants:
+                    for variant in scenario_package.get("variants", []):
+                        variant["url"] = base + variant["url"]
+                else:
+                    scenario_package.pop("variants", None)
+                if name == "corrupt_variant":
+                    for variant in scenario_package.get("variants", []):
+                        path = mirror_dir / variant["url"].rsplit('/', 1)[-1]
+                        data = bytearray(path.read_bytes())
+                        data[len(data) // 2] ^= 0xFF
+                        path.write_bytes(data)
+                results.append(pools[name].apply(_run_scenario, (name, scenario_config, args.verbose)))
+
+            config_fetch = {name: pools[f"config_{name}"].apply(_fetch_config,
+                                                                (f"{mirror.urls[name]}/cloud_config.json",))
+                            for name in ("plain", "gzip")}
+    finally:
+        for pool in pools.values():
+            pool.terminate()
+        shutil.rmtree(build_dir, ignore_errors=True)
+        shutil.rmtree(mirror_dir, ignore_errors=True)
+
+    report = {
+        'size_mb': args.size_mb,
+        'publish_seconds': publish_seconds,
+        'variant_mb': {encoding: round(size / 1024 / 1024, 2) for encoding, size in variants.items()},
+        'scenarios': results,
+        'config_fetch': config_fetch,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
+    ok = all(r['success'] for r in results) and all(r['success'] for r in config_fetch.values())
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+下载和校验I/O基准测试
+对比旧的小块读取循环（read(8192)下载、read(4096)计算MD5）和下载器当前的复用缓冲区实现，
+输出每MB的CPU时间、耗时、读取调用次数和Python内存分配峰值
+
+当前实现下载时同时计算MD5，之后的校验直接命中缓存，因此单独的下载用例不能与旧实现直接比较；
+加速比按“下载+校验”整体对比，单独的校验用例每次运行前清空MD5缓存
+
+镜像服务器运行在独立进程中，CPU时间只统计下载端
+"""
+
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+from pathlib import Path
+
+BENCHMARK_DIR = Path(os.path.abspath(__file__)).parent
+PROJECT_ROOT = BENCHMARK_DIR.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(BENCHMARK_DIR))
+
+from mirror_server import MirrorProcess, MirrorProfile  # noqa: E402
+
+PAYLOAD_NAME = "payload.bin"
+
+
+class _CallCounter:
+    """统计HTTP响应的read()/readinto()调用次数"""
+
+    def __init__(self):
+        self.reads = 0
+        self.readintos = 0
+        self._read = http.client.HTTPResponse.read
+        self._readinto = http.client.HTTPResponse.readinto
+
+    def __enter__(self):
+        counter = self
+
+        def read(response, *args, **kwargs):
+            counter.reads += 1
+            return counter._read(response, *args, **kwargs)
+
+        def readinto(response, *args, **kwargs):
+            counter.readintos += 1
+            return counter._readinto(response, *args, **kwargs)
+
+        http.client.HTTPResponse.read = read
+        http.client.HTTPResponse.readinto = readinto
+        return self
+
+    def __exit__(self, *exc):
+        http.client.HTTPResponse.read = self._read
+        http.client.HTTPResponse.readinto = self._readinto
+
+
+def legacy_download(url: str, local_path: Path) -> bool:
+    """旧实现：每次read(8192)返回新的bytes对象"""
+    with urllib.request.urlopen(url, timeout=30) as response:
+        with open(local_path, 'wb') as f:
+            while True:
+                chunk = response.read(8192)
+                if not chunk:
+                    break
+                f.write(chunk)
+    return True
+
+
+def legacy_verify(file_path: Path, expected_md5: str) -> bool:
+    """旧实现：每次read(4096)返回新的bytes对象"""
+    hash_md5 = hashlib.md5()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(4096), b""):
+            hash_md5.update(chunk)
+    return hash_md5.hexdigest() == expected_md5
+
+
+def _measure(func, size: int, trace_memory: bool) -> dict:
+    """运行一次并统计耗时、CPU时间和读取调用次数"""
+    if trace_memory:
+        tracemalloc.start()
+    with _CallCounter() as counter:
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        success = func()
+        wall = time.perf_counter() - start
+        cpu = time.process_time() - cpu_start
+    result = {
+        'success': bool(success),
+        'wall_seconds': round(wall, 3),
+        'cpu_seconds': round(cpu, 3),
+        'cpu_ms_per_mb': round(cpu * 1000 / (size / 1024 / 1024), 3),
+        'throughput_mb_s': round(size / 1024 / 1024 / wall, 1) if wall else None,
+        'http_read_calls': counter.reads,
+        'http_readinto_calls': counter.readintos,
+    }
+    if trace_memory:
+        result['python_alloc_peak_kb'] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        tracemalloc.stop()
+    return result
+
+
+def run(url: str, size: int, md5: str, work_dir: Path, repeat: int) -> dict:
+    """对比旧实现和当前实现的下载与校验"""
+    from core.cloud_downloader import CloudDownloader
+
+    downloader = CloudDownloader(lambda msg_type, data: None)
+    local_path = work_dir / PAYLOAD_NAME
+
+    def verify_uncached() -> bool:
+        # 清空下载时记录的MD5，重新读取文件计算
+        downloader._md5_cache.clear()
+        return downloader.verify_file(local_path, md5)
+
+    def end_to_end_legacy() -> bool:
+        return legacy_download(url, local_path) and legacy_verify(local_path, md5)
+
+    def end_to_end_current() -> bool:
+        downloader._md5_cache.clear()
+        return downloader.download_file(url, local_path, size) and downloader.verify_file(local_path, md5)
+
+    cases = {
+        'download_legacy': lambda: legacy_download(url, local_path),
+        # 包含下载时计算MD5的开销
+        'download_current': lambda: downloader.download_file(url, local_path, size),
+        'verify_legacy': lambda: legacy_verify(local_path, md5),
+        'verify_current': verify_uncached,
+        'download_verify_legacy': end_to_end_legacy,
+        'download_verify_current': end_to_end_current,
+    }
+
+    results = {}
+    for name, func in cases.items():
+        # 取多次运行中CPU时间最少的一次，另外单独运行一次统计内存分配（tracemalloc本身开销较大）
+        runs = [_measure(func, size, trace_memory=False) for _ in range(repeat)]
+        best = min(runs, key=lambda r: r['cpu_seconds'])
+        best['success'] = all(r['success'] for r in runs)
+        best['python_alloc_peak_kb'] = _measure(func, size, trace_memory=True)['python_alloc_peak_kb']
+        results[name] = best
+
+    for kind in ('download_verify', 'verify'):
+        legacy = results[f'{kind}_legacy']['cpu_seconds']
+        current = results[f'{kind}_current']['cpu_seconds']
+        results[f'{kind}_cpu_speedup'] = round(legacy / current, 2) if current else None
+    return results
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="对比下载和MD5校验的I/O实现")
+    parser.add_argument("--size-mb", type=float, default=200, help="测试文件大小(MB)")
+    parser.add_argument("--repeat", type=int, default=3, help="每种实现的运行次数")
+    parser.add_argument("--output", help="报告JSON的保存路径")
+    args = parser.parse_args()
+
+    fixture_dir = Path(tempfile.mkdtemp(prefix="kouri_io_mirror_"))
+    work_dir = Path(tempfile.mkdtemp(prefix="kouri_io_bench_"))
+    size = int(args.size_mb * 1024 * 1024)
+    try:
+        digest = hashlib.md5()
+        with open(fixture_dir / PAYLOAD_NAME, 'wb') as f:
+            remaining = size
+            while remaining > 0:
+                chunk = os.urandom(min(remaining, 4 * 1024 * 1024))
+                digest.update(chunk)
+                f.write(chunk)
+                remaining -= len(chunk)
+
+        with MirrorProcess(str(fixture_dir), {"local": MirrorProfile()}) as mirror:
+            url = f"{mirror.urls['local']}/{PAYLOAD_NAME}"
+            results = run(url, size, digest.hexdigest(), work_dir, max(1, args.repeat))
+    finally:
+        shutil.rmtree(fixture_dir, ignore_errors=True)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {'size_mb': args.size_mb, 'repeat': args.repeat, 'results': results}
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
+    return 0 if all(r['success'] for r in results.values() if isinstance(r, dict)) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
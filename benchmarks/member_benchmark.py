@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按条目增量更新基准测试
+生成两个版本的项目包（大量源码文件和大体积资源文件，第二版只修改少量源码），
+通过本地镜像先完整安装第一版，再升级到第二版（升级前删除一个未变化的文件），对比下载量和耗时并校验解压结果；
+另外测试只重新打包（注释变化、文件不变）时不下载，以及镜像不支持Range请求时回退到下载完整ZIP
+
+镜像服务器运行在独立进程中
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import zipfile
+from pathlib import Path
+
+BENCHMARK_DIR = Path(os.path.abspath(__file__)).parent
+PROJECT_ROOT = BENCHMARK_DIR.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(BENCHMARK_DIR))
+
+from delta_benchmark import install, verify_tree  # noqa: E402
+from mirror_server import MirrorProcess, MirrorProfile  # noqa: E402
+
+PACKAGE_NAME = "1.4.2fix.zip"
+
+# 项目中的源码文件数
+SOURCE_FILES = 3000
+
+# 资源文件数（不压缩存储的随机数据）
+ASSET_FILES = 20
+
+# 第二版修改的源码文件数
+CHANGED_FILES = 5
+
+
+def _source(i: int, version: int) -> bytes:
+    """模拟源码文件内容"""
+    body = f"# KouriChat module {i}\n".encode() + b"async def reply(context):\n    return context\n" * 60
+    if version > 1 and i < CHANGED_FILES:
+        body += f"\n# patched in release {version}\n".encode()
+    return body
+
+
+def build_release(path: Path, version: int, assets: list, comment: bytes = b""):
+    """生成一个版本的项目ZIP"""
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.comment = comment
+        zf.writestr("KouriChat/run.bat", b"@echo off\r\npython run.py\r\n")
+        for i in range(SOURCE_FILES):
+            zf.writestr(f"KouriChat/src/module_{i // 100:02d}/file_{i:04d}.py", _source(i, version))
+        if version > 1:
+            zf.writestr("KouriChat/src/new_feature.py", b"FEATURE = True\n")
+        for i, data in enumerate(assets):
+            zf.writestr(zipfile.ZipInfo(f"KouriChat/data/asset_{i:02d}.bin"), data, compress_type=zipfile.ZIP_STORED)
+
+
+def _config(path: Path, url: str, version: str) -> dict:
+    data = path.read_bytes()
+    return {"version": version, "packages": [{
+        "name": PACKAGE_NAME, "url": url, "size": len(data), "md5": hashlib.md5(data).hexdigest(),
+        "extract_to": "project", "post_download": "extract",
+    }]}
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="测试按ZIP条目增量更新的下载量和耗时")
+    parser.add_argument("--asset-mb", type=float, default=90, help="项目包中资源文件的总大小(MB)")
+    parser.add_argument("--latency-ms", type=float, default=20, help="镜像首字节延迟(毫秒)")
+    parser.add_argument("--bandwidth-mb", type=float, default=0, help="每个连接的带宽(MB/s)，0为不限速")
+    parser.add_argument("--output", help="报告JSON的保存路径")
+    parser.add_argument("--verbose", action="store_true", help="输出下载器日志")
+    args = parser.parse_args()
+
+    mirror_dir = Path(tempfile.mkdtemp(prefix="kouri_member_mirror_"))
+    work_root = Path(tempfile.mkdtemp(prefix="kouri_member_bench_"))
+    latency, bandwidth = args.latency_ms / 1000, args.bandwidth_mb * 1024 * 1024
+    profiles = {
+        "oss": MirrorProfile(latency=latency, bandwidth=bandwidth),
+        "no_range": MirrorProfile(latency=latency, bandwidth=bandwidth, support_range=False),
+    }
+    try:
+        asset_size = int(args.asset_mb * 1024 * 1024 / ASSET_FILES)
+        assets = [os.urandom(asset_size) for _ in range(ASSET_FILES)]
+        releases = {"v1": (1, b""), "v1-rebuilt": (1, b"rebuilt"), "v2": (2, b"")}
+        for name, (version, comment) in releases.items():
+            (mirror_dir / name).mkdir()
+            build_release(mirror_dir / name / PACKAGE_NAME, version, assets, comment)
+        del assets
+
+        with MirrorProcess(str(mirror_dir), profiles) as mirror:
+            results = {}
+            for mirror_name in ("oss", "no_range"):
+                work_dir = work_root / mirror_name
+                work_dir.mkdir()
+                runs = [("full_install", "v1"), ("rebuilt_unchanged", "v1-rebuilt"), ("upgrade", "v2")]
+                for run, release in runs:
+                    if run == "upgrade":
+                        # 升级前删除一个未变化的文件，升级后应恢复
+                        (work_dir / "project" / "KouriChat/src/module_10/file_1000.py").unlink()
+                    config = _config(mirror_dir / release / PACKAGE_NAME,
+                                     f"{mirror.urls[mirror_name]}/{release}/{PACKAGE_NAME}", release)
+                    result = install(work_dir, config, args.verbose)
+                    result['tree_ok'] = verify_tree(work_dir / "project", mirror_dir / release / PACKAGE_NAME)
+                    results[f"{mirror_name}:{run}"] = result
+    finally:
+        shutil.rmtree(mirror_dir, ignore_errors=True)
+        shutil.rmtree(work_root, ignore_errors=True)
+
+    full_mb = results["oss:full_install"]['total_downloaded_mb']
+    report = {
+        'asset_mb': args.asset_mb,
+        'source_files': SOURCE_FILES,
+        'changed_files': CHANGED_FILES,
+        'runs': results,
+        'upgrade_download_ratio': round(results["oss:upgrade"]['total_downloaded_mb'] / full_mb, 4)
+        if full_mb else None,
+    }
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
+    ok = all(r['success'] and r['tree_ok'] for r in results.values())
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
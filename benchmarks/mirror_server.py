@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地镜像服务器 - 基准测试中替代OSS、GitHub和python.org等下载源
+支持请求延迟、带宽限制、故障注入、Range请求、ETag和gzip压缩传输
+"""
+
+import email.utils
+import multiprocessing
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+# 故障类型
+FAIL_STATUS = 'status'    # 返回503
+FAIL_RESET = 'reset'      # 发送部分内容后断开连接
+
+
+class MirrorProfile:
+    """镜像行为配置"""
+
+    def __init__(self, latency: float = 0.0, bandwidth: float = 0.0,
+                 fail_rate: float = 0.0, fail_first: int = 0, fail_mode: str = FAIL_STATUS,
+                 support_range: bool = True, support_etag: bool = True, seed: Optional[int] = None,
+                 gzip_static: bool = False):
+        """
+        初始化镜像配置
+
+        Args:
+            latency: 每个请求的首字节延迟（秒）
+            bandwidth: 每个连接的带宽上限（字节/秒），0表示不限速
+            fail_rate: 随机失败概率
+            fail_first: 每个路径的前N次请求失败
+            fail_mode: 失败方式（FAIL_STATUS / FAIL_RESET）
+            support_range: 是否支持Range请求
+            support_etag: 是否返回ETag并处理If-None-Match / If-Range
+            seed: 随机失败的随机数种子
+            gzip_static: 客户端接受gzip且存在同名.gz文件时，以Content-Encoding: gzip返回该文件（完整请求）
+        """
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.fail_rate = fail_rate
+        self.fail_first = fail_first
+        self.fail_mode = fail_mode
+        self.support_range = support_range
+        self.support_etag = support_etag
+        self.random = random.Random(seed)
+        self.gzip_static = gzip_static
+
+
+class MirrorRequestHandler(BaseHTTPRequestHandler):
+    """镜像请求处理"""
+
+    protocol_version = "HTTP/1.1"
+    chunk_size = 64 * 1024
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def mirror(self) -> 'MirrorServer':
+        return self.server.mirror
+
+    def _resolve(self) -> Optional[str]:
+        name = self.path.split('?', 1)[0].lstrip('/')
+        path = os.path.join(self.mirror.root, *name.split('/'))
+        if name and os.path.isfile(path):
+            return path
+        return None
+
+    def _should_fail(self, name: str) -> bool:
+        profile = self.mirror.profile
+        with self.mirror.lock:
+            count = self.mirror.request_counts.get(name, 0) + 1
+            self.mirror.request_counts[name] = count
+            if count <= profile.fail_first:
+                return True
+            return profile.fail_rate > 0 and profile.random.random() < profile.fail_rate
+
+    def _parse_range(self, size: int):
+        """解析单个字节范围，返回(start, end)或None"""
+        header = self.headers.get('Range')
+        if not header or not self.mirror.profile.support_range:
+            return None
+        match = re.match(r'bytes=(\d*)-(\d*)$', header.strip())
+        if not match or (not match.group(1) and not match.group(2)):
+            return None
+        if match.group(1):
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else size - 1
+        else:
+            start = max(0, size - int(match.group(2)))
+            end = size - 1
+        if start >= size or start > end:
+            return 'invalid'
+        return start, min(end, size - 1)
+
+    def _send_body(self, f, start: int, length: int, reset_after: Optional[int] = None):
+        bandwidth = self.mirror.profile.bandwidth
+        f.seek(start)
+        sent = 0
+        begin = time.perf_counter()
+        while sent < length:
+            chunk = f.read(min(self.chunk_size, length - sent))
+            if not chunk:
+                break
+            if reset_after is not None and sent + len(chunk) > reset_after:
+                self.wfile.write(chunk[:max(0, reset_after - sent)])
+                self.wfile.flush()
+                self.close_connection = True
+                return
+            self.wfile.write(chunk)
+            sent += len(chunk)
+            with self.mirror.lock:
+                self.mirror.bytes_sent += len(chunk)
+            if bandwidth:
+                # 按已发送字节数计算应到达的时间，平滑限速
+                delay = sent / bandwidth - (time.perf_counter() - begin)
+                if delay > 0:
+                    time.sleep(delay)
+
+    def _handle(self, send_body: bool):
+        profile = self.mirror.profile
+        if profile.latency:
+            time.sleep(profile.latency)
+
+        path = self._resolve()
+        if path is None:
+            self.send_error(404)
+            return
+
+        name = os.path.relpath(path, self.mirror.root)
+        fail = self._should_fail(name)
+        if fail and profile.fail_mode == FAIL_STATUS:
+            self.send_error(503, "Injected failure")
+            return
+
+        content_encoding = None
+        accept = self.headers.get('Accept-Encoding', '')
+        if (profile.gzip_static and 'gzip' in accept and not self.headers.get('Range')
+                and os.path.isfile(path + '.gz')):
+            path += '.gz'
+            content_encoding = 'gzip'
+
+        stat = os.stat(path)
+        size = stat.st_size
+        etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+
+        if profile.support_etag and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        byte_range = self._parse_range(size)
+        if_range = self.headers.get('If-Range')
+        if byte_range and if_range and (not profile.support_etag or if_range != etag):
+            # 资源已变化，返回完整内容
+            byte_range = None
+        if byte_range == 'invalid':
+            self.send_response(416)
+            self.send_header('Content-Range', f'bytes */{size}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        start, end = byte_range if byte_range else (0, size - 1)
+        length = end - start + 1 if size else 0
+
+        self.send_response(206 if byte_range else 200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(length))
+        self.send_header('Last-Modified', email.utils.formatdate(stat.st_mtime, usegmt=True))
+        if profile.support_range:
+            self.send_header('Accept-Ranges', 'bytes')
+        if profile.support_etag:
+            self.send_header('ETag', etag)
+        if content_encoding:
+            self.send_header('Content-Encoding', content_encoding)
+        if byte_range:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.end_headers()
+
+        if send_body and length:
+            with open(path, 'rb') as f:
+                self._send_body(f, start, length, reset_after=length // 2 if fail else None)
+
+    def do_GET(self):
+        try:
+            self._handle(send_body=True)
+        except (ConnectionResetError, BrokenPipeError):
+            # 客户端校验失败后主动断开
+            self.close_connection = True
+
+    def do_HEAD(self):
+        self._handle(send_body=False)
+
+
+class MirrorServer:
+    """本地镜像服务器，在后台线程中提供目录下的文件"""
+
+    def __init__(self, root: str, profile: Optional[MirrorProfile] = None, host: str = "127.0.0.1"):
+        """
+        初始化镜像服务器
+
+        Args:
+            root: 提供文件的目录
+            profile: 镜像行为配置
+            host: 监听地址
+        """
+        self.root = root
+        self.profile = profile or MirrorProfile()
+        self.lock = threading.Lock()
+        self.request_counts: Dict[str, int] = {}
+        self.bytes_sent = 0
+
+        self.httpd = ThreadingHTTPServer((host, 0), MirrorRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.mirror = self
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url(self, name: str) -> str:
+        """文件的下载地址"""
+        return f"{self.base_url}/{name}"
+
+    def start(self) -> 'MirrorServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _serve_mirrors(root: str, profiles: Dict[str, MirrorProfile], ready, stop):
+    """镜像进程：启动所有镜像并返回地址，收到停止信号后返回统计数据"""
+    servers = {name: MirrorServer(root, profile).start() for name, profile in profiles.items()}
+    ready.put({name: server.base_url for name, server in servers.items()})
+    stop.wait()
+    stats = {name: {'requests': sum(server.request_counts.values()), 'bytes_sent': server.bytes_sent}
+             for name, server in servers.items()}
+    for server in servers.values():
+        server.stop()
+    ready.put(stats)
+
+
+class MirrorProcess:
+    """在独立进程中运行一组镜像，基准测试的CPU时间和内存峰值不包含服务端"""
+
+    def __init__(self, root: str, profiles: Dict[str, MirrorProfile]):
+        """
+        初始化镜像进程
+
+        Args:
+            root: 提供文件的目录
+            profiles: 镜像名称 -> 镜像行为配置
+        """
+        self.root = root
+        self.profiles = profiles
+        self.urls: Dict[str, str] = {}
+        self.stats: Dict[str, Dict] = {}
+        self._ctx = multiprocessing.get_context("spawn")
+        self._ready = self._ctx.Queue()
+        self._stop = self._ctx.Event()
+        self._process = None
+
+    def start(self, timeout: float = 30) -> Dict[str, str]:
+        """启动进程，返回镜像名称 -> 地址"""
+        self._process = self._ctx.Process(target=_serve_mirrors,
+                                          args=(self.root, self.profiles, self._ready, self._stop),
+                                          daemon=True)
+        self._process.start()
+        self.urls = self._ready.get(timeout=timeout)
+        return self.urls
+
+    def stop(self, timeout: float = 30) -> Dict[str, Dict]:
+        """停止进程，返回各镜像的请求数和发送字节数"""
+        if self._process is None:
+            return self.stats
+        self._stop.set()
+        try:
+            self.stats = self._ready.get(timeout=timeout)
+        finally:
+            self._process.join(timeout=timeout)
+            self._process = None
+        return self.stats
+
+    def __enter__(self) -> 'MirrorProcess':
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
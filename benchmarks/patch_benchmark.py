@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+二进制补丁更新基准测试
+模拟安装程序发布新版本（少量原位修改、插入资源、删除数据），下载目录中保留旧版本，
+通过本地镜像对比补丁更新和完整下载的下载量、耗时和内存峰值，并验证：
+补丁损坏时回退到完整下载、旧版本与补丁不匹配时直接完整下载
+
+镜像服务器运行在独立进程中，每个场景也在独立进程中运行
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCHMARK_DIR = Path(os.path.abspath(__file__)).parent
+PROJECT_ROOT = BENCHMARK_DIR.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(BENCHMARK_DIR))
+
+from download_benchmark import get_peak_rss_mb  # noqa: E402
+from mirror_server import MirrorProcess, MirrorProfile  # noqa: E402
+
+PACKAGE_NAME = "WeChatSetup.exe"
+
+# 场景：下载目录中的旧文件
+SCENARIOS = ("full", "patch", "corrupt_patch", "unknown_old")
+
+
+def build_versions(root: Path, size_mb: float):
+    """
+    生成旧版本和新版本
+
+    Returns:
+        (旧版本路径, 新版本路径)
+    """
+    old = bytearray(os.urandom(int(size_mb * 1024 * 1024)))
+    new = bytearray(old)
+    # 版本号、签名等分散的原位修改
+    for position in range(4096, len(new), max(len(new) // 40, 1)):
+        new[position:position + 32] = os.urandom(32)
+    # 插入新资源并删除一段旧数据，之后的内容整体偏移
+    new[len(new) // 3:len(new) // 3] = os.urandom(64 * 1024)
+    del new[len(new) * 2 // 3:len(new) * 2 // 3 + 32 * 1024]
+
+    paths = []
+    for name, data in (("old", old), ("new", new)):
+        (root / name).mkdir()
+        path = root / name / PACKAGE_NAME
+        path.write_bytes(data)
+        paths.append(path)
+    return paths
+
+
+class _Quiet:
+    """收集下载器日志，不输出到控制台"""
+
+    def __init__(self, verbose: bool):
+        self.verbose = verbose
+
+    def __call__(self, msg_type, data):
+        if self.verbose and msg_type == 'detail':
+            print(f"    {data}")
+
+
+def _run_scenario(name: str, config: dict, old_path: str, verbose: bool) -> dict:
+    """在当前（子）进程中运行一个场景"""
+    from core.cloud_downloader import CloudDownloader
+    from core.install_manifest import InstallManifest
+    from core.metrics import get_registry
+
+    work_dir = Path(tempfile.mkdtemp(prefix="kouri_patch_bench_"))
+    try:
+        downloader = CloudDownloader(_Quiet(verbose))
+        downloader.app_path = work_dir
+        downloader.download_dir = work_dir / "downloads"
+        downloader.download_dir.mkdir(exist_ok=True)
+        downloader.manifest = InstallManifest(work_dir)
+        downloader.config = config
+
+        cached = downloader.download_dir / PACKAGE_NAME
+        if name in ("patch", "corrupt_patch"):
+            shutil.copyfile(old_path, cached)
+        elif name == "unknown_old":
+            shutil.copyfile(old_path, cached)
+            with open(cached, 'r+b') as f:
+                f.write(b"X")
+
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        items = downloader.download_packages()
+        wall = time.perf_counter() - start
+        downloader.manifest.close()
+
+        downloaded = {}
+        for value in get_registry().counter("download_bytes_total", "").to_dict():
+            kind = value['labels'].get('kind', '')
+            downloaded[kind] = downloaded.get(kind, 0) + value['value']
+        outcomes = {value['labels']['outcome']: value['value']
+                    for value in get_registry().counter("patch_updates_total", "").to_dict()}
+
+        return {
+            'scenario': name,
+            'success': len(items) == 1 and downloader.file_md5(cached) == config["packages"][0]["md5"],
+            'patch_outcomes': outcomes,
+            'downloaded_bytes': downloaded,
+            'downloaded_mb': round(sum(downloaded.values()) / 1024 / 1024, 2),
+            'wall_seconds': round(wall, 3),
+            'cpu_seconds': round(time.process_time() - cpu_start, 3),
+            'peak_rss_mb': get_peak_rss_mb(),
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="测试二进制补丁更新的下载量、耗时和内存")
+    parser.add_argument("--size-mb", type=float, default=150, help="安装程序大小(MB)")
+    parser.add_argument("--latency-ms", type=float, default=20, help="镜像首字节延迟(毫秒)")
+    parser.add_argument("--bandwidth-mb", type=float, default=0, help="每个连接的带宽(MB/s)，0为不限速")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS), help="要运行的场景")
+    parser.add_argument("--output", help="报告JSON的保存路径")
+    parser.add_argument("--verbose", action="store_true", help="输出下载器日志")
+    args = parser.parse_args()
+
+    from cloud_config_manager import PackagePublisher
+
+    build_dir = Path(tempfile.mkdtemp(prefix="kouri_patch_build_"))
+    mirror_dir = Path(tempfile.mkdtemp(prefix="kouri_patch_mirror_"))
+    ctx = multiprocessing.get_context("spawn")
+    profile = MirrorProfile(latency=args.latency_ms / 1000, bandwidth=args.bandwidth_mb * 1024 * 1024)
+    # 在生成测试文件之前创建场景进程，子进程的内存峰值不包含主进程生成文件时占用的内存
+    pools = {name: ctx.Pool(1) for name in args.scenarios}
+    try:
+        old_path, new_path = build_versions(build_dir, args.size_mb)
+        with MirrorProcess(str(mirror_dir), {"oss": profile}) as mirror:
+            start = time.perf_counter()
+            config = PackagePublisher(progress_callback=lambda *a: None).publish(
+                [new_path], {"version": "2", "packages": []}, mirror_dir,
+                base_url=f"{mirror.urls['oss']}/", patch_from=[old_path.parent])
+            publish_seconds = round(time.perf_counter() - start, 3)
+            shutil.copyfile(new_path, mirror_dir / PACKAGE_NAME)
+            package = config["packages"][0]
+            patch_size = package["patches"][0]["size"] if package.get("patches") else None
+
+            results = []
+            for name in args.scenarios:
+                if name == "corrupt_patch":
+                    patch_file = next(mirror_dir.glob("*.patch"))
+                    data = bytearray(patch_file.read_bytes())
+                    data[len(data) // 2] ^= 0xFF
+                    patch_file.write_bytes(data)
+                results.append(pools[name].apply(_run_scenario, (name, config, str(old_path), args.verbose)))
+    finally:
+        for pool in pools.values():
+            pool.terminate()
+        shutil.rmtree(build_dir, ignore_errors=True)
+        shutil.rmtree(mirror_dir, ignore_errors=True)
+
+    report = {
+        'size_mb': args.size_mb,
+        'publish_seconds': publish_seconds,
+        'patch_kb': round(patch_size / 1024, 1) if patch_size else None,
+        'scenarios': results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
+    return 0 if all(r['success'] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+局域网缓存基准测试
+模拟同一网络中的多台电脑安装：第一台从限速的云端镜像下载并开启缓存服务，
+其余各台通过UDP发现（本机回环地址）找到它并从节点下载，统计云端下载量和每台耗时；
+最后用提供错误内容的节点确认安装器校验失败后回退到云端
+
+全部运行在本机：云端镜像在独立进程中，每台“电脑”也在独立进程中运行
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCHMARK_DIR = Path(os.path.abspath(__file__)).parent
+PROJECT_ROOT = BENCHMARK_DIR.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(BENCHMARK_DIR))
+
+from mirror_server import MirrorProcess, MirrorProfile  # noqa: E402
+
+PACKAGE_NAME = "WeChatSetup.exe"
+
+# 本机测试使用的发现端口（避免与正在运行的缓存服务冲突）
+HONEST_DISCOVERY_PORT = 47491
+TAMPERED_DISCOVERY_PORT = 47492
+
+
+class _Quiet:
+    """收集下载器日志，不输出到控制台"""
+
+    def __init__(self, verbose: bool):
+        self.verbose = verbose
+
+    def __call__(self, msg_type, data):
+        if self.verbose and msg_type == 'detail':
+            print(f"    {data}")
+
+
+def _create_downloader(work_dir: Path, config: dict, verbose: bool):
+    from core.cloud_downloader import CloudDownloader
+    from core.install_manifest import InstallManifest
+
+    downloader = CloudDownloader(_Quiet(verbose))
+    downloader.app_path = work_dir
+    downloader.download_dir = work_dir / "downloads"
+    downloader.download_dir.mkdir(exist_ok=True)
+    downloader.manifest = InstallManifest(work_dir)
+    downloader.config = config
+    return downloader
+
+
+def _install(name: str, config: dict, discovery_port, verbose: bool) -> dict:
+    """在当前（子）进程中模拟一台电脑安装，discovery_port为None时不使用局域网缓存"""
+    from core.metrics import get_registry
+    from core.peer_cache import configure_peer_cache
+
+    if discovery_port is not None:
+        configure_peer_cache("auto", discovery_port=discovery_port, discovery_addresses=("127.0.0.1",))
+
+    work_dir = Path(tempfile.mkdtemp(prefix="kouri_peer_bench_"))
+    try:
+        downloader = _create_downloader(work_dir, config, verbose)
+        start = time.perf_counter()
+        items = downloader.download_packages()
+        wall = time.perf_counter() - start
+        downloader.manifest.close()
+
+        downloaded = {}
+        for value in get_registry().counter("download_bytes_total", "").to_dict():
+            kind = value['labels'].get('kind', '')
+            downloaded[kind] = downloaded.get(kind, 0) + value['value']
+        outcomes = {value['labels']['outcome']: value['value']
+                    for value in get_registry().counter("peer_downloads_total", "").to_dict()}
+        local_path = downloader.download_dir / PACKAGE_NAME
+        return {
+            'seat': name,
+            'success': len(items) == 1 and downloader.file_md5(local_path) == config["packages"][0]["md5"],
+            'peer_outcomes': outcomes,
+            'downloaded_mb': {kind: round(count / 1024 / 1024, 2) for kind, count in downloaded.items()},
+            'wall_seconds': round(wall, 3),
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="测试局域网缓存节省的云端下载量和安装耗时")
+    parser.add_argument("--size-mb", type=float, default=40, help="安装包大小(MB)")
+    parser.add_argument("--seats", type=int, default=4, help="第一台之后安装的电脑数")
+    parser.add_argument("--latency-ms", type=float, default=30, help="云端镜像首字节延迟(毫秒)")
+    parser.add_argument("--bandwidth-mb", type=float, default=8, help="云端镜像每个连接的带宽(MB/s)")
+    parser.add_argument("--output", help="报告JSON的保存路径")
+    parser.add_argument("--verbose", action="store_true", help="输出下载器日志")
+    args = parser.parse_args()
+
+    from core.peer_cache import PeerCacheServer, PeerContentStore, configure_peer_cache
+
+    mirror_dir = Path(tempfile.mkdtemp(prefix="kouri_peer_mirror_"))
+    seed_dir = Path(tempfile.mkdtemp(prefix="kouri_peer_seed_"))
+    ctx = multiprocessing.get_context("spawn")
+    profile = MirrorProfile(latency=args.latency_ms / 1000, bandwidth=args.bandwidth_mb * 1024 * 1024)
+    tampered = None
+    try:
+        data = os.urandom(int(args.size_mb * 1024 * 1024))
+        (mirror_dir / PACKAGE_NAME).write_bytes(data)
+        # 错误节点提供同样大小但内容不同的文件
+        (seed_dir / "tampered.bin").write_bytes(data[:-1] + bytes([data[-1] ^ 0xFF]))
+        md5 = hashlib.md5(data).hexdigest()
+        del data
+
+        with MirrorProcess(str(mirror_dir), {"oss": profile}) as mirror:
+            config = {"version": "1", "packages": [{
+                "name": PACKAGE_NAME, "url": f"{mirror.urls['oss']}/{PACKAGE_NAME}",
+                "md5": md5, "size": int(args.size_mb * 1024 * 1024),
+            }]}
+
+            # 第一台：从云端下载，并在本进程中持续提供缓存服务
+            configure_peer_cache(None, serve=True, discovery_port=HONEST_DISCOVERY_PORT, serve_port=0)
+            first_dir = seed_dir / "first"
+            first_dir.mkdir()
+            start = time.perf_counter()
+            first = _create_downloader(first_dir, config, args.verbose)
+            first_ok = len(first.download_packages()) == 1
+            first_result = {'seat': 'first', 'success': first_ok,
+                            'wall_seconds': round(time.perf_counter() - start, 3)}
+            first.manifest.close()
+
+            tampered_store = PeerContentStore()
+            tampered_store.add(md5, seed_dir / "tampered.bin")
+            tampered = PeerCacheServer(tampered_store, host="127.0.0.1",
+                                       discovery_port=TAMPERED_DISCOVERY_PORT).start()
+
+            runs = [("no_peer", None)]
+            runs += [(f"peer_{i + 1}", HONEST_DISCOVERY_PORT) for i in range(args.seats)]
+            runs += [("tampered_peer", TAMPERED_DISCOVERY_PORT)]
+            results = [first_result]
+            for name, port in runs:
+                with ctx.Pool(1) as pool:
+                    results.append(pool.apply(_install, (name, config, port, args.verbose)))
+
+            from core.peer_cache import get_peer_cache
+            served = dict(get_peer_cache().server.counters)
+            configure_peer_cache(None)
+        mirror_stats = mirror.stats
+    finally:
+        if tampered is not None:
+            tampered.stop()
+        shutil.rmtree(mirror_dir, ignore_errors=True)
+        shutil.rmtree(seed_dir, ignore_errors=True)
+
+    report = {
+        'size_mb': args.size_mb,
+        'origin_bandwidth_mb': args.bandwidth_mb,
+        'seats': results,
+        'peer_served': served,
+        'origin': mirror_stats,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
+    return 0 if all(r['success'] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
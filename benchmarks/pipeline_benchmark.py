@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流水线安装基准测试
+使用本地限速HTTP服务器和模拟安装程序，对比顺序模式与流水线模式的端到端耗时
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+BENCHMARK_DIR = Path(os.path.abspath(__file__)).parent
+PROJECT_ROOT = BENCHMARK_DIR.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(BENCHMARK_DIR))
+
+from core.cloud_downloader import CloudDownloader  # noqa: E402
+from core.install_manifest import InstallManifest  # noqa: E402
+from main_controller import InstallationController  # noqa: E402
+from mirror_server import MirrorProfile, MirrorServer  # noqa: E402
+
+
+class ConsoleWindow:
+    """无界面的进度窗口替代对象"""
+
+    def __init__(self, verbose: bool = False):
+        self.closed = False
+        self.verbose = verbose
+
+    def set_progress(self, value, status=None):
+        if self.verbose and status:
+            print(f"[{value:5.1f}%] {status}")
+
+    def update_detail(self, message):
+        if self.verbose:
+            print(f"    {message}")
+
+    def keep_alive(self):
+        pass
+
+    def force_update(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class FakeInstaller:
+    """模拟安装程序：按配置的耗时休眠"""
+
+    def __init__(self, install_seconds: dict):
+        self.install_seconds = install_seconds
+        self.python_installed = False
+        self.install_log = []
+
+    def install_software(self, exe_path: Path) -> bool:
+        self.install_log.append((exe_path.name, time.perf_counter()))
+        time.sleep(self.install_seconds.get(exe_path.name, 0.5))
+        if "python" in exe_path.name.lower():
+            self.python_installed = True
+        return True
+
+
+def build_payloads(scale: float) -> dict:
+    """生成按比例缩小的模拟安装包"""
+    python_size = int(26 * 1024 * 1024 * scale)
+    wechat_size = int(150 * 1024 * 1024 * scale)
+    zip_size = int(100 * 1024 * 1024 * scale)
+
+    zip_path = Path(tempfile.mkdtemp()) / "project.zip"
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as zf:
+        zf.writestr("kourichat/run.bat", b"@echo off\r\n")
+        zf.writestr("kourichat/data.bin", os.urandom(zip_size))
+    zip_data = zip_path.read_bytes()
+    shutil.rmtree(zip_path.parent, ignore_errors=True)
+
+    return {
+        "python-3.11.9-amd64.exe": os.urandom(python_size),
+        "WeChatSetup.exe": os.urandom(wechat_size),
+        "1.4.2fix.zip": zip_data,
+    }
+
+
+def run_flow(mode: str, base_url: str, payloads: dict, install_seconds: dict, verbose: bool) -> dict:
+    """在临时目录中执行一次下载+安装流程"""
+    work_dir = Path(tempfile.mkdtemp(prefix="kouri_bench_"))
+    try:
+        downloader = CloudDownloader()
+        downloader.app_path = work_dir
+        downloader.download_dir = work_dir / "downloads"
+        downloader.download_dir.mkdir()
+        downloader.manifest = InstallManifest(work_dir)
+        downloader.config = {"packages": [
+            {"name": name, "url": f"{base_url}/{name}", "size": len(data), "md5": "",
+             **({"extract_to": "project", "post_download": "extract"} if name.endswith(".zip") else {})}
+            for name, data in payloads.items()
+        ]}
+
+        controller = InstallationController(progress_window=ConsoleWindow(verbose))
+        controller.cloud_downloader = downloader
+        controller.installer = FakeInstaller(install_seconds)
+        downloader.progress_callback = controller._progress_callback
+
+        start = time.perf_counter()
+        if mode == InstallationController.FLOW_PIPELINED:
+            items, success = controller.install_packages_pipelined()
+        else:
+            items = controller.download_packages()
+            success = controller.install_packages(items)
+        elapsed = time.perf_counter() - start
+
+        downloader.manifest.close()
+        return {
+            'mode': mode,
+            'success': success,
+            'items': len(items),
+            'wall_seconds': round(elapsed, 3),
+            'install_start_offsets': {name: round(t - start, 3)
+                                      for name, t in controller.installer.install_log},
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="对比顺序与流水线下载安装的端到端耗时")
+    parser.add_argument("--scale", type=float, default=0.1, help="安装包大小缩放比例（1为真实大小）")
+    parser.add_argument("--bandwidth-mb", type=float, default=8, help="每个连接的带宽(MB/s)")
+    parser.add_argument("--python-install", type=float, default=2.0, help="模拟Python安装耗时(秒)")
+    parser.add_argument("--wechat-install", type=float, default=2.0, help="模拟微信安装耗时(秒)")
+    parser.add_argument("--verbose", action="store_true", help="输出详细进度")
+    args = parser.parse_args()
+
+    payloads = build_payloads(args.scale)
+    mirror_dir = Path(tempfile.mkdtemp(prefix="kouri_mirror_"))
+    for name, data in payloads.items():
+        (mirror_dir / name).write_bytes(data)
+
+    server = MirrorServer(str(mirror_dir), MirrorProfile(bandwidth=args.bandwidth_mb * 1024 * 1024)).start()
+    base_url = server.base_url
+
+    install_seconds = {
+        "python-3.11.9-amd64.exe": args.python_install,
+        "WeChatSetup.exe": args.wechat_install,
+    }
+
+    try:
+        serial = run_flow(InstallationController.FLOW_SERIAL, base_url, payloads, install_seconds, args.verbose)
+        pipelined = run_flow(InstallationController.FLOW_PIPELINED, base_url, payloads, install_seconds, args.verbose)
+    finally:
+        server.stop()
+        shutil.rmtree(mirror_dir, ignore_errors=True)
+
+    report = {
+        'payload_mb': {name: round(len(data) / 1024 / 1024, 1) for name, data in payloads.items()},
+        'serial': serial,
+        'pipelined': pipelined,
+        'speedup': round(serial['wall_seconds'] / pipelined['wall_seconds'], 2) if pipelined['wall_seconds'] else None,
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
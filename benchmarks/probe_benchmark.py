@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+系统检测基准测试
+使用模拟的系统访问延迟，对比逐项重复检测与并发缓存检测的耗时
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(os.path.abspath(__file__)).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from core.env_source import StaticEnvironmentSource  # noqa: E402
+from core.system_access import StaticSystemAccess  # noqa: E402
+from core.system_checker import SystemChecker  # noqa: E402
+
+
+def build_python_dir() -> str:
+    """创建只包含解释器文件和pyvenv.cfg的模拟Python目录"""
+    python_dir = tempfile.mkdtemp(prefix="kouri_probe_")
+    with open(os.path.join(python_dir, "python"), 'w') as f:
+        f.write("#!/bin/sh\n")
+    with open(os.path.join(python_dir, "pyvenv.cfg"), 'w') as f:
+        f.write("version = 3.11.9\n")
+    return python_dir
+
+
+def build_access(latency: float, python_dir: str) -> StaticSystemAccess:
+    """模拟已安装Python 3.11和微信3.9的系统，微信版本需从文件属性读取"""
+    wechat_path = r"C:\Program Files\Tencent\WeChat\WeChat.exe"
+    return StaticSystemAccess(
+        registry_values={},
+        file_versions={wechat_path: "3.9.12.17"},
+        commands={
+            f"{os.path.join(python_dir, 'python')} --version": (0, "Python 3.11.9\n"),
+        },
+        env={"ProgramFiles": r"C:\Program Files"},
+        latency=latency,
+    )
+
+
+def create_checker(access: StaticSystemAccess, python_dir: str) -> SystemChecker:
+    """创建PATH只包含模拟Python目录的检查器"""
+    return SystemChecker(lambda *_: None, access=access, env_source=StaticEnvironmentSource(python_dir))
+
+
+def run_legacy(latency: float, python_dir: str) -> dict:
+    """原有流程：控制器顺序检测，每个安装程序再新建检查器重新检测"""
+    access = build_access(latency, python_dir)
+    start = time.perf_counter()
+    checker = create_checker(access, python_dir)
+    checker._detect_python_version()
+    checker._detect_wechat_version()
+    for _ in ("python", "wechat"):
+        installer_checker = create_checker(access, python_dir)
+        installer_checker._detect_python_version()
+        installer_checker._detect_wechat_version()
+    return {'wall_seconds': round(time.perf_counter() - start, 3), 'os_calls': len(access.calls)}
+
+
+def run_shared(latency: float, python_dir: str) -> dict:
+    """共享检查器：并发检测一次，安装程序和启动器复用缓存结果"""
+    access = build_access(latency, python_dir)
+    start = time.perf_counter()
+    checker = create_checker(access, python_dir)
+    checker.probe_all()
+    for _ in ("python", "wechat"):
+        checker.check_python_version()
+        checker.check_wechat_version()
+    return {'wall_seconds': round(time.perf_counter() - start, 3), 'os_calls': len(access.calls)}
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="对比重复检测与并发缓存检测的耗时")
+    parser.add_argument("--latency", type=float, default=0.1, help="每次系统访问的模拟耗时(秒)")
+    args = parser.parse_args()
+
+    python_dir = build_python_dir()
+    try:
+        legacy = run_legacy(args.latency, python_dir)
+        shared = run_shared(args.latency, python_dir)
+    finally:
+        shutil.rmtree(python_dir, ignore_errors=True)
+    report = {
+        'latency_seconds': args.latency,
+        'legacy': legacy,
+        'shared': shared,
+        'speedup': round(legacy['wall_seconds'] / shared['wall_seconds'], 2) if shared['wall_seconds'] else None,
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
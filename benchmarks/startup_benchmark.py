@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+启动性能基准测试
+统计 python -X importtime 的导入耗时以及窗口首次绘制时间
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(os.path.abspath(__file__)).parent.parent
+
+# 在子进程中测量首次绘制时间：从解释器启动到窗口第一次完成update
+FIRST_PAINT_SCRIPT = """
+import json, time
+t0 = time.perf_counter()
+from main_controller import InstallationController
+t_import = time.perf_counter()
+controller = InstallationController()
+controller.progress_window.force_update()
+t_paint = time.perf_counter()
+controller.cleanup()
+print(json.dumps({'import_ms': (t_import - t0) * 1000, 'first_paint_ms': (t_paint - t0) * 1000}))
+"""
+
+
+def measure_import_time(module: str = "main_controller", top: int = 15) -> dict:
+    """使用 -X importtime 统计导入耗时"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=str(PROJECT_ROOT),
+                            capture_output=True,
+                            text=True,
+                            timeout=60)
+
+    entries = []
+    for line in result.stderr.splitlines():
+        # 格式: import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            entries.append((name.strip(), int(self_us), int(cumulative_us)))
+        except ValueError:
+            continue
+
+    total_us = sum(self_us for _, self_us, _ in entries)
+    slowest = sorted(entries, key=lambda e: e[2], reverse=True)[:top]
+    return {
+        'module': module,
+        'ok': result.returncode == 0,
+        'modules_imported': len(entries),
+        'total_ms': total_us / 1000,
+        'slowest_cumulative_ms': {name: cumulative / 1000 for name, _, cumulative in slowest},
+    }
+
+
+def measure_first_paint() -> dict:
+    """测量窗口首次绘制时间（需要图形界面环境）"""
+    result = subprocess.run([sys.executable, "-c", FIRST_PAINT_SCRIPT],
+                            cwd=str(PROJECT_ROOT),
+                            capture_output=True,
+                            text=True,
+                            timeout=60)
+    if result.returncode != 0:
+        return {'ok': False, 'error': result.stderr.strip().splitlines()[-1:] or ['unknown']}
+
+    data = json.loads(result.stdout.strip().splitlines()[-1])
+    data['ok'] = True
+    return data
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="安装器启动性能基准测试")
+    parser.add_argument("--runs", type=int, default=5, help="首次绘制测量次数")
+    parser.add_argument("--no-paint", action="store_true", help="只统计导入耗时")
+    parser.add_argument("--output", help="结果JSON输出路径")
+    args = parser.parse_args()
+
+    report = {'import_time': measure_import_time()}
+
+    if not args.no_paint:
+        runs = [measure_first_paint() for _ in range(args.runs)]
+        ok_runs = [r for r in runs if r.get('ok')]
+        report['first_paint'] = {
+            'runs': runs,
+            'best_ms': min((r['first_paint_ms'] for r in ok_runs), default=None),
+        }
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output, encoding='utf-8')
+    print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
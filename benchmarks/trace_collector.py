@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地追踪收集服务
+接收安装器上传的JSON-lines追踪数据，按trace_id保存并输出各环节耗时汇总，用于验证追踪上传
+
+用法:
+    python benchmarks/trace_collector.py --port 8765 --output-dir traces
+    python install_all_new.py --trace --trace-upload http://127.0.0.1:8765/traces
+"""
+
+import argparse
+import json
+import os
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+PROJECT_ROOT = Path(os.path.abspath(__file__)).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from core.tracing import Span, Tracer  # noqa: E402
+
+
+def summarize(records) -> str:
+    """用追踪器的汇总表格式输出上传的区间"""
+    tracer = Tracer()
+    for record in records:
+        span = Span(tracer, record['name'], None, record.get('attrs', {}))
+        span.start = record['start']
+        span.duration = record['duration']
+        span.bytes = record.get('bytes', 0)
+        span.outcome = record.get('outcome')
+        tracer.spans.append(span)
+    return tracer.format_summary()
+
+
+class CollectorHandler(BaseHTTPRequestHandler):
+    """接收POST上传的追踪数据"""
+
+    output_dir = Path("traces")
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length).decode('utf-8')
+        try:
+            records = [json.loads(line) for line in body.splitlines() if line.strip()]
+        except json.JSONDecodeError:
+            self.send_error(400, "Invalid JSON lines")
+            return
+
+        trace_id = self.headers.get('X-Trace-Id') or (records[0]['trace_id'] if records else "empty")
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        path = self.output_dir / f"{trace_id}.jsonl"
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(body)
+
+        print(f"收到追踪 {trace_id}: {len(records)} 个区间 -> {path}")
+        print(summarize(records))
+
+        self.send_response(204)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="接收并保存安装器上传的追踪数据")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8765, help="监听端口")
+    parser.add_argument("--output-dir", default="traces", help="追踪文件保存目录")
+    args = parser.parse_args()
+
+    CollectorHandler.output_dir = Path(args.output_dir)
+    server = ThreadingHTTPServer((args.host, args.port), CollectorHandler)
+    print(f"追踪收集服务已启动: http://{args.host}:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
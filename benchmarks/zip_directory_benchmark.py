@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ZIP中央目录基准测试
+生成包含大量小文件的压缩包（模拟打包的虚拟环境），对比zipfile和列存储中央目录：
+打开压缩包的耗时、Python对象内存、进程内存峰值、写出第一个文件前的耗时，以及完整解压耗时
+
+每种实现在独立进程中运行
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from pathlib import Path
+
+BENCHMARK_DIR = Path(os.path.abspath(__file__)).parent
+PROJECT_ROOT = BENCHMARK_DIR.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(BENCHMARK_DIR))
+
+from download_benchmark import get_peak_rss_mb  # noqa: E402
+
+READERS = ("zipfile", "columns")
+
+
+def build_archive(path: Path, entries: int):
+    """生成包含大量小文件的压缩包"""
+    body = b"# generated module\nVALUE = 1\n" * 8
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        for i in range(entries):
+            zf.writestr(f"venv/Lib/site-packages/package_{i // 500:04d}/module_{i:07d}.py", body)
+
+
+def _open(reader: str, path: Path):
+    if reader == "zipfile":
+        zf = zipfile.ZipFile(path)
+        zf.infolist()
+        return zf
+    from core.zip_directory import ZipDirectory
+    return ZipDirectory.open(path)
+
+
+def _run_reader(reader: str, path: str, extract: bool) -> dict:
+    """在当前（子）进程中测试一种实现"""
+    path = Path(path)
+    target = Path(tempfile.mkdtemp(prefix="kouri_zipdir_bench_"))
+    try:
+        tracemalloc.start()
+        start = time.perf_counter()
+        archive = _open(reader, path)
+        open_seconds = time.perf_counter() - start
+        _, open_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        # 写出第一个文件
+        if reader == "zipfile":
+            archive.extract(archive.infolist()[0], target)
+        else:
+            archive.extract(0, target)
+        first_file_seconds = time.perf_counter() - start
+
+        result = {
+            'reader': reader,
+            'open_seconds': round(open_seconds, 3),
+            'open_python_mb': round(open_peak / 1024 / 1024, 1),
+            'first_file_seconds': round(first_file_seconds, 3),
+        }
+        if extract:
+            start = time.perf_counter()
+            if reader == "zipfile":
+                for info in archive.infolist():
+                    archive.extract(info, target)
+            else:
+                for i in range(len(archive)):
+                    archive.extract(i, target)
+            result['extract_seconds'] = round(time.perf_counter() - start, 3)
+        archive.close()
+        result['peak_rss_mb'] = get_peak_rss_mb()
+        return result
+    finally:
+        shutil.rmtree(target, ignore_errors=True)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="对比zipfile和列存储中央目录打开大型压缩包的耗时和内存")
+    parser.add_argument("--entries", type=int, default=300000, help="压缩包中的文件数")
+    parser.add_argument("--extract", action="store_true", help="同时测试完整解压耗时")
+    parser.add_argument("--output", help="报告JSON的保存路径")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    # 在生成压缩包之前创建测试进程，子进程的内存峰值不包含主进程生成压缩包时占用的内存
+    pools = {reader: ctx.Pool(1) for reader in READERS}
+    build_dir = Path(tempfile.mkdtemp(prefix="kouri_zipdir_build_"))
+    try:
+        path = build_dir / "venv.zip"
+        start = time.perf_counter()
+        build_archive(path, args.entries)
+        build_seconds = round(time.perf_counter() - start, 3)
+        results = [pools[reader].apply(_run_reader, (reader, str(path), args.extract)) for reader in READERS]
+        archive_mb = round(path.stat().st_size / 1024 / 1024, 1)
+    finally:
+        for pool in pools.values():
+            pool.terminate()
+        shutil.rmtree(build_dir, ignore_errors=True)
+
+    report = {
+        'entries': args.entries,
+        'archive_mb': archive_mb,
+        'build_seconds': build_seconds,
+        'readers': results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
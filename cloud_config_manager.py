@@ -5,12 +5,397 @@
 用于配置和管理云端下载源
 """
 
+import argparse
+import gzip
+import hashlib
 import json
+import lzma
+import os
+import struct
+import threading
+import time
+import zipfile
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import ttk, messagebox, filedialog
 from pathlib import Path
+from typing import Dict, List, Optional
 import sys
 
+from core.binary_patch import create_patch
+from core.chunk_store import build_chunk_pack
+
+
+# 发布时的读缓冲区大小，同时也是分块清单的块大小（按块Range下载和校验）
+CHUNK_SIZE = 4 * 1024 * 1024
+
+# 同时处理的文件数
+PUBLISH_FILE_WORKERS = 4
+
+# 计算摘要的线程数（hashlib处理大块数据时释放GIL，MD5和SHA-256可并行计算）
+HASH_WORKERS = max(3, min(8, os.cpu_count() or 1))
+
+# ZIP索引文件后缀（与安装包一起上传）
+ZIP_INDEX_SUFFIX = ".index.json"
+
+# 补丁大小超过新文件的该比例时不发布补丁
+PATCH_MAX_RATIO = 0.5
+
+# 预压缩文件的格式和后缀（安装器下载时流式解压）
+VARIANT_SUFFIXES = {"gzip": ".gz", "xz": ".xz"}
+
+# 预压缩文件超过原文件的该比例时不发布（已压缩的安装程序再压缩几乎没有收益）
+VARIANT_MAX_RATIO = 0.9
+
+# ZIP本地文件头
+ZIP_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+ZIP_LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+
+
+def _file_type(file_name: str) -> str:
+    """根据文件名确定文件类型"""
+    if file_name.lower().endswith('.zip'):
+        return "ZIP压缩包"
+    elif file_name.lower().endswith('.exe'):
+        return "可执行文件"
+    return "其他文件"
+
+
+def _format_size_mb(size: int) -> str:
+    """界面上显示的大小(MB)"""
+    return f"{size / 1024 / 1024:.1f}"
+
+
+class PackagePublisher:
+    """安装包发布工具 - 计算摘要和精确大小，生成分块清单、ZIP索引和可直接上传的cloud_config.json"""
+
+    def __init__(self, progress_callback=None, chunk_size: int = CHUNK_SIZE,
+                 file_workers: int = PUBLISH_FILE_WORKERS, hash_workers: int = HASH_WORKERS):
+        """
+        初始化发布工具
+
+        Args:
+            progress_callback: 进度回调函数
+            chunk_size: 分块大小（字节）
+            file_workers: 同时处理的文件数
+            hash_workers: 计算摘要的线程数
+        """
+        self.progress_callback = progress_callback
+        self.chunk_size = chunk_size
+        self.file_workers = max(1, file_workers)
+        self.hash_workers = max(3, hash_workers)
+        self._hash_pool: Optional[ThreadPoolExecutor] = None
+
+    def _log(self, message: str):
+        """日志记录"""
+        if self.progress_callback:
+            self.progress_callback('detail', message)
+        else:
+            print(message)
+
+    def _set_progress(self, progress: int, status: str):
+        """设置进度"""
+        if self.progress_callback:
+            self.progress_callback('progress', (progress, status))
+
+    def _read_block(self, f, view: memoryview) -> int:
+        """读满一个块（文件末尾除外），保证块边界固定"""
+        filled = 0
+        while filled < len(view):
+            count = f.readinto(view[filled:])
+            if not count:
+                break
+            filled += count
+        return filled
+
+    def hash_file(self, path: Path) -> Dict:
+        """
+        计算文件的精确大小、MD5、SHA-256和每块的SHA-256
+
+        读取下一块的同时，在线程池中并行计算当前块的MD5、整体SHA-256和块SHA-256
+
+        Returns:
+            {'size', 'md5', 'sha256', 'chunks': {'size', 'sha256': [...]}}
+        """
+        md5 = hashlib.md5()
+        sha256 = hashlib.sha256()
+        chunk_digests: List[str] = []
+        buffers = [memoryview(bytearray(self.chunk_size)), memoryview(bytearray(self.chunk_size))]
+        pending = []
+        size = 0
+
+        def chunk_digest(block):
+            chunk_digests.append(hashlib.sha256(block).hexdigest())
+
+        with open(path, 'rb', buffering=0) as f:
+            index = 0
+            while True:
+                # 双缓冲：读入一个缓冲区时，另一个缓冲区的摘要仍在计算
+                view = buffers[index % 2]
+                count = self._read_block(f, view)
+                for future in pending:
+                    future.result()
+                if not count:
+                    break
+                block = view[:count]
+                pending = [self._hash_pool.submit(md5.update, block),
+                           self._hash_pool.submit(sha256.update, block),
+                           self._hash_pool.submit(chunk_digest, block)]
+                size += count
+                index += 1
+
+        return {
+            'size': size,
+            'md5': md5.hexdigest(),
+            'sha256': sha256.hexdigest(),
+            'chunks': {'size': self.chunk_size, 'sha256': chunk_digests},
+        }
+
+    def build_zip_index(self, path: Path) -> List[Dict]:
+        """
+        生成ZIP索引：每个文件的CRC、大小、压缩方式和数据在压缩包中的偏移，
+        安装器可据此按Range只下载和校验需要的文件
+        """
+        entries = []
+        with open(path, 'rb') as raw, zipfile.ZipFile(raw) as zf:
+            for info in zf.infolist():
+                raw.seek(info.header_offset)
+                header = raw.read(ZIP_LOCAL_HEADER.size)
+                fields = ZIP_LOCAL_HEADER.unpack(header)
+                if fields[0] != ZIP_LOCAL_HEADER_SIGNATURE:
+                    raise zipfile.BadZipFile(f"本地文件头无效: {info.filename}")
+                name_length, extra_length = fields[-2], fields[-1]
+                entries.append({
+                    'name': info.filename,
+                    'crc': f"{info.CRC:08x}",
+                    'size': info.file_size,
+                    'compressed_size': info.compress_size,
+                    'compress_type': info.compress_type,
+                    'header_offset': info.header_offset,
+                    'data_offset': info.header_offset + ZIP_LOCAL_HEADER.size + name_length + extra_length,
+                    'is_dir': info.is_dir(),
+                })
+        return entries
+
+    def _write_json(self, path: Path, data) -> bytes:
+        """原子写入JSON文件，返回写入的内容"""
+        content = json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+        tmp_path = path.with_suffix(path.suffix + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        return content
+
+    def build_patches(self, path: Path, info: Dict, patch_from: List[Path], base_url: str,
+                      output_dir: Path) -> List[Dict]:
+        """
+        为旧版本目录中的同名文件生成到新版本的补丁
+
+        Returns:
+            补丁配置列表 [{'from_md5', 'to_md5', 'url', 'size'}]
+        """
+        patches = []
+        for old_dir in patch_from:
+            old_path = Path(old_dir) / path.name
+            if not old_path.is_file():
+                continue
+            old_md5 = self.hash_file(old_path)['md5']
+            if old_md5 == info['md5'] or any(p['from_md5'] == old_md5 for p in patches):
+                continue
+
+            patch_name = f"{path.name}.{old_md5[:8]}-{info['md5'][:8]}.patch"
+            patch_path = output_dir / patch_name
+            start = time.perf_counter()
+            method = create_patch(old_path, path, patch_path)
+            patch_size = patch_path.stat().st_size
+            if patch_size > info['size'] * PATCH_MAX_RATIO:
+                self._log(f"补丁过大，不发布: {patch_name} ({patch_size // 1024}KB)")
+                patch_path.unlink()
+                continue
+
+            patches.append({'from_md5': old_md5, 'to_md5': info['md5'],
+                            'url': base_url + patch_name, 'size': patch_size})
+            self._log(f"✓ {path.name}: 补丁 {old_md5[:8]} -> {info['md5'][:8]} {patch_size // 1024}KB "
+                      f"({method}, {time.perf_counter() - start:.1f}秒)")
+        return patches
+
+    def build_variants(self, path: Path, info: Dict, encodings: List[str], base_url: str,
+                       output_dir: Path) -> List[Dict]:
+        """
+        生成预压缩文件（.gz/.xz），压缩效果不明显的格式不发布
+
+        Returns:
+            预压缩文件配置列表 [{'encoding', 'url', 'size'}]，按大小从小到大排列
+        """
+        variants = []
+        for encoding in encodings:
+            variant_name = path.name + VARIANT_SUFFIXES[encoding]
+            variant_path = output_dir / variant_name
+            tmp_path = variant_path.with_name(variant_name + '.tmp')
+            start = time.perf_counter()
+            with open(tmp_path, 'wb') as out:
+                if encoding == "gzip":
+                    # 固定mtime，相同输入生成相同文件
+                    writer = gzip.GzipFile(variant_name, 'wb', 9, out, mtime=0)
+                else:
+                    writer = lzma.LZMAFile(out, 'wb', preset=6)
+                with writer, open(path, 'rb') as f:
+                    while True:
+                        data = f.read(self.chunk_size)
+                        if not data:
+                            break
+                        writer.write(data)
+
+            variant_size = tmp_path.stat().st_size
+            if variant_size > info['size'] * VARIANT_MAX_RATIO:
+                self._log(f"压缩效果不明显，不发布: {variant_name} ({variant_size * 100 // max(info['size'], 1)}%)")
+                tmp_path.unlink()
+                continue
+            os.replace(tmp_path, variant_path)
+            variants.append({'encoding': encoding, 'url': base_url + variant_name, 'size': variant_size})
+            self._log(f"✓ {path.name}: {encoding} {variant_size // 1024}KB "
+                      f"({variant_size * 100 // max(info['size'], 1)}%, {time.perf_counter() - start:.1f}秒)")
+        return sorted(variants, key=lambda variant: variant['size'])
+
+    def publish_file(self, path: Path, base_url: str, output_dir: Path,
+                     patch_from: Optional[List[Path]] = None, compress: Optional[List[str]] = None) -> Dict:
+        """
+        处理单个安装包
+
+        Args:
+            path: 安装包文件
+            base_url: 基础URL
+            output_dir: 输出目录
+            patch_from: 旧版本目录，其中的同名文件会生成到新版本的补丁
+            compress: 预压缩格式（gzip/xz）
+
+        Returns:
+            包配置中由发布工具生成的字段
+        """
+        start = time.perf_counter()
+        info = self.hash_file(path)
+        elapsed = time.perf_counter() - start
+        speed = info['size'] / 1024 / 1024 / elapsed if elapsed else 0
+        self._log(f"✓ {path.name}: {info['size']} 字节, MD5 {info['md5']} ({speed:.0f} MB/s)")
+
+        if zipfile.is_zipfile(path):
+            entries = self.build_zip_index(path)
+            index_name = path.name + ZIP_INDEX_SUFFIX
+            content = self._write_json(output_dir / index_name, {
+                'package': path.name,
+                'sha256': info['sha256'],
+                'entries': entries,
+            })
+            info['zip_index'] = {
+                'url': base_url + index_name,
+                'size': len(content),
+                'sha256': hashlib.sha256(content).hexdigest(),
+                'entries': len(entries),
+            }
+            self._log(f"✓ {path.name}: ZIP索引 {len(entries)} 个条目 -> {index_name}")
+            # 安装器下载前据此检查解压所需的磁盘空间
+            info['unpacked_size'] = sum(entry['size'] for entry in entries)
+
+            # 分块包：版本升级时安装器只下载有变化的分块
+            pack = build_chunk_pack(path, output_dir)
+            with open(pack['manifest'], 'rb') as f:
+                manifest_content = f.read()
+            info['chunked'] = {
+                'manifest_url': base_url + pack['manifest'].name,
+                'manifest_size': len(manifest_content),
+                'manifest_sha256': hashlib.sha256(manifest_content).hexdigest(),
+                'pack_url': base_url + pack['pack'].name,
+                'pack_size': pack['pack'].stat().st_size,
+            }
+            self._log(f"✓ {path.name}: 分块包 {pack['chunks']} 个分块 -> {pack['pack'].name}")
+
+        if patch_from:
+            patches = self.build_patches(path, info, patch_from, base_url, output_dir)
+            if patches:
+                info['patches'] = patches
+
+        if compress:
+            variants = self.build_variants(path, info, compress, base_url, output_dir)
+            if variants:
+                info['variants'] = variants
+        return info
+
+    def publish(self, files: List[Path], config: Dict, output_dir: Path,
+                base_url: Optional[str] = None, version: Optional[str] = None,
+                patch_from: Optional[List[Path]] = None, compress: Optional[List[str]] = None) -> Dict:
+        """
+        处理安装包并生成cloud_config.json
+
+        已有配置中的同名包保留URL、描述和解压设置，只更新大小和摘要；新包按基础URL生成下载地址
+
+        Args:
+            files: 本地安装包文件
+            config: 已有配置（作为模板，不会被修改）
+            output_dir: 输出目录（写入cloud_config.json和ZIP索引）
+            base_url: 基础URL，None时使用配置中的base_url
+            version: 配置版本号，None时保持不变
+            patch_from: 旧版本目录，其中的同名文件会生成到新版本的补丁
+            compress: 预压缩格式（gzip/xz），安装器优先下载压缩后的文件
+
+        Returns:
+            新的配置
+        """
+        files = [Path(path) for path in files]
+        missing = [str(path) for path in files if not path.is_file()]
+        if missing:
+            raise FileNotFoundError(f"安装包不存在: {', '.join(missing)}")
+
+        config = json.loads(json.dumps(config))
+        base_url = config.get("base_url", "") if base_url is None else base_url
+        if base_url and not base_url.endswith('/'):
+            base_url += '/'
+        config["base_url"] = base_url
+        if version:
+            config["version"] = version
+
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        total = len(files)
+        results = {}
+        self._set_progress(0, f"正在计算 {total} 个安装包的摘要...")
+        with ThreadPoolExecutor(max_workers=self.hash_workers, thread_name_prefix="PublishHash") as hash_pool, \
+                ThreadPoolExecutor(max_workers=self.file_workers, thread_name_prefix="PublishFile") as file_pool:
+            self._hash_pool = hash_pool
+            try:
+                futures = {path.name: file_pool.submit(self.publish_file, path, base_url, output_dir, patch_from, compress)
+                           for path in files}
+                for done, (name, future) in enumerate(futures.items(), 1):
+                    results[name] = future.result()
+                    self._set_progress(done * 100 // total, f"已处理 {done}/{total}: {name}")
+            finally:
+                self._hash_pool = None
+
+        packages = config.setdefault("packages", [])
+        existing = {package.get("name"): package for package in packages}
+        for path in files:
+            package = existing.get(path.name)
+            if package is None:
+                package = {"name": path.name, "url": base_url + path.name, "description": ""}
+                if path.name.lower().endswith('.zip'):
+                    package["extract_to"] = "."
+                    package["post_download"] = "extract"
+                packages.append(package)
+            # 重新发布时去掉旧的ZIP索引、分块包、补丁和预压缩文件，避免残留
+            package.pop("zip_index", None)
+            package.pop("unpacked_size", None)
+            package.pop("chunked", None)
+            package.pop("patches", None)
+            package.pop("variants", None)
+            package.update(results[path.name])
+
+        config["last_updated"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        config_path = output_dir / "cloud_config.json"
+        self._write_json(config_path, config)
+        self._log(f"✓ 已生成配置: {config_path}")
+        return config
+
+
 class CloudConfigManager:
     """云下发配置管理器GUI"""
     
@@ -109,6 +494,12 @@ class CloudConfigManager:
         ttk.Button(buttons_frame, text="删除包", command=self.delete_package).pack(side=tk.LEFT, padx=5)
         ttk.Button(buttons_frame, text="保存配置", command=self.save_config_from_ui).pack(side=tk.LEFT, padx=5)
         ttk.Button(buttons_frame, text="加载配置", command=self.load_config_from_file).pack(side=tk.LEFT, padx=5)
+        self.publish_button = ttk.Button(buttons_frame, text="发布安装包", command=self.publish_packages)
+        self.publish_button.pack(side=tk.LEFT, padx=5)
+
+        # 发布进度
+        self.status_var = tk.StringVar()
+        ttk.Label(main_frame, textvariable=self.status_var).grid(row=3, column=0, columnspan=3, sticky=tk.W)
         
         # 配置网格权重
         self.root.columnconfigure(0, weight=1)
@@ -128,23 +519,13 @@ class CloudConfigManager:
         
         # 添加包到树视图
         for package in self.config.get("packages", []):
-            size_mb = package.get("size", 0) // (1024 * 1024)
-
-            # 确定文件类型
             file_name = package.get("name", "")
-            if file_name.lower().endswith('.zip'):
-                file_type = "ZIP压缩包"
-            elif file_name.lower().endswith('.exe'):
-                file_type = "可执行文件"
-            else:
-                file_type = "其他文件"
-
             self.packages_tree.insert('', 'end', values=(
-                package.get("name", ""),
+                file_name,
                 package.get("url", ""),
-                f"{size_mb}",
+                _format_size_mb(package.get("size", 0)),
                 package.get("description", ""),
-                file_type
+                _file_type(file_name)
             ))
     
     def save_config_from_ui(self):
@@ -152,28 +533,36 @@ class CloudConfigManager:
         self.config["base_url"] = self.base_url_var.get()
         
         # 收集包信息
+        existing = {package.get("name"): package for package in self.config.get("packages", [])}
         packages = []
         for item in self.packages_tree.get_children():
             values = self.packages_tree.item(item, 'values')
             if len(values) >= 4:
-                try:
-                    size_mb = int(values[2]) if values[2].isdigit() else 0
-                    size_bytes = size_mb * 1024 * 1024
-                except:
-                    size_bytes = 0
+                previous = existing.get(values[0])
+                if previous and _format_size_mb(previous.get("size", 0)) == values[2]:
+                    # 大小未修改：保留发布工具计算的精确大小、摘要和索引
+                    package_info = dict(previous)
+                else:
+                    try:
+                        size_bytes = int(float(values[2]) * 1024 * 1024)
+                    except:
+                        size_bytes = 0
+                    package_info = {"size": size_bytes, "md5": ""}
+                    if previous:
+                        for key in ("extract_to", "post_download"):
+                            if key in previous:
+                                package_info[key] = previous[key]
 
-                package_info = {
+                package_info.update({
                     "name": values[0],
                     "url": values[1],
-                    "size": size_bytes,
                     "description": values[3],
-                    "md5": ""
-                }
+                })
 
                 # 如果是ZIP文件，添加解压配置
                 if values[0].lower().endswith('.zip'):
-                    package_info["extract_to"] = "."
-                    package_info["post_download"] = "extract"
+                    package_info.setdefault("extract_to", ".")
+                    package_info.setdefault("post_download", "extract")
 
                 packages.append(package_info)
         
@@ -250,16 +639,7 @@ class CloudConfigManager:
                 messagebox.showerror("错误", "文件名和URL不能为空")
                 return
             
-            # 确定文件类型
-            file_name = name_var.get()
-            if file_name.lower().endswith('.zip'):
-                file_type = "ZIP压缩包"
-            elif file_name.lower().endswith('.exe'):
-                file_type = "可执行文件"
-            else:
-                file_type = "其他文件"
-
-            new_values = (name_var.get(), url_var.get(), size_var.get(), desc_var.get(), file_type)
+            new_values = (name_var.get(), url_var.get(), size_var.get(), desc_var.get(), _file_type(name_var.get()))
 
             if item:
                 self.packages_tree.item(item, values=new_values)
@@ -287,10 +667,105 @@ class CloudConfigManager:
             except Exception as e:
                 messagebox.showerror("错误", f"加载配置文件失败: {e}")
     
+    def publish_packages(self):
+        """选择本地安装包，在后台线程中计算摘要并生成配置"""
+        file_paths = filedialog.askopenfilenames(title="选择要发布的安装包")
+        if not file_paths:
+            return
+        output_dir = filedialog.askdirectory(title="选择输出目录（cloud_config.json和ZIP索引）")
+        if not output_dir:
+            return
+
+        self.config["base_url"] = self.base_url_var.get()
+        self.publish_button.state(['disabled'])
+        events = []
+
+        def progress_callback(msg_type, data):
+            # 在后台线程中调用，只记录事件，由界面线程轮询显示
+            events.append((msg_type, data))
+
+        def worker():
+            try:
+                config = PackagePublisher(progress_callback).publish(
+                    [Path(path) for path in file_paths], self.config, Path(output_dir))
+                events.append(('done', config))
+            except Exception as e:
+                events.append(('error', e))
+
+        def poll():
+            while events:
+                msg_type, data = events.pop(0)
+                if msg_type == 'progress':
+                    self.status_var.set(f"{data[0]}% {data[1]}")
+                elif msg_type == 'detail':
+                    self.status_var.set(data)
+                elif msg_type == 'done':
+                    self.publish_button.state(['!disabled'])
+                    self.config = data
+                    self.load_config_to_ui()
+                    self.status_var.set(f"发布完成: {Path(output_dir) / 'cloud_config.json'}")
+                    messagebox.showinfo("成功", f"已生成 {Path(output_dir) / 'cloud_config.json'}")
+                    return
+                elif msg_type == 'error':
+                    self.publish_button.state(['!disabled'])
+                    self.status_var.set("发布失败")
+                    messagebox.showerror("错误", f"发布失败: {data}")
+                    return
+            self.root.after(100, poll)
+
+        threading.Thread(target=worker, name="PackagePublisher", daemon=True).start()
+        self.root.after(100, poll)
+
     def run(self):
         """运行GUI"""
         self.root.mainloop()
 
+
+def main(argv=None) -> int:
+    """
+    命令行入口
+
+    无参数时打开图形界面；publish子命令在无界面环境下发布安装包:
+        python cloud_config_manager.py publish python-3.11.9-amd64.exe 1.4.2fix.zip --output dist
+    """
+    parser = argparse.ArgumentParser(description="云下发配置管理工具")
+    subparsers = parser.add_subparsers(dest="command")
+    publish_parser = subparsers.add_parser("publish", help="计算安装包摘要并生成cloud_config.json")
+    publish_parser.add_argument("files", nargs="+", help="本地安装包文件")
+    publish_parser.add_argument("--config", default="cloud_config.json", help="作为模板的已有配置文件")
+    publish_parser.add_argument("--output", default="dist", help="输出目录")
+    publish_parser.add_argument("--base-url", help="基础URL（默认使用配置中的base_url）")
+    publish_parser.add_argument("--version", help="配置版本号")
+    publish_parser.add_argument("--patch-from", action="append", default=[], metavar="DIR",
+                                help="旧版本安装包所在目录，为其中的同名文件生成补丁（可重复指定）")
+    publish_parser.add_argument("--compress", action="append", default=[], choices=sorted(VARIANT_SUFFIXES),
+                                help="同时发布预压缩文件（可重复指定），安装器下载时流式解压")
+    publish_parser.add_argument("--chunk-size-mb", type=float, default=CHUNK_SIZE / 1024 / 1024, help="分块大小(MB)")
+    publish_parser.add_argument("--workers", type=int, default=PUBLISH_FILE_WORKERS, help="同时处理的文件数")
+    args = parser.parse_args(argv)
+
+    if args.command != "publish":
+        app = CloudConfigManager()
+        app.run()
+        return 0
+
+    config = {"base_url": "", "packages": [], "version": "1.0.0"}
+    config_path = Path(args.config)
+    if config_path.exists():
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+
+    publisher = PackagePublisher(chunk_size=max(64 * 1024, int(args.chunk_size_mb * 1024 * 1024)),
+                                 file_workers=args.workers)
+    try:
+        publisher.publish([Path(path) for path in args.files], config, Path(args.output),
+                          base_url=args.base_url, version=args.version,
+                          patch_from=[Path(path) for path in args.patch_from], compress=args.compress)
+    except (OSError, zipfile.BadZipFile) as e:
+        print(f"发布失败: {e}")
+        return 1
+    return 0
+
+
 if __name__ == "__main__":
-    app = CloudConfigManager()
-    app.run()
+    sys.exit(main())
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+二进制补丁模块 - 读写bsdiff格式（BSDIFF40）的补丁，
+安装程序发布新版本时只下载旧版本到新版本的补丁，在本地流式生成新文件
+
+补丁格式:
+    头部32字节: "BSDIFF40", 控制块压缩长度, 差异块压缩长度, 新文件大小
+    之后依次是bzip2压缩的控制块、差异块和新增块
+    控制块由 (x, y, z) 三元组组成：新文件的下x字节 = 差异块的x字节与旧文件当前位置的x字节逐字节相加，
+    再从新增块复制y字节，然后旧文件位置移动z字节
+"""
+
+import bz2
+import functools
+import hashlib
+import io
+import os
+import struct
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from .chunk_store import chunk_digest, iter_chunks
+
+
+# 补丁文件头
+PATCH_MAGIC = b"BSDIFF40"
+PATCH_HEADER_SIZE = 32
+
+# 应用和生成补丁时每次处理的数据量（内存占用上限与此相关，与文件大小无关）
+PATCH_BLOCK_SIZE = 1024 * 1024
+
+# 生成补丁时，未匹配的分块与旧文件对应位置的差异中零字节超过该比例时按差异保存，否则按新增数据保存
+DIFF_ZERO_RATIO = 0.5
+
+
+class PatchError(Exception):
+    """补丁格式错误或与旧文件不匹配"""
+
+
+def _encode_offset(value: int) -> bytes:
+    """bsdiff的整数编码：8字节小端绝对值，最高位为符号位"""
+    encoded = struct.pack("<Q", abs(value))
+    if value < 0:
+        encoded = encoded[:7] + bytes([encoded[7] | 0x80])
+    return encoded
+
+
+def _decode_offset(data: bytes) -> int:
+    value = struct.unpack("<Q", bytes(data[:7]) + bytes([data[7] & 0x7F]))[0]
+    return -value if data[7] & 0x80 else value
+
+
+@functools.lru_cache(maxsize=8)
+def _byte_masks(length: int) -> Tuple[int, int, int]:
+    """逐字节运算用的掩码（每字节0x7F、0x80和0xFF）"""
+    return (int.from_bytes(b"\x7f" * length, 'little'), int.from_bytes(b"\x80" * length, 'little'),
+            int.from_bytes(b"\xff" * length, 'little'))
+
+
+def add_bytes(a: bytes, b: bytes) -> bytes:
+    """
+    逐字节相加（模256）
+
+    将两段数据作为大整数处理：低7位相加不会产生跨字节进位，最高位用异或补上，
+    整段数据的运算都在C中完成
+    """
+    length = len(a)
+    low, high, _ = _byte_masks(length)
+    x = int.from_bytes(a, 'little')
+    y = int.from_bytes(b, 'little')
+    return (((x & low) + (y & low)) ^ ((x ^ y) & high)).to_bytes(length, 'little')
+
+
+def subtract_bytes(a: bytes, b: bytes) -> bytes:
+    """逐字节相减（模256）"""
+    length = len(a)
+    full = _byte_masks(length)[2]
+    # 逐字节 -b = ~b + 1
+    inverted = (int.from_bytes(b, 'little') ^ full).to_bytes(length, 'little')
+    return add_bytes(a, add_bytes(inverted, b"\x01" * length))
+
+
+class _SliceReader(io.RawIOBase):
+    """只读取文件中 [start, end) 范围的数据，供bzip2逐段解压"""
+
+    def __init__(self, f, start: int, end: int):
+        self._file = f
+        self._position = start
+        self._end = end
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        count = min(len(buffer), self._end - self._position)
+        if count <= 0:
+            return 0
+        self._file.seek(self._position)
+        data = self._file.read(count)
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+
+def _read_exact(stream, size: int) -> bytes:
+    data = stream.read(size)
+    if len(data) != size:
+        raise PatchError("补丁数据不完整")
+    return data
+
+
+def _read_old(f, old_size: int, position: int, size: int) -> bytes:
+    """读取旧文件 [position, position + size)，超出文件范围的部分视为0"""
+    start = max(position, 0)
+    end = min(position + size, old_size)
+    if start >= end:
+        return bytes(size)
+    f.seek(start)
+    data = f.read(end - start)
+    return bytes(start - position) + data + bytes(position + size - end)
+
+
+def read_patch_header(patch_path: Path) -> Tuple[int, int, int]:
+    """
+    读取补丁头
+
+    Returns:
+        (控制块长度, 差异块长度, 新文件大小)
+    """
+    with open(patch_path, 'rb') as f:
+        header = f.read(PATCH_HEADER_SIZE)
+    if len(header) != PATCH_HEADER_SIZE or header[:8] != PATCH_MAGIC:
+        raise PatchError("不是有效的bsdiff补丁")
+    ctrl_length, diff_length, new_size = (_decode_offset(header[i:i + 8]) for i in (8, 16, 24))
+    if ctrl_length < 0 or diff_length < 0 or new_size < 0:
+        raise PatchError("补丁头无效")
+    return ctrl_length, diff_length, new_size
+
+
+def apply_patch(old_path: Path, patch_path: Path, new_path: Path) -> str:
+    """
+    流式应用补丁，内存占用只与块大小有关
+
+    Args:
+        old_path: 旧文件
+        patch_path: 补丁文件
+        new_path: 新文件输出路径
+
+    Returns:
+        新文件的MD5
+
+    Raises:
+        PatchError: 补丁格式错误或数据不完整
+    """
+    ctrl_length, diff_length, new_size = read_patch_header(patch_path)
+    patch_size = os.path.getsize(patch_path)
+    diff_start = PATCH_HEADER_SIZE + ctrl_length
+    extra_start = diff_start + diff_length
+    if extra_start > patch_size:
+        raise PatchError("补丁长度与文件头不符")
+
+    md5 = hashlib.md5()
+    old_size = os.path.getsize(old_path)
+    old_position = 0
+    new_position = 0
+
+    with open(patch_path, 'rb') as ctrl_file, open(patch_path, 'rb') as diff_file, \
+            open(patch_path, 'rb') as extra_file, open(old_path, 'rb') as old, open(new_path, 'wb') as out:
+        ctrl = bz2.BZ2File(_SliceReader(ctrl_file, PATCH_HEADER_SIZE, diff_start))
+        diff = bz2.BZ2File(_SliceReader(diff_file, diff_start, extra_start))
+        extra = bz2.BZ2File(_SliceReader(extra_file, extra_start, patch_size))
+        try:
+            while new_position < new_size:
+                triple = _read_exact(ctrl, 24)
+                diff_size, extra_size, seek = (_decode_offset(triple[i:i + 8]) for i in (0, 8, 16))
+                if diff_size < 0 or extra_size < 0 or new_position + diff_size + extra_size > new_size:
+                    raise PatchError("补丁控制数据无效")
+
+                remaining = diff_size
+                while remaining:
+                    count = min(remaining, PATCH_BLOCK_SIZE)
+                    data = add_bytes(_read_exact(diff, count), _read_old(old, old_size, old_position, count))
+                    out.write(data)
+                    md5.update(data)
+                    old_position += count
+                    remaining -= count
+
+                remaining = extra_size
+                while remaining:
+                    count = min(remaining, PATCH_BLOCK_SIZE)
+                    data = _read_exact(extra, count)
+                    out.write(data)
+                    md5.update(data)
+                    remaining -= count
+
+                new_position += diff_size + extra_size
+                old_position += seek
+        except (OSError, EOFError, ValueError) as e:
+            # bzip2数据损坏
+            raise PatchError(f"补丁数据损坏: {e}")
+        finally:
+            ctrl.close()
+            diff.close()
+            extra.close()
+
+    return md5.hexdigest()
+
+
+class _PatchWriter:
+    """按 (差异, 新增) 操作序列生成控制块，差异块和新增块边写边压缩"""
+
+    def __init__(self):
+        self.triples: List[List[int]] = []
+        self.diff = tempfile.TemporaryFile()
+        self.extra = tempfile.TemporaryFile()
+        self._diff_compressor = bz2.BZ2Compressor(9)
+        self._extra_compressor = bz2.BZ2Compressor(9)
+        # 下一个差异操作无需移动旧文件位置时可并入当前三元组
+        self.old_end = 0
+        self.new_size = 0
+
+    def copy(self, old_position: int, diff: bytes):
+        """新文件的下一段 = 旧文件 old_position 处的数据 + diff"""
+        current = self.triples[-1] if self.triples else None
+        if current is None or current[1] or old_position != self.old_end:
+            if current is not None:
+                current[2] = old_position - self.old_end
+            self.triples.append([0, 0, 0])
+        self.triples[-1][0] += len(diff)
+        self.old_end = old_position + len(diff)
+        self.diff.write(self._diff_compressor.compress(diff))
+        self.new_size += len(diff)
+
+    def add(self, data: bytes):
+        """新文件的下一段直接来自新增块"""
+        if not self.triples:
+            self.triples.append([0, 0, 0])
+        self.triples[-1][1] += len(data)
+        self.extra.write(self._extra_compressor.compress(data))
+        self.new_size += len(data)
+
+    def write(self, patch_path: Path):
+        """写出补丁文件"""
+        self.diff.write(self._diff_compressor.flush())
+        self.extra.write(self._extra_compressor.flush())
+        ctrl = bz2.compress(b"".join(_encode_offset(value) for triple in self.triples for value in triple), 9)
+
+        tmp_path = Path(str(patch_path) + '.tmp')
+        with open(tmp_path, 'wb') as out:
+            out.write(PATCH_MAGIC + _encode_offset(len(ctrl)) + _encode_offset(self.diff.tell())
+                      + _encode_offset(self.new_size))
+            out.write(ctrl)
+            for stream in (self.diff, self.extra):
+                stream.seek(0)
+                while True:
+                    data = stream.read(PATCH_BLOCK_SIZE)
+                    if not data:
+                        break
+                    out.write(data)
+        os.replace(tmp_path, patch_path)
+
+    def close(self):
+        self.diff.close()
+        self.extra.close()
+
+
+def _create_patch_by_chunks(old_path: Path, new_path: Path, patch_path: Path):
+    """
+    按内容分块匹配生成补丁：与旧文件相同的分块按零差异复制，
+    位置对应的相似分块按差异保存，其余按新增数据保存
+    """
+    old_chunks: Dict[str, int] = {}
+    offset = 0
+    with open(old_path, 'rb') as f:
+        for data in iter_chunks(f):
+            old_chunks.setdefault(chunk_digest(data), offset)
+            offset += len(data)
+    old_size = offset
+
+    writer = _PatchWriter()
+    try:
+        with open(old_path, 'rb') as old, open(new_path, 'rb') as new:
+            for data in iter_chunks(new):
+                old_position = old_chunks.get(chunk_digest(data))
+                if old_position is not None:
+                    writer.copy(old_position, bytes(len(data)))
+                    continue
+
+                # 未匹配的分块与旧文件中紧接上一段的位置比较（原位修改的情况）
+                candidate = writer.old_end
+                if candidate + len(data) <= old_size:
+                    diff = subtract_bytes(bytes(data), _read_old(old, old_size, candidate, len(data)))
+                    if diff.count(0) >= len(diff) * DIFF_ZERO_RATIO:
+                        writer.copy(candidate, diff)
+                        continue
+                writer.add(bytes(data))
+        writer.write(patch_path)
+    finally:
+        writer.close()
+
+
+def create_patch(old_path: Path, new_path: Path, patch_path: Path) -> str:
+    """
+    生成从旧文件到新文件的补丁
+
+    安装了bsdiff4时使用其后缀排序算法（补丁更小，但需要将两个文件读入内存），
+    否则按内容分块匹配生成
+
+    Returns:
+        使用的生成方式
+    """
+    try:
+        import bsdiff4
+    except ImportError:
+        bsdiff4 = None
+
+    if bsdiff4 is not None:
+        bsdiff4.file_diff(str(old_path), str(new_path), str(patch_path))
+        return "bsdiff4"
+    _create_patch_by_chunks(Path(old_path), Path(new_path), Path(patch_path))
+    return "chunks"
+
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分块存储模块 - 按内容切分文件，生成分块包（发布时）和本地分块存储（安装时），
+版本升级时只下载本地没有的分块并重新组装文件
+
+分块包格式:
+    <包名>.chunks.pack  所有不重复分块依次拼接（可压缩的分块使用zlib压缩）
+    <包名>.chunks.json  分块清单：每个分块的SHA-256、在分块包中的位置，以及每个文件由哪些分块组成
+"""
+
+import hashlib
+import json
+import os
+import zipfile
+import zlib
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+# 分块清单格式版本
+CHUNK_FORMAT_VERSION = 1
+
+# 分块大小范围：内容边界只在最小值之后查找，到最大值时强制切分
+CHUNK_MIN_SIZE = 16 * 1024
+CHUNK_MAX_SIZE = 512 * 1024
+
+# 内容边界：每个字节按固定表映射为1比特，连续16个字节的比特序列等于下面的模式时切分，
+# 随机数据上平均每64KB出现一次；映射和查找都由C实现的bytes.translate/find完成
+_BOUNDARY_BITS = hashlib.sha256(b"kouri-chunk-boundary").digest()
+_BOUNDARY_TABLE = bytes(0x31 if _BOUNDARY_BITS[i // 8] >> (i % 8) & 1 else 0x30 for i in range(256))
+BOUNDARY_PATTERN = b"1011000111010010"
+
+# 切分时每次读取的大小
+CHUNK_READ_SIZE = 4 * 1024 * 1024
+
+# 分块包和清单的文件名后缀
+CHUNK_PACK_SUFFIX = ".chunks.pack"
+CHUNK_MANIFEST_SUFFIX = ".chunks.json"
+
+# 合并下载范围时允许的最大间隔（间隔中的数据一起下载后丢弃，减少请求数）
+RANGE_MERGE_GAP = 64 * 1024
+
+
+def chunk_digest(data) -> str:
+    """分块的SHA-256"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def _find_cut(bits: bytes, start: int, end: int) -> int:
+    """在 bits[start:end] 对应的数据中查找下一个分块的结束位置"""
+    limit = min(start + CHUNK_MAX_SIZE, end)
+    search_from = start + CHUNK_MIN_SIZE - len(BOUNDARY_PATTERN)
+    index = bits.find(BOUNDARY_PATTERN, search_from, limit) if search_from < limit else -1
+    return index + len(BOUNDARY_PATTERN) if index >= 0 else limit
+
+
+def iter_chunks(stream) -> Iterator[memoryview]:
+    """
+    按内容切分数据流
+
+    边界只由附近的内容决定，文件中间插入或删除数据后，其余部分的分块保持不变
+
+    Yields:
+        分块数据（下一次迭代前有效）
+    """
+    data = b""
+    bits = b""
+    eof = False
+    while True:
+        if not eof and len(data) < CHUNK_MAX_SIZE:
+            more = stream.read(CHUNK_READ_SIZE)
+            if more:
+                data += more
+                bits = data.translate(_BOUNDARY_TABLE)
+            else:
+                eof = True
+            continue
+        if not data:
+            return
+
+        view = memoryview(data)
+        position = 0
+        while len(data) - position >= CHUNK_MAX_SIZE or (eof and position < len(data)):
+            cut = _find_cut(bits, position, len(data))
+            yield view[position:cut]
+            position = cut
+        view.release()
+        data = data[position:]
+        bits = bits[position:]
+
+
+def merge_ranges(ranges: List[Tuple[int, int]], gap: int = RANGE_MERGE_GAP,
+                 max_size: int = 0) -> List[Tuple[int, int]]:
+    """
+    合并相邻的下载范围
+
+    Args:
+        ranges: (起始位置, 结束位置) 列表，结束位置不含
+        gap: 允许合并的最大间隔
+        max_size: 合并后单个范围的最大长度（限制每次请求读入内存的数据量），0为不限制
+
+    Returns:
+        按起始位置排序的合并后范围
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if (merged and start - merged[-1][1] <= gap
+                and (not max_size or max(end, merged[-1][1]) - merged[-1][0] <= max_size)):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def build_chunk_pack(zip_path: Path, output_dir: Path) -> Dict:
+    """
+    将ZIP中的文件按内容切分，生成分块包和分块清单
+
+    Args:
+        zip_path: ZIP文件路径
+        output_dir: 输出目录
+
+    Returns:
+        {'manifest': 清单路径, 'pack': 分块包路径, 'chunks': 分块数, 'files': 文件数}
+    """
+    zip_path = Path(zip_path)
+    output_dir = Path(output_dir)
+    pack_path = output_dir / (zip_path.name + CHUNK_PACK_SUFFIX)
+    manifest_path = output_dir / (zip_path.name + CHUNK_MANIFEST_SUFFIX)
+
+    chunk_index: Dict[str, int] = {}
+    chunks = []
+    files = []
+    dirs = []
+    offset = 0
+
+    tmp_pack = pack_path.with_suffix(pack_path.suffix + '.tmp')
+    with zipfile.ZipFile(zip_path) as zf, open(tmp_pack, 'wb') as pack:
+        for info in zf.infolist():
+            if info.is_dir():
+                dirs.append(info.filename)
+                continue
+            file_chunks = []
+            with zf.open(info) as member:
+                for data in iter_chunks(member):
+                    digest = chunk_digest(data)
+                    if digest not in chunk_index:
+                        compressed = zlib.compress(data, 6)
+                        stored = compressed if len(compressed) < len(data) else data
+                        pack.write(stored)
+                        chunk_index[digest] = len(chunks)
+                        chunks.append([digest, offset, len(stored), len(data), int(stored is compressed)])
+                        offset += len(stored)
+                    file_chunks.append(chunk_index[digest])
+            files.append({'path': info.filename, 'size': info.file_size, 'chunks': file_chunks})
+    os.replace(tmp_pack, pack_path)
+
+    manifest = {
+        'format': CHUNK_FORMAT_VERSION,
+        'package': zip_path.name,
+        'pack_size': offset,
+        # 每个分块: [SHA-256, 分块包中的偏移, 存储长度, 原始长度, 是否压缩]
+        'chunks': chunks,
+        'files': files,
+        'dirs': dirs,
+    }
+    tmp_manifest = manifest_path.with_suffix(manifest_path.suffix + '.tmp')
+    with open(tmp_manifest, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_manifest, manifest_path)
+
+    return {'manifest': manifest_path, 'pack': pack_path, 'chunks': len(chunks), 'files': len(files)}
+
+
+class ChunkStore:
+    """本地分块存储 - 保存下载的分块，并索引已安装文件中可直接复用的分块"""
+
+    def __init__(self, root: Path):
+        """
+        初始化分块存储
+
+        Args:
+            root: 存储目录（按SHA-256前两位分目录保存分块）
+        """
+        self.root = Path(root)
+        # 已安装文件中的分块: SHA-256 -> (文件路径, 偏移, 长度)
+        self._local: Dict[str, Tuple[Path, int, int]] = {}
+
+    def _path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def index_file(self, path: Path) -> List[str]:
+        """
+        切分已安装的文件并索引其中的分块
+
+        Returns:
+            文件的分块SHA-256列表
+        """
+        digests = []
+        offset = 0
+        with open(path, 'rb') as f:
+            for data in iter_chunks(f):
+                digest = chunk_digest(data)
+                self._local.setdefault(digest, (Path(path), offset, len(data)))
+                digests.append(digest)
+                offset += len(data)
+        return digests
+
+    def has(self, digest: str) -> bool:
+        """本地是否有该分块"""
+        return digest in self._local or self._path(digest).is_file()
+
+    def get(self, digest: str) -> bytes:
+        """
+        读取分块并校验
+
+        Raises:
+            KeyError: 本地没有该分块或内容已变化
+        """
+        candidates = []
+        if digest in self._local:
+            candidates.append(self._local[digest])
+        candidates.append((self._path(digest), 0, None))
+
+        for path, offset, length in candidates:
+            try:
+                with open(path, 'rb') as f:
+                    f.seek(offset)
+                    data = f.read(length) if length is not None else f.read()
+            except OSError:
+                continue
+            if chunk_digest(data) == digest:
+                return data
+        raise KeyError(digest)
+
+    def put(self, digest: str, data: bytes):
+        """保存下载的分块"""
+        path = self._path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def prune(self, keep) -> int:
+        """
+        删除不在 keep 中的已保存分块
+
+        Returns:
+            删除的分块数
+        """
+        keep = set(keep)
+        removed = 0
+        if not self.root.is_dir():
+            return removed
+        for path in self.root.glob("*/*"):
+            if path.name not in keep:
+                try:
+                    path.unlink()
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
+
+
+def decode_chunk(entry: List, stored: bytes) -> Optional[bytes]:
+    """
+    还原分块包中的一个分块并校验
+
+    Args:
+        entry: 清单中的分块记录
+        stored: 分块包中的存储数据
+
+    Returns:
+        原始数据，校验失败返回None
+    """
+    digest, _, _, size, compressed = entry
+    try:
+        data = zlib.decompress(stored) if compressed else bytes(stored)
+    except zlib.error:
+        return None
+    if len(data) != size or chunk_digest(data) != digest:
+        return None
+    return data
@@ -6,12 +6,109 @@
 
 import urllib.request
 import urllib.error
+import urllib.parse
+import errno
+import os
+import threading
+import time
 import hashlib
 import json
 import zipfile
 import shutil
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional
+
+from .binary_patch import PatchError, apply_patch
+from .chunk_store import (CHUNK_FORMAT_VERSION, ChunkStore, decode_chunk, merge_ranges)
+from .disk_space import check_writable, find_alternate_dir, find_shortages
+from .content_encoding import (ACCEPT_ENCODING, SUPPORTED_ENCODINGS, DecodingReader, decode_bytes,
+                               normalize_encoding)
+from .install_manifest import (InstallManifest, LAUNCH_SCRIPT_NAME, STAGE_DOWNLOAD, STAGE_VERIFY,
+                               STAGE_EXTRACT, STAGE_INSTALL, STATE_DONE, STATE_FAILED, STATE_SKIPPED)
+from .metrics import get_registry, THROUGHPUT_BUCKETS, RATE_BUCKETS
+from .peer_cache import PEER_TIMEOUT, get_peer_cache
+from .tracing import current_span, get_tracer
+from .remote_zip import RemoteZipIndex
+from .staged_extract import StagedTree, recover_interrupted
+from .zip_directory import ZipDirectory, local_data_offset, write_member
+
+
+# 下载和校验的读缓冲区大小（每个线程复用一个缓冲区）
+IO_BUFFER_SIZE = 1024 * 1024
+
+_thread_buffers = threading.local()
+
+# 分块存储目录（位于下载目录下）
+CHUNK_STORE_DIR = "chunks"
+
+# 增量更新需要下载的数据超过完整文件的该比例时，直接下载完整文件
+DELTA_MAX_RATIO = 0.7
+
+# 每个Range请求的额外开销（按字节折算，用于比较增量更新和完整下载）
+RANGE_REQUEST_OVERHEAD = 16 * 1024
+
+# 按条目增量更新时，合并后单个Range请求的最大长度（每次读入内存的数据量）
+MEMBER_FETCH_MAX = 8 * 1024 * 1024
+
+# 已安装ZIP包的中央目录保存目录（位于下载目录下），升级时与远程中央目录比较
+INSTALLED_DIRECTORY_DIR = "zip_directories"
+INSTALLED_DIRECTORY_SUFFIX = ".cdir"
+
+# 应用补丁时新文件的临时后缀
+PATCH_TMP_SUFFIX = ".kouri-patched"
+
+_metrics = get_registry()
+DOWNLOAD_BYTES = _metrics.counter("download_bytes_total", "各下载源下载的字节数")
+DOWNLOAD_ATTEMPTS = _metrics.counter("download_attempts_total", "各下载源的下载尝试次数")
+DOWNLOAD_RETRIES = _metrics.counter("download_retries_total", "主源失败后改用备用源重试的次数")
+CACHE_LOOKUPS = _metrics.counter("cache_lookups_total", "本地缓存命中和未命中次数")
+HASH_BYTES = _metrics.counter("hash_bytes_total", "校验时计算摘要的字节数")
+HASH_SECONDS = _metrics.counter("hash_seconds_total", "校验时计算摘要的耗时（秒）")
+HASH_THROUGHPUT = _metrics.histogram("hash_throughput_mb_per_second", "单个文件摘要计算速度（MB/s）",
+                                     THROUGHPUT_BUCKETS)
+EXTRACT_FILES = _metrics.counter("extract_files_total", "解压的文件数")
+EXTRACT_SECONDS = _metrics.counter("extract_seconds_total", "解压耗时（秒）")
+EXTRACT_RATE = _metrics.histogram("extract_files_per_second", "单个压缩包的解压速度（文件/秒）", RATE_BUCKETS)
+DELTA_UPDATES = _metrics.counter("delta_updates_total", "分块增量更新的结果")
+DELTA_BYTES = _metrics.counter("delta_bytes_total", "增量更新中下载和本地复用的分块字节数")
+PATCH_UPDATES = _metrics.counter("patch_updates_total", "二进制补丁更新的结果")
+PATCH_SAVED_BYTES = _metrics.counter("patch_saved_bytes_total", "使用补丁比下载完整文件少下载的字节数")
+PEER_DOWNLOADS = _metrics.counter("peer_downloads_total", "从局域网节点下载的结果")
+VARIANT_DOWNLOADS = _metrics.counter("variant_downloads_total", "预压缩文件（.gz/.xz）下载的结果")
+PREFLIGHT_CHECKS = _metrics.counter("preflight_checks_total", "下载前磁盘空间预检的结果")
+ZIP_INDEX_FETCHES = _metrics.counter("zip_index_fetches_total", "按Range读取远程ZIP中央目录的结果")
+MEMBER_UPDATES = _metrics.counter("member_updates_total", "按ZIP条目增量更新的结果")
+MEMBER_BYTES = _metrics.counter("member_update_bytes_total", "按ZIP条目增量更新时下载的字节数和少下载的字节数")
+
+
+def _mirror_label(url: str) -> str:
+    """指标中的下载源标签（主机名）"""
+    return urllib.parse.urlsplit(url).hostname or "unknown"
+
+
+def _io_buffer() -> memoryview:
+    """当前线程复用的读缓冲区，避免每次读取都分配新的bytes对象"""
+    view = getattr(_thread_buffers, 'view', None)
+    if view is None:
+        view = _thread_buffers.view = memoryview(bytearray(IO_BUFFER_SIZE))
+    return view
+
+
+def _preallocate(f, size: int):
+    """
+    按文件大小预先分配磁盘空间，减少写入时的碎片和扩展开销，空间不足时立即失败
+
+    支持posix_fallocate的系统直接分配；其他系统（Windows）通过设置文件长度扩展
+    """
+    if hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(f.fileno(), 0, size)
+            return
+        except OSError as e:
+            # 文件系统不支持时退回设置文件长度，空间不足则直接报错
+            if e.errno == errno.ENOSPC:
+                raise
+    f.truncate(size)
 
 
 class CloudDownloader:
@@ -28,7 +125,14 @@ class CloudDownloader:
         self.app_path = self._get_application_path()
         self.download_dir = self.app_path / "downloads"
         self.download_dir.mkdir(exist_ok=True)
+        self.manifest = InstallManifest(self.app_path)
         self.config = self._load_config()
+        # 文件路径 -> (大小, 修改时间, MD5)
+        self._md5_cache: Dict[str, tuple] = {}
+        # 预检时因空间不足改为保存到其他卷的包：包名 -> 目录
+        self._package_dirs: Dict[str, Path] = {}
+        # 远程ZIP索引：URL -> 索引（读取失败时为None，不再重试）
+        self._zip_indexes: Dict[str, Optional[RemoteZipIndex]] = {}
     
     def _get_application_path(self) -> Path:
         """获取应用程序路径"""
@@ -103,6 +207,12 @@ class CloudDownloader:
             self._log(f"未找到包配置: {package_name}")
             return False
 
+        # 优先从局域网节点下载，其次下载预压缩文件
+        if self.download_from_peers(package, local_path, expected_size):
+            return True
+        if self.download_variant(package, local_path, expected_size):
+            return True
+
         primary_url = package.get("url", "")
         if not primary_url:
             self._log(f"包 {package_name} 没有配置下载URL")
@@ -121,7 +231,15 @@ class CloudDownloader:
 
             self._update_progress(f"尝试从{url_type}下载: {package_name} ({provider})")
 
-            if self.download_file(url, local_path, expected_size):
+            with get_tracer().span("mirror_attempt", package=package_name, url=url, provider=provider) as attempt:
+                success = self.download_file(url, local_path, expected_size)
+                if not success:
+                    attempt.fail()
+            DOWNLOAD_ATTEMPTS.inc(mirror=_mirror_label(url), outcome="ok" if success else "failed")
+            if i > 0:
+                DOWNLOAD_RETRIES.inc(mirror=_mirror_label(url))
+
+            if success:
                 if i == 0:
                     self._log(f"✓ 主源下载成功: {package_name}")
                 else:
@@ -151,43 +269,175 @@ class CloudDownloader:
         else:
             return "其他源"
 
-    def download_file(self, url: str, local_path: Path, expected_size: int = 0) -> bool:
+    def download_from_peers(self, package: Dict, local_path: Path, expected_size: int = 0) -> bool:
+        """
+        从局域网缓存节点下载包
+
+        节点按配置中的MD5提供文件，下载后重新计算MD5，与配置不一致时删除文件并不再使用该节点，
+        因此节点返回的内容无需信任
+
+        Args:
+            package: 包配置
+            local_path: 本地保存路径
+            expected_size: 预期文件大小
+
+        Returns:
+            是否已从节点得到校验通过的文件
+        """
+        peer_cache = get_peer_cache()
+        expected_md5 = package.get("md5", "").lower()
+        if peer_cache is None or not expected_md5:
+            return False
+
+        package_name = package.get("name", "")
+        for peer, url in peer_cache.content_urls(expected_md5):
+            with get_tracer().span("peer_attempt", package=package_name, peer=peer) as attempt:
+                if not self.download_file(url, local_path, expected_size, kind="peer", timeout=PEER_TIMEOUT):
+                    attempt.fail("节点下载失败")
+                    PEER_DOWNLOADS.inc(outcome="failed")
+                    continue
+                try:
+                    actual_md5 = self.file_md5(local_path)
+                except OSError:
+                    actual_md5 = ""
+                if actual_md5 == expected_md5:
+                    PEER_DOWNLOADS.inc(outcome="ok")
+                    self._log(f"✓ 局域网节点下载成功: {package_name} ({peer})")
+                    return True
+
+                attempt.fail("节点文件校验失败")
+                PEER_DOWNLOADS.inc(outcome="rejected")
+                self._log(f"✗ 局域网节点文件校验失败，不再使用该节点: {peer}")
+                peer_cache.drop_peer(peer)
+                try:
+                    local_path.unlink()
+                except OSError:
+                    pass
+        return False
+
+    def download_variant(self, package: Dict, local_path: Path, expected_size: int = 0) -> bool:
+        """
+        下载配置中声明的预压缩文件（variants: [{'encoding': 'xz', 'url', 'size'}]），边下载边解压
+
+        解压后的MD5与配置不一致或下载失败时删除文件，由调用方下载未压缩的文件
+
+        Returns:
+            是否已得到校验通过的文件
+        """
+        expected_md5 = package.get("md5", "").lower()
+        package_name = package.get("name", "")
+        for variant in package.get("variants") or []:
+            encoding = normalize_encoding(variant.get("encoding"))
+            if encoding not in SUPPORTED_ENCODINGS or not variant.get("url"):
+                continue
+
+            self._update_progress(f"下载压缩版本: {package_name} ({encoding}, {variant.get('size', 0) // 1024}KB)")
+            with get_tracer().span("variant_attempt", package=package_name, encoding=encoding) as attempt:
+                success = self.download_file(variant["url"], local_path, expected_size, kind="variant",
+                                             encoding=encoding)
+                if success and expected_md5:
+                    # 下载时已计算解压后数据的MD5，这里直接命中缓存
+                    success = self.file_md5(local_path) == expected_md5
+                if not success:
+                    attempt.fail("压缩版本下载或校验失败")
+            VARIANT_DOWNLOADS.inc(encoding=encoding, outcome="ok" if success else "failed")
+            if success:
+                self._log(f"✓ 压缩版本下载成功: {package_name} ({encoding})")
+                return True
+
+            self._log(f"✗ 压缩版本下载失败: {package_name} ({encoding})，改为下载未压缩文件")
+            try:
+                local_path.unlink()
+            except OSError:
+                pass
+        return False
+
+    def share_with_peers(self, package: Dict, local_path: Path):
+        """向局域网节点提供已校验的包（本实例开启缓存服务时）"""
+        peer_cache = get_peer_cache()
+        if peer_cache is not None and peer_cache.serving:
+            peer_cache.register(package.get("md5", ""), local_path)
+
+    def download_file(self, url: str, local_path: Path, expected_size: int = 0, kind: str = "package",
+                      timeout: float = 30, encoding: Optional[str] = None) -> bool:
         """
         下载单个文件
+
+        服务器使用gzip/deflate传输压缩时边下载边解压；写入文件的同时计算解压后数据的MD5，
+        校验阶段无需再读取文件
         
         Args:
             url: 下载URL
             local_path: 本地保存路径
-            expected_size: 预期文件大小
+            expected_size: 预期文件大小（解压后）
+            kind: 指标中的数据类型
+            timeout: 连接和读取超时（秒）
+            encoding: 文件本身的压缩格式（预压缩的.gz/.xz文件），下载时解压
             
         Returns:
             下载是否成功
         """
+        span = current_span()
+        # 网络传输的字节数和写入文件的（解压后）字节数
+        downloaded = 0
+        written = 0
         try:
             self._update_progress(f"开始下载: {local_path.name}")
             
             req = urllib.request.Request(url)
             req.add_header('User-Agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
+            req.add_header('Accept-Encoding', ACCEPT_ENCODING)
             
-            with urllib.request.urlopen(req, timeout=30) as response:
+            with urllib.request.urlopen(req, timeout=timeout) as response:
                 total_size = int(response.headers.get('Content-Length', expected_size))
-                downloaded = 0
-                
+                has_length = 'Content-Length' in response.headers
+                transfer_encoding = normalize_encoding(response.headers.get('Content-Encoding'))
+                wire = DecodingReader(response, transfer_encoding) if transfer_encoding else None
+                reader = wire or response
+                if encoding:
+                    reader = DecodingReader(reader, encoding)
+                    wire = wire or reader
+                buffer = _io_buffer()
+                hash_md5 = hashlib.md5()
+
                 with open(local_path, 'wb') as f:
-                    while True:
-                        chunk = response.read(8192)
-                        if not chunk:
-                            break
+                    # 解压时Content-Length是压缩数据的长度，按预期的解压后大小预分配
+                    allocate = expected_size if wire else (total_size if has_length else 0)
+                    if allocate > 0:
+                        _preallocate(f, allocate)
+
+                    try:
+                        while True:
+                            count = reader.readinto(buffer)
+                            if not count:
+                                break
                         
-                        f.write(chunk)
-                        downloaded += len(chunk)
+                            f.write(buffer[:count])
+                            hash_md5.update(buffer[:count])
+                            written += count
+                            downloaded = wire.raw_bytes if wire else written
+                            span.add_bytes(count)
                         
-                        if total_size > 0:
-                            download_progress = (downloaded / total_size) * 100
-                            self._update_progress(
-                                f"下载中: {local_path.name} ({downloaded // 1024}KB / {total_size // 1024}KB) - {download_progress:.1f}%"
-                            )
-            
+                            done, total = (downloaded, total_size) if has_length else (written, expected_size)
+                            if total > 0:
+                                download_progress = (done / total) * 100
+                                self._update_progress(
+                                    f"下载中: {local_path.name} ({done // 1024}KB / {total // 1024}KB) - {download_progress:.1f}%"
+                                )
+                    finally:
+                        # 预分配后连接提前断开或读取出错时，去掉未写入的部分
+                        if f.tell() < os.fstat(f.fileno()).st_size:
+                            f.truncate()
+
+                # 连接提前断开时readinto()直接返回0，需按Content-Length判断是否完整
+                if has_length and downloaded < total_size:
+                    self._log(f"下载不完整: {local_path.name} ({downloaded}/{total_size} 字节)")
+                    self._update_progress(f"✗ 下载失败: {local_path.name} - 连接中断")
+                    return False
+
+            stat = local_path.stat()
+            self._md5_cache[str(local_path)] = (stat.st_size, stat.st_mtime_ns, hash_md5.hexdigest())
+            HASH_BYTES.inc(written, algorithm="md5")
             self._update_progress(f"✓ 下载完成: {local_path.name}")
             return True
             
@@ -199,6 +449,8 @@ class CloudDownloader:
             self._log(f"下载失败: {e}")
             self._update_progress(f"✗ 下载失败: {local_path.name} - {str(e)}")
             return False
+        finally:
+            DOWNLOAD_BYTES.inc(downloaded, mirror=_mirror_label(url), kind=kind)
     
     def verify_file(self, file_path: Path, expected_md5: str = "") -> bool:
         """
@@ -218,21 +470,51 @@ class CloudDownloader:
             return file_path.stat().st_size > 0
         
         try:
-            hash_md5 = hashlib.md5()
-            with open(file_path, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_md5.update(chunk)
-            
-            file_md5 = hash_md5.hexdigest()
-            return file_md5.lower() == expected_md5.lower()
+            return self.file_md5(file_path).lower() == expected_md5.lower()
         except Exception as e:
             self._log(f"文件校验失败: {e}")
             return False
 
+    def file_md5(self, file_path: Path) -> str:
+        """
+        计算文件的MD5
+
+        文件大小和修改时间未变化时直接返回上次的结果（如缓存校验失败后查找补丁时不再重复计算）
+        """
+        stat = file_path.stat()
+        key = str(file_path)
+        cached = self._md5_cache.get(key)
+        if cached and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+            return cached[2]
+
+        hash_md5 = hashlib.md5()
+        hashed = 0
+        buffer = _io_buffer()
+        start = time.perf_counter()
+        with open(file_path, "rb", buffering=0) as f:
+            while True:
+                count = f.readinto(buffer)
+                if not count:
+                    break
+                hash_md5.update(buffer[:count])
+                hashed += count
+
+        file_md5 = hash_md5.hexdigest()
+        elapsed = time.perf_counter() - start
+        HASH_BYTES.inc(hashed, algorithm="md5")
+        HASH_SECONDS.inc(elapsed, algorithm="md5")
+        if elapsed > 0:
+            HASH_THROUGHPUT.observe(hashed / 1024 / 1024 / elapsed, algorithm="md5")
+        self._md5_cache[key] = (stat.st_size, stat.st_mtime_ns, file_md5)
+        return file_md5
+
     def extract_zip_file(self, zip_path: Path, extract_to: str = ".") -> bool:
         """
         解压ZIP文件
 
+        先完整解压到目标目录旁的暂存目录，再替换目标目录中的顶层文件和目录（旧版本移到备份目录）；
+        解压失败或中断时目标目录保持旧版本，ZIP文件在替换完成后才删除
+
         Args:
             zip_path: ZIP文件路径
             extract_to: 解压目标目录
@@ -240,6 +522,7 @@ class CloudDownloader:
         Returns:
             解压是否成功
         """
+        tree = None
         try:
             # 确定解压目标目录
             if extract_to == ".":
@@ -248,158 +531,1098 @@ class CloudDownloader:
                 target_dir = self.app_path / extract_to
 
             target_dir.mkdir(parents=True, exist_ok=True)
+            tree = StagedTree(target_dir, zip_path.name)
+            staging_dir = tree.prepare()
 
             self._update_progress(f"开始解压: {zip_path.name}")
 
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                # 获取压缩包内容信息
-                file_list = zip_ref.namelist()
-                total_files = len(file_list)
+            # 中央目录按列解析（不为每个条目创建ZipInfo），条目数据从内存映射中读取
+            with ZipDirectory.open(zip_path) as directory:
+                total_files = len(directory)
 
                 self._log(f"ZIP文件包含 {total_files} 个文件/文件夹")
+                current_span().set(files=total_files).add_bytes(directory.total_size())
 
-                # 逐个解压文件以显示进度
-                for i, file_name in enumerate(file_list):
-                    try:
-                        zip_ref.extract(file_name, target_dir)
+                # 记录启动脚本位置，启动时无需搜索目录
+                launch_scripts = [target_dir / name for name in directory.names()
+                                  if name.rsplit('/', 1)[-1].lower() == LAUNCH_SCRIPT_NAME]
 
-                        # 更新进度
-                        progress = (i + 1) / total_files * 100
-                        if i % 10 == 0 or i == total_files - 1:  # 每10个文件或最后一个文件更新一次
-                            self._update_progress(f"解压中: {progress:.1f}% ({i+1}/{total_files})")
+                # 逐个解压文件以显示进度，任何文件失败时放弃暂存的新版本
+                start = time.perf_counter()
+                for i in range(total_files):
+                    try:
+                        directory.extract(i, staging_dir)
                     except Exception as e:
-                        self._log(f"解压文件 {file_name} 时出错: {e}")
-                        continue
+                        self._log(f"解压文件 {directory.name(i)} 时出错: {e}")
+                        tree.discard()
+                        self._update_progress(f"✗ 解压失败，保留当前版本: {zip_path.name}")
+                        return False
+
+                    # 更新进度
+                    progress = (i + 1) / total_files * 100
+                    if i % 10 == 0 or i == total_files - 1:  # 每10个文件或最后一个文件更新一次
+                        self._update_progress(f"解压中: {progress:.1f}% ({i+1}/{total_files})")
+
+                elapsed = time.perf_counter() - start
+
+                # 旧版本中不在压缩包里的文件（用户数据等）保留到新版本中，上一版本压缩包中有、新版本已删除的文件除外
+                self._update_progress(f"替换为新版本: {zip_path.name}")
+                removed = self._removed_files(target_dir, self._archive_paths(directory, target_dir))
+                kept = self._commit_staged(tree, removed)
+                if kept:
+                    self._log(f"保留 {kept} 个不在压缩包中的文件")
+
+                # 记录已安装版本的中央目录，升级时只需比较有变化的文件
+                try:
+                    directory.save(self._installed_directory_path(target_dir))
+                except OSError:
+                    pass
+
+            EXTRACT_FILES.inc(total_files)
+            EXTRACT_SECONDS.inc(elapsed)
+            if elapsed > 0:
+                EXTRACT_RATE.observe(total_files / elapsed)
 
             self._update_progress(f"✓ 解压完成: {zip_path.name}")
-            self._log(f"ZIP文件解压成功: {zip_path} -> {target_dir}")
+            self._log(f"ZIP文件解压成功: {zip_path} -> {target_dir}（上一版本保存在 {tree.backup_dir.name}）")
 
-            # 解压完成后删除ZIP文件以节省空间
-            try:
-                zip_path.unlink()
-                self._log(f"已删除ZIP文件: {zip_path}")
-            except Exception as e:
-                self._log(f"删除ZIP文件失败: {e}")
+            # 关闭映射后中央目录的列数据仍可使用
+            self.manifest.record_files(zip_path.name, (target_dir / name for name in directory.names()
+                                                       if not name.endswith('/')))
+            if launch_scripts:
+                self.manifest.record_launch_scripts(zip_path.name, launch_scripts)
+
+            # 替换完成后删除ZIP文件以节省空间（向局域网提供缓存时保留）
+            peer_cache = get_peer_cache()
+            if peer_cache is None or not peer_cache.serving:
+                try:
+                    zip_path.unlink()
+                    self._log(f"已删除ZIP文件: {zip_path}")
+                except Exception as e:
+                    self._log(f"删除ZIP文件失败: {e}")
 
             return True
 
         except zipfile.BadZipFile:
+            if tree is not None:
+                tree.discard()
             self._log(f"ZIP文件损坏: {zip_path}")
             self._update_progress(f"✗ ZIP文件损坏: {zip_path.name}")
             return False
         except Exception as e:
+            if tree is not None:
+                tree.discard()
             self._log(f"解压ZIP文件失败: {e}")
             self._update_progress(f"✗ 解压失败: {zip_path.name} - {str(e)}")
             return False
 
-    def download_packages(self, skip_python: bool = False, skip_wechat: bool = False) -> List[Path]:
+    def rollback_package(self, package: Dict) -> bool:
         """
-        下载所有配置的安装包
+        把ZIP包的解压目录换回上一版本
+
+        回滚后保留解压阶段的完成状态（同一配置版本不再重新解压），并删除中央目录记录，
+        下次升级时下载完整文件
+
+        Returns:
+            是否已回滚
+        """
+        if not self.needs_extract(package):
+            return False
+        package_name = package.get("name", "")
+        target_dir = self.get_extract_target(package)
+        try:
+            rolled_back = StagedTree(target_dir, package_name).rollback()
+        except OSError as e:
+            self._log(f"回滚失败: {package_name} ({e})")
+            return False
+        if rolled_back:
+            try:
+                self._installed_directory_path(target_dir).unlink()
+            except OSError:
+                pass
+            self._log(f"✓ 已回滚到上一版本: {package_name} -> {target_dir}")
+        else:
+            self._log(f"没有可回滚的版本: {package_name}")
+        return rolled_back
+
+    def rollback_packages(self) -> bool:
+        """回滚配置中所有ZIP包，返回是否有包被回滚"""
+        results = [self.rollback_package(package) for package in self.config.get("packages", [])]
+        return any(results)
+
+    def filter_packages(self, skip_python: bool = False, skip_wechat: bool = False,
+                        quiet: bool = False, evidence: Optional[Dict[str, str]] = None) -> List[Dict]:
+        """
+        根据系统检测结果过滤需要下载的包
 
         Args:
             skip_python: 是否跳过Python安装包下载
             skip_wechat: 是否跳过微信安装包下载
+            quiet: 是否不输出跳过日志
+            evidence: 检测到的已安装程序文件 {"python": 路径, "wechat": 路径}，记录到安装清单，
+                      下次运行时文件仍然存在才跳过检测；没有时下次运行重新检测
 
         Returns:
-            成功下载的文件路径列表
+            需要下载的包配置列表
         """
-        downloaded_files = []
-        packages = self.config.get("packages", [])
-
-        if not packages:
-            self._log("没有配置需要下载的安装包")
-            return downloaded_files
-
-        # 根据检测结果过滤需要下载的包
+        evidence = evidence or {}
         filtered_packages = []
-        for package in packages:
+        for package in self.config.get("packages", []):
             package_name = package.get("name", "").lower()
 
             if skip_python and "python" in package_name:
-                self._log(f"跳过Python安装包下载: {package.get('name', '')}")
+                if not quiet:
+                    self._log(f"跳过Python安装包下载: {package.get('name', '')}")
+                self.manifest.mark_skipped(package, self.config_version, evidence.get("python"))
                 continue
 
             if skip_wechat and ("wechat" in package_name or "微信" in package_name):
-                self._log(f"跳过微信安装包下载: {package.get('name', '')}")
+                if not quiet:
+                    self._log(f"跳过微信安装包下载: {package.get('name', '')}")
+                self.manifest.mark_skipped(package, self.config_version, evidence.get("wechat"))
                 continue
 
             filtered_packages.append(package)
 
+        return filtered_packages
+
+    def get_extract_target(self, package: Dict) -> Path:
+        """获取ZIP包的解压目标目录"""
+        extract_to = package.get("extract_to", ".")
+        if extract_to == ".":
+            return self.app_path
+        return self.app_path / extract_to
+
+    def needs_extract(self, package: Dict) -> bool:
+        """判断包下载后是否需要解压"""
+        return (package.get("post_download", "") == "extract"
+                and package.get("name", "").lower().endswith(".zip"))
+
+    @property
+    def config_version(self) -> str:
+        """当前配置版本"""
+        return str(self.config.get("version", ""))
+
+    def _mark_stage(self, package: Dict, stage: str, success: bool):
+        """在安装清单中记录包的阶段结果"""
+        self.manifest.sync_package(package, self.config_version)
+        self.manifest.mark_stage(package.get("name", ""), stage, STATE_DONE if success else STATE_FAILED)
+
+    def get_final_stage(self, package: Dict) -> str:
+        """包处理完成所需的最后一个阶段"""
+        if self.needs_extract(package):
+            return STAGE_EXTRACT
+        if package.get("name", "").lower().endswith('.exe'):
+            return STAGE_INSTALL
+        return STAGE_VERIFY
+
+    def is_package_complete(self, package: Dict) -> bool:
+        """
+        根据安装清单判断包是否已处理完成（配置未变化且产物仍然存在）
+
+        Args:
+            package: 包配置
+
+        Returns:
+            是否可以跳过该包的所有阶段
+        """
+        if not self.manifest.sync_package(package, self.config_version):
+            return False
+
+        package_name = package.get("name", "")
+        final_stage = self.get_final_stage(package)
+        status = self.manifest.get_stage_status(package_name, final_stage)
+        if status == STATE_SKIPPED:
+            # 跳过是根据当时的检测结果决定的，检测到的程序文件仍然存在才有效（如未被卸载）
+            files = self.manifest.get_files(package_name)
+            return bool(files) and all(path.is_file() for path in files)
+        if status != STATE_DONE:
+            return False
+
+        if final_stage == STAGE_EXTRACT:
+            return self.get_extract_target(package).is_dir()
+        if final_stage == STAGE_VERIFY:
+            return self.manifest.is_local_file_current(package_name, self.local_path(package_name))
+        return True
+
+    def get_completed_item(self, package: Dict) -> Path:
+        """已完成包的产物（解压目录或本地文件）"""
+        if self.needs_extract(package):
+            return self.get_extract_target(package)
+        return self.local_path(package.get("name", ""))
+
+    def local_path(self, package_name: str) -> Path:
+        """包的本地保存路径（预检时可能改到其他卷的目录）"""
+        return self._package_dirs.get(package_name, self.download_dir) / package_name
+
+    def record_install_result(self, package_name: str, success: bool):
+        """记录安装程序的执行结果"""
+        for package in self.config.get("packages", []):
+            if package.get("name", "") == package_name:
+                self._mark_stage(package, STAGE_INSTALL, success)
+                return
+
+    def is_cached(self, package: Dict) -> bool:
+        """
+        检查包是否已存在于下载目录且有效
+
+        清单中记录已校验且文件未被修改时不再重新计算摘要
+        """
+        package_name = package.get("name", "")
+        local_path = self.local_path(package_name)
+        if (self.manifest.sync_package(package, self.config_version)
+                and self.manifest.is_local_file_current(package_name, local_path)):
+            CACHE_LOOKUPS.inc(result="hit", source="manifest")
+            self.share_with_peers(package, local_path)
+            return True
+
+        if self.verify_file(local_path, package.get("md5", "")):
+            self._mark_stage(package, STAGE_VERIFY, True)
+            self.manifest.record_local_file(package_name, local_path)
+            CACHE_LOOKUPS.inc(result="hit", source="verify")
+            self.share_with_peers(package, local_path)
+            return True
+        CACHE_LOOKUPS.inc(result="miss")
+        return False
+
+    def download_package(self, package: Dict) -> Optional[Path]:
+        """
+        使用主源和备用源下载单个包
+
+        Args:
+            package: 包配置
+
+        Returns:
+            本地文件路径，失败返回None
+        """
+        package_name = package.get("name", "")
+        local_path = self.local_path(package_name)
+
+        with get_tracer().span("download", package=package_name) as span:
+            success = (self.download_patch(package, local_path)
+                       or self.download_file_with_fallback(package_name, local_path, package.get("size", 0)))
+            if success:
+                span.add_bytes(local_path.stat().st_size)
+            else:
+                span.fail("所有下载源都失败")
+        self._mark_stage(package, STAGE_DOWNLOAD, success)
+        return local_path if success else None
+
+    def download_patch(self, package: Dict, local_path: Path) -> bool:
+        """
+        用补丁把下载目录中的旧版本更新为新版本
+
+        配置中的patches按 (from_md5 -> to_md5) 列出补丁；本地文件与某个补丁的起始版本一致时，
+        只下载补丁并流式生成新文件，结果校验不一致或任何一步失败时返回False，由调用方下载完整文件
+
+        Args:
+            package: 包配置
+            local_path: 本地文件路径（旧版本）
+
+        Returns:
+            是否已通过补丁得到新版本
+        """
+        patches = package.get("patches") or []
+        expected_md5 = package.get("md5", "").lower()
+        if not patches or not expected_md5 or not local_path.is_file():
+            return False
+
+        package_name = package.get("name", "")
+        try:
+            local_md5 = self.file_md5(local_path)
+        except OSError:
+            return False
+        patch = next((p for p in patches
+                      if p.get("from_md5", "").lower() == local_md5
+                      and p.get("to_md5", expected_md5).lower() == expected_md5), None)
+        if patch is None:
+            return False
+
+        patch_path = local_path.with_name(f"{package_name}.{local_md5[:8]}-{expected_md5[:8]}.patch")
+        new_path = local_path.with_name(local_path.name + PATCH_TMP_SUFFIX)
+        with get_tracer().span("patch", package=package_name, from_md5=local_md5) as span:
+            try:
+                self._update_progress(f"使用补丁更新: {package_name} ({patch.get('size', 0) // 1024}KB)")
+                if not self.download_file(patch["url"], patch_path, patch.get("size", 0), kind="patch"):
+                    raise PatchError("补丁下载失败")
+                span.add_bytes(patch_path.stat().st_size)
+
+                new_md5 = apply_patch(local_path, patch_path, new_path)
+                if new_md5 != expected_md5:
+                    raise PatchError(f"补丁结果校验失败: {new_md5}")
+                os.replace(new_path, local_path)
+                # 补丁结果已校验，记录摘要避免校验阶段重复计算
+                stat = local_path.stat()
+                self._md5_cache[str(local_path)] = (stat.st_size, stat.st_mtime_ns, new_md5)
+            except (PatchError, OSError, KeyError) as e:
+                self._log(f"补丁更新失败，改为下载完整文件: {e}")
+                span.fail(str(e))
+                PATCH_UPDATES.inc(outcome="failed")
+                try:
+                    new_path.unlink()
+                except OSError:
+                    pass
+                return False
+            finally:
+                saved = package.get("size", 0) - (patch_path.stat().st_size if patch_path.exists() else 0)
+                try:
+                    patch_path.unlink()
+                except OSError:
+                    pass
+
+        PATCH_UPDATES.inc(outcome="applied")
+        PATCH_SAVED_BYTES.inc(max(saved, 0))
+        self._update_progress(f"✓ 补丁更新完成: {package_name}")
+        return True
+
+    def verify_package(self, package: Dict, local_path: Path) -> bool:
+        """
+        校验下载的包，校验失败时删除文件
+
+        Args:
+            package: 包配置
+            local_path: 本地文件路径
+
+        Returns:
+            校验是否通过
+        """
+        with get_tracer().span("verify", package=package.get("name", ""),
+                               algorithm="md5" if package.get("md5") else "size") as span:
+            verified = self.verify_file(local_path, package.get("md5", ""))
+            if local_path.exists():
+                span.add_bytes(local_path.stat().st_size)
+            if not verified:
+                span.fail("校验失败")
+
+        if verified:
+            self._mark_stage(package, STAGE_VERIFY, True)
+            self.manifest.record_local_file(package.get("name", ""), local_path)
+            self.share_with_peers(package, local_path)
+            return True
+
+        self._mark_stage(package, STAGE_VERIFY, False)
+        self._log(f"文件下载后验证失败: {package.get('name', '')}")
+        try:
+            local_path.unlink()
+        except:
+            pass
+        return False
+
+    def extract_package(self, package: Dict, local_path: Path) -> Optional[Path]:
+        """
+        解压ZIP包
+
+        Args:
+            package: 包配置
+            local_path: ZIP文件路径
+
+        Returns:
+            解压目标目录，失败返回None
+        """
+        with get_tracer().span("extract", package=package.get("name", "")) as span:
+            extracted = self.extract_zip_file(local_path, package.get("extract_to", "."))
+            if not extracted:
+                span.fail("解压失败")
+
+        if extracted:
+            self._mark_stage(package, STAGE_EXTRACT, True)
+            self._log(f"文件下载、验证并解压成功: {package.get('name', '')}")
+            return self.get_extract_target(package)
+
+        self._mark_stage(package, STAGE_EXTRACT, False)
+        self._log(f"文件下载成功但解压失败: {package.get('name', '')}")
+        return None
+
+    def _fetch_bytes(self, url: str, start: Optional[int] = None, end: Optional[int] = None,
+                     kind: str = "chunk") -> bytes:
+        """
+        下载URL的内容到内存，指定范围时使用Range请求
+
+        Args:
+            url: 下载URL
+            start: 起始位置
+            end: 结束位置（不含）
+            kind: 指标中的数据类型
+
+        Raises:
+            ValueError: 服务器不支持Range请求或返回的长度不符
+        """
+        req = urllib.request.Request(url)
+        req.add_header('User-Agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
+        if start is not None:
+            req.add_header('Range', f"bytes={start}-{end - 1}")
+        else:
+            # 完整下载清单等文本时允许压缩传输
+            req.add_header('Accept-Encoding', ACCEPT_ENCODING)
+
+        with urllib.request.urlopen(req, timeout=30) as response:
+            if start is not None and response.status != 206:
+                raise ValueError(f"服务器不支持Range请求: {url}")
+            data = response.read()
+            encoding = response.headers.get('Content-Encoding')
+        DOWNLOAD_BYTES.inc(len(data), mirror=_mirror_label(url), kind=kind)
+        data = decode_bytes(data, encoding)
+
+        if start is not None and len(data) != end - start:
+            raise ValueError(f"Range响应长度不符: {len(data)}/{end - start} 字节")
+        return data
+
+    def remote_zip_index(self, package: Dict) -> Optional[RemoteZipIndex]:
+        """
+        按Range读取远程ZIP的中央目录（每个URL只读取一次）
+
+        Returns:
+            远程ZIP索引，服务器不支持Range请求或读取失败时返回None
+        """
+        url, size = package.get("url", ""), package.get("size", 0)
+        if not url or not size:
+            return None
+        if url in self._zip_indexes:
+            return self._zip_indexes[url]
+
+        package_name = package.get("name", "")
+        index = None
+        with get_tracer().span("zip_index", package=package_name) as span:
+            try:
+                index = RemoteZipIndex.fetch(
+                    url, size, lambda u, start, end: self._fetch_bytes(u, start, end, kind="zip_directory"))
+                span.set(entries=len(index)).add_bytes(index.fetched_bytes)
+                self._log(f"远程ZIP目录: {package_name} - {len(index)} 个条目，解压后 "
+                          f"{index.total_size() // 1024 // 1024}MB（读取 {index.fetched_bytes // 1024}KB）")
+            except (OSError, ValueError, zipfile.BadZipFile) as e:
+                self._log(f"无法读取远程ZIP目录: {package_name} ({e})")
+                span.fail(str(e))
+        ZIP_INDEX_FETCHES.inc(outcome="ok" if index else "failed")
+        self._zip_indexes[url] = index
+        return index
+
+    def recover_interrupted_swaps(self, packages: List[Dict]) -> int:
+        """
+        完成各个ZIP包解压目录中上次中断的版本替换（在下载和解压之前调用）
+
+        Returns:
+            完成的替换数
+        """
+        recovered = 0
+        for target_dir in {self.get_extract_target(p) for p in packages if self.needs_extract(p)}:
+            try:
+                count = recover_interrupted(target_dir)
+            except OSError as e:
+                self._log(f"完成上次中断的版本替换失败: {target_dir} ({e})")
+                continue
+            if count:
+                self._log(f"已完成上次中断的版本替换: {target_dir}")
+                recovered += count
+        return recovered
+
+    def fetch_zip_indexes(self, packages: List[Dict]) -> int:
+        """
+        读取需要的远程ZIP中央目录：配置中没有解压后大小（空间预检和进度估算使用），
+        或已有安装记录（按条目更新使用）的ZIP包；结果缓存在下载器中，供后续阶段直接使用
+
+        Returns:
+            读取成功的包数
+        """
+        fetched = 0
+        for package in packages:
+            if not package.get("url", "") or not self.needs_extract(package):
+                continue
+            if self.is_package_complete(package):
+                continue
+            if package.get("unpacked_size") and not self._installed_directory_path(
+                    self.get_extract_target(package)).is_file():
+                continue
+            if self.remote_zip_index(package):
+                fetched += 1
+        return fetched
+
+    def unpacked_size(self, package: Dict) -> int:
+        """
+        ZIP包解压后的总大小：优先使用配置中发布工具记录的unpacked_size，
+        否则按Range读取远程中央目录；无法获取时返回0
+        """
+        if package.get("unpacked_size"):
+            return int(package["unpacked_size"])
+        index = self.remote_zip_index(package)
+        return index.total_size() if index else 0
+
+    def _installed_directory_path(self, target_dir: Path) -> Path:
+        """解压目录对应的中央目录记录（按解压目录而不是包名保存：新版本的包名可能不同，
+        多个包也可能解压到同一目录，记录的总是最后一次解压写入的文件）"""
+        key = hashlib.md5(str(Path(target_dir).resolve()).encode('utf-8')).hexdigest()[:16]
+        return self.download_dir / INSTALLED_DIRECTORY_DIR / (key + INSTALLED_DIRECTORY_SUFFIX)
+
+    def installed_zip_directory(self, package: Dict) -> Optional[ZipDirectory]:
+        """上次解压该包时保存的中央目录（解压目录不存在或没有记录时返回None）"""
+        path = self._installed_directory_path(self.get_extract_target(package))
+        if not path.is_file() or not self.get_extract_target(package).is_dir():
+            return None
+        try:
+            return ZipDirectory.load(path)
+        except (OSError, zipfile.BadZipFile):
+            return None
+
+    @staticmethod
+    def _archive_paths(directory, target_dir: Path) -> List[Path]:
+        """中央目录（ZipDirectory）中所有文件条目的解压路径"""
+        return [directory.target_path(i, target_dir) for i in range(len(directory)) if not directory.is_dir(i)]
+
+    def _removed_files(self, target_dir: Path, paths: List[Path]) -> List[Path]:
+        """
+        上次解压的版本中有、新版本中没有的文件
+
+        Args:
+            target_dir: 解压目录
+            paths: 新版本的文件路径
+
+        Returns:
+            已删除文件的路径，没有中央目录记录时返回空列表
+        """
+        record = self._installed_directory_path(target_dir)
+        if not record.is_file():
+            return []
+        try:
+            installed = ZipDirectory.load(record)
+        except (OSError, zipfile.BadZipFile):
+            return []
+        old_paths = self._archive_paths(installed, target_dir)
+        # 记录属于解压到同一目录的另一个包时（没有相同的顶层目录或文件），不删除任何文件
+        top_names = {path.relative_to(target_dir).parts[0] for path in paths}
+        if not any(path.relative_to(target_dir).parts[0] in top_names for path in old_paths):
+            return []
+        keep = {os.path.normcase(str(path)) for path in paths}
+        return [path for path in old_paths if os.path.normcase(str(path)) not in keep]
+
+    def _commit_staged(self, tree: StagedTree, removed: List[Path]) -> int:
+        """
+        把旧版本中不在暂存目录里的文件（已删除的文件除外）保留到暂存目录，再替换目标目录中的对应项，
+        旧版本移到备份目录（可回滚）
+
+        Args:
+            tree: 已写入新文件的暂存解压
+            removed: 新版本中已删除的文件
+
+        Returns:
+            从旧版本保留的文件数
+
+        Raises:
+            OSError: 替换失败（目标目录保持旧版本）
+        """
+        removed_names = []
+        created = []
+        for path in removed:
+            parts = path.relative_to(tree.target_dir).parts
+            if len(parts) == 1:
+                removed_names.append(parts[0])
+            elif not os.path.lexists(tree.staging_dir / parts[0]):
+                # 顶层目录中只有文件被删除时，也要替换该目录
+                (tree.staging_dir / parts[0]).mkdir()
+                created.append(parts[0])
+        kept = tree.carry_over(exclude=removed)
+        for name in created:
+            # 目录中的文件都已删除（也没有用户数据）时，整个目录移到备份目录
+            if not any(filenames for _, _, filenames in os.walk(tree.staging_dir / name)):
+                shutil.rmtree(tree.staging_dir / name)
+                removed_names.append(name)
+        tree.commit(removed=removed_names)
+        return kept
+
+    def _record_installed_directory(self, package: Dict, directory=None):
+        """
+        记录已安装版本的中央目录
+
+        Args:
+            package: 包配置
+            directory: 解压使用的中央目录（ZipDirectory或RemoteZipIndex），None时使用已读取的远程索引，
+                       都没有时删除旧记录，避免下次按过期的记录比较
+        """
+        path = self._installed_directory_path(self.get_extract_target(package))
+        if directory is None:
+            directory = self._zip_indexes.get(package.get("url", ""))
+        try:
+            if directory is not None:
+                directory.save(path)
+            elif path.exists():
+                path.unlink()
+        except OSError as e:
+            self._log(f"保存ZIP目录记录失败: {e}")
+
+    def plan_zip_update(self, package: Dict) -> Optional[List[int]]:
+        """
+        比较远程中央目录和已安装版本，得到有变化的条目
+
+        Returns:
+            新增或内容变化的文件条目序号；首次安装、没有已安装记录或无法读取远程目录时返回None
+        """
+        if not self.needs_extract(package):
+            return None
+        installed = self.installed_zip_directory(package)
+        if installed is None:
+            return None
+        index = self.remote_zip_index(package)
+        if index is None:
+            return None
+
+        changed = index.changed_members(installed)
+        # 记录中未变化但已被删除或大小不符的文件（如被手动修改）也重新下载
+        directory = index.directory
+        target_dir = self.get_extract_target(package)
+        pending = set(changed)
+        for i in range(len(directory)):
+            if i in pending or directory.is_dir(i):
+                continue
+            try:
+                intact = os.stat(directory.target_path(i, target_dir)).st_size == directory.file_sizes[i]
+            except OSError:
+                intact = False
+            if not intact:
+                changed.append(i)
+        self._log(f"与已安装版本相比 {len(changed)}/{len(index)} 个条目有变化: {package.get('name', '')}"
+                  f"（压缩数据 {index.members_size(changed) // 1024}KB）")
+        return changed
+
+    def download_members(self, package: Dict) -> Optional[Path]:
+        """
+        按条目增量更新ZIP包：只按Range下载与已安装版本相比有变化的条目，解压到暂存目录后
+        与未变化的文件一起替换已安装的版本（旧版本移到备份目录，新版本中已删除的文件不再保留）
+
+        没有已安装记录、服务器不支持Range请求、需要下载的数据过多或任何一步失败时返回None，
+        由调用方改为分块增量更新或下载完整ZIP
+
+        Args:
+            package: 包配置
+
+        Returns:
+            解压目标目录，未使用按条目更新时返回None
+        """
+        changed = self.plan_zip_update(package)
+        if changed is None:
+            return None
+
+        package_name = package.get("name", "")
+        target_dir = self.get_extract_target(package)
+        removed = self._removed_files(
+            target_dir, self._archive_paths(self.remote_zip_index(package).directory, target_dir))
+        if changed or removed:
+            with get_tracer().span("members", package=package_name, files=len(changed)) as span:
+                try:
+                    target_dir = self._apply_members(package, changed, removed, span)
+                except (OSError, ValueError, zipfile.BadZipFile) as e:
+                    self._log(f"按条目更新失败，改为下载完整文件: {e}")
+                    span.fail(str(e))
+                    MEMBER_UPDATES.inc(outcome="failed")
+                    return None
+            if target_dir is None:
+                MEMBER_UPDATES.inc(outcome="skipped")
+                return None
+            MEMBER_UPDATES.inc(outcome="applied")
+            self._update_progress(f"✓ 按条目更新完成: {package_name} ({len(changed)} 个文件)")
+        else:
+            # 所有文件与已安装版本一致（如只修改了压缩包注释或时间）
+            MEMBER_UPDATES.inc(outcome="unchanged")
+            self._update_progress(f"✓ 文件内容未变化，无需下载: {package_name}")
+
+        for stage in (STAGE_DOWNLOAD, STAGE_VERIFY, STAGE_EXTRACT):
+            self._mark_stage(package, stage, True)
+        self._record_installed_directory(package)
+        return self.get_extract_target(package)
+
+    def _apply_members(self, package: Dict, changed: List[int], removed: List[Path], span) -> Optional[Path]:
+        """下载有变化的条目解压到暂存目录后替换，需要下载的数据过多或有无法直接解压的条目时返回None"""
+        package_name = package.get("name", "")
+        index = self.remote_zip_index(package)
+        directory = index.directory
+        target_dir = self.get_extract_target(package)
+
+        if not all(directory.is_supported(i) for i in changed):
+            self._log(f"有加密或压缩方式不支持的文件，改为下载完整文件: {package_name}")
+            return None
+
+        ranges = merge_ranges([index.member_range(i) for i in changed], max_size=MEMBER_FETCH_MAX)
+        fetch_bytes = sum(end - start for start, end in ranges)
+        span.set(ranges=len(ranges))
+        if fetch_bytes + len(ranges) * RANGE_REQUEST_OVERHEAD > index.archive_size * DELTA_MAX_RATIO:
+            self._log(f"按条目更新需下载 {fetch_bytes // 1024}KB，改为下载完整文件: {package_name}")
+            return None
+
+        self._update_progress(
+            f"按条目更新: {package_name} - {len(changed)} 个文件有变化，{len(removed)} 个文件已删除，"
+            f"下载 {len(ranges)} 段 ({fetch_bytes // 1024}KB)"
+        )
+
+        # 先解压到暂存目录并校验CRC，全部成功后再替换，失败或中断时已安装的版本不受影响
+        tree = StagedTree(target_dir, package_name)
+        staging_dir = tree.prepare()
+        pending = sorted(changed, key=lambda i: directory.header_offsets[i])
+        position = 0
+        try:
+            for start, end in ranges:
+                data = self._fetch_bytes(index.url, start, end, kind="zip_member")
+                span.add_bytes(len(data))
+                with memoryview(data) as view:
+                    while position < len(pending) and directory.header_offsets[pending[position]] < end:
+                        i = pending[position]
+                        position += 1
+                        name = directory.name(i)
+                        offset = local_data_offset(view, directory.header_offsets[i] - start, name)
+                        member = view[offset:offset + directory.compressed_sizes[i]]
+                        if len(member) != directory.compressed_sizes[i]:
+                            raise zipfile.BadZipFile(f"条目数据不完整: {name}")
+
+                        path = directory.target_path(i, staging_dir)
+                        path.parent.mkdir(parents=True, exist_ok=True)
+                        with open(path, 'wb') as f:
+                            size, crc = write_member(member, directory.methods[i], f)
+                        if size != directory.file_sizes[i] or crc != directory.crcs[i]:
+                            raise zipfile.BadZipFile(f"CRC校验失败: {name}")
+            for i in range(len(directory)):
+                if directory.is_dir(i) and not directory.target_path(i, target_dir).is_dir():
+                    directory.target_path(i, staging_dir).mkdir(parents=True, exist_ok=True)
+            self._commit_staged(tree, removed)
+        except:
+            tree.discard()
+            raise
+
+        paths = [target_dir / name for name in directory.names() if not name.endswith('/')]
+        self.manifest.record_files(package_name, paths)
+        launch_scripts = [path for path in paths if path.name.lower() == LAUNCH_SCRIPT_NAME]
+        if launch_scripts:
+            self.manifest.record_launch_scripts(package_name, launch_scripts)
+
+        MEMBER_BYTES.inc(fetch_bytes, source="downloaded")
+        MEMBER_BYTES.inc(max(index.archive_size - fetch_bytes, 0), source="saved")
+        self._log(f"按条目更新成功: {package_name} -> {target_dir}（下载 {fetch_bytes // 1024}KB，"
+                  f"完整文件 {index.archive_size // 1024}KB）")
+        return target_dir
+
+    def _estimated_work(self, package: Dict) -> int:
+        """估算包的处理量（下载大小加解压大小），只使用配置和已读取的远程索引，不发起请求"""
+        work = package.get("size", 0)
+        if self.needs_extract(package):
+            index = self._zip_indexes.get(package.get("url", ""))
+            work += package.get("unpacked_size") or (index.total_size() if index else 0)
+        return max(work, 1)
+
+    def preflight(self, packages: List[Dict]) -> bool:
+        """
+        下载前检查磁盘空间和目录权限
+
+        按配置汇总需要下载的大小和ZIP解压后的大小，按卷与可用空间比较（ZIP解压完成前一直保留，
+        与解压目录在同一卷时两者一起计算）；下载目录所在的卷空间不足时，把需要下载的包改存到
+        其他卷的目录
+
+        Args:
+            packages: 需要处理的包配置
+
+        Returns:
+            是否可以开始下载
+        """
+        with get_tracer().span("preflight", packages=len(packages)) as span:
+            download_bytes = 0
+            pending = []
+            extract_needs: Dict[Path, int] = {}
+            for package in packages:
+                package_name = package.get("name", "")
+                if not package.get("url", "") or self.is_package_complete(package):
+                    continue
+                if not self.manifest.is_local_file_current(package_name, self.local_path(package_name)):
+                    download_bytes += package.get("size", 0)
+                    pending.append(package_name)
+                if self.needs_extract(package):
+                    target = self.get_extract_target(package)
+                    extract_needs[target] = extract_needs.get(target, 0) + self.unpacked_size(package)
+            span.set(download_bytes=download_bytes, extract_bytes=sum(extract_needs.values()))
+
+            for path in [self.download_dir] + list(extract_needs):
+                error = check_writable(path)
+                if error:
+                    self._log(f"✗ 目录不可写: {path} ({error})")
+                    self._update_progress(f"✗ 无法写入目录: {path}")
+                    span.fail("目录不可写")
+                    PREFLIGHT_CHECKS.inc(outcome="unwritable")
+                    return False
+
+            needs = dict(extract_needs)
+            needs[self.download_dir] = needs.get(self.download_dir, 0) + download_bytes
+            try:
+                shortages = find_shortages(needs)
+            except OSError as e:
+                self._log(f"无法获取磁盘可用空间，跳过空间检查: {e}")
+                PREFLIGHT_CHECKS.inc(outcome="unknown")
+                return True
+            if not shortages:
+                PREFLIGHT_CHECKS.inc(outcome="ok")
+                return True
+
+            # 下载目录所在的卷空间不足时，下载文件改存到其他卷
+            alternate = None
+            if download_bytes:
+                alternate = find_alternate_dir(download_bytes, extract_needs, self.download_dir)
+            if alternate is not None:
+                for package_name in pending:
+                    self._package_dirs[package_name] = alternate
+                self._log(f"下载目录空间不足，安装包改为保存到: {alternate}")
+                span.set(download_dir=str(alternate))
+                PREFLIGHT_CHECKS.inc(outcome="relocated")
+                return True
+
+            for shortage in shortages:
+                self._log(f"✗ 磁盘空间不足: {shortage.path} 需要 {shortage.needed // 1024 // 1024}MB，"
+                          f"可用 {shortage.free // 1024 // 1024}MB")
+            self._update_progress(f"✗ 磁盘空间不足，需要 {shortages[0].needed // 1024 // 1024}MB，"
+                                  f"可用 {shortages[0].free // 1024 // 1024}MB")
+            span.fail("磁盘空间不足")
+            PREFLIGHT_CHECKS.inc(outcome="insufficient")
+            return False
+
+    def _delta_target(self, target_dir: Path, name: str) -> Path:
+        """分块清单中的文件路径，不允许写到解压目录之外"""
+        path = (target_dir / name).resolve()
+        if path != target_dir.resolve() and target_dir.resolve() not in path.parents:
+            raise ValueError(f"分块清单中的路径无效: {name}")
+        return path
+
+    def download_delta(self, package: Dict) -> Optional[Path]:
+        """
+        分块增量更新：只下载本地没有的分块，组装到暂存目录后与未变化的文件一起替换已安装的版本
+
+        本地分块来自分块存储和已安装的同名文件；需要下载的数据过多或任何一步失败时返回None，
+        由调用方改为下载完整ZIP
+
+        Args:
+            package: 包配置（包含发布工具生成的chunked字段）
+
+        Returns:
+            解压目标目录，未使用增量更新时返回None
+        """
+        chunked = package.get("chunked")
+        if not chunked or not self.needs_extract(package):
+            return None
+
+        package_name = package.get("name", "")
+        with get_tracer().span("delta", package=package_name) as span:
+            try:
+                target_dir = self._apply_delta(package, chunked, span)
+            except Exception as e:
+                self._log(f"增量更新失败，改为下载完整文件: {e}")
+                span.fail(str(e))
+                DELTA_UPDATES.inc(outcome="failed")
+                return None
+
+        if target_dir is None:
+            DELTA_UPDATES.inc(outcome="skipped")
+            return None
+
+        DELTA_UPDATES.inc(outcome="applied")
+        for stage in (STAGE_DOWNLOAD, STAGE_VERIFY, STAGE_EXTRACT):
+            self._mark_stage(package, stage, True)
+        self._record_installed_directory(package)
+        self._update_progress(f"✓ 增量更新完成: {package_name}")
+        return target_dir
+
+    def _apply_delta(self, package: Dict, chunked: Dict, span) -> Optional[Path]:
+        """下载缺少的分块并组装到暂存目录后替换，本地没有可复用的数据或需要下载的数据过多时返回None"""
+        package_name = package.get("name", "")
+        target_dir = self.get_extract_target(package)
+        store = ChunkStore(self.download_dir / CHUNK_STORE_DIR)
+
+        # 首次安装时本地没有可复用的分块，不下载分块清单
+        if not target_dir.is_dir() and not store.root.is_dir():
+            return None
+
+        manifest_data = self._fetch_bytes(chunked["manifest_url"], kind="chunk_manifest")
+        if (chunked.get("manifest_sha256")
+                and hashlib.sha256(manifest_data).hexdigest() != chunked["manifest_sha256"]):
+            raise ValueError("分块清单校验失败")
+        manifest = json.loads(manifest_data.decode('utf-8'))
+        if manifest.get("format") != CHUNK_FORMAT_VERSION:
+            raise ValueError(f"不支持的分块清单格式: {manifest.get('format')}")
+
+        entries = manifest["chunks"]
+        files = manifest["files"]
+
+        # 索引已安装的同名文件：分块完全相同的文件不再写入，其余文件的分块可以复用
+        changed = []
+        for file in files:
+            path = self._delta_target(target_dir, file["path"])
+            if path.is_file():
+                local = store.index_file(path)
+                if local == [entries[i][0] for i in file["chunks"]]:
+                    continue
+            changed.append(file)
+
+        needed = sorted({i for file in changed for i in file["chunks"]})
+        missing = [i for i in needed if not store.has(entries[i][0])]
+        ranges = merge_ranges([(entries[i][1], entries[i][1] + entries[i][2]) for i in missing])
+        fetch_bytes = sum(end - start for start, end in ranges)
+        reused_bytes = sum(entries[i][3] for i in needed) - sum(entries[i][3] for i in missing)
+
+        full_size = package.get("size", 0) or chunked.get("pack_size", 0)
+        span.set(files=len(changed), chunks=len(missing), ranges=len(ranges))
+        if fetch_bytes + len(ranges) * RANGE_REQUEST_OVERHEAD > full_size * DELTA_MAX_RATIO:
+            self._log(f"增量更新需下载 {fetch_bytes // 1024}KB，改为下载完整文件: {package_name}")
+            return None
+
+        self._update_progress(
+            f"增量更新: {package_name} - {len(changed)} 个文件有变化，下载 {len(missing)} 个分块 ({fetch_bytes // 1024}KB)"
+        )
+
+        # 按范围下载分块包，逐个解压校验后放入分块存储
+        pending = sorted(missing, key=lambda i: entries[i][1])
+        position = 0
+        for start, end in ranges:
+            data = self._fetch_bytes(chunked["pack_url"], start, end)
+            span.add_bytes(len(data))
+            while position < len(pending) and entries[pending[position]][1] < end:
+                entry = entries[pending[position]]
+                offset = entry[1] - start
+                raw = decode_chunk(entry, data[offset:offset + entry[2]])
+                if raw is None:
+                    raise ValueError(f"分块校验失败: {entry[0]}")
+                store.put(entry[0], raw)
+                position += 1
+        DELTA_BYTES.inc(fetch_bytes, source="downloaded")
+        DELTA_BYTES.inc(reused_bytes, source="local")
+
+        # 先组装到暂存目录（此时已安装的旧文件仍可读取分块），全部成功后再替换
+        paths = [target_dir / file["path"] for file in files]
+        removed = self._removed_files(target_dir, paths)
+        tree = StagedTree(target_dir, package_name)
+        staging_dir = tree.prepare()
+        try:
+            for file in changed:
+                path = self._delta_target(staging_dir, file["path"])
+                path.parent.mkdir(parents=True, exist_ok=True)
+                with open(path, 'wb') as f:
+                    for i in file["chunks"]:
+                        f.write(store.get(entries[i][0]))
+            for name in manifest.get("dirs", []):
+                if not self._delta_target(target_dir, name).is_dir():
+                    self._delta_target(staging_dir, name).mkdir(parents=True, exist_ok=True)
+            self._commit_staged(tree, removed)
+        except:
+            tree.discard()
+            raise
+
+        self.manifest.record_files(package_name, paths)
+        launch_scripts = [path for path in paths if path.name.lower() == LAUNCH_SCRIPT_NAME]
+        if launch_scripts:
+            self.manifest.record_launch_scripts(package_name, launch_scripts)
+
+        # 分块存储只保留当前版本的分块
+        store.prune(entry[0] for entry in entries)
+        self._log(f"增量更新成功: {package_name} -> {target_dir}（复用本地 {reused_bytes // 1024}KB）")
+        return target_dir
+
+    def download_packages(self, skip_python: bool = False, skip_wechat: bool = False,
+                          on_package_done: Optional[Callable[[Dict, Optional[Path]], None]] = None,
+                          report_progress: bool = True,
+                          evidence: Optional[Dict[str, str]] = None) -> List[Path]:
+        """
+        下载所有配置的安装包
+
+        Args:
+            skip_python: 是否跳过Python安装包下载
+            skip_wechat: 是否跳过微信安装包下载
+            on_package_done: 每个包处理结束后的回调 (包配置, 获取到的项目或None)，
+                             用于流水线模式在下载其余文件时立即安装
+            report_progress: 是否汇报12%-20%的下载进度（流水线模式由控制器统一汇报）
+            evidence: 跳过的包对应的已安装程序文件（见filter_packages）
+
+        Returns:
+            成功下载的文件路径列表
+        """
+        downloaded_files = []
+
+        if not self.config.get("packages", []):
+            self._log("没有配置需要下载的安装包")
+            return downloaded_files
+
+        # 根据检测结果过滤需要下载的包
+        filtered_packages = self.filter_packages(skip_python, skip_wechat, evidence=evidence)
+
         if not filtered_packages:
             self._log("根据系统检测结果，没有需要下载的安装包")
             return downloaded_files
 
-        if self.progress_callback:
+        if self.progress_callback and report_progress:
             self.progress_callback('progress', (12, "准备从云端下载安装包..."))
             self.progress_callback('detail', "开始云端下载流程")
 
+        # 完成上次中断的解压替换，避免目录停留在新旧版本混杂的状态
+        self.recover_interrupted_swaps(filtered_packages)
+
+        # 先读取远程ZIP目录，空间预检、进度估算和按条目更新使用同一份结果
+        self.fetch_zip_indexes(filtered_packages)
+
+        # 空间不足或目录不可写时不开始下载，避免下载到一半或解压到一半才失败
+        if not self.preflight(filtered_packages):
+            return downloaded_files
+
         total_packages = len(filtered_packages)
         self._log(f"需要下载 {total_packages} 个安装包")
 
+        # 按下载和解压的数据量估算进度（不按包的个数平均分配）
+        weights = [self._estimated_work(package) if package.get("url", "") else 0 for package in filtered_packages]
+        total_work = max(sum(weights), 1)
+        done_work = 0
+
         for i, package in enumerate(filtered_packages):
             package_name = package.get("name", f"package_{i}")
-            package_url = package.get("url", "")
-            package_size = package.get("size", 0)
-            package_md5 = package.get("md5", "")
             
-            if not package_url:
+            if not package.get("url", ""):
                 self._log(f"跳过无效的包配置: {package_name}")
+                if on_package_done:
+                    on_package_done(package, None)
                 continue
             
             # 计算进度 (从12%开始，到20%结束)
             base_progress = 12
-            download_progress = (i / total_packages) * 8
-            current_progress = base_progress + download_progress
+            current_progress = base_progress + (done_work / total_work) * 8
+            done_work += weights[i]
 
-            if self.progress_callback:
+            if self.progress_callback and report_progress:
                 self.progress_callback('progress', (
                     current_progress,
                     f"下载安装包: {package_name} ({i+1}/{total_packages})"
                 ))
             
-            local_path = self.download_dir / package_name
-            
             # 检查文件是否已存在且有效
-            if self.verify_file(local_path, package_md5):
+            if self.is_cached(package):
                 self._log(f"文件已存在且有效，跳过下载: {package_name}")
                 self._update_progress(f"✓ 文件已存在: {package_name}")
-                downloaded_files.append(local_path)
+                downloaded_files.append(self.local_path(package_name))
+                if on_package_done:
+                    on_package_done(package, downloaded_files[-1])
                 continue
-            
-            # 使用主源和备用源下载文件
-            if self.download_file_with_fallback(package_name, local_path, package_size):
-                if self.verify_file(local_path, package_md5):
+
+            # ZIP包先按远程中央目录只下载有变化的条目，其次有分块清单时尝试分块增量更新，
+            # 否则使用主源和备用源下载完整文件
+            item = self.download_members(package) or self.download_delta(package)
+            if item:
+                downloaded_files.append(item)
+            else:
+                local_path = self.download_package(package)
+                if local_path and self.verify_package(package, local_path):
                     # 检查是否需要解压
-                    post_download = package.get("post_download", "")
-                    if post_download == "extract" and local_path.suffix.lower() == ".zip":
-                        extract_to = package.get("extract_to", ".")
-                        if self.extract_zip_file(local_path, extract_to):
-                            self._log(f"文件下载、验证并解压成功: {package_name}")
-                            # 对于ZIP文件，我们返回解压后的目录而不是ZIP文件本身
-                            if extract_to == ".":
-                                extracted_dir = self.app_path
-                            else:
-                                extracted_dir = self.app_path / extract_to
-                            downloaded_files.append(extracted_dir)
-                        else:
-                            self._log(f"文件下载成功但解压失败: {package_name}")
-                            downloaded_files.append(local_path)  # 仍然返回ZIP文件
+                    if self.needs_extract(package):
+                        # 对于ZIP文件，我们返回解压后的目录而不是ZIP文件本身
+                        extracted_dir = self.extract_package(package, local_path)
+                        item = extracted_dir or local_path  # 解压失败仍然返回ZIP文件
                     else:
-                        downloaded_files.append(local_path)
+                        item = local_path
                         self._log(f"文件下载并验证成功: {package_name}")
-                else:
-                    self._log(f"文件下载后验证失败: {package_name}")
-                    try:
-                        local_path.unlink()
-                    except:
-                        pass
+                    downloaded_files.append(item)
+
+            if on_package_done:
+                on_package_done(package, item)
             
             # 更新完成进度
-            completed_progress = base_progress + ((i + 1) / total_packages) * 8
-            if self.progress_callback:
+            completed_progress = base_progress + (done_work / total_work) * 8
+            if self.progress_callback and report_progress:
                 self.progress_callback('progress', (completed_progress, None))
 
-        if self.progress_callback:
+        if self.progress_callback and report_progress:
             self.progress_callback('progress', (20, "云端下载完成"))
             self.progress_callback('detail', f"云端下载完成，成功下载 {len(downloaded_files)} 个文件")
         
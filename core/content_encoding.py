@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+传输压缩模块 - 请求gzip/deflate压缩传输，并在下载时流式解压（包括配置中声明的.gz/.xz预压缩文件）
+
+解压按调用方的缓冲区大小逐段输出，内存占用与文件大小无关；
+校验、进度和写入处理的都是解压后的数据
+"""
+
+import io
+import lzma
+import zlib
+from typing import Optional
+
+
+# 请求头中声明支持的传输压缩
+ACCEPT_ENCODING = "gzip, deflate"
+
+# 配置中预压缩文件支持的格式
+SUPPORTED_ENCODINGS = ("gzip", "deflate", "xz")
+
+# 预压缩文件后缀 -> 格式
+SUFFIX_ENCODINGS = {".gz": "gzip", ".xz": "xz"}
+
+# 每次从网络读取的压缩数据量
+DECODE_READ_SIZE = 256 * 1024
+
+_ENCODING_ALIASES = {"x-gzip": "gzip", "lzma": "xz"}
+
+
+class DecodeError(Exception):
+    """压缩数据损坏、不完整或格式不支持"""
+
+
+def normalize_encoding(value: Optional[str]) -> Optional[str]:
+    """
+    规范化Content-Encoding或配置中的压缩格式
+
+    Returns:
+        格式名称，未压缩时返回None
+    """
+    value = (value or "").strip().lower()
+    if value in ("", "identity"):
+        return None
+    return _ENCODING_ALIASES.get(value, value)
+
+
+class _ZlibDecoder:
+    """gzip/zlib流解压"""
+
+    def __init__(self, wbits: Optional[int]):
+        self._obj = zlib.decompressobj(wbits) if wbits is not None else None
+        self._tail = b""
+
+    @property
+    def needs_input(self) -> bool:
+        return not self._tail
+
+    @property
+    def eof(self) -> bool:
+        return self._obj is not None and self._obj.eof
+
+    def decompress(self, data: bytes, max_length: int) -> bytes:
+        if self._tail:
+            data = self._tail + data
+        out = self._obj.decompress(data, max_length)
+        self._tail = self._obj.unconsumed_tail
+        return out
+
+
+class _DeflateDecoder(_ZlibDecoder):
+    """HTTP deflate：标准为zlib格式，部分服务器发送不带头的原始deflate，按首字节判断"""
+
+    def __init__(self):
+        super().__init__(None)
+
+    def decompress(self, data: bytes, max_length: int) -> bytes:
+        if self._obj is None:
+            if not data:
+                return b""
+            wrapped = len(data) >= 2 and data[0] & 0x0F == 8 and ((data[0] << 8) | data[1]) % 31 == 0
+            self._obj = zlib.decompressobj(zlib.MAX_WBITS if wrapped else -zlib.MAX_WBITS)
+        return super().decompress(data, max_length)
+
+
+class _LzmaDecoder:
+    """xz流解压"""
+
+    def __init__(self):
+        self._obj = lzma.LZMADecompressor(lzma.FORMAT_XZ)
+
+    @property
+    def needs_input(self) -> bool:
+        return self._obj.needs_input
+
+    @property
+    def eof(self) -> bool:
+        return self._obj.eof
+
+    def decompress(self, data: bytes, max_length: int) -> bytes:
+        return self._obj.decompress(data, max_length)
+
+
+def _create_decoder(encoding: str):
+    if encoding == "gzip":
+        return _ZlibDecoder(16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        return _DeflateDecoder()
+    if encoding == "xz":
+        return _LzmaDecoder()
+    raise DecodeError(f"不支持的压缩格式: {encoding}")
+
+
+class DecodingReader(io.RawIOBase):
+    """从压缩数据流读取解压后的数据（readinto每次最多填满调用方的缓冲区）"""
+
+    def __init__(self, raw, encoding: str):
+        """
+        初始化解压读取器
+
+        Args:
+            raw: 压缩数据流（如HTTP响应）
+            encoding: 压缩格式
+
+        Raises:
+            DecodeError: 格式不支持
+        """
+        self._raw = raw
+        self._decoder = _create_decoder(normalize_encoding(encoding))
+        self._raw_eof = False
+        # 已读取的压缩数据字节数（实际传输量）
+        self.raw_bytes = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        starved = False
+        while not self._decoder.eof:
+            data = b""
+            if (self._decoder.needs_input or starved) and not self._raw_eof:
+                data = self._raw.read(DECODE_READ_SIZE)
+                if data:
+                    self.raw_bytes += len(data)
+                else:
+                    self._raw_eof = True
+            try:
+                out = self._decoder.decompress(data, len(buffer))
+            except (zlib.error, lzma.LZMAError) as e:
+                raise DecodeError(f"压缩数据损坏: {e}")
+            if out:
+                buffer[:len(out)] = out
+                return len(out)
+            if self._raw_eof:
+                raise DecodeError("压缩数据不完整")
+            starved = True
+        return 0
+
+
+def decode_bytes(data: bytes, encoding: Optional[str]) -> bytes:
+    """解压完整的响应内容（配置文件等小文件）"""
+    if normalize_encoding(encoding) is None:
+        return data
+    return DecodingReader(io.BytesIO(data), encoding).readall()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+磁盘空间预检模块 - 下载前按卷汇总所需空间，空间不足或目录不可写时立即失败
+
+下载目录和解压目录可能在同一个卷上（ZIP在解压完成前一直保留，两者需要同时放得下），
+因此按卷（st_dev）累加需求后再与 shutil.disk_usage 的可用空间比较；
+下载目录所在的卷空间不足时，可以改用其他卷上的目录存放下载文件
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+from collections import namedtuple
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+# 每个卷额外保留的空间（临时文件、安装程序运行时写入的数据等）
+SPACE_MARGIN = 64 * 1024 * 1024
+
+# 环境变量：下载目录空间不足时优先使用的备用目录
+DOWNLOAD_DIR_ENV = "KOURI_DOWNLOAD_DIR"
+
+# 在备用卷上创建的下载目录名
+ALTERNATE_DIR_NAME = "kouri-downloads"
+
+# GetDriveTypeW: 本地硬盘
+_DRIVE_FIXED = 3
+
+Shortage = namedtuple("Shortage", "path needed free")
+
+
+def existing_dir(path: Path) -> Path:
+    """路径本身或最近的已存在的上级目录（目标目录尚未创建时按它所在的卷计算）"""
+    path = Path(path).absolute()
+    while not path.exists() and path.parent != path:
+        path = path.parent
+    return path
+
+
+def volume_of(path: Path) -> int:
+    """路径所在卷的标识"""
+    return os.stat(existing_dir(path)).st_dev
+
+
+def free_bytes(path: Path) -> int:
+    """路径所在卷的可用空间"""
+    return shutil.disk_usage(existing_dir(path)).free
+
+
+def check_writable(path: Path) -> Optional[str]:
+    """
+    检查目录能否创建和写入文件
+
+    Returns:
+        错误信息，可写时返回None
+    """
+    try:
+        Path(path).mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryFile(dir=path) as f:
+            f.write(b"\0")
+            f.flush()
+    except OSError as e:
+        return str(e)
+    return None
+
+
+def find_shortages(needs: Dict[Path, int], margin: int = SPACE_MARGIN) -> List[Shortage]:
+    """
+    按卷汇总空间需求并与可用空间比较
+
+    Args:
+        needs: 目录 -> 需要写入的字节数
+        margin: 每个卷额外保留的空间
+
+    Returns:
+        空间不足的卷（以该卷上的第一个目录表示）
+    """
+    volumes: Dict[int, list] = {}
+    for path, size in needs.items():
+        if size <= 0:
+            continue
+        entry = volumes.setdefault(volume_of(path), [path, 0])
+        entry[1] += size
+
+    shortages = []
+    for path, size in volumes.values():
+        free = free_bytes(path)
+        if size + margin > free:
+            shortages.append(Shortage(path, size + margin, free))
+    return shortages
+
+
+def _fixed_drives() -> List[Path]:
+    """Windows下的本地硬盘根目录"""
+    try:
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        mask = kernel32.GetLogicalDrives()
+    except Exception:
+        return []
+    drives = []
+    for i in range(26):
+        if mask & (1 << i):
+            root = f"{chr(ord('A') + i)}:\\"
+            if kernel32.GetDriveTypeW(root) == _DRIVE_FIXED:
+                drives.append(Path(root))
+    return drives
+
+
+def alternate_dirs() -> List[Path]:
+    """下载目录空间不足时可以使用的备用目录（环境变量指定的目录优先，其次临时目录、用户目录和其他硬盘）"""
+    candidates = []
+    if os.environ.get(DOWNLOAD_DIR_ENV):
+        candidates.append(Path(os.environ[DOWNLOAD_DIR_ENV]))
+    candidates.append(Path(tempfile.gettempdir()) / ALTERNATE_DIR_NAME)
+    candidates.append(Path.home() / ALTERNATE_DIR_NAME)
+    if sys.platform == "win32":
+        candidates.extend(drive / ALTERNATE_DIR_NAME for drive in _fixed_drives())
+    return candidates
+
+
+def find_alternate_dir(download_bytes: int, other_needs: Dict[Path, int],
+                       exclude: Path, margin: int = SPACE_MARGIN) -> Optional[Path]:
+    """
+    查找能放下全部下载文件的备用目录
+
+    Args:
+        download_bytes: 需要下载的字节数
+        other_needs: 其他目录的空间需求（与备用目录在同一卷时一起计算）
+        exclude: 原下载目录，与它在同一卷的备用目录不使用
+        margin: 每个卷额外保留的空间
+
+    Returns:
+        可用的备用目录，没有时返回None
+    """
+    try:
+        excluded = volume_of(exclude)
+    except OSError:
+        excluded = None
+    seen = set()
+    for candidate in alternate_dirs():
+        try:
+            volume = volume_of(candidate)
+            if volume == excluded or volume in seen:
+                continue
+            seen.add(volume)
+            needs = dict(other_needs)
+            needs[candidate] = needs.get(candidate, 0) + download_bytes
+            if find_shortages(needs, margin) or check_writable(candidate):
+                continue
+        except OSError:
+            continue
+        return candidate
+    return None
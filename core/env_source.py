@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+环境数据源模块 - 负责读取最新的环境变量并等待其变化
+"""
+
+import os
+import threading
+import time
+
+
+# 系统环境变量注册表路径
+SYSTEM_ENVIRONMENT_KEY = r"SYSTEM\CurrentControlSet\Control\Session Manager\Environment"
+USER_ENVIRONMENT_KEY = "Environment"
+
+
+class EnvironmentSource:
+    """环境数据源基类 - 使用当前进程的环境变量"""
+
+    def read_path(self) -> str:
+        """读取最新的PATH"""
+        return os.environ.get("PATH", "")
+
+    def wait_for_change(self, timeout: float) -> bool:
+        """
+        等待环境变量变化
+
+        Args:
+            timeout: 最长等待时间（秒）
+
+        Returns:
+            是否检测到变化（无法检测时等待后返回False）
+        """
+        time.sleep(timeout)
+        return False
+
+    def close(self):
+        """释放资源"""
+        pass
+
+
+class StaticEnvironmentSource(EnvironmentSource):
+    """静态环境数据源 - 由调用方设置PATH，用于非Windows环境和模拟"""
+
+    def __init__(self, path: str = ""):
+        self._path = path
+        self._changed = threading.Event()
+
+    def set_path(self, path: str):
+        """更新PATH并唤醒等待者"""
+        self._path = path
+        self._changed.set()
+
+    def read_path(self) -> str:
+        return self._path
+
+    def wait_for_change(self, timeout: float) -> bool:
+        changed = self._changed.wait(timeout)
+        self._changed.clear()
+        return changed
+
+
+class RegistryEnvironmentSource(EnvironmentSource):
+    """注册表环境数据源 - 读取系统和用户PATH，通过注册表变更通知等待变化"""
+
+    def __init__(self):
+        self._notify = None
+
+    def read_path(self) -> str:
+        import winreg
+
+        paths = []
+        for root, subkey in ((winreg.HKEY_LOCAL_MACHINE, SYSTEM_ENVIRONMENT_KEY),
+                             (winreg.HKEY_CURRENT_USER, USER_ENVIRONMENT_KEY)):
+            try:
+                with winreg.OpenKey(root, subkey) as key:
+                    value, value_type = winreg.QueryValueEx(key, "PATH")
+                    if value_type == winreg.REG_EXPAND_SZ:
+                        value = winreg.ExpandEnvironmentStrings(value)
+                    paths.append(value)
+            except OSError:
+                continue
+
+        return ";".join(p for p in paths if p) or super().read_path()
+
+    def wait_for_change(self, timeout: float) -> bool:
+        if self._notify is None:
+            try:
+                self._notify = _RegistryChangeNotifier()
+            except Exception:
+                # 无法注册变更通知时退化为定时检查
+                self._notify = False
+
+        if not self._notify:
+            return super().wait_for_change(timeout)
+        return self._notify.wait(timeout)
+
+    def close(self):
+        if self._notify:
+            self._notify.close()
+        self._notify = None
+
+
+class _RegistryChangeNotifier:
+    """监听系统和用户环境变量注册表键的变更"""
+
+    KEY_NOTIFY = 0x0010
+    REG_NOTIFY_CHANGE_LAST_SET = 0x00000004
+    WAIT_TIMEOUT = 0x00000102
+    HKEY_LOCAL_MACHINE = 0x80000002
+    HKEY_CURRENT_USER = 0x80000001
+
+    def __init__(self):
+        import ctypes
+        from ctypes import wintypes
+
+        self._ctypes = ctypes
+        self._advapi32 = ctypes.windll.advapi32
+        self._kernel32 = ctypes.windll.kernel32
+        self._keys = []
+        self._events = []
+
+        for root, subkey in ((self.HKEY_LOCAL_MACHINE, SYSTEM_ENVIRONMENT_KEY),
+                             (self.HKEY_CURRENT_USER, USER_ENVIRONMENT_KEY)):
+            hkey = wintypes.HKEY()
+            if self._advapi32.RegOpenKeyExW(wintypes.HKEY(root), subkey, 0,
+                                            self.KEY_NOTIFY, ctypes.byref(hkey)) != 0:
+                continue
+            event = self._kernel32.CreateEventW(None, False, False, None)
+            self._keys.append(hkey)
+            self._events.append(event)
+            self._arm(len(self._keys) - 1)
+
+        if not self._events:
+            raise OSError("无法监听环境变量注册表")
+
+    def _arm(self, index: int):
+        """注册一次性变更通知"""
+        self._advapi32.RegNotifyChangeKeyValue(self._keys[index], False,
+                                               self.REG_NOTIFY_CHANGE_LAST_SET,
+                                               self._events[index], True)
+
+    def wait(self, timeout: float) -> bool:
+        """等待任一环境变量键变化"""
+        from ctypes import wintypes
+
+        handles = (wintypes.HANDLE * len(self._events))(*self._events)
+        result = self._kernel32.WaitForMultipleObjects(len(self._events), handles, False,
+                                                       int(timeout * 1000))
+        if result == self.WAIT_TIMEOUT or result >= len(self._events):
+            return False
+
+        # 通知只触发一次，需要重新注册
+        self._arm(result)
+        return True
+
+    def close(self):
+        for hkey in self._keys:
+            self._advapi32.RegCloseKey(hkey)
+        for event in self._events:
+            self._kernel32.CloseHandle(event)
+        self._keys = []
+        self._events = []
+
+
+def get_default_environment_source() -> EnvironmentSource:
+    """获取当前平台默认的环境数据源"""
+    if os.name == 'nt':
+        return RegistryEnvironmentSource()
+    return EnvironmentSource()
@@ -10,8 +10,19 @@ import json
 import sys
 import urllib.request
 import urllib.error
+import urllib.parse
 import shutil
 from pathlib import Path
+from typing import Optional
+
+from .content_encoding import ACCEPT_ENCODING, decode_bytes
+from .metrics import get_registry
+from .tracing import get_tracer
+
+
+_metrics = get_registry()
+DOWNLOAD_BYTES = _metrics.counter("download_bytes_total", "各下载源下载的字节数")
+CONFIG_FETCHES = _metrics.counter("config_fetch_total", "云端配置各来源的获取次数")
 
 
 class HotUpdater:
@@ -66,65 +77,97 @@ class HotUpdater:
         Returns:
             下载是否成功
         """
-        self._update_progress("正在从云端获取最新配置文件...")
-
-        # 尝试从主源和备用源下载cloud_config.json
-        all_urls = [self.cloud_config_url] + self.fallback_config_urls
-
-        for i, url in enumerate(all_urls):
-            url_type = "主源" if i == 0 else f"备用源{i}"
-            self._update_progress(f"正在从{url_type}获取云端配置文件...")
-
-            try:
-                req = urllib.request.Request(url)
-                req.add_header('User-Agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
-                req.add_header('Cache-Control', 'no-cache')
-
-                with urllib.request.urlopen(req, timeout=15) as response:
-                    data = response.read().decode('utf-8')
-
-                    try:
-                        # 验证JSON格式
-                        cloud_config = json.loads(data)
-
-                        # 备份当前配置文件
-                        if self.config_path.exists():
-                            backup_path = self.config_path.with_suffix('.json.bak')
-                            try:
-                                shutil.copy2(self.config_path, backup_path)
-                                self._log(f"已备份原配置文件到 {backup_path}")
-                            except Exception as e:
-                                self._log(f"备份配置文件失败: {e}")
-
-                        # 保存新的配置文件
-                        with open(self.config_path, 'w', encoding='utf-8') as f:
-                            json.dump(cloud_config, f, indent=2, ensure_ascii=False)
-
-                        self._log(f"✓ 成功下载云端配置文件 (使用{url_type})")
-                        self._log(f"✓ 配置版本: {cloud_config.get('version', 'unknown')}")
-                        self._log(f"✓ 配置文件保存到: {self.config_path}")
-
-                        # 验证文件是否正确保存
-                        if self.config_path.exists():
-                            self._log("✓ 配置文件验证成功")
-                        else:
-                            self._log("✗ 配置文件保存失败")
-                            return False
-
-                        return True
-
-                    except json.JSONDecodeError as e:
-                        self._log(f"✗ 云端配置文件格式错误: {e}")
-                        continue
-
-            except urllib.error.URLError as e:
-                self._log(f"✗ {url_type}连接失败: {e}")
-            except Exception as e:
-                self._log(f"✗ {url_type}获取失败: {e}")
-
-        self._log("✗ 所有云端配置源都无法访问，使用本地配置")
-        return False
-    
+        tracer = get_tracer()
+        with tracer.span("hot_update") as span:
+            self._update_progress("正在从云端获取最新配置文件...")
+
+            # 尝试从主源和备用源下载cloud_config.json
+            all_urls = [self.cloud_config_url] + self.fallback_config_urls
+
+            for i, url in enumerate(all_urls):
+                url_type = "主源" if i == 0 else f"备用源{i}"
+                self._update_progress(f"正在从{url_type}获取云端配置文件...")
+
+                with tracer.span("mirror_attempt", url=url, source=url_type) as attempt:
+                    result = self._fetch_cloud_config(url, url_type, attempt)
+                CONFIG_FETCHES.inc(mirror=urllib.parse.urlsplit(url).hostname or "unknown",
+                                   outcome="ok" if result else "failed")
+                if result is not None:
+                    if not result:
+                        span.fail("配置文件保存失败")
+                    return result
+
+            self._log("✗ 所有云端配置源都无法访问，使用本地配置")
+            span.fail("所有配置源都无法访问")
+            return False
+
+    def _fetch_cloud_config(self, url: str, url_type: str, attempt) -> Optional[bool]:
+        """
+        从单个配置源下载配置文件并保存
+
+        Returns:
+            保存结果，该配置源不可用时返回None（继续尝试下一个配置源）
+        """
+        try:
+            req = urllib.request.Request(url)
+            req.add_header('User-Agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
+            req.add_header('Cache-Control', 'no-cache')
+            req.add_header('Accept-Encoding', ACCEPT_ENCODING)
+
+            with urllib.request.urlopen(req, timeout=15) as response:
+                raw = response.read()
+                attempt.add_bytes(len(raw))
+                DOWNLOAD_BYTES.inc(len(raw), mirror=urllib.parse.urlsplit(url).hostname or "unknown", kind="config")
+                # 配置文件为JSON文本，压缩传输通常只有原大小的五分之一
+                data = decode_bytes(raw, response.headers.get('Content-Encoding')).decode('utf-8')
+
+                try:
+                    # 验证JSON格式
+                    cloud_config = json.loads(data)
+
+                    # 备份当前配置文件
+                    if self.config_path.exists():
+                        backup_path = self.config_path.with_suffix('.json.bak')
+                        try:
+                            shutil.copy2(self.config_path, backup_path)
+                            self._log(f"已备份原配置文件到 {backup_path}")
+                        except Exception as e:
+                            self._log(f"备份配置文件失败: {e}")
+
+                    # 保存新的配置文件（先写临时文件再替换，后台更新被中断时不会留下损坏的配置）
+                    tmp_path = self.config_path.with_suffix('.json.tmp')
+                    with open(tmp_path, 'w', encoding='utf-8') as f:
+                        json.dump(cloud_config, f, indent=2, ensure_ascii=False)
+                    os.replace(tmp_path, self.config_path)
+
+                    self._log(f"✓ 成功下载云端配置文件 (使用{url_type})")
+                    self._log(f"✓ 配置版本: {cloud_config.get('version', 'unknown')}")
+                    self._log(f"✓ 配置文件保存到: {self.config_path}")
+                    attempt.set(config_version=cloud_config.get('version', 'unknown'))
+
+                    # 验证文件是否正确保存
+                    if self.config_path.exists():
+                        self._log("✓ 配置文件验证成功")
+                    else:
+                        self._log("✗ 配置文件保存失败")
+                        attempt.fail("配置文件保存失败")
+                        return False
+
+                    return True
+
+                except json.JSONDecodeError as e:
+                    self._log(f"✗ 云端配置文件格式错误: {e}")
+                    attempt.fail("配置文件格式错误")
+                    return None
+
+        except urllib.error.URLError as e:
+            self._log(f"✗ {url_type}连接失败: {e}")
+            attempt.fail(f"连接失败: {e}")
+        except Exception as e:
+            self._log(f"✗ {url_type}获取失败: {e}")
+            attempt.fail(f"获取失败: {e}")
+        return None
+
     def _get_local_config_version(self) -> str:
         """获取本地配置文件版本"""
         try:
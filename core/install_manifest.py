@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+安装清单模块 - 使用SQLite记录每个包的安装进度、解压文件和启动脚本位置，
+再次运行时从第一个未完成的阶段继续
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+
+# 状态数据库文件名（位于应用程序目录）
+STATE_DB_NAME = "install_state.db"
+
+# 启动脚本文件名
+LAUNCH_SCRIPT_NAME = "run.bat"
+
+# 包的处理阶段
+STAGE_DOWNLOAD = 'download'
+STAGE_VERIFY = 'verify'
+STAGE_EXTRACT = 'extract'
+STAGE_INSTALL = 'install'
+PACKAGE_STAGES = (STAGE_DOWNLOAD, STAGE_VERIFY, STAGE_EXTRACT, STAGE_INSTALL)
+
+# 阶段状态
+STATE_DONE = 'done'
+STATE_FAILED = 'failed'
+STATE_SKIPPED = 'skipped'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS packages (
+    name TEXT PRIMARY KEY,
+    config_version TEXT,
+    digest TEXT,
+    size INTEGER,
+    url TEXT,
+    local_size INTEGER,
+    local_mtime_ns INTEGER,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS stages (
+    package TEXT,
+    stage TEXT,
+    status TEXT,
+    updated_at REAL,
+    PRIMARY KEY (package, stage)
+);
+CREATE TABLE IF NOT EXISTS files (
+    package TEXT,
+    path TEXT,
+    PRIMARY KEY (package, path)
+);
+CREATE TABLE IF NOT EXISTS launch_scripts (
+    package TEXT,
+    path TEXT,
+    PRIMARY KEY (package, path)
+);
+"""
+
+
+class InstallManifest:
+    """安装清单 - 包状态数据库"""
+
+    def __init__(self, app_path: Path):
+        """
+        初始化安装清单
+
+        Args:
+            app_path: 应用程序目录，数据库位于该目录，文件路径相对于该目录保存
+        """
+        self.app_path = Path(app_path)
+        self.db_path = self.app_path / STATE_DB_NAME
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        """首次使用时打开数据库，无法打开时返回None（清单不可用不影响安装）"""
+        if self._conn is None:
+            try:
+                conn = sqlite3.connect(str(self.db_path), timeout=5, check_same_thread=False)
+                conn.executescript(SCHEMA)
+                self._conn = conn
+            except sqlite3.Error:
+                return None
+        return self._conn
+
+    def _execute(self, sql: str, params=(), many: bool = False) -> List[tuple]:
+        """在锁内执行语句并提交，出错时返回空结果"""
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return []
+            try:
+                if many:
+                    conn.executemany(sql, params)
+                    rows = []
+                else:
+                    rows = conn.execute(sql, params).fetchall()
+                conn.commit()
+                return rows
+            except sqlite3.Error:
+                conn.rollback()
+                return []
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _to_relative(self, path: Path) -> str:
+        try:
+            return str(Path(path).resolve().relative_to(self.app_path.resolve()))
+        except ValueError:
+            return str(Path(path).resolve())
+
+    def sync_package(self, package: Dict, config_version: str = "") -> bool:
+        """
+        登记包配置，配置中的地址、大小或摘要变化时清除该包的旧状态
+
+        Args:
+            package: 包配置
+            config_version: 云端配置版本
+
+        Returns:
+            已有状态是否仍然有效
+        """
+        name = package.get("name", "")
+        digest = package.get("md5", "")
+        size = package.get("size", 0)
+        url = package.get("url", "")
+
+        rows = self._execute("SELECT digest, size, url FROM packages WHERE name = ?", (name,))
+        if rows and rows[0] == (digest, size, url):
+            if config_version:
+                self._execute("UPDATE packages SET config_version = ? WHERE name = ?", (config_version, name))
+            return True
+
+        # 包已变化（或首次登记），旧的阶段和文件记录作废
+        for table in ("stages", "files", "launch_scripts"):
+            self._execute(f"DELETE FROM {table} WHERE package = ?", (name,))
+        self._execute("INSERT OR REPLACE INTO packages (name, config_version, digest, size, url, updated_at) "
+                      "VALUES (?, ?, ?, ?, ?, ?)",
+                      (name, config_version, digest, size, url, time.time()))
+        return False
+
+    def mark_stage(self, package_name: str, stage: str, status: str):
+        """记录阶段状态"""
+        self._execute("INSERT OR REPLACE INTO stages (package, stage, status, updated_at) VALUES (?, ?, ?, ?)",
+                      (package_name, stage, status, time.time()))
+
+    def mark_skipped(self, package: Dict, config_version: str = "", evidence: Optional[Path] = None):
+        """
+        记录包因系统已满足要求而跳过
+
+        Args:
+            package: 包配置
+            config_version: 云端配置版本
+            evidence: 检测到的已安装程序文件，作为包的文件记录；再次运行时文件仍然存在才视为已完成
+        """
+        name = package.get("name", "")
+        self.sync_package(package, config_version)
+        for stage in PACKAGE_STAGES:
+            self.mark_stage(name, stage, STATE_SKIPPED)
+        self.record_files(name, [evidence] if evidence else [])
+
+    def get_stage_status(self, package_name: str, stage: str) -> Optional[str]:
+        """获取阶段状态，未记录时返回None"""
+        rows = self._execute("SELECT status FROM stages WHERE package = ? AND stage = ?", (package_name, stage))
+        return rows[0][0] if rows else None
+
+    def get_stage_statuses(self, package_name: str) -> Dict[str, str]:
+        """获取包的所有阶段状态"""
+        return dict(self._execute("SELECT stage, status FROM stages WHERE package = ?", (package_name,)))
+
+    def record_local_file(self, package_name: str, path: Path):
+        """记录已校验的本地文件大小和修改时间"""
+        try:
+            stat = Path(path).stat()
+        except OSError:
+            return
+        self._execute("UPDATE packages SET local_size = ?, local_mtime_ns = ?, updated_at = ? WHERE name = ?",
+                      (stat.st_size, stat.st_mtime_ns, time.time(), package_name))
+
+    def is_local_file_current(self, package_name: str, path: Path) -> bool:
+        """本地文件是否已校验且之后未被修改"""
+        if self.get_stage_status(package_name, STAGE_VERIFY) != STATE_DONE:
+            return False
+        rows = self._execute("SELECT local_size, local_mtime_ns FROM packages WHERE name = ?", (package_name,))
+        if not rows or rows[0][0] is None:
+            return False
+        try:
+            stat = Path(path).stat()
+        except OSError:
+            return False
+        return rows[0] == (stat.st_size, stat.st_mtime_ns)
+
+    def record_files(self, package_name: str, paths: Iterable[Path]):
+        """记录包解压出的文件"""
+        self._execute("DELETE FROM files WHERE package = ?", (package_name,))
+        self._execute("INSERT OR IGNORE INTO files (package, path) VALUES (?, ?)",
+                      ((package_name, self._to_relative(p)) for p in paths), many=True)
+
+    def get_files(self, package_name: str) -> List[Path]:
+        """获取包解压出的文件"""
+        rows = self._execute("SELECT path FROM files WHERE package = ? ORDER BY path", (package_name,))
+        return [self.app_path / path for path, in rows]
+
+    def record_launch_scripts(self, package_name: str, scripts: List[Path]):
+        """
+        记录包解压出的启动脚本位置
+
+        Args:
+            package_name: 包名称
+            scripts: 启动脚本路径
+        """
+        self._execute("DELETE FROM launch_scripts WHERE package = ?", (package_name,))
+        self._execute("INSERT OR IGNORE INTO launch_scripts (package, path) VALUES (?, ?)",
+                      [(package_name, self._to_relative(p)) for p in scripts], many=True)
+
+    def get_launch_scripts(self) -> List[Path]:
+        """
+        获取已记录且仍然存在的启动脚本
+
+        Returns:
+            启动脚本路径列表（路径短的优先）
+        """
+        rows = self._execute("SELECT path FROM launch_scripts")
+        paths = sorted((path for path, in rows), key=lambda p: (len(Path(p).parts), p))
+
+        scripts = []
+        for path in paths:
+            script = self.app_path / path
+            if os.path.isfile(script):
+                scripts.append(script)
+        return scripts
@@ -5,25 +5,178 @@
 """
 
 import subprocess
+import threading
 import time
 import os
+from collections import deque
 from pathlib import Path
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional
+
+from .env_source import EnvironmentSource, get_default_environment_source
+from .system_checker import SystemChecker, PROBE_PYTHON, PROBE_WECHAT
+from .python_env import PythonReadinessProbe, get_installer_target_dir, get_python_install_dirs
+from .metrics import get_registry, DURATION_BUCKETS
+from .tracing import current_span, get_tracer
+
+
+# 每个输出流保留的最大行数，避免长时间运行的安装程序占用大量内存
+MAX_OUTPUT_LINES = 200
+
+# 安装进程状态检查间隔（秒）
+POLL_INTERVAL = 0.5
+
+# 安装进程存活状态汇报间隔（秒）
+LIVENESS_REPORT_INTERVAL = 10
+
+# 安装程序最长运行时间（秒），超时后结束进程
+INSTALL_TIMEOUT = 600
+
+
+_metrics = get_registry()
+INSTALLS = _metrics.counter("installs_total", "安装程序处理次数（按结果）")
+INSTALLER_DURATION = _metrics.histogram("installer_duration_seconds", "安装程序运行耗时（秒）", DURATION_BUCKETS)
+ENV_WAIT_SECONDS = _metrics.histogram("env_wait_seconds", "等待Python环境生效的耗时（秒）", DURATION_BUCKETS)
+
+
+class InstallerProcess:
+    """安装进程 - 后台线程增量读取输出，不阻塞调用线程"""
+
+    def __init__(self, cmd: List[str], creationflags: int = 0, encoding: str = 'gbk',
+                 on_output: Optional[Callable[[str, str], None]] = None):
+        """
+        初始化安装进程
+
+        Args:
+            cmd: 命令行
+            creationflags: 进程创建标志
+            encoding: 输出编码
+            on_output: 输出回调 (流名称, 行内容)，在读取线程中调用
+        """
+        self.cmd = cmd
+        self.creationflags = creationflags
+        self.encoding = encoding
+        self.on_output = on_output
+        self.stdout_lines = deque(maxlen=MAX_OUTPUT_LINES)
+        self.stderr_lines = deque(maxlen=MAX_OUTPUT_LINES)
+        self.process: Optional[subprocess.Popen] = None
+        self.start_time: Optional[float] = None
+        self._readers: List[threading.Thread] = []
+
+    def start(self):
+        """启动进程和输出读取线程"""
+        self.process = subprocess.Popen(self.cmd,
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE,
+                                        stdin=subprocess.DEVNULL,
+                                        creationflags=self.creationflags,
+                                        text=True,
+                                        encoding=self.encoding,
+                                        errors='ignore')
+        self.start_time = time.time()
+
+        for name, stream, lines in (('stdout', self.process.stdout, self.stdout_lines),
+                                    ('stderr', self.process.stderr, self.stderr_lines)):
+            reader = threading.Thread(target=self._read_stream,
+                                      args=(name, stream, lines),
+                                      name=f"installer-{name}",
+                                      daemon=True)
+            reader.start()
+            self._readers.append(reader)
+
+    def _read_stream(self, name: str, stream, lines: deque):
+        """逐行读取输出流"""
+        try:
+            for line in iter(stream.readline, ''):
+                line = line.rstrip()
+                if not line:
+                    continue
+                lines.append(line)
+                if self.on_output:
+                    self.on_output(name, line)
+        except Exception:
+            pass
+        finally:
+            try:
+                stream.close()
+            except Exception:
+                pass
+
+    @property
+    def pid(self) -> Optional[int]:
+        """进程ID"""
+        return self.process.pid if self.process else None
+
+    @property
+    def returncode(self) -> Optional[int]:
+        """返回码，进程未结束时为None"""
+        return self.process.poll() if self.process else None
+
+    @property
+    def elapsed(self) -> float:
+        """已运行时间（秒）"""
+        return time.time() - self.start_time if self.start_time else 0.0
+
+    def is_alive(self) -> bool:
+        """进程是否仍在运行"""
+        return self.process is not None and self.process.poll() is None
+
+    def wait(self, timeout: float) -> bool:
+        """
+        最多等待指定时间
+
+        Returns:
+            进程是否已结束
+        """
+        try:
+            self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return False
+
+        # 进程结束后读取剩余输出
+        for reader in self._readers:
+            reader.join(timeout=1)
+        return True
+
+    def kill(self):
+        """结束进程"""
+        if self.is_alive():
+            try:
+                self.process.kill()
+                self.process.wait(timeout=5)
+            except Exception:
+                pass
+
+    @property
+    def stdout(self) -> str:
+        """已保留的标准输出"""
+        return "\n".join(self.stdout_lines)
+
+    @property
+    def stderr(self) -> str:
+        """已保留的错误输出"""
+        return "\n".join(self.stderr_lines)
 
 
 class SoftwareInstaller:
     """软件安装器"""
     
-    def __init__(self, progress_callback=None):
+    def __init__(self, progress_callback=None, system_checker: Optional[SystemChecker] = None,
+                 env_source: Optional[EnvironmentSource] = None):
         """
         初始化安装器
         
         Args:
             progress_callback: 进度回调函数
+            system_checker: 共享的系统检查器，默认单独创建
+            env_source: 环境数据源，默认按平台选择
         """
         self.progress_callback = progress_callback
+        self.system_checker = system_checker or SystemChecker(progress_callback)
         self.python_installed = False
         self.python_install_time = None
+        self.env_source = env_source or get_default_environment_source()
+        # 已安装Python的目标目录，环境变量生效前可直接从这里找到解释器
+        self.python_target_dirs: List[str] = []
         
         # 安装参数配置
         self.install_params: Dict[str, List[str]] = {
@@ -62,6 +215,16 @@ class SoftwareInstaller:
         Returns:
             安装是否成功
         """
+        with get_tracer().span("install", package=exe_path.name) as span:
+            success = self._install_software(exe_path)
+            if not success:
+                span.fail()
+            outcome = "skipped" if span.attrs.get("skipped") else ("ok" if success else "failed")
+            INSTALLS.inc(package=exe_path.name, outcome=outcome)
+            return success
+
+    def _install_software(self, exe_path: Path) -> bool:
+        """安装单个软件（跳过检查、执行安装程序、更新检测结果）"""
         exe_name = exe_path.name
         self._log(f"开始处理 {exe_name}")
         self._update_progress(f"正在分析 {exe_name}...")
@@ -69,6 +232,7 @@ class SoftwareInstaller:
         # 检查是否需要跳过安装
         if self._should_skip_installation(exe_name):
             self._log(f"跳过安装 {exe_name}")
+            current_span().set(skipped=True)
             return True
         
         # 执行安装
@@ -87,48 +251,82 @@ class SoftwareInstaller:
                 CREATE_NO_WINDOW = 0x08000000
                 create_flags = CREATE_NO_WINDOW
             
-            timeout_seconds = 600
-            result = subprocess.run(cmd, 
-                                    check=True, 
-                                    creationflags=create_flags,
-                                    capture_output=True, 
-                                    text=True, 
-                                    encoding='gbk', 
-                                    errors='ignore',
-                                    timeout=timeout_seconds)
+            timeout_seconds = INSTALL_TIMEOUT
+            process = InstallerProcess(cmd,
+                                       creationflags=create_flags,
+                                       on_output=lambda stream, line: self._log(f"[{exe_name}] {line}"))
+            process.start()
+
+            if not self._wait_for_process(process, exe_name, timeout_seconds):
+                self._log(f"{exe_name} 安装超时 ({timeout_seconds}秒)")
+                self._log(f"输出: {process.stdout}")
+                self._log(f"错误: {process.stderr}")
+                self._update_progress(f"{exe_name} 安装超时 ({timeout_seconds}秒)")
+                INSTALLER_DURATION.observe(process.elapsed, package=exe_name, outcome="timeout")
+                return False
+
+            current_span().set(returncode=process.returncode, installer_seconds=round(process.elapsed, 3))
+            INSTALLER_DURATION.observe(process.elapsed, package=exe_name,
+                                       outcome="ok" if process.returncode == 0 else "failed")
+            if process.returncode != 0:
+                self._log(f"{exe_name} 安装失败，返回码: {process.returncode}")
+                self._log(f"错误输出: {process.stderr[:200]}...")
+                self._update_progress(f"{exe_name} 安装失败: 返回码 {process.returncode}")
+                return False
             
-            self._log(f"{exe_name} 安装命令执行完成，返回码: {result.returncode}")
+            self._log(f"{exe_name} 安装命令执行完成，返回码: {process.returncode}，耗时 {process.elapsed:.1f} 秒")
             self._update_progress(f"{exe_name} 安装完成")
             
+            # 安装改变了系统状态，之前的检测结果不再有效
+            if "python" in exe_name.lower():
+                self.system_checker.invalidate(PROBE_PYTHON)
+            elif "wechat" in exe_name.lower() or "微信" in exe_name.lower():
+                self.system_checker.invalidate(PROBE_WECHAT)
+            
             if "python" in exe_name.lower():
                 self.python_installed = True
                 self.python_install_time = time.time()
+                target_dir = get_installer_target_dir(exe_name)
+                if target_dir:
+                    self.python_target_dirs.append(target_dir)
                 self._log("Python安装完成，记录安装时间")
                 self._update_progress("Python安装成功")
             
             return True
             
-        except subprocess.CalledProcessError as e:
-            self._log(f"{exe_name} 安装失败，返回码: {e.returncode}")
-            self._log(f"错误输出: {e.stderr[:200]}...")
-            self._update_progress(f"{exe_name} 安装失败: 返回码 {e.returncode}")
-            return False
-        except subprocess.TimeoutExpired as e:
-            self._log(f"{exe_name} 安装超时 ({timeout_seconds}秒)")
-            self._log(f"输出: {e.stdout}")
-            self._log(f"错误: {e.stderr}")
-            self._update_progress(f"{exe_name} 安装超时 ({timeout_seconds}秒)")
-            return False
         except Exception as e:
             self._log(f"安装 {exe_name} 时发生未知错误: {e}")
             self._update_progress(f"安装 {exe_name} 时发生未知错误: {e}")
             return False
+
+    def _wait_for_process(self, process: InstallerProcess, exe_name: str, timeout_seconds: float) -> bool:
+        """
+        等待安装进程结束，定期汇报存活状态和已用时间，超时后结束进程
+
+        Returns:
+            进程是否在超时前结束
+        """
+        last_report = 0.0
+        while not process.wait(POLL_INTERVAL):
+            elapsed = process.elapsed
+
+            if elapsed >= timeout_seconds:
+                process.kill()
+                return False
+
+            if elapsed - last_report >= LIVENESS_REPORT_INTERVAL:
+                last_report = elapsed
+                self._update_progress(f"{exe_name} 正在安装 (PID {process.pid})，已用时 {int(elapsed)} 秒...")
+
+            # 通知调用方进程仍在运行，便于保持界面响应
+            if self.progress_callback:
+                self.progress_callback('heartbeat', (exe_name, elapsed))
+
+        return True
     
     def _should_skip_installation(self, exe_name: str) -> bool:
         """检查是否应该跳过安装"""
-        from .system_checker import SystemChecker
-        
-        checker = SystemChecker(self.progress_callback)
+        checker = self.system_checker
         
         if "python" in exe_name.lower():
             python_suitable, python_in_path, python_version = checker.check_python_version()
@@ -151,76 +349,40 @@ class SoftwareInstaller:
         
         return False
     
-    def wait_for_python_env_vars(self, min_wait_time: int = 10, max_wait_time: int = 60):
-        """等待Python环境变量生效"""
+    def wait_for_python_env_vars(self, max_wait_time: int = 60) -> bool:
+        """
+        等待Python环境变量生效，解释器可用后立即返回
+
+        Args:
+            max_wait_time: 最长等待时间（秒）
+
+        Returns:
+            Python是否可用
+        """
         if not self.python_install_time:
             self._log("未检测到Python安装时间，不执行等待")
-            return
-            
-        elapsed = time.time() - self.python_install_time
-        
+            return False
+
         if self.progress_callback:
             self.progress_callback('progress', (95, "等待环境变量生效..."))
         self._update_progress("正在等待Python环境变量生效")
-        
-        wait_needed = False
-        if elapsed < min_wait_time:
-            wait_time = min_wait_time - elapsed
-            self._log(f"Python安装后时间过短({elapsed:.1f}s)，等待环境变量生效，将等待 {wait_time:.1f} 秒...")
-            self._update_progress(f"正在等待环境变量生效，请稍候...")
-            wait_needed = True
-            
-            start_time = time.time()
-            while time.time() - start_time < wait_time:
-                remaining = wait_time - (time.time() - start_time)
-                if remaining <= 0:
-                    break
-                if int(remaining) % 2 == 0 or remaining < 2:
-                    self._update_progress(f"正在等待环境变量生效，剩余约 {int(remaining)+1} 秒...")
-                time.sleep(0.2)
-            self._update_progress("等待结束，检查Python命令...")
-        
-        elif elapsed > max_wait_time:
-            self._log(f"Python安装后已过去 {elapsed:.1f} 秒，超过最大等待时间 {max_wait_time} 秒，假设环境变量已生效")
-            self._update_progress(f"已等待较长时间 ({elapsed:.1f}s)，继续检查Python命令")
-        else:
-            self._log(f"Python安装后已过去 {elapsed:.1f} 秒，继续检查Python命令")
-            self._update_progress(f"已等待 {elapsed:.1f} 秒，检查Python命令...")
-        
-        # 检查Python是否能正常使用
-        self._update_progress("尝试执行 'python --version'...")
-        python_ok = False
-        try:
-            result = subprocess.run(["python", "--version"],
-                                   capture_output=True,
-                                   text=True,
-                                   creationflags=subprocess.CREATE_NO_WINDOW,
-                                   timeout=10)
-            if result.returncode == 0:
-                self._log(f"Python环境变量已生效: {result.stdout.strip()}")
-                self._update_progress(f"Python命令执行成功: {result.stdout.strip()}")
-                python_ok = True
-            else:
-                self._log(f"'python --version' 执行失败，返回码: {result.returncode}")
-                self._update_progress(f"Python命令执行失败 (返回码 {result.returncode})")
-        except subprocess.TimeoutExpired:
-            self._log("检查Python命令超时")
-            self._update_progress("检查Python命令超时，可能存在问题。")
-        except Exception as e:
-            self._log(f"检查Python命令时出错: {e}")
-            self._update_progress(f"检查Python命令时出错: {e}")
-        
-        # 额外等待
-        if wait_needed and not python_ok:
-            extra_wait = 5
-            self._log(f"首次检查Python命令失败，额外等待 {extra_wait} 秒...")
-            self._update_progress(f"Python命令检查失败，再等待 {extra_wait} 秒...")
-            start_time = time.time()
-            while time.time() - start_time < extra_wait:
-                remaining = extra_wait - (time.time() - start_time)
-                if remaining <= 0: 
-                    break
-                self._update_progress(f"额外等待 {int(remaining)+1} 秒...")
-                time.sleep(0.2)
-            self._log("额外等待结束")
-            self._update_progress("额外等待结束")
+
+        probe = PythonReadinessProbe(env_source=self.env_source,
+                                     known_dirs=self.python_target_dirs + get_python_install_dirs(),
+                                     log_callback=self._log)
+        start_time = time.time()
+        with get_tracer().span("env_wait", max_wait=max_wait_time) as span:
+            interpreter = probe.wait_until_ready(max_wait_time)
+            if not interpreter:
+                span.fail("等待超时")
+        elapsed = time.time() - start_time
+        ENV_WAIT_SECONDS.observe(elapsed, caller="installer", outcome="ok" if interpreter else "timeout")
+
+        if interpreter:
+            self._log(f"Python环境变量已生效: {interpreter}（等待 {elapsed:.1f} 秒）")
+            self._update_progress("Python环境已就绪")
+            return True
+
+        self._log(f"等待 {max_wait_time} 秒后仍未找到Python，继续后续流程")
+        self._update_progress("Python环境等待超时，继续后续流程")
+        return False
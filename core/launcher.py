@@ -7,22 +7,58 @@
 import os
 import sys
 import subprocess
+import time
+from collections import deque
 from pathlib import Path
+from typing import Iterable, Optional
 import ctypes
 
+from .env_source import EnvironmentSource, get_default_environment_source
+from .install_manifest import InstallManifest, LAUNCH_SCRIPT_NAME
+from .python_env import PythonReadinessProbe, get_python_install_dirs
+from .system_checker import SystemChecker, PROBE_PYTHON
+from .metrics import get_registry, DURATION_BUCKETS
+from .tracing import get_tracer
+
+
+# 兜底搜索的最大目录深度和耗时（秒）
+SEARCH_MAX_DEPTH = 4
+SEARCH_TIME_LIMIT = 3.0
+
+# 项目目录关键字，同一层中优先搜索
+PRIORITY_KEYWORDS = ('kourichat', 'kouri', 'exploration')
+
+# 不可能包含项目的目录，搜索时跳过
+PRUNED_DIRS = {
+    'node_modules', '__pycache__', 'site-packages', 'downloads', 'appdata',
+    'windows', 'program files', 'program files (x86)', 'programdata', '$recycle.bin',
+    'system volume information', 'venv', 'env',
+}
+
+_metrics = get_registry()
+LAUNCHES = _metrics.counter("launches_total", "启动脚本的处理结果（按启动方式）")
+LAUNCH_SEARCH_SECONDS = _metrics.histogram("launch_search_seconds", "查找启动脚本的耗时（秒）")
+ENV_WAIT_SECONDS = _metrics.histogram("env_wait_seconds", "等待Python环境生效的耗时（秒）", DURATION_BUCKETS)
+
 
 class ScriptLauncher:
     """脚本启动器"""
     
-    def __init__(self, progress_callback=None):
+    def __init__(self, progress_callback=None, system_checker: SystemChecker = None,
+                 env_source: EnvironmentSource = None):
         """
         初始化启动器
         
         Args:
             progress_callback: 进度回调函数
+            system_checker: 共享的系统检查器，用于复用已有的Python检测结果
+            env_source: 环境数据源，默认按平台选择
         """
         self.progress_callback = progress_callback
+        self.system_checker = system_checker
+        self.env_source = env_source or get_default_environment_source()
         self.app_path = self._get_application_path()
+        self.manifest = InstallManifest(self.app_path)
     
     def _get_application_path(self) -> Path:
         """获取应用程序路径"""
@@ -51,14 +87,27 @@ class ScriptLauncher:
         Returns:
             是否成功找到并运行脚本
         """
+        with get_tracer().span("launch") as span:
+            success = self._find_and_launch_script()
+            if not success:
+                span.fail()
+            return success
+
+    def _find_and_launch_script(self) -> bool:
+        """查找启动脚本、等待Python环境并启动"""
         self._update_progress(98, "查找启动脚本...")
         self._log("正在查找 run.bat 文件")
 
         # 递归搜索run.bat文件
-        bat_path = self._search_run_bat()
+        start = time.perf_counter()
+        with get_tracer().span("launch_search") as span:
+            bat_path = self._search_run_bat()
+            span.set(found=bool(bat_path))
+        LAUNCH_SEARCH_SECONDS.observe(time.perf_counter() - start, found=bool(bat_path))
 
         if not bat_path:
             self._log("未找到 run.bat 文件")
+            LAUNCHES.inc(method="not_found")
             # 不显示错误，而是显示完成信息
             self._show_completion_message()
             return True  # 返回True，让程序正常结束
@@ -80,6 +129,7 @@ class ScriptLauncher:
             if success:
                 self._update_progress(100, "项目启动成功")
                 self._log("✓ run.bat 已成功以管理员身份启动")
+                LAUNCHES.inc(method="admin")
                 self._show_success_message()
                 return True
             else:
@@ -89,25 +139,33 @@ class ScriptLauncher:
                 if success:
                     self._update_progress(100, "项目启动成功")
                     self._log("✓ run.bat 已以普通权限启动")
+                    LAUNCHES.inc(method="normal")
                     self._show_success_message()
                     return True
                 else:
                     # 如果自动运行失败，打开文件夹让用户手动运行
                     self._open_folder_and_highlight(bat_path)
+                    LAUNCHES.inc(method="manual")
                     return True  # 仍然返回True，表示处理完成
 
         except Exception as e:
             self._log(f"运行脚本时发生错误: {e}")
+            LAUNCHES.inc(method="error")
             self._show_manual_run_message(bat_path)
             return False
 
-    def _search_run_bat(self) -> Path:
+    def _search_run_bat(self) -> Optional[Path]:
         """
-        递归搜索run.bat文件
+        查找run.bat文件：先查安装清单，再检查常见位置，最后有限制地广度优先搜索
 
         Returns:
             找到的run.bat文件路径，如果未找到则返回None
         """
+        # 解压时记录的启动脚本位置
+        for bat_path in self.manifest.get_launch_scripts():
+            self._log(f"从安装清单中找到 run.bat: {bat_path}")
+            return bat_path
+
         # 获取exe文件的实际运行目录
         if getattr(sys, 'frozen', False):
             # 如果是打包的exe，获取exe文件所在目录
@@ -116,103 +174,113 @@ class ScriptLauncher:
             # 如果是开发环境，使用当前工作目录
             exe_dir = Path.cwd()
 
-        search_paths = [
-            # 首先在exe文件所在目录搜索
-            exe_dir,
-            # 在app_path目录下搜索
-            self.app_path,
-            # 在app_path的父目录下搜索
-            self.app_path.parent,
-        ]
+        search_paths = []
+        for search_root in (exe_dir, self.app_path, self.app_path.parent):
+            if search_root.exists() and search_root not in search_paths:
+                search_paths.append(search_root)
 
+        # 首先检查直接的kourichat目录
         for search_root in search_paths:
-            if not search_root.exists():
-                continue
-
-            self._log(f"在目录中搜索 run.bat: {search_root}")
-
-            # 首先检查直接的kourichat目录
-            kourichat_path = search_root / "kourichat" / "run.bat"
-            if kourichat_path.exists():
+            kourichat_path = search_root / "kourichat" / LAUNCH_SCRIPT_NAME
+            if kourichat_path.is_file():
                 self._log(f"在kourichat目录中找到 run.bat: {kourichat_path}")
                 return kourichat_path
 
-            # 递归搜索run.bat文件
-            for root, dirs, files in os.walk(search_root):
-                if "run.bat" in files:
-                    bat_path = Path(root) / "run.bat"
-                    self._log(f"找到 run.bat 文件: {bat_path}")
-                    return bat_path
-
-                # 优先搜索可能的项目目录
-                for dir_name in dirs:
-                    if any(keyword in dir_name.lower() for keyword in ['kourichat', 'kouri', 'exploration']):
-                        priority_path = Path(root) / dir_name / "run.bat"
-                        if priority_path.exists():
-                            self._log(f"在优先目录中找到 run.bat: {priority_path}")
-                            return priority_path
+        self._log(f"在目录中搜索 run.bat: {', '.join(str(p) for p in search_paths)}")
+        bat_path = self._breadth_first_search(search_paths)
+        if bat_path:
+            self._log(f"找到 run.bat 文件: {bat_path}")
+            # 记录搜索结果，下次启动直接使用
+            self.manifest.record_launch_scripts("search", [bat_path])
+            return bat_path
 
         self._log("未找到 run.bat 文件")
         return None
-    
-    def _wait_for_python_env(self) -> bool:
-        """等待Python环境变量生效"""
-        import time
-        import subprocess
-
-        self._log("等待Python环境变量生效...")
-        max_wait_time = 30  # 最大等待30秒
-        check_interval = 2  # 每2秒检查一次
 
-        for i in range(0, max_wait_time, check_interval):
-            try:
-                # 刷新当前进程的环境变量
-                self._refresh_environment()
-
-                # 检查Python是否可用
-                result = subprocess.run(['python', '--version'],
-                                      capture_output=True,
-                                      text=True,
-                                      timeout=5)
-
-                if result.returncode == 0:
-                    python_version = result.stdout.strip()
-                    self._log(f"✓ Python环境已生效: {python_version}")
-                    return True
+    def _breadth_first_search(self, roots: Iterable[Path], max_depth: int = SEARCH_MAX_DEPTH,
+                              time_limit: float = SEARCH_TIME_LIMIT) -> Optional[Path]:
+        """
+        广度优先搜索run.bat，浅层目录先找到即返回
 
-            except (subprocess.TimeoutExpired, subprocess.CalledProcessError, FileNotFoundError):
-                pass
+        Args:
+            roots: 搜索根目录
+            max_depth: 最大搜索深度
+            time_limit: 最长搜索时间（秒）
 
-            self._log(f"等待Python环境生效... ({i + check_interval}/{max_wait_time}秒)")
-            time.sleep(check_interval)
+        Returns:
+            找到的文件路径，未找到或超时返回None
+        """
+        deadline = time.monotonic() + time_limit
+        queue = deque((str(root), 0) for root in roots)
+        visited = set()
+
+        while queue:
+            if time.monotonic() > deadline:
+                self._log(f"搜索 run.bat 超过 {time_limit} 秒，停止搜索")
+                return None
+
+            directory, depth = queue.popleft()
+            key = os.path.normcase(directory)
+            if key in visited:
+                continue
+            visited.add(key)
 
-        self._log("⚠ Python环境变量等待超时，将尝试直接启动")
-        return False
+            priority_dirs = []
+            other_dirs = []
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        name = entry.name.lower()
+                        try:
+                            if entry.is_file() and name == LAUNCH_SCRIPT_NAME:
+                                return Path(entry.path)
+                            if depth >= max_depth or not entry.is_dir(follow_symlinks=False):
+                                continue
+                        except OSError:
+                            continue
+                        if name.startswith('.') or name in PRUNED_DIRS:
+                            continue
+                        if any(keyword in name for keyword in PRIORITY_KEYWORDS):
+                            priority_dirs.append(entry.path)
+                        else:
+                            other_dirs.append(entry.path)
+            except OSError:
+                continue
 
-    def _refresh_environment(self):
-        """刷新当前进程的环境变量"""
-        try:
-            import winreg
+            # 项目目录优先放到队首
+            for path in reversed(priority_dirs):
+                queue.appendleft((path, depth + 1))
+            queue.extend((path, depth + 1) for path in other_dirs)
 
-            # 读取系统环境变量
-            with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE,
-                               r"SYSTEM\CurrentControlSet\Control\Session Manager\Environment") as key:
-                system_path = winreg.QueryValueEx(key, "PATH")[0]
+        return None
+    
+    def _wait_for_python_env(self, max_wait_time: int = 30) -> bool:
+        """等待Python环境变量生效，解释器可用后立即返回"""
+        # 检测结果仍有效（之后没有安装Python）且Python已在PATH中时无需等待
+        if self.system_checker:
+            cached = self.system_checker.get_cached(PROBE_PYTHON)
+            if cached and cached[0] and cached[1]:
+                self._log(f"✓ Python环境已生效: {cached[2]}")
+                return True
 
-            # 读取用户环境变量
-            try:
-                with winreg.OpenKey(winreg.HKEY_CURRENT_USER, "Environment") as key:
-                    user_path = winreg.QueryValueEx(key, "PATH")[0]
-                    combined_path = f"{system_path};{user_path}"
-            except FileNotFoundError:
-                combined_path = system_path
+        self._log("等待Python环境变量生效...")
 
-            # 更新当前进程的PATH环境变量
-            os.environ["PATH"] = combined_path
-            self._log("已刷新环境变量")
+        probe = PythonReadinessProbe(env_source=self.env_source,
+                                     known_dirs=get_python_install_dirs(),
+                                     log_callback=self._log)
+        start = time.perf_counter()
+        with get_tracer().span("env_wait", max_wait=max_wait_time) as span:
+            interpreter = probe.wait_until_ready(max_wait_time)
+            if not interpreter:
+                span.fail("等待超时")
+        ENV_WAIT_SECONDS.observe(time.perf_counter() - start, caller="launcher",
+                                 outcome="ok" if interpreter else "timeout")
+        if interpreter:
+            self._log(f"✓ Python环境已生效: {interpreter}")
+            return True
 
-        except Exception as e:
-            self._log(f"刷新环境变量失败: {e}")
+        self._log("⚠ Python环境变量等待超时，将尝试直接启动")
+        return False
 
     def _run_as_admin(self, bat_path: Path) -> bool:
         """以管理员身份运行批处理文件"""
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PE文件版本读取模块 - 直接从可执行文件的版本资源中读取VS_FIXEDFILEINFO，不依赖wmic
+"""
+
+import mmap
+import os
+import struct
+import threading
+from typing import Dict, Optional, Tuple
+
+
+# 版本资源类型 RT_VERSION
+RT_VERSION = 16
+
+# 资源目录索引（IMAGE_DIRECTORY_ENTRY_RESOURCE）
+RESOURCE_DIRECTORY_INDEX = 2
+
+# VS_FIXEDFILEINFO 签名
+FIXED_FILE_INFO_SIGNATURE = 0xFEEF04BD
+
+# 资源目录项的高位表示子目录
+SUBDIRECTORY_FLAG = 0x80000000
+
+# 资源目录最大嵌套层数（类型/名称/语言）
+MAX_RESOURCE_DEPTH = 3
+
+# 路径 -> (修改时间, 文件大小, 版本号)
+_version_cache: Dict[str, Tuple[int, int, Optional[str]]] = {}
+_cache_lock = threading.Lock()
+
+
+class PEFormatError(ValueError):
+    """PE文件格式错误"""
+
+
+def _unpack(fmt: str, data, offset: int) -> tuple:
+    """按格式读取，越界时抛出格式错误"""
+    try:
+        return struct.unpack_from(fmt, data, offset)
+    except struct.error:
+        raise PEFormatError(f"读取越界: offset={offset}")
+
+
+def _rva_to_offset(sections, rva: int) -> int:
+    """将相对虚拟地址转换为文件偏移"""
+    for virtual_address, virtual_size, raw_offset, raw_size in sections:
+        if virtual_address <= rva < virtual_address + max(virtual_size, raw_size):
+            return raw_offset + (rva - virtual_address)
+    raise PEFormatError(f"RVA不在任何节中: {rva:#x}")
+
+
+def _find_version_entry(data, resource_offset: int) -> Tuple[int, int]:
+    """
+    在资源目录树中查找版本资源
+
+    Returns:
+        (资源数据RVA, 资源数据大小)
+    """
+    directory = resource_offset
+    for depth in range(MAX_RESOURCE_DEPTH):
+        named_count, id_count = _unpack('<HH', data, directory + 12)
+        entries = directory + 16
+        target = None
+        for index in range(named_count + id_count):
+            name, offset_to_data = _unpack('<II', data, entries + index * 8)
+            # 第一层按类型匹配RT_VERSION，名称和语言层取第一项
+            if depth == 0 and (name & SUBDIRECTORY_FLAG or name != RT_VERSION):
+                continue
+            target = offset_to_data
+            break
+
+        if target is None:
+            raise PEFormatError("未找到版本资源")
+
+        if not target & SUBDIRECTORY_FLAG:
+            return _unpack('<II', data, resource_offset + target)
+        directory = resource_offset + (target & ~SUBDIRECTORY_FLAG)
+
+    # 语言层下应为数据项
+    raise PEFormatError("版本资源目录层级异常")
+
+
+def parse_fixed_file_version(data) -> str:
+    """
+    从PE文件内容中解析文件版本号
+
+    Args:
+        data: 文件内容（bytes或mmap）
+
+    Returns:
+        版本号字符串，如 3.9.12.17
+    """
+    if _unpack('<2s', data, 0)[0] != b'MZ':
+        raise PEFormatError("不是有效的PE文件")
+
+    pe_offset = _unpack('<I', data, 0x3C)[0]
+    if _unpack('<4s', data, pe_offset)[0] != b'PE\0\0':
+        raise PEFormatError("缺少PE签名")
+
+    # COFF文件头
+    section_count = _unpack('<H', data, pe_offset + 6)[0]
+    optional_size = _unpack('<H', data, pe_offset + 20)[0]
+    optional_offset = pe_offset + 24
+
+    # 可选头：PE32与PE32+的数据目录位置不同
+    magic = _unpack('<H', data, optional_offset)[0]
+    if magic == 0x10B:
+        directories_offset = optional_offset + 96
+    elif magic == 0x20B:
+        directories_offset = optional_offset + 112
+    else:
+        raise PEFormatError(f"未知的可选头类型: {magic:#x}")
+
+    directory_count = _unpack('<I', data, directories_offset - 4)[0]
+    if directory_count <= RESOURCE_DIRECTORY_INDEX:
+        raise PEFormatError("没有资源目录")
+    resource_rva, resource_size = _unpack('<II', data, directories_offset + RESOURCE_DIRECTORY_INDEX * 8)
+    if not resource_rva or not resource_size:
+        raise PEFormatError("没有资源目录")
+
+    # 节表
+    sections = []
+    section_table = optional_offset + optional_size
+    for index in range(section_count):
+        entry = section_table + index * 40
+        virtual_size, virtual_address, raw_size, raw_offset = _unpack('<IIII', data, entry + 8)
+        sections.append((virtual_address, virtual_size, raw_offset, raw_size))
+
+    resource_offset = _rva_to_offset(sections, resource_rva)
+    data_rva, data_size = _find_version_entry(data, resource_offset)
+    version_offset = _rva_to_offset(sections, data_rva)
+
+    # VS_VERSIONINFO: wLength, wValueLength, wType, "VS_VERSION_INFO\0"(UTF-16)，
+    # 按4字节对齐后紧跟VS_FIXEDFILEINFO
+    value_length = _unpack('<H', data, version_offset + 2)[0]
+    if value_length < 52:
+        raise PEFormatError("版本资源不包含VS_FIXEDFILEINFO")
+    key_end = version_offset + 6 + len("VS_VERSION_INFO\0") * 2
+    fixed_offset = (key_end + 3) & ~3
+    if fixed_offset + 52 > version_offset + data_size:
+        raise PEFormatError("版本资源长度异常")
+
+    signature, _, version_ms, version_ls = _unpack('<IIII', data, fixed_offset)
+    if signature != FIXED_FILE_INFO_SIGNATURE:
+        raise PEFormatError("VS_FIXEDFILEINFO签名不匹配")
+
+    return f"{version_ms >> 16}.{version_ms & 0xFFFF}.{version_ls >> 16}.{version_ls & 0xFFFF}"
+
+
+def read_file_version(path: str) -> Optional[str]:
+    """
+    读取可执行文件的文件版本号，结果按路径和修改时间缓存
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        版本号字符串，文件不存在或没有版本资源时返回None
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    with _cache_lock:
+        cached = _version_cache.get(path)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+
+    version = None
+    try:
+        with open(path, 'rb') as f:
+            # 内存映射只会读入实际访问到的文件头和资源数据页
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                version = parse_fixed_file_version(data)
+    except (OSError, ValueError):
+        version = None
+
+    with _cache_lock:
+        _version_cache[path] = (stat.st_mtime_ns, stat.st_size, version)
+    return version
+
+
+def clear_version_cache():
+    """清空版本号缓存"""
+    with _cache_lock:
+        _version_cache.clear()
@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+局域网缓存模块 - 同一办公网络中的多台电脑只需从云端下载一次
+
+一个安装器实例（或单独运行的缓存服务）通过HTTP按MD5提供已校验的安装包，
+其他实例通过UDP广播或配置的地址找到它，下载时优先从局域网节点获取；
+下载后仍按配置中的MD5校验，节点提供的内容不可信也不影响安装结果
+
+单独运行缓存服务:
+    python -m core.peer_cache --serve downloads
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import socket
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+# 环境变量：auto/1 通过广播查找节点，host:port 使用指定节点，0 关闭
+PEER_ENV = "KOURI_PEER"
+# 环境变量：设置为1时本实例也向局域网提供已下载的安装包
+PEER_SERVE_ENV = "KOURI_PEER_SERVE"
+
+# 发现节点的UDP端口
+DISCOVERY_PORT = 47391
+DISCOVERY_REQUEST = b"KOURI-PEER-DISCOVER/1"
+DISCOVERY_REPLY_PREFIX = b"KOURI-PEER/1 "
+# 等待节点回复的时间（秒）
+DISCOVERY_TIMEOUT = 0.5
+# 收到第一个回复后继续等待其他节点的时间（秒）
+DISCOVERY_GRACE = 0.05
+
+# 缓存服务的默认HTTP端口
+DEFAULT_SERVE_PORT = 47392
+
+# 从节点下载的超时时间（秒），局域网内连接失败应很快返回
+PEER_TIMEOUT = 5
+
+# 按MD5获取文件的路径前缀
+CONTENT_PATH_PREFIX = "/md5/"
+
+_MD5_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _file_md5(path: Path) -> str:
+    digest = hashlib.md5()
+    with open(path, 'rb', buffering=0) as f:
+        buffer = memoryview(bytearray(1024 * 1024))
+        while True:
+            count = f.readinto(buffer)
+            if not count:
+                break
+            digest.update(buffer[:count])
+    return digest.hexdigest()
+
+
+class PeerContentStore:
+    """按MD5索引的本地文件，文件被修改或删除后不再提供"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # MD5 -> (路径, 大小, 修改时间)
+        self._files: Dict[str, Tuple[Path, int, int]] = {}
+
+    def add(self, md5: str, path: Path):
+        """登记已校验的文件"""
+        stat = Path(path).stat()
+        with self._lock:
+            self._files[md5.lower()] = (Path(path), stat.st_size, stat.st_mtime_ns)
+
+    def get(self, md5: str) -> Optional[Path]:
+        """查找文件，文件已变化时返回None"""
+        with self._lock:
+            entry = self._files.get(md5.lower())
+        if entry is None:
+            return None
+        path, size, mtime_ns = entry
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+            return None
+        return path
+
+    def scan(self, directory: Path) -> int:
+        """
+        计算目录中所有文件的MD5并登记（单独运行缓存服务时使用）
+
+        Returns:
+            登记的文件数
+        """
+        count = 0
+        for path in sorted(Path(directory).iterdir()):
+            if path.is_file() and not path.name.startswith('.'):
+                self.add(_file_md5(path), path)
+                count += 1
+        return count
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._files)
+
+
+class _ContentHandler(BaseHTTPRequestHandler):
+    """GET/HEAD /md5/<MD5> 返回对应的文件"""
+
+    store: PeerContentStore = None
+    counters: Dict[str, int] = None
+
+    def _send_file(self, include_body: bool):
+        if not self.path.startswith(CONTENT_PATH_PREFIX):
+            self.send_error(404)
+            return
+        md5 = self.path[len(CONTENT_PATH_PREFIX):].lower()
+        path = self.store.get(md5) if _MD5_PATTERN.match(md5) else None
+        if path is None:
+            self.send_error(404)
+            return
+
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            self.send_error(404)
+            return
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(size))
+            self.send_header('ETag', f'"{md5}"')
+            self.end_headers()
+            if include_body:
+                # 由操作系统直接从文件发送到套接字
+                sent = self.connection.sendfile(f)
+                self.counters['bytes_sent'] += sent
+                self.counters['files_sent'] += 1
+
+    def do_GET(self):
+        self._send_file(True)
+
+    def do_HEAD(self):
+        self._send_file(False)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PeerCacheServer:
+    """局域网缓存服务：HTTP提供文件，UDP回复节点发现请求"""
+
+    def __init__(self, store: PeerContentStore, host: str = "0.0.0.0", port: int = 0,
+                 discovery_port: Optional[int] = DISCOVERY_PORT, instance_id: Optional[str] = None):
+        """
+        初始化缓存服务
+
+        Args:
+            store: 提供的文件
+            host: 监听地址
+            port: HTTP端口，0为自动分配
+            discovery_port: 节点发现UDP端口，None时不回复发现请求
+            instance_id: 实例标识（发现时用于排除自己）
+        """
+        self.store = store
+        self.host = host
+        self.port = port
+        self.discovery_port = discovery_port
+        self.instance_id = instance_id or uuid.uuid4().hex
+        self.counters = {'bytes_sent': 0, 'files_sent': 0}
+
+        self._http: Optional[ThreadingHTTPServer] = None
+        self._udp: Optional[socket.socket] = None
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def url(self) -> str:
+        host = "127.0.0.1" if self.host in ("0.0.0.0", "") else self.host
+        return f"http://{host}:{self.port}"
+
+    def start(self) -> 'PeerCacheServer':
+        """启动服务；发现端口被占用时只提供HTTP服务"""
+        handler = type("PeerContentHandler", (_ContentHandler,), {'store': self.store, 'counters': self.counters})
+        self._http = ThreadingHTTPServer((self.host, self.port), handler)
+        self._http.daemon_threads = True
+        self.port = self._http.server_address[1]
+        self._threads.append(threading.Thread(target=self._http.serve_forever, name="PeerCacheHTTP", daemon=True))
+
+        if self.discovery_port is not None:
+            try:
+                self._udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                self._udp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                self._udp.bind((self.host, self.discovery_port))
+                self._threads.append(threading.Thread(target=self._answer_discovery, name="PeerCacheDiscovery",
+                                                      daemon=True))
+            except OSError as e:
+                print(f"[局域网缓存] 节点发现端口 {self.discovery_port} 不可用，只能通过地址访问: {e}")
+                self._udp.close()
+                self._udp = None
+
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def _answer_discovery(self):
+        reply = DISCOVERY_REPLY_PREFIX + json.dumps({'port': self.port, 'id': self.instance_id,
+                                                     'files': len(self.store)}).encode('utf-8')
+        while self._udp is not None:
+            try:
+                data, address = self._udp.recvfrom(1024)
+            except OSError:
+                break
+            if data == DISCOVERY_REQUEST:
+                try:
+                    self._udp.sendto(reply, address)
+                except OSError:
+                    pass
+
+    def stop(self):
+        """停止服务"""
+        if self._http is not None:
+            self._http.shutdown()
+            self._http.server_close()
+            self._http = None
+        if self._udp is not None:
+            udp, self._udp = self._udp, None
+            udp.close()
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._threads = []
+
+    def __enter__(self) -> 'PeerCacheServer':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def discover_peers(port: int = DISCOVERY_PORT, timeout: float = DISCOVERY_TIMEOUT,
+                   addresses=("<broadcast>",), exclude_id: Optional[str] = None) -> List[str]:
+    """
+    通过UDP广播查找局域网缓存节点
+
+    Args:
+        port: 发现端口
+        timeout: 等待回复的时间（秒）
+        addresses: 发送发现请求的地址（默认广播，本机测试时可用127.0.0.1）
+        exclude_id: 排除的实例标识（本实例）
+
+    Returns:
+        节点地址列表，如 ["http://192.168.1.10:47392"]
+    """
+    peers = []
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        for address in addresses:
+            try:
+                sock.sendto(DISCOVERY_REQUEST, (address, port))
+            except OSError:
+                pass
+
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            sock.settimeout(remaining)
+            try:
+                data, (host, _) = sock.recvfrom(1024)
+            except OSError:
+                break
+            if not data.startswith(DISCOVERY_REPLY_PREFIX):
+                continue
+            try:
+                info = json.loads(data[len(DISCOVERY_REPLY_PREFIX):].decode('utf-8'))
+            except ValueError:
+                continue
+            if exclude_id and info.get('id') == exclude_id:
+                continue
+            url = f"http://{host}:{int(info['port'])}"
+            if url not in peers:
+                peers.append(url)
+                deadline = min(deadline, time.monotonic() + DISCOVERY_GRACE)
+    return peers
+
+
+class PeerCache:
+    """下载器使用的局域网缓存：查找节点、生成节点下载地址、登记本实例提供的文件"""
+
+    def __init__(self, address: Optional[str] = None, serve: bool = False,
+                 discovery_port: int = DISCOVERY_PORT, discovery_addresses=("<broadcast>",),
+                 serve_port: int = DEFAULT_SERVE_PORT):
+        """
+        初始化局域网缓存
+
+        Args:
+            address: 节点地址（host:port 或 URL），None时通过广播查找
+            serve: 是否向局域网提供本实例已下载的文件
+            discovery_port: 节点发现UDP端口
+            discovery_addresses: 发送发现请求的地址
+            serve_port: 提供文件时的HTTP端口（被占用时自动分配）
+        """
+        self.address = address
+        self.discovery_port = discovery_port
+        self.discovery_addresses = tuple(discovery_addresses)
+        self.instance_id = uuid.uuid4().hex
+        self._peers: Optional[List[str]] = None
+        self._lock = threading.Lock()
+
+        self.store = PeerContentStore()
+        self.server: Optional[PeerCacheServer] = None
+        if serve:
+            for port in (serve_port, 0):
+                try:
+                    self.server = PeerCacheServer(self.store, port=port, discovery_port=discovery_port,
+                                                  instance_id=self.instance_id).start()
+                    break
+                except OSError:
+                    continue
+
+    @property
+    def serving(self) -> bool:
+        return self.server is not None
+
+    def peers(self) -> List[str]:
+        """节点地址（首次调用时查找，之后复用）"""
+        with self._lock:
+            if self._peers is None:
+                if self.address:
+                    address = self.address.rstrip('/')
+                    self._peers = [address if "://" in address else f"http://{address}"]
+                else:
+                    self._peers = discover_peers(self.discovery_port, addresses=self.discovery_addresses,
+                                                 exclude_id=self.instance_id)
+            return list(self._peers)
+
+    def drop_peer(self, peer: str):
+        """不再使用连接失败的节点"""
+        with self._lock:
+            if self._peers and peer in self._peers:
+                self._peers.remove(peer)
+
+    def content_urls(self, md5: str) -> List[Tuple[str, str]]:
+        """
+        按MD5生成各节点的下载地址
+
+        Returns:
+            [(节点地址, 下载URL)]
+        """
+        if not md5:
+            return []
+        return [(peer, f"{peer}{CONTENT_PATH_PREFIX}{md5.lower()}") for peer in self.peers()]
+
+    def register(self, md5: str, path: Path):
+        """登记本实例已校验的文件（提供服务时）"""
+        if self.server is not None and md5:
+            try:
+                self.store.add(md5, path)
+            except OSError:
+                pass
+
+    def close(self):
+        if self.server is not None:
+            self.server.stop()
+            self.server = None
+
+
+_peer_cache: Optional[PeerCache] = None
+_peer_cache_configured = False
+_peer_cache_lock = threading.Lock()
+
+
+def _create_peer_cache(value: Optional[str], serve: bool, **options) -> Optional[PeerCache]:
+    if value in ("0", "false", "off"):
+        value = None
+    if not value and not serve:
+        return None
+    address = None if not value or value in ("1", "true", "on", "auto") else value
+    return PeerCache(address=address, serve=serve, **options)
+
+
+def configure_peer_cache(value: Optional[str] = None, serve: bool = False, **options) -> Optional[PeerCache]:
+    """
+    配置全局局域网缓存（替换已有配置）
+
+    Args:
+        value: "auto"通过广播查找节点，host:port 使用指定节点，None时只在serve为True时提供文件
+        serve: 是否向局域网提供本实例已下载的文件
+        **options: 传给PeerCache的其他参数（如发现端口、发现地址）
+
+    Returns:
+        未开启时返回None
+    """
+    global _peer_cache, _peer_cache_configured
+    with _peer_cache_lock:
+        if _peer_cache is not None:
+            _peer_cache.close()
+        _peer_cache = _create_peer_cache(value, serve, **options)
+        _peer_cache_configured = True
+        return _peer_cache
+
+
+def get_peer_cache() -> Optional[PeerCache]:
+    """获取全局局域网缓存，首次调用时按环境变量配置，未开启时返回None"""
+    global _peer_cache, _peer_cache_configured
+    if not _peer_cache_configured:
+        with _peer_cache_lock:
+            if not _peer_cache_configured:
+                _peer_cache = _create_peer_cache(os.environ.get(PEER_ENV) or None,
+                                                 os.environ.get(PEER_SERVE_ENV) in ("1", "true", "on"))
+                _peer_cache_configured = True
+    return _peer_cache
+
+
+def main():
+    """单独运行缓存服务"""
+    parser = argparse.ArgumentParser(description="KouriChat安装包局域网缓存服务")
+    parser.add_argument("--serve", required=True, metavar="DIR", help="提供的安装包目录（如downloads）")
+    parser.add_argument("--host", default="0.0.0.0", help="监听地址")
+    parser.add_argument("--port", type=int, default=DEFAULT_SERVE_PORT, help="HTTP端口")
+    parser.add_argument("--discovery-port", type=int, default=DISCOVERY_PORT, help="节点发现UDP端口")
+    args = parser.parse_args()
+
+    store = PeerContentStore()
+    print(f"正在计算 {args.serve} 中文件的MD5...")
+    count = store.scan(Path(args.serve))
+    server = PeerCacheServer(store, args.host, args.port, args.discovery_port).start()
+    print(f"局域网缓存服务已启动: {server.url}（{count} 个文件，发现端口 {args.discovery_port}）")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
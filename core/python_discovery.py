@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Python解释器发现模块 - 从PATH、注册表（PEP 514）和默认安装目录枚举解释器，
+通过文件元数据读取版本号，不执行解释器
+"""
+
+import glob
+import os
+import re
+from typing import List, Optional, Tuple
+
+from .env_source import EnvironmentSource, get_default_environment_source
+from .pe_version import read_file_version
+from .python_env import get_python_install_dirs, is_usable_interpreter_file
+from .system_access import SystemAccess, HKEY_CURRENT_USER, HKEY_LOCAL_MACHINE
+
+
+# PEP 514 注册表路径
+PYTHON_CORE_KEYS = [
+    (HKEY_CURRENT_USER, r"Software\Python\PythonCore"),
+    (HKEY_LOCAL_MACHINE, r"Software\Python\PythonCore"),
+    (HKEY_LOCAL_MACHINE, r"Software\WOW6432Node\Python\PythonCore"),
+]
+
+# 解释器来源
+SOURCE_PATH = 'path'
+SOURCE_REGISTRY = 'registry'
+SOURCE_INSTALL_DIR = 'install_dir'
+
+SOURCE_LABELS = {
+    SOURCE_PATH: "PATH",
+    SOURCE_REGISTRY: "注册表",
+    SOURCE_INSTALL_DIR: "安装目录",
+}
+
+# 最终确认执行的超时时间（秒）
+CONFIRM_TIMEOUT = 10
+
+PYTHON_EXECUTABLES = ("python.exe", "python") if os.name == 'nt' else ("python", "python3")
+
+
+class PythonInterpreter:
+    """发现的Python解释器"""
+
+    def __init__(self, path: str, version: Optional[Tuple[int, ...]], source: str,
+                 in_path: bool = False, path_index: int = -1):
+        """
+        初始化解释器信息
+
+        Args:
+            path: 可执行文件路径
+            version: 从元数据读取的版本号，未知时为None
+            source: 发现来源
+            in_path: 是否是PATH中的解释器
+            path_index: 在PATH中的位置（越小越优先）
+        """
+        self.path = path
+        self.version = version
+        self.source = source
+        self.in_path = in_path
+        self.path_index = path_index
+        self.confirmed = False
+
+    @property
+    def version_string(self) -> Optional[str]:
+        """版本号字符串"""
+        if not self.version:
+            return None
+        return '.'.join(str(part) for part in self.version)
+
+    @property
+    def source_label(self) -> str:
+        """来源名称"""
+        return SOURCE_LABELS.get(self.source, self.source)
+
+    def __repr__(self):
+        return f"PythonInterpreter({self.path!r}, {self.version_string}, {self.source})"
+
+
+def _parse_version(text: str) -> Optional[Tuple[int, ...]]:
+    """解析 3.11 / 3.11.9 形式的版本号"""
+    match = re.match(r'^\s*(\d+)\.(\d+)(?:\.(\d+))?', text)
+    if not match:
+        return None
+    return tuple(int(part) for part in match.groups() if part is not None)
+
+
+def _version_from_pyvenv(exe_dir: str) -> Optional[Tuple[int, ...]]:
+    """从虚拟环境的pyvenv.cfg读取版本号（位于解释器目录或其上级目录）"""
+    for cfg_dir in (exe_dir, os.path.dirname(exe_dir)):
+        try:
+            with open(os.path.join(cfg_dir, "pyvenv.cfg"), 'r', encoding='utf-8') as f:
+                for line in f:
+                    key, _, value = line.partition('=')
+                    if key.strip() in ('version', 'version_info'):
+                        version = _parse_version(value)
+                        if version:
+                            return version
+        except OSError:
+            continue
+    return None
+
+
+def _version_from_pe(exe_path: str) -> Optional[Tuple[int, ...]]:
+    """
+    从python.exe的版本资源读取版本号
+
+    CPython的文件版本第三段为 micro*1000 + 发布级别*10 + 序号（如 3.11.9150 表示 3.11.9）
+    """
+    file_version = read_file_version(exe_path)
+    if not file_version:
+        return None
+    parts = [int(part) for part in file_version.split('.')]
+    if len(parts) < 3:
+        return None
+    micro = parts[2] // 1000 if parts[2] >= 1000 else parts[2]
+    return parts[0], parts[1], micro
+
+
+def _version_from_layout(exe_path: str) -> Optional[Tuple[int, ...]]:
+    """从安装目录布局推断版本号：Windows的python3X.dll，其他平台的lib/python3.X"""
+    exe_dir = os.path.dirname(exe_path)
+
+    for dll in glob.glob(os.path.join(exe_dir, "python3*.dll")):
+        match = re.match(r'python3(\d+)\.dll$', os.path.basename(dll), re.IGNORECASE)
+        if match:
+            return 3, int(match.group(1))
+
+    real_path = os.path.realpath(exe_path)
+    match = re.match(r'python(\d+)\.(\d+)$', os.path.basename(real_path))
+    if match:
+        return int(match.group(1)), int(match.group(2))
+
+    prefix = os.path.dirname(os.path.dirname(real_path))
+    for lib_dir in sorted(glob.glob(os.path.join(prefix, "lib", "python3.*")), reverse=True):
+        version = _parse_version(os.path.basename(lib_dir)[len("python"):])
+        if version:
+            return version
+    return None
+
+
+def read_interpreter_version(exe_path: str) -> Optional[Tuple[int, ...]]:
+    """
+    不执行解释器，从文件元数据读取版本号
+
+    Args:
+        exe_path: 解释器路径
+
+    Returns:
+        版本号元组，无法确定时返回None
+    """
+    return (_version_from_pyvenv(os.path.dirname(exe_path))
+            or _version_from_pe(exe_path)
+            or _version_from_layout(exe_path))
+
+
+class PythonDiscovery:
+    """Python解释器发现器"""
+
+    def __init__(self, access: Optional[SystemAccess] = None,
+                 env_source: Optional[EnvironmentSource] = None,
+                 known_dirs: Optional[List[str]] = None):
+        """
+        初始化发现器
+
+        Args:
+            access: 系统访问对象（读取PEP 514注册表信息）
+            env_source: 环境数据源（读取最新PATH）
+            known_dirs: 额外检查的安装目录，默认为Python安装程序的默认目录
+        """
+        self.access = access or SystemAccess()
+        self.env_source = env_source or get_default_environment_source()
+        self.known_dirs = known_dirs
+
+    def _find_in_dir(self, directory: str) -> Optional[str]:
+        for name in PYTHON_EXECUTABLES:
+            candidate = os.path.join(directory, name)
+            if is_usable_interpreter_file(candidate):
+                return candidate
+        return None
+
+    def _path_candidates(self) -> List[Tuple[str, str]]:
+        """按PATH顺序列出解释器"""
+        path_value = self.env_source.read_path()
+        separator = ';' if ';' in path_value else os.pathsep
+        return [(d, SOURCE_PATH) for d in path_value.split(separator) if d.strip()]
+
+    def _registry_candidates(self) -> List[Tuple[str, str]]:
+        """从PEP 514注册表信息列出安装目录"""
+        candidates = []
+        for root, key in PYTHON_CORE_KEYS:
+            for tag in self.access.enum_registry_subkeys(root, key):
+                install_key = rf"{key}\{tag}\InstallPath"
+                executable = self.access.read_registry_value(root, install_key, "ExecutablePath")
+                if executable and executable[0]:
+                    candidates.append((os.path.dirname(str(executable[0])), SOURCE_REGISTRY))
+                    continue
+                install_path = self.access.read_registry_value(root, install_key, "")
+                if install_path and install_path[0]:
+                    candidates.append((str(install_path[0]), SOURCE_REGISTRY))
+        return candidates
+
+    def discover(self) -> List[PythonInterpreter]:
+        """
+        枚举所有解释器并排序
+
+        排序规则：PATH中的解释器按PATH顺序在前（第一个即为 python 命令实际使用的解释器），
+        其余按版本从高到低
+
+        Returns:
+            版本号可确定的解释器列表
+        """
+        known_dirs = self.known_dirs if self.known_dirs is not None else get_python_install_dirs()
+        candidates = (self._path_candidates()
+                      + self._registry_candidates()
+                      + [(d, SOURCE_INSTALL_DIR) for d in known_dirs])
+
+        interpreters = []
+        seen = set()
+        path_index = 0
+        for directory, source in candidates:
+            exe_path = self._find_in_dir(directory.strip().strip('"'))
+            if not exe_path:
+                continue
+
+            key = os.path.normcase(os.path.realpath(exe_path))
+            if key in seen:
+                continue
+            seen.add(key)
+
+            in_path = source == SOURCE_PATH
+            version = read_interpreter_version(exe_path)
+            if version:
+                interpreters.append(PythonInterpreter(exe_path, version, source,
+                                                      in_path=in_path,
+                                                      path_index=path_index if in_path else -1))
+            if in_path:
+                path_index += 1
+
+        interpreters.sort(key=lambda i: (0, i.path_index) if i.in_path
+                          else (1, tuple(-part for part in i.version)))
+        return interpreters
+
+    def confirm(self, interpreter: PythonInterpreter, timeout: float = CONFIRM_TIMEOUT) -> bool:
+        """
+        执行一次解释器确认其可用，并以实际输出的版本号为准
+
+        Args:
+            interpreter: 要确认的解释器
+            timeout: 超时时间（秒）
+
+        Returns:
+            解释器是否可用
+        """
+        result = self.access.run_command([interpreter.path, "--version"], timeout=timeout)
+        if not result or result[0] != 0:
+            return False
+
+        match = re.search(r'Python (\d+\.\d+(?:\.\d+)?)', result[1])
+        if match:
+            interpreter.version = _parse_version(match.group(1))
+        interpreter.confirmed = True
+        return True
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Python环境就绪检测模块 - 直接解析解释器路径，环境变量生效后立即返回
+"""
+
+import glob
+import os
+import shutil
+import time
+from typing import Callable, List, Optional
+
+from .env_source import EnvironmentSource, get_default_environment_source
+
+
+# 环境变量变化通知之外的兜底检查间隔（秒），用于发现安装目录中新出现的解释器
+RECHECK_INTERVAL = 1.0
+
+
+def is_usable_interpreter_file(path: str) -> bool:
+    """是否是可用的解释器文件（排除Windows应用商店的0字节占位别名）"""
+    try:
+        return os.path.isfile(path) and os.path.getsize(path) > 0
+    except OSError:
+        return False
+
+
+def find_python(dirs: List[str]) -> Optional[str]:
+    """
+    按顺序在目录中查找python可执行文件，跳过应用商店的占位别名
+
+    Returns:
+        解释器路径，未找到返回None
+    """
+    for directory in dirs:
+        if not directory.strip():
+            continue
+        candidate = shutil.which("python", path=directory)
+        if candidate and is_usable_interpreter_file(candidate):
+            return candidate
+    return None
+
+
+def merge_path(current: str, additions: List[str], prepend: List[str] = ()) -> str:
+    """
+    把PATH条目合并到当前PATH：prepend中的条目放在最前，additions中缺少的条目按顺序追加在后，
+    保留当前PATH中已有的条目和顺序，去掉重复项
+
+    Args:
+        current: 当前PATH
+        additions: 追加的条目（如注册表中的最新PATH）
+        prepend: 放在最前的条目（如刚安装的解释器目录）
+
+    Returns:
+        合并后的PATH
+    """
+    merged = []
+    seen = set()
+    for entry in list(prepend) + current.split(os.pathsep) + list(additions):
+        key = os.path.normcase(os.path.normpath(entry)) if entry.strip() else ""
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        merged.append(entry)
+    return os.pathsep.join(merged)
+
+
+def get_python_install_dirs(version_tag: str = "3*") -> List[str]:
+    """
+    获取Python安装程序的默认安装目录
+
+    Args:
+        version_tag: 版本号通配（如 "311" 或 "3*"）
+
+    Returns:
+        存在的安装目录列表
+    """
+    patterns = [
+        os.path.expandvars(rf"%ProgramFiles%\Python{version_tag}"),
+        os.path.expandvars(rf"%LOCALAPPDATA%\Programs\Python\Python{version_tag}"),
+    ]
+
+    dirs = []
+    for pattern in patterns:
+        # 未展开的环境变量说明当前平台没有该目录
+        if "%" in pattern:
+            continue
+        dirs.extend(sorted(glob.glob(pattern), reverse=True))
+    return dirs
+
+
+def get_installer_target_dir(installer_name: str) -> Optional[str]:
+    """
+    根据安装程序文件名推断全局安装（InstallAllUsers=1）的目标目录
+
+    Args:
+        installer_name: 安装程序文件名，如 python-3.11.9-amd64.exe
+
+    Returns:
+        目标目录，无法推断时返回None
+    """
+    parts = installer_name.lower().split("-")
+    if len(parts) < 2 or parts[0] != "python":
+        return None
+
+    version = parts[1].split(".")
+    if len(version) < 2:
+        return None
+
+    program_files = os.environ.get("ProgramFiles")
+    if not program_files:
+        return None
+    return os.path.join(program_files, f"Python{version[0]}{version[1]}")
+
+
+class PythonReadinessProbe:
+    """Python就绪检测器"""
+
+    def __init__(self, env_source: Optional[EnvironmentSource] = None,
+                 known_dirs: Optional[List[str]] = None,
+                 log_callback: Optional[Callable[[str], None]] = None):
+        """
+        初始化就绪检测器
+
+        Args:
+            env_source: 环境数据源，默认按平台选择
+            known_dirs: 已知的安装目录（如安装程序的目标目录），优先检查
+            log_callback: 日志回调函数
+        """
+        self.env_source = env_source or get_default_environment_source()
+        self.known_dirs = list(known_dirs or [])
+        self.log_callback = log_callback
+
+    def _log(self, message: str):
+        if self.log_callback:
+            self.log_callback(message)
+
+    def resolve(self, refresh_process_env: bool = True) -> Optional[str]:
+        """
+        解析当前可用的Python解释器路径
+
+        Args:
+            refresh_process_env: 是否用最新PATH刷新当前进程的环境变量，
+                                 使之后启动的子进程能找到Python
+
+        Returns:
+            解释器路径，未找到返回None
+        """
+        path_value = self.env_source.read_path()
+        search_path = path_value.replace(";", os.pathsep) if os.pathsep != ";" else path_value
+        path_dirs = search_path.split(os.pathsep)
+
+        interpreter = find_python(path_dirs)
+        from_known_dir = False
+        if not interpreter:
+            interpreter = find_python(self.known_dirs)
+            from_known_dir = interpreter is not None
+
+        if refresh_process_env and path_value:
+            prepend = []
+            if from_known_dir:
+                # 注册表PATH尚未更新时，把解释器目录加入当前进程的PATH
+                install_dir = os.path.dirname(interpreter)
+                prepend = [install_dir, os.path.join(install_dir, "Scripts")]
+            # 只补充缺少的条目，保留当前进程自己加入的目录（如打包程序的解压目录）
+            os.environ["PATH"] = merge_path(os.environ.get("PATH", ""), path_dirs, prepend)
+
+        return interpreter
+
+    def wait_until_ready(self, timeout: float) -> Optional[str]:
+        """
+        等待Python可用，找到后立即返回，不设最短等待时间
+
+        Args:
+            timeout: 最长等待时间（秒）
+
+        Returns:
+            解释器路径，超时返回None
+        """
+        deadline = time.time() + timeout
+
+        while True:
+            interpreter = self.resolve()
+            if interpreter:
+                return interpreter
+
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+
+            # 环境变量变化时立即重新检查，否则按兜底间隔检查安装目录
+            if self.env_source.wait_for_change(min(remaining, RECHECK_INTERVAL)):
+                self._log("检测到环境变量变化，重新检查Python...")
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+远程ZIP索引模块 - 用Range请求只下载远程ZIP的结束记录和中央目录
+
+下载前即可知道压缩包的文件数、解压后大小和每个条目的压缩数据位置；
+与上次解压时保存的中央目录比较，得到升级后有变化的条目，用于空间预检、进度估算和增量更新
+"""
+
+from bisect import bisect_right
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+from .zip_directory import (END_SEARCH_SIZE, CentralDirectoryInfo, ZipDirectory, find_central_directory,
+                            save_central_directory)
+
+
+class RemoteZipIndex:
+    """远程ZIP的中央目录"""
+
+    def __init__(self, url: str, archive_size: int, directory: ZipDirectory, data: bytes, data_offset: int):
+        """
+        初始化远程ZIP索引
+
+        Args:
+            url: ZIP文件URL
+            archive_size: ZIP文件大小
+            directory: 解析后的中央目录
+            data: 下载的原始数据（包含整个中央目录）
+            data_offset: data在压缩包中的起始位置
+        """
+        self.url = url
+        self.archive_size = archive_size
+        self.directory = directory
+        # 通过Range请求下载的字节数
+        self.fetched_bytes = len(data)
+        self._data = data
+        self._data_offset = data_offset
+        self._sorted_offsets: Optional[List[int]] = None
+
+    @classmethod
+    def fetch(cls, url: str, archive_size: int,
+              fetch_range: Callable[[str, int, int], bytes]) -> 'RemoteZipIndex':
+        """
+        下载并解析远程ZIP的中央目录：先下载末尾（结束记录和注释最长64KB），
+        中央目录不在末尾这段数据中时再下载其余部分
+
+        Args:
+            url: ZIP文件URL
+            archive_size: ZIP文件大小
+            fetch_range: 下载函数 (url, 起始位置, 结束位置（不含）) -> 数据
+
+        Raises:
+            ValueError: 服务器不支持Range请求
+            zipfile.BadZipFile: 不是有效的ZIP文件
+        """
+        tail_start = max(0, archive_size - END_SEARCH_SIZE)
+        data = fetch_range(url, tail_start, archive_size)
+        data_offset = tail_start
+        info = find_central_directory(data, tail_start, archive_size)
+        start = info.offset + info.concat
+        if start < tail_start:
+            data = fetch_range(url, start, tail_start) + data
+            data_offset = start
+        return cls(url, archive_size, ZipDirectory.parse(data, data_offset, info), data, data_offset)
+
+    @property
+    def info(self) -> CentralDirectoryInfo:
+        return self.directory.info
+
+    def __len__(self) -> int:
+        return len(self.directory)
+
+    def total_size(self) -> int:
+        """所有条目解压后的总大小"""
+        return self.directory.total_size()
+
+    def save(self, path: Path):
+        """保存中央目录，解压完成后作为已安装版本的记录"""
+        save_central_directory(path, self._data, self._data_offset, self.info)
+
+    def changed_members(self, installed: Optional[ZipDirectory]) -> List[int]:
+        """
+        与已安装版本的中央目录比较
+
+        Args:
+            installed: 已安装版本的中央目录，None表示尚未安装
+
+        Returns:
+            新增或内容有变化的文件条目序号（不含目录条目）
+        """
+        if installed is None:
+            changed = range(len(self.directory))
+        else:
+            changed = self.directory.diff(installed)
+        return [index for index in changed if not self.directory.is_dir(index)]
+
+    def member_range(self, index: int) -> Tuple[int, int]:
+        """
+        条目在压缩包中的数据范围：从本地文件头到下一个条目（或中央目录）的开始位置，
+        包含本地文件头、压缩数据和可能存在的数据描述符
+        """
+        if self._sorted_offsets is None:
+            self._sorted_offsets = sorted(self.directory.header_offsets)
+        start = self.directory.header_offsets[index]
+        position = bisect_right(self._sorted_offsets, start)
+        if position < len(self._sorted_offsets):
+            end = self._sorted_offsets[position]
+        else:
+            end = self.info.offset + self.info.concat
+        return start, end
+
+    def members_size(self, indices: List[int]) -> int:
+        """条目的压缩数据范围总大小（按Range下载这些条目时的下载量）"""
+        total = 0
+        for index in indices:
+            start, end = self.member_range(index)
+            total += end - start
+        return total
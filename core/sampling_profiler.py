@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+采样分析模块 - 按固定间隔采样所有线程（包括Tk主线程和下载、解压工作线程）的调用栈，
+输出可直接生成火焰图的折叠栈（collapsed stacks）文件
+
+只在显式开启时导入和运行，关闭时没有任何开销
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+
+# 环境变量：设置为1时写入默认文件，设置为路径时写入该文件
+PROFILE_ENV = "KOURI_PROFILE"
+# 环境变量：采样间隔（毫秒）
+PROFILE_INTERVAL_ENV = "KOURI_PROFILE_INTERVAL"
+
+# 默认输出文件名（位于应用程序目录）
+PROFILE_FILE_NAME = "install_profile.collapsed"
+
+# 默认采样间隔（秒）
+DEFAULT_INTERVAL = 0.005
+
+# 检查重入的源文件：同一调用栈中这些文件的同一函数出现多次视为重入
+# （如 set_progress 中的 root.update() 处理事件时再次调用 set_progress）
+REENTRANCY_WATCH_FILES = ("progress_window.py",)
+
+
+def _get_application_path() -> Path:
+    """获取应用程序路径"""
+    if getattr(sys, 'frozen', False):
+        return Path(sys.executable).parent
+    return Path(os.path.abspath(__file__)).parent.parent
+
+
+def _frame_label(code) -> str:
+    """栈帧标签：函数名和定义位置，同一函数的不同行合并"""
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """采样分析器 - 在后台线程中定期读取 sys._current_frames()"""
+
+    def __init__(self, output_path: Optional[Path] = None, interval: float = DEFAULT_INTERVAL,
+                 watch_files: Iterable[str] = REENTRANCY_WATCH_FILES):
+        """
+        初始化采样分析器
+
+        Args:
+            output_path: 折叠栈输出文件路径，None时不写文件
+            interval: 采样间隔（秒）
+            watch_files: 检查重入的源文件名
+        """
+        self.output_path = Path(output_path) if output_path else None
+        self.interval = interval
+        self.watch_files = tuple(watch_files)
+
+        self.stacks: Counter = Counter()
+        self.reentrant: Counter = Counter()
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self.elapsed = 0.0
+
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _walk(self, frame) -> Tuple[List[str], List[str]]:
+        """
+        从最内层栈帧回溯
+
+        Returns:
+            (由外到内的栈帧标签, 重入的函数标签)
+        """
+        labels = []
+        watched = Counter()
+        while frame is not None:
+            code = frame.f_code
+            label = _frame_label(code)
+            labels.append(label)
+            if code.co_filename.endswith(self.watch_files):
+                watched[label] += 1
+            frame = frame.f_back
+        labels.reverse()
+        return labels, [label for label, count in watched.items() if count > 1]
+
+    def sample_once(self):
+        """采样一次所有线程的调用栈"""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own_ident = threading.get_ident()
+
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            labels, reentrant = self._walk(frame)
+            thread_name = names.get(ident, f"thread-{ident}").replace(';', '_')
+            self.stacks[';'.join([thread_name] + labels)] += 1
+            for label in reentrant:
+                self.reentrant[label] += 1
+        self.samples += 1
+
+    def _run(self):
+        next_sample = time.perf_counter()
+        while not self._stop_event.is_set():
+            self.sample_once()
+            # 按固定节拍采样，采样本身的耗时不累积到间隔中
+            next_sample += self.interval
+            delay = next_sample - time.perf_counter()
+            if delay <= 0:
+                next_sample = time.perf_counter()
+                delay = 0
+            self._stop_event.wait(delay)
+
+    def start(self) -> 'SamplingProfiler':
+        """开始采样"""
+        if self._thread is None:
+            self.started_at = time.perf_counter()
+            self._thread = threading.Thread(target=self._run, name="SamplingProfiler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """停止采样并写入折叠栈文件"""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        self.elapsed = time.perf_counter() - self.started_at
+        if self.output_path:
+            self.write(self.output_path)
+
+    def write(self, path: Path):
+        """写入折叠栈文件（每行：由外到内以分号分隔的栈帧 采样次数）"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+        os.replace(tmp_path, path)
+
+    def format_summary(self, top: int = 10) -> str:
+        """采样概况：每个线程的采样数、最耗时的叶子函数和界面重入热点"""
+        lines = [f"采样 {self.samples} 次，间隔 {self.interval * 1000:.1f} 毫秒，持续 {self.elapsed:.1f} 秒"]
+
+        threads = Counter()
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')
+            threads[frames[0]] += count
+            leaves[frames[-1]] += count
+
+        lines.append("线程采样数:")
+        lines.extend(f"  {name}: {count}" for name, count in threads.most_common())
+        lines.append(f"最常出现的栈顶函数（前{top}）:")
+        lines.extend(f"  {count:>6}  {label}" for label, count in leaves.most_common(top))
+        if self.reentrant:
+            lines.append("界面更新重入（同一调用栈中多次出现）:")
+            lines.extend(f"  {count:>6}  {label}" for label, count in self.reentrant.most_common(top))
+        return "\n".join(lines)
+
+    def __enter__(self) -> 'SamplingProfiler':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+def create_profiler(value: Optional[str] = None, interval_ms: Optional[float] = None) -> Optional[SamplingProfiler]:
+    """
+    按参数或环境变量创建采样分析器
+
+    Args:
+        value: 输出路径，"1"表示应用程序目录下的默认文件；None时读取环境变量
+        interval_ms: 采样间隔（毫秒）；None时读取环境变量
+
+    Returns:
+        未开启时返回None
+    """
+    value = value or os.environ.get(PROFILE_ENV)
+    if not value or value in ("0", "false", "off"):
+        return None
+    if value in ("1", "true", "on"):
+        value = str(_get_application_path() / PROFILE_FILE_NAME)
+
+    if interval_ms is None:
+        try:
+            interval_ms = float(os.environ.get(PROFILE_INTERVAL_ENV, ""))
+        except ValueError:
+            interval_ms = DEFAULT_INTERVAL * 1000
+
+    return SamplingProfiler(Path(value), interval=max(interval_ms, 0.5) / 1000)
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+阶段调度模块 - 按依赖关系并发执行安装阶段
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+
+# 阶段状态
+STATUS_PENDING = 'pending'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+STATUS_SKIPPED = 'skipped'
+
+# 资源类型
+RESOURCE_NETWORK = 'network'
+RESOURCE_DISK = 'disk'
+RESOURCE_INSTALLER = 'installer'
+
+# 默认资源容量：安装程序同一时间只能运行一个
+DEFAULT_RESOURCE_LIMITS = {
+    RESOURCE_NETWORK: 3,
+    RESOURCE_DISK: 2,
+    RESOURCE_INSTALLER: 1,
+}
+
+
+class Stage:
+    """安装阶段"""
+
+    def __init__(self, name: str, action: Callable, depends_on: Iterable[str] = (),
+                 resources: Iterable[str] = (), priority: int = 0,
+                 requires_success: bool = True, after: Iterable[str] = (),
+                 shared_resources: Iterable[str] = (), description: str = ""):
+        """
+        初始化安装阶段
+
+        Args:
+            name: 阶段名称（唯一）
+            action: 阶段执行函数，返回None或False视为失败
+            depends_on: 依赖的阶段名称
+            resources: 执行时占用的资源
+            priority: 优先级，同时就绪时数值大的先执行
+            requires_success: 是否要求依赖全部成功，否则依赖结束即可执行
+            after: 仅约束执行顺序的阶段，结束即可（不要求成功，不存在则忽略）
+            shared_resources: 共享占用的资源，可与其他共享占用者同时执行，
+                              但不能与独占该资源的阶段同时执行
+            description: 阶段描述
+        """
+        self.name = name
+        self.action = action
+        self.depends_on = list(depends_on)
+        self.resources = list(resources)
+        self.priority = priority
+        self.requires_success = requires_success
+        self.after = list(after)
+        self.shared_resources = list(shared_resources)
+        self.description = description or name
+
+
+class StageResult:
+    """阶段执行结果"""
+
+    def __init__(self, status: str = STATUS_PENDING):
+        self.status = status
+        self.value = None
+        self.error: Optional[BaseException] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def duration(self) -> float:
+        """执行耗时（秒）"""
+        if self.started_at is None or self.finished_at is None:
+            return 0.0
+        return self.finished_at - self.started_at
+
+    @property
+    def finished(self) -> bool:
+        """是否已结束"""
+        return self.status in (STATUS_DONE, STATUS_FAILED, STATUS_SKIPPED)
+
+
+class StageScheduler:
+    """阶段调度器 - 依赖满足且资源空闲的阶段交给线程池执行"""
+
+    def __init__(self, max_workers: int = 4, resource_limits: Optional[Dict[str, int]] = None,
+                 poll_callback: Optional[Callable] = None, stage_callback: Optional[Callable] = None,
+                 poll_interval: float = 0.05):
+        """
+        初始化阶段调度器
+
+        Args:
+            max_workers: 工作线程数
+            resource_limits: 资源容量，未声明的资源容量为1
+            poll_callback: 等待期间在调用线程上周期执行的回调（用于保持UI响应）
+            stage_callback: 阶段结束回调 (stage, result) -> None，在调用线程上执行
+            poll_interval: 等待轮询间隔（秒）
+        """
+        self.max_workers = max_workers
+        self.resource_limits = dict(DEFAULT_RESOURCE_LIMITS)
+        if resource_limits:
+            self.resource_limits.update(resource_limits)
+        self.poll_callback = poll_callback
+        self.stage_callback = stage_callback
+        self.poll_interval = poll_interval
+
+        self._stages: Dict[str, Stage] = {}
+        self._results: Dict[str, StageResult] = {}
+        self._order: List[str] = []
+        self._resources_in_use: Dict[str, int] = {}
+        self._exclusive_in_use: Dict[str, int] = {}
+        # 已在调用线程上处理完结束回调的阶段，后续阶段只依据这里判断依赖是否结束
+        self._settled = set()
+        self._lock = threading.RLock()
+        self._completed = queue.Queue()
+
+    def add_stage(self, stage: Stage):
+        """添加阶段，运行期间也可以由其他阶段动态添加"""
+        with self._lock:
+            if stage.name in self._stages:
+                raise ValueError(f"阶段名称重复: {stage.name}")
+            self._stages[stage.name] = stage
+            self._results[stage.name] = StageResult()
+            self._order.append(stage.name)
+
+    def has_stage(self, name: str) -> bool:
+        """是否存在指定阶段"""
+        with self._lock:
+            return name in self._stages
+
+    def get_result(self, name: str) -> Optional[StageResult]:
+        """获取阶段结果"""
+        with self._lock:
+            return self._results.get(name)
+
+    def get_value(self, name: str, default=None):
+        """获取已成功阶段的返回值"""
+        result = self.get_result(name)
+        if result and result.status == STATUS_DONE:
+            return result.value
+        return default
+
+    @property
+    def results(self) -> Dict[str, StageResult]:
+        """所有阶段结果（按添加顺序）"""
+        with self._lock:
+            return {name: self._results[name] for name in self._order}
+
+    def _resources_available(self, stage: Stage) -> bool:
+        """检查阶段所需资源是否空闲"""
+        for resource in stage.resources:
+            limit = self.resource_limits.get(resource, 1)
+            if self._resources_in_use.get(resource, 0) >= limit:
+                return False
+        for resource in stage.shared_resources:
+            if self._exclusive_in_use.get(resource, 0) > 0:
+                return False
+        return True
+
+    def _acquire_resources(self, stage: Stage):
+        for resource in stage.resources:
+            self._resources_in_use[resource] = self._resources_in_use.get(resource, 0) + 1
+            self._exclusive_in_use[resource] = self._exclusive_in_use.get(resource, 0) + 1
+        for resource in stage.shared_resources:
+            self._resources_in_use[resource] = self._resources_in_use.get(resource, 0) + 1
+
+    def _release_resources(self, stage: Stage):
+        for resource in stage.resources:
+            self._resources_in_use[resource] -= 1
+            self._exclusive_in_use[resource] -= 1
+        for resource in stage.shared_resources:
+            self._resources_in_use[resource] -= 1
+
+    def _skip(self, name: str, reason: str):
+        """将阶段标记为跳过"""
+        result = self._results[name]
+        result.status = STATUS_SKIPPED
+        result.error = RuntimeError(reason)
+        result.started_at = result.finished_at = time.time()
+        self._completed.put(name)
+
+    def _collect_ready(self) -> List[Stage]:
+        """找出依赖已满足的阶段，依赖失败的阶段直接跳过"""
+        ready = []
+        for name in self._order:
+            result = self._results[name]
+            if result.status != STATUS_PENDING:
+                continue
+
+            stage = self._stages[name]
+            if any(dep not in self._settled for dep in stage.depends_on):
+                continue
+            if any(prev in self._stages and prev not in self._settled for prev in stage.after):
+                continue
+
+            if stage.requires_success:
+                failed_deps = [dep for dep in stage.depends_on
+                               if self._results[dep].status != STATUS_DONE]
+                if failed_deps:
+                    self._skip(name, f"依赖阶段未成功: {', '.join(failed_deps)}")
+                    continue
+
+            ready.append(stage)
+
+        ready.sort(key=lambda s: s.priority, reverse=True)
+        return ready
+
+    def _execute(self, stage: Stage):
+        """在工作线程中执行阶段"""
+        result = self._results[stage.name]
+        try:
+            value = stage.action()
+            result.value = value
+            result.status = STATUS_FAILED if value is None or value is False else STATUS_DONE
+        except Exception as e:
+            result.error = e
+            result.status = STATUS_FAILED
+        finally:
+            result.finished_at = time.time()
+            self._completed.put(stage.name)
+
+    def _dispatch(self, pool: ThreadPoolExecutor, running: set):
+        """提交所有可执行的阶段"""
+        for stage in self._collect_ready():
+            if len(running) >= self.max_workers:
+                break
+            if not self._resources_available(stage):
+                continue
+
+            self._acquire_resources(stage)
+            result = self._results[stage.name]
+            result.status = STATUS_RUNNING
+            result.started_at = time.time()
+            running.add(stage.name)
+            pool.submit(self._execute, stage)
+
+    def _skip_unresolvable(self):
+        """没有运行中的阶段时，剩余阶段的依赖无法满足（缺失或循环依赖）"""
+        for name in self._order:
+            if self._results[name].status == STATUS_PENDING:
+                self._skip(name, "依赖阶段不存在或存在循环依赖")
+
+    def run(self) -> Dict[str, StageResult]:
+        """
+        执行所有阶段直到全部结束
+
+        Returns:
+            阶段名称到执行结果的映射
+        """
+        running = set()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while True:
+                with self._lock:
+                    self._dispatch(pool, running)
+                    has_pending = any(r.status == STATUS_PENDING for r in self._results.values())
+                    if not running and self._completed.empty():
+                        if not has_pending:
+                            break
+                        self._skip_unresolvable()
+
+                try:
+                    name = self._completed.get(timeout=self.poll_interval)
+                except queue.Empty:
+                    if self.poll_callback:
+                        self.poll_callback()
+                    continue
+
+                with self._lock:
+                    stage = self._stages[name]
+                    result = self._results[name]
+                    self._settled.add(name)
+                    if name in running:
+                        running.discard(name)
+                        self._release_resources(stage)
+
+                if self.stage_callback:
+                    self.stage_callback(stage, result)
+                if self.poll_callback:
+                    self.poll_callback()
+
+        return self.results
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+暂存解压模块 - 先把ZIP完整解压到目标目录旁的暂存目录，再用重命名替换顶层文件和目录
+
+解压中断时目标目录保持旧版本；替换前写入替换记录，替换中断（断电、进程被结束）时，
+下次运行按记录继续完成替换，不会留下新旧文件混杂的目录。被替换的旧版本移到备份目录，
+可以立即回滚；每个包使用独立的暂存目录，多个包可以同时解压。
+按条目或分块增量更新时暂存目录中只写入有变化的文件，其余文件从旧版本链接过来
+
+目标目录下的临时目录:
+    .kouri-staging-<包名>/     解压中的新版本
+    .kouri-backup-<包名>/      上一版本（回滚用）
+    .kouri-backup-<包名>.json  当前版本的顶层名称（回滚时移除上一版本没有的项）
+    .kouri-swap-<包名>.json    替换记录（存在时表示替换未完成）
+"""
+
+import json
+import os
+import re
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+
+# 暂存目录、备份目录和替换记录的名称前缀
+STAGING_PREFIX = ".kouri-staging-"
+BACKUP_PREFIX = ".kouri-backup-"
+JOURNAL_PREFIX = ".kouri-swap-"
+JOURNAL_SUFFIX = ".json"
+# 替换期间暂时保留的更早一个版本的备份，替换失败时恢复
+PREVIOUS_BACKUP_SUFFIX = ".previous"
+
+# 同一目标目录的替换和回滚依次进行（解压本身可以并行）
+_target_locks: Dict[str, threading.Lock] = {}
+_target_locks_lock = threading.Lock()
+
+
+def _target_lock(target_dir: Path) -> threading.Lock:
+    key = os.path.normcase(str(Path(target_dir).absolute()))
+    with _target_locks_lock:
+        return _target_locks.setdefault(key, threading.Lock())
+
+
+def _exists(path: Path) -> bool:
+    return os.path.lexists(path)
+
+
+def _remove(path: Path):
+    """删除文件或目录（不存在时忽略）"""
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    elif _exists(path):
+        os.unlink(path)
+
+
+class StagedTree:
+    """一个包在目标目录中的暂存解压和替换"""
+
+    def __init__(self, target_dir: Path, package_name: str):
+        """
+        初始化暂存解压
+
+        Args:
+            target_dir: 解压目标目录
+            package_name: 包名称（区分同一目录中不同包的暂存目录）
+        """
+        key = re.sub(r'[^\w.-]', '_', package_name)
+        self.target_dir = Path(target_dir)
+        self.staging_dir = self.target_dir / (STAGING_PREFIX + key)
+        self.backup_dir = self.target_dir / (BACKUP_PREFIX + key)
+        self.journal_path = self.target_dir / (JOURNAL_PREFIX + key + JOURNAL_SUFFIX)
+        self.names_path = self.backup_dir.with_name(self.backup_dir.name + JOURNAL_SUFFIX)
+        self._previous_backup = self.backup_dir.with_name(self.backup_dir.name + PREVIOUS_BACKUP_SUFFIX)
+
+    def prepare(self) -> Path:
+        """
+        完成上次中断的替换并清理残留的暂存目录
+
+        Returns:
+            空的暂存目录
+        """
+        self.recover()
+        _remove(self.staging_dir)
+        # 写入到一半的记录（写入完成前中断，替换尚未开始）
+        for path in (self.journal_path, self.names_path):
+            _remove(path.with_name(path.name + ".tmp"))
+        self.staging_dir.mkdir(parents=True)
+        return self.staging_dir
+
+    def discard(self):
+        """放弃暂存的新版本（解压失败时），目标目录不受影响"""
+        try:
+            _remove(self.staging_dir)
+        except OSError:
+            pass
+
+    def carry_over(self, exclude: Iterable[Path] = ()) -> int:
+        """
+        把旧版本中不在暂存目录里的文件（用户数据、运行时生成的文件、增量更新时未变化的文件等）
+        链接到暂存目录，替换后仍然保留；同一卷上使用硬链接，不能链接时复制
+
+        Args:
+            exclude: 不保留的旧文件（上一版本压缩包中有、新版本中已删除的文件）
+
+        Returns:
+            保留的文件数
+        """
+        excluded = {os.path.normcase(os.path.relpath(path, self.target_dir)) for path in exclude}
+        kept = 0
+        for name in os.listdir(self.staging_dir):
+            old_root = self.target_dir / name
+            new_root = self.staging_dir / name
+            if not old_root.is_dir() or old_root.is_symlink() or not new_root.is_dir():
+                continue
+            for dirpath, dirnames, filenames in os.walk(old_root):
+                relative = os.path.relpath(dirpath, old_root)
+                new_dir = new_root / relative
+                if not new_dir.is_dir():
+                    if _exists(new_dir):
+                        # 新版本中同名的是文件，旧目录中的内容不再保留
+                        dirnames[:] = []
+                        continue
+                    new_dir.mkdir(parents=True)
+                for filename in filenames:
+                    source = os.path.join(dirpath, filename)
+                    destination = new_dir / filename
+                    if _exists(destination):
+                        continue
+                    if excluded and os.path.normcase(os.path.relpath(source, self.target_dir)) in excluded:
+                        continue
+                    try:
+                        os.link(source, destination, follow_symlinks=False)
+                    except OSError:
+                        shutil.copy2(source, destination, follow_symlinks=False)
+                    kept += 1
+        return kept
+
+    def commit(self, removed: Iterable[str] = ()) -> List[str]:
+        """
+        用暂存目录中的顶层文件和目录替换目标目录中的同名项，旧版本移到备份目录
+
+        先写入替换记录（包括原有备份是否已移开）再移动备份和逐项重命名，任何一步中断都能按记录继续；
+        重命名失败（如文件被占用）时撤销已替换的项并抛出异常，目标目录和原有的备份保持不变
+
+        Args:
+            removed: 新版本中已删除的顶层名称（只移到备份目录，不替换）
+
+        Returns:
+            替换的顶层名称
+
+        Raises:
+            OSError: 替换失败
+        """
+        names = sorted(os.listdir(self.staging_dir))
+        removed = sorted(set(removed) - set(names))
+        with _target_lock(self.target_dir):
+            self._settle_previous()
+            previous = _exists(self.backup_dir)
+            self._write_journal(names, previous, removed)
+            self._move_previous(previous)
+            try:
+                self._swap(names, removed)
+            except OSError:
+                self._undo(names, removed)
+                _remove(self.backup_dir)
+                if _exists(self._previous_backup):
+                    os.rename(self._previous_backup, self.backup_dir)
+                self.journal_path.unlink()
+                raise
+            self._write_names(self.names_path, names)
+            self.journal_path.unlink()
+            _remove(self._previous_backup)
+        try:
+            self.staging_dir.rmdir()
+        except OSError:
+            pass
+        return names
+
+    def recover(self) -> bool:
+        """
+        按替换记录完成上次中断的替换（暂存目录在写入记录前已完整解压，继续替换即可）
+
+        Returns:
+            是否有中断的替换
+        """
+        with _target_lock(self.target_dir):
+            if not self.journal_path.is_file():
+                self._settle_previous()
+                return False
+            try:
+                with open(self.journal_path, 'r', encoding='utf-8') as f:
+                    journal = json.load(f)
+                names = journal["names"]
+            except (OSError, ValueError, KeyError):
+                names = None
+            if names is None:
+                # 记录不完整（写入记录前中断），替换尚未开始
+                self.journal_path.unlink()
+                self._settle_previous()
+                return False
+            self._move_previous(journal.get("previous", False))
+            self._swap(names, journal.get("removed", []))
+            self._write_names(self.names_path, names)
+            self.journal_path.unlink()
+            _remove(self._previous_backup)
+        return True
+
+    def rollback(self) -> bool:
+        """
+        换回备份的上一版本，当前版本移到暂存目录后删除
+
+        Returns:
+            是否已回滚（没有备份时返回False）
+        """
+        self.recover()
+        if not self.backup_dir.is_dir():
+            return False
+        with _target_lock(self.target_dir):
+            names = sorted(os.listdir(self.backup_dir))
+            try:
+                with open(self.names_path, 'r', encoding='utf-8') as f:
+                    current_names = json.load(f)["names"]
+            except (OSError, ValueError, KeyError):
+                current_names = []
+            _remove(self.staging_dir)
+            self.staging_dir.mkdir(parents=True)
+            for name in sorted(set(names) | set(current_names)):
+                current = self.target_dir / name
+                if _exists(current):
+                    os.rename(current, self.staging_dir / name)
+            for name in names:
+                os.rename(self.backup_dir / name, self.target_dir / name)
+            self.backup_dir.rmdir()
+            if _exists(self.names_path):
+                self.names_path.unlink()
+        self.discard()
+        return True
+
+    def _write_journal(self, names: List[str], previous: bool, removed: List[str] = ()):
+        self._write_names(self.journal_path, names, previous=previous, removed=list(removed))
+
+    def _move_previous(self, previous: bool):
+        """把原有的备份移开并创建新的备份目录（已移开的跳过）"""
+        if previous and not _exists(self._previous_backup) and _exists(self.backup_dir):
+            os.rename(self.backup_dir, self._previous_backup)
+        self.backup_dir.mkdir(exist_ok=True)
+
+    def _settle_previous(self):
+        """
+        处理没有替换记录时残留的更早备份：备份目录不存在时说明替换失败后未来得及恢复，换回备份目录；
+        否则是替换完成后未来得及删除，直接删除
+        """
+        if not _exists(self._previous_backup):
+            return
+        if _exists(self.backup_dir):
+            _remove(self._previous_backup)
+        else:
+            os.rename(self._previous_backup, self.backup_dir)
+
+    @staticmethod
+    def _write_names(path: Path, names: List[str], **extra):
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"names": names, **extra}, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _swap(self, names: List[str], removed: List[str] = ()):
+        """逐项替换：目标中的旧项移到备份目录，再把暂存的新项移到目标（已替换的项跳过）；
+        新版本中已删除的项只移到备份目录"""
+        for name in names:
+            staged = self.staging_dir / name
+            if not _exists(staged):
+                continue
+            current = self.target_dir / name
+            if _exists(current):
+                os.rename(current, self.backup_dir / name)
+            os.rename(staged, current)
+        for name in removed:
+            current = self.target_dir / name
+            if _exists(current) and not _exists(self.backup_dir / name):
+                os.rename(current, self.backup_dir / name)
+
+    def _undo(self, names: List[str], removed: List[str] = ()):
+        """撤销部分完成的替换"""
+        for name in removed:
+            current = self.target_dir / name
+            old = self.backup_dir / name
+            if _exists(old) and not _exists(current):
+                os.rename(old, current)
+        for name in names:
+            staged = self.staging_dir / name
+            current = self.target_dir / name
+            old = self.backup_dir / name
+            if not _exists(staged) and _exists(current):
+                os.rename(current, staged)
+            if _exists(old) and not _exists(current):
+                os.rename(old, current)
+
+
+def recover_interrupted(target_dir: Path) -> int:
+    """
+    完成目标目录中所有中断的替换
+
+    Returns:
+        完成的替换数
+    """
+    target_dir = Path(target_dir)
+    if not target_dir.is_dir():
+        return 0
+    recovered = 0
+    for journal in target_dir.glob(JOURNAL_PREFIX + "*" + JOURNAL_SUFFIX):
+        key = journal.name[len(JOURNAL_PREFIX):-len(JOURNAL_SUFFIX)]
+        if StagedTree(target_dir, key).recover():
+            recovered += 1
+    return recovered
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+系统访问模块 - 封装系统检查用到的注册表、文件和命令访问，便于替换和模拟
+"""
+
+import os
+import subprocess
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .pe_version import read_file_version
+
+
+# 注册表根键名称
+HKEY_CURRENT_USER = 'HKCU'
+HKEY_LOCAL_MACHINE = 'HKLM'
+
+# 命令执行默认超时（秒）
+DEFAULT_COMMAND_TIMEOUT = 10
+
+
+class SystemAccess:
+    """系统访问 - 直接访问当前系统"""
+
+    def _open_root(self, root: str):
+        import winreg
+        return {
+            HKEY_CURRENT_USER: winreg.HKEY_CURRENT_USER,
+            HKEY_LOCAL_MACHINE: winreg.HKEY_LOCAL_MACHINE,
+        }[root]
+
+    def read_registry_value(self, root: str, subkey: str, name: str) -> Optional[Tuple[object, int]]:
+        """
+        读取注册表值
+
+        Returns:
+            (值, 类型)，不存在时返回None
+        """
+        try:
+            import winreg
+            with winreg.OpenKey(self._open_root(root), subkey) as key:
+                return winreg.QueryValueEx(key, name)
+        except (ImportError, OSError):
+            return None
+
+    def enum_registry_subkeys(self, root: str, subkey: str) -> List[str]:
+        """枚举注册表子键名称，键不存在时返回空列表"""
+        try:
+            import winreg
+            names = []
+            with winreg.OpenKey(self._open_root(root), subkey) as key:
+                i = 0
+                while True:
+                    try:
+                        names.append(winreg.EnumKey(key, i))
+                        i += 1
+                    except OSError:
+                        break
+            return names
+        except (ImportError, OSError):
+            return []
+
+    def path_exists(self, path: str) -> bool:
+        """检查路径是否存在"""
+        return os.path.exists(path)
+
+    def expand_vars(self, path: str) -> str:
+        """展开路径中的环境变量"""
+        return os.path.expandvars(path)
+
+    def read_file_version(self, path: str) -> Optional[str]:
+        """读取可执行文件的文件版本号，没有版本资源时返回None"""
+        return read_file_version(path)
+
+    def run_command(self, cmd, shell: bool = False,
+                    timeout: float = DEFAULT_COMMAND_TIMEOUT) -> Optional[Tuple[int, str]]:
+        """
+        执行命令
+
+        Returns:
+            (返回码, 标准输出)，命令无法执行或超时返回None
+        """
+        try:
+            result = subprocess.run(cmd,
+                                    capture_output=True,
+                                    text=True,
+                                    shell=shell,
+                                    timeout=timeout,
+                                    creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
+            return result.returncode, result.stdout
+        except (OSError, subprocess.SubprocessError):
+            return None
+
+    def is_admin(self) -> bool:
+        """检查是否具有管理员权限"""
+        try:
+            import ctypes
+            return ctypes.windll.shell32.IsUserAnAdmin() != 0
+        except:
+            return False
+
+
+class StaticSystemAccess(SystemAccess):
+    """静态系统访问 - 返回预设数据，用于非Windows环境的测试和基准测试"""
+
+    def __init__(self, registry_values: Optional[Dict[Tuple[str, str, str], Tuple[object, int]]] = None,
+                 registry_subkeys: Optional[Dict[Tuple[str, str], List[str]]] = None,
+                 files: Optional[List[str]] = None,
+                 file_versions: Optional[Dict[str, str]] = None,
+                 commands: Optional[Dict[str, Tuple[int, str]]] = None,
+                 env: Optional[Dict[str, str]] = None,
+                 admin: bool = True,
+                 latency: float = 0.0):
+        """
+        初始化静态系统访问
+
+        Args:
+            registry_values: (根键, 子键, 值名称) -> (值, 类型)
+            registry_subkeys: (根键, 子键) -> 子键名称列表
+            files: 存在的文件路径
+            file_versions: 文件路径 -> 文件版本号
+            commands: 命令字符串 -> (返回码, 标准输出)，未列出的命令视为无法执行
+            env: 展开路径时使用的环境变量
+            admin: 是否具有管理员权限
+            latency: 每次访问的模拟耗时（秒）
+        """
+        self.registry_values = dict(registry_values or {})
+        self.registry_subkeys = dict(registry_subkeys or {})
+        self.files = set(files or [])
+        self.file_versions = dict(file_versions or {})
+        self.commands = dict(commands or {})
+        self.env = dict(env or {})
+        self.admin = admin
+        self.latency = latency
+        self.calls: List[str] = []
+
+    def _access(self, kind: str):
+        self.calls.append(kind)
+        if self.latency:
+            time.sleep(self.latency)
+
+    def read_registry_value(self, root: str, subkey: str, name: str) -> Optional[Tuple[object, int]]:
+        self._access('registry')
+        return self.registry_values.get((root, subkey, name))
+
+    def enum_registry_subkeys(self, root: str, subkey: str) -> List[str]:
+        self._access('registry')
+        return list(self.registry_subkeys.get((root, subkey), []))
+
+    def path_exists(self, path: str) -> bool:
+        self._access('file')
+        return path in self.files
+
+    def read_file_version(self, path: str) -> Optional[str]:
+        self._access('file')
+        return self.file_versions.get(path)
+
+    def expand_vars(self, path: str) -> str:
+        for name, value in self.env.items():
+            path = path.replace(f"%{name}%", value)
+        return path
+
+    def run_command(self, cmd, shell: bool = False,
+                    timeout: float = DEFAULT_COMMAND_TIMEOUT) -> Optional[Tuple[int, str]]:
+        self._access('command')
+        key = cmd if isinstance(cmd, str) else ' '.join(cmd)
+        return self.commands.get(key)
+
+    def is_admin(self) -> bool:
+        return self.admin
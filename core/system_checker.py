@@ -4,24 +4,57 @@
 系统检查模块 - 负责检查系统环境和已安装软件
 """
 
-import subprocess
 import re
-import winreg
-import os
-from typing import Tuple, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+
+from .env_source import EnvironmentSource
+from .python_discovery import PythonDiscovery
+from .system_access import SystemAccess, HKEY_CURRENT_USER
+from .metrics import get_registry
+from .tracing import get_tracer
+
+
+# 检测项名称
+PROBE_PYTHON = 'python'
+PROBE_WECHAT = 'wechat'
+PROBE_ADMIN = 'admin'
+
+_metrics = get_registry()
+PROBE_LATENCY = _metrics.histogram("probe_latency_seconds", "系统检测项耗时（秒）")
+PROBE_LOOKUPS = _metrics.counter("probe_lookups_total", "检测结果缓存命中和未命中次数")
 
 
 class SystemChecker:
-    """系统检查器"""
+    """系统检查器 - 各检测项并发执行一次，结果缓存到显式失效为止"""
     
-    def __init__(self, progress_callback=None):
+    def __init__(self, progress_callback=None, access: Optional[SystemAccess] = None,
+                 env_source: Optional[EnvironmentSource] = None):
         """
         初始化系统检查器
         
         Args:
             progress_callback: 进度回调函数
+            access: 系统访问对象，默认直接访问当前系统
+            env_source: 环境数据源（查找PATH中的Python），默认按平台选择
         """
         self.progress_callback = progress_callback
+        self.access = access or SystemAccess()
+        self.python_discovery = PythonDiscovery(self.access, env_source)
+
+        self._probes = {
+            PROBE_PYTHON: self._detect_python_version,
+            PROBE_WECHAT: self._detect_wechat_version,
+            PROBE_ADMIN: self.access.is_admin,
+        }
+        self._results: Dict[str, object] = {}
+        # 检测到合适版本时的可执行文件路径：检测项名称 -> 路径
+        self._installed_paths: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        # 同一检测项同时只执行一次，其他调用者等待并复用结果
+        self._probe_locks = {name: threading.Lock() for name in self._probes}
     
     def _log(self, message: str):
         """日志记录"""
@@ -29,169 +62,202 @@ class SystemChecker:
             self.progress_callback('detail', message)
         else:
             print(message)
+
+    def probe(self, name: str, refresh: bool = False):
+        """
+        获取检测项结果，已缓存时直接返回
+
+        Args:
+            name: 检测项名称
+            refresh: 是否忽略缓存重新检测
+        """
+        with self._probe_locks[name]:
+            if not refresh:
+                with self._lock:
+                    if name in self._results:
+                        PROBE_LOOKUPS.inc(probe=name, result="hit")
+                        return self._results[name]
+
+            PROBE_LOOKUPS.inc(probe=name, result="miss")
+            start = time.perf_counter()
+            with get_tracer().span(f"probe:{name}"):
+                result = self._probes[name]()
+            PROBE_LATENCY.observe(time.perf_counter() - start, probe=name)
+            with self._lock:
+                self._results[name] = result
+            return result
+
+    def probe_all(self, names: Optional[Iterable[str]] = None) -> Dict[str, object]:
+        """
+        并发执行检测项（已缓存的直接复用）
+
+        Args:
+            names: 检测项名称，默认全部
+
+        Returns:
+            检测项名称到结果的映射
+        """
+        names = list(names or self._probes)
+        with ThreadPoolExecutor(max_workers=len(names)) as pool:
+            futures = {name: pool.submit(self.probe, name) for name in names}
+        return {name: future.result() for name, future in futures.items()}
+
+    def invalidate(self, *names: str):
+        """使检测结果失效（如安装软件后），不指定名称时全部失效"""
+        with self._lock:
+            if not names:
+                self._results.clear()
+                self._installed_paths.clear()
+            for name in names:
+                self._results.pop(name, None)
+                self._installed_paths.pop(name, None)
+
+    def get_cached(self, name: str):
+        """获取已缓存的检测结果，未检测时返回None"""
+        with self._lock:
+            return self._results.get(name)
+
+    def get_installed_path(self, name: str) -> Optional[str]:
+        """
+        检测到合适版本时对应的可执行文件路径（记录到安装清单，下次运行时只需确认文件仍然存在）
+
+        Returns:
+            文件路径，未检测、版本不合适或无法确定文件位置时返回None
+        """
+        with self._lock:
+            return self._installed_paths.get(name)
+
+    def _set_installed_path(self, name: str, path: Optional[str]):
+        with self._lock:
+            if path:
+                self._installed_paths[name] = path
+            else:
+                self._installed_paths.pop(name, None)
+
+    def snapshot(self) -> Dict[str, object]:
+        """当前所有已缓存检测结果的副本"""
+        with self._lock:
+            return dict(self._results)
     
     def check_python_version(self) -> Tuple[bool, bool, Optional[str]]:
         """
-        检查Python版本
+        检查Python版本（使用缓存结果）
         
         Returns:
             Tuple[已安装合适版本, 环境变量正确, 版本信息]
         """
+        return self.probe(PROBE_PYTHON)
+
+    def check_wechat_version(self) -> Tuple[bool, Optional[str]]:
+        """
+        检查微信版本（使用缓存结果）
+        
+        Returns:
+            Tuple[版本符合要求, 版本信息]
+        """
+        return self.probe(PROBE_WECHAT)
+
+    def check_admin_privileges(self) -> bool:
+        """检查管理员权限（使用缓存结果）"""
+        return self.probe(PROBE_ADMIN)
+    
+    @staticmethod
+    def _is_suitable_python(version) -> bool:
+        """Python版本是否符合要求（3.x且不高于3.11）"""
+        return bool(version) and version[0] == 3 and len(version) > 1 and version[1] <= 11
+    
+    def _detect_python_version(self) -> Tuple[bool, bool, Optional[str]]:
+        """检测Python版本：从文件元数据读取各解释器版本，只执行一次最终确认"""
         self._log("正在检查Python安装状态...")
         
         python_version = None
         python_in_path = False
+        version_suitable = False
+        installed_path = None
         
-        # 检查命令行Python
-        try:
-            result = subprocess.run(["python", "--version"], 
-                                   capture_output=True, 
-                                   text=True, 
-                                   creationflags=subprocess.CREATE_NO_WINDOW)
-            
-            if result.returncode == 0:
-                python_in_path = True
-                version_output = result.stdout.strip()
-                match = re.search(r'Python (\d+\.\d+\.\d+)', version_output)
-                if match:
-                    python_version = match.group(1)
-                    self._log(f"检测到系统已安装Python版本：{python_version}")
-        except Exception as e:
-            self._log(f"检测Python版本时发生错误，将继续尝试其他检测方法")
+        interpreters = self.python_discovery.discover()
+        path_interpreters = [i for i in interpreters if i.in_path]
         
-        # 判断版本是否符合要求
-        version_suitable = False
-        if python_version:
-            try:
-                major, minor, _ = map(int, python_version.split('.'))
-                if major == 3 and minor <= 11:
+        # PATH中的第一个解释器就是 python 命令实际使用的解释器
+        if path_interpreters:
+            primary = path_interpreters[0]
+            if self.python_discovery.confirm(primary):
+                python_in_path = True
+                python_version = primary.version_string
+                self._log(f"检测到系统已安装Python版本：{python_version}（{primary.path}）")
+                
+                if self._is_suitable_python(primary.version):
                     version_suitable = True
+                    installed_path = primary.path
                     self._log(f"当前Python版本 {python_version} 符合要求")
                 else:
                     self._log(f"当前Python版本 {python_version} 不符合要求，将安装Python 3.11")
-            except ValueError:
-                self._log(f"无法解析Python版本字符串: {python_version}")
+            else:
+                self._log(f"PATH中的Python无法正常执行: {primary.path}")
         
-        # 检查注册表
+        # 检查注册表和默认安装目录中的其他解释器
         if not python_version:
-            self._log("未从命令行检测到Python，正在检查注册表...")
-            try:
-                python_keys = []
-                
-                # 检查HKEY_CURRENT_USER
-                try:
-                    with winreg.OpenKey(winreg.HKEY_CURRENT_USER, r"Software\Python\PythonCore") as key:
-                        i = 0
-                        while True:
-                            try:
-                                version = winreg.EnumKey(key, i)
-                                python_keys.append(version)
-                                i += 1
-                            except WindowsError:
-                                break
-                except WindowsError:
-                    pass
-                
-                # 检查HKEY_LOCAL_MACHINE
-                try:
-                    with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, r"Software\Python\PythonCore") as key:
-                        i = 0
-                        while True:
-                            try:
-                                version = winreg.EnumKey(key, i)
-                                if version not in python_keys:
-                                    python_keys.append(version)
-                                i += 1
-                            except WindowsError:
-                                break
-                except WindowsError:
-                    pass
-                
-                # 检查符合要求的版本
-                for version in python_keys:
-                    try:
-                        major, minor = map(int, version.split('.'))
-                        if major == 3 and minor <= 11:
-                            version_suitable = True
-                            python_version = version
-                            self._log(f"从注册表检测到Python版本：{version}，符合要求")
-                            break
-                    except ValueError:
-                        continue
-            except Exception as e:
-                self._log("检查Python注册表信息时发生错误，将继续后续安装步骤")
+            self._log("未从命令行检测到Python，正在检查注册表和安装目录...")
+            for interpreter in interpreters:
+                if not interpreter.in_path and self._is_suitable_python(interpreter.version):
+                    version_suitable = True
+                    python_version = interpreter.version_string
+                    installed_path = interpreter.path
+                    self._log(f"从{interpreter.source_label}检测到Python版本：{python_version}（{interpreter.path}），符合要求")
+                    break
         
+        self._set_installed_path(PROBE_PYTHON, installed_path)
         return version_suitable, python_in_path, python_version
     
-    def check_wechat_version(self) -> Tuple[bool, Optional[str]]:
-        """
-        检查微信版本
-        
-        Returns:
-            Tuple[版本符合要求, 版本信息]
-        """
+    def _detect_wechat_version(self) -> Tuple[bool, Optional[str]]:
+        """检测微信版本"""
         self._log("正在检查微信安装状态...")
         
         wechat_version = None
         version_suitable = False
+        installed_path = None
         
         # 可能的微信安装路径
         possible_paths = [
-            os.path.expandvars(r"%ProgramFiles%\Tencent\WeChat\WeChat.exe"),
-            os.path.expandvars(r"%ProgramFiles(x86)%\Tencent\WeChat\WeChat.exe"),
-            os.path.expandvars(r"%APPDATA%\Tencent\WeChat\WeChat.exe"),
-            os.path.expandvars(r"%LOCALAPPDATA%\Tencent\WeChat\WeChat.exe"),
+            self.access.expand_vars(r"%ProgramFiles%\Tencent\WeChat\WeChat.exe"),
+            self.access.expand_vars(r"%ProgramFiles(x86)%\Tencent\WeChat\WeChat.exe"),
+            self.access.expand_vars(r"%APPDATA%\Tencent\WeChat\WeChat.exe"),
+            self.access.expand_vars(r"%LOCALAPPDATA%\Tencent\WeChat\WeChat.exe"),
         ]
         
         # 检查注册表
-        try:
-            with winreg.OpenKey(winreg.HKEY_CURRENT_USER, r"Software\Tencent\WeChat") as key:
-                try:
-                    raw_version, reg_type = winreg.QueryValueEx(key, "Version")
-                    self._log(f"从注册表检测到微信原始版本值：{raw_version}，类型：{reg_type}")
-                    
-                    if isinstance(raw_version, int):
-                        # 解析DWORD格式版本号
-                        major = (raw_version >> 24) & 0xFF
-                        minor = (raw_version >> 16) & 0xFF
-                        patch = (raw_version >> 8) & 0xFF
-                        build = raw_version & 0xFF
-                        
-                        if major > 10:
-                            major = 3
-                        
-                        wechat_version = f"{major}.{minor}.{patch}.{build}"
-                        self._log(f"解析微信版本号：{raw_version} → {wechat_version}")
-                    else:
-                        wechat_version = str(raw_version)
-                        self._log(f"从注册表检测到微信版本：{wechat_version}")
-                except WindowsError:
-                    pass
-        except WindowsError:
-            pass
+        registry_value = self.access.read_registry_value(HKEY_CURRENT_USER, r"Software\Tencent\WeChat", "Version")
+        if registry_value:
+            raw_version, reg_type = registry_value
+            self._log(f"从注册表检测到微信原始版本值：{raw_version}，类型：{reg_type}")
+            
+            if isinstance(raw_version, int):
+                # 解析DWORD格式版本号
+                major = (raw_version >> 24) & 0xFF
+                minor = (raw_version >> 16) & 0xFF
+                patch = (raw_version >> 8) & 0xFF
+                build = raw_version & 0xFF
+                
+                if major > 10:
+                    major = 3
+                
+                wechat_version = f"{major}.{minor}.{patch}.{build}"
+                self._log(f"解析微信版本号：{raw_version} → {wechat_version}")
+            else:
+                wechat_version = str(raw_version)
+                self._log(f"从注册表检测到微信版本：{wechat_version}")
         
         # 从文件属性获取版本
         if not wechat_version:
             self._log("在注册表中未找到微信版本信息，尝试从文件属性获取...")
             for path in possible_paths:
-                if os.path.exists(path):
-                    try:
-                        escaped_path = path.replace("\\", "\\\\")
-                        cmd = f'wmic datafile where name="{escaped_path}" get Version /value'
-                        result = subprocess.run(cmd, 
-                                               capture_output=True, 
-                                               text=True, 
-                                               shell=True,
-                                               creationflags=subprocess.CREATE_NO_WINDOW)
-                        
-                        if result.returncode == 0:
-                            match = re.search(r'Version=(.+)', result.stdout)
-                            if match:
-                                wechat_version = match.group(1).strip()
-                                self._log(f"从文件属性检测到微信版本：{wechat_version}")
-                                break
-                    except Exception as e:
-                        self._log(f"读取微信版本信息时发生错误: {e}")
+                # 直接读取exe的版本资源，不再为每个路径启动wmic
+                version = self.access.read_file_version(path)
+                if version:
+                    wechat_version = version
+                    installed_path = path
+                    self._log(f"从文件属性检测到微信版本：{wechat_version}")
+                    break
         
         # 判断版本是否符合要求
         if wechat_version:
@@ -213,12 +279,8 @@ class SystemChecker:
                 self._log(f"解析微信版本字符串时发生错误，视为符合要求")
                 version_suitable = True
         
+        if version_suitable and not installed_path:
+            # 版本来自注册表时，以默认安装位置中存在的WeChat.exe作为依据
+            installed_path = next((path for path in possible_paths if self.access.path_exists(path)), None)
+        self._set_installed_path(PROBE_WECHAT, installed_path if version_suitable else None)
         return version_suitable, wechat_version
-    
-    def check_admin_privileges(self) -> bool:
-        """检查管理员权限"""
-        try:
-            import ctypes
-            return ctypes.windll.shell32.IsUserAnAdmin() != 0
-        except:
-            return False
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+追踪模块 - 记录安装流程各环节的嵌套耗时区间（span），
+输出JSON-lines追踪文件和按环节汇总的耗时表，可选上传到收集服务
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import unicodedata
+import urllib.request
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+# 环境变量：设置为1时写入默认追踪文件，设置为路径时写入该文件
+TRACE_ENV = "KOURI_TRACE"
+# 环境变量：追踪上传地址（不设置则不上传）
+TRACE_UPLOAD_ENV = "KOURI_TRACE_UPLOAD"
+
+# 默认追踪文件名（位于应用程序目录）
+TRACE_FILE_NAME = "install_trace.jsonl"
+
+# 上传超时时间（秒）
+UPLOAD_TIMEOUT = 10
+
+# 区间结果
+OUTCOME_OK = 'ok'
+OUTCOME_FAILED = 'failed'    # 操作返回失败
+OUTCOME_ERROR = 'error'      # 抛出异常
+
+
+def _get_application_path() -> Path:
+    """获取应用程序路径"""
+    if getattr(sys, 'frozen', False):
+        return Path(sys.executable).parent
+    return Path(os.path.abspath(__file__)).parent.parent
+
+
+def _display_width(text: str) -> int:
+    """终端显示宽度（中文字符占两列）"""
+    return sum(2 if unicodedata.east_asian_width(ch) in ('W', 'F') else 1 for ch in text)
+
+
+def _format_row(values, widths) -> str:
+    """第一列左对齐，其余右对齐"""
+    cells = []
+    for i, (value, width) in enumerate(zip(values, widths)):
+        text = str(value)
+        padding = " " * max(0, width - _display_width(text))
+        cells.append(text + padding if i == 0 else padding + text)
+    return "".join(cells)
+
+
+class Span:
+    """一个耗时区间，作为上下文管理器使用，退出时结束"""
+
+    def __init__(self, tracer: 'Tracer', name: str, parent: Optional['Span'], attrs: Dict):
+        self.tracer = tracer
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attrs = dict(attrs)
+        self.bytes = 0
+        self.outcome = OUTCOME_OK
+        self.start = time.time()
+        self.duration: Optional[float] = None
+        self.thread = threading.current_thread().name
+        self._start_perf = time.perf_counter()
+
+    def set(self, **attrs) -> 'Span':
+        """设置属性"""
+        self.attrs.update(attrs)
+        return self
+
+    def add_bytes(self, count: int) -> 'Span':
+        """累加处理的字节数"""
+        self.bytes += count
+        return self
+
+    def fail(self, reason: str = "") -> 'Span':
+        """标记操作失败（未抛出异常的失败）"""
+        self.outcome = OUTCOME_FAILED
+        if reason:
+            self.attrs['reason'] = reason
+        return self
+
+    def end(self):
+        """结束区间并记录，重复调用无效"""
+        if self.duration is None:
+            self.duration = time.perf_counter() - self._start_perf
+            self.tracer._finish(self)
+
+    def to_dict(self) -> Dict:
+        return {
+            'trace_id': self.tracer.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': round(self.start, 6),
+            'duration': round(self.duration or 0.0, 6),
+            'thread': self.thread,
+            'outcome': self.outcome,
+            'bytes': self.bytes,
+            'attrs': self.attrs,
+        }
+
+    def __enter__(self) -> 'Span':
+        self.tracer._push(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.outcome = OUTCOME_ERROR
+            self.attrs['error'] = f"{exc_type.__name__}: {exc}"
+        self.tracer._pop(self)
+        self.end()
+        return False
+
+
+class _NullSpan:
+    """没有活动区间时current_span()返回的空对象，调用方无需判断"""
+
+    def set(self, **attrs):
+        return self
+
+    def add_bytes(self, count: int):
+        return self
+
+    def fail(self, reason: str = ""):
+        return self
+
+
+class Tracer:
+    """追踪器 - 每次运行一个实例，区间在内存中汇总并按需写入文件"""
+
+    def __init__(self, trace_path: Optional[Path] = None, upload_url: Optional[str] = None):
+        """
+        初始化追踪器
+
+        Args:
+            trace_path: JSON-lines追踪文件路径，None时只在内存中汇总
+            upload_url: 追踪上传地址
+        """
+        self.trace_id = uuid.uuid4().hex
+        self.trace_path = Path(trace_path) if trace_path else None
+        self.upload_url = upload_url
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._root: Optional[Span] = None
+        self._file = None
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _push(self, span: Span):
+        self._stack().append(span)
+
+    def _pop(self, span: Span):
+        stack = self._stack()
+        if span in stack:
+            stack.remove(span)
+
+    def current(self) -> Optional[Span]:
+        """当前线程最内层的活动区间"""
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def span(self, name: str, parent: Optional[Span] = None, root: bool = False, **attrs) -> Span:
+        """
+        创建区间（配合with使用）
+
+        其他线程中创建的顶层区间挂在根区间下，阶段线程中的操作也能归入同一次运行
+
+        Args:
+            name: 区间名称（同类操作使用相同名称，便于汇总）
+            parent: 父区间，默认为当前线程的活动区间或根区间
+            root: 是否作为本次运行的根区间
+            **attrs: 区间属性
+        """
+        if parent is None and not root:
+            parent = self.current() or self._root
+        span = Span(self, name, parent, attrs)
+        if root:
+            self._root = span
+        return span
+
+    def _finish(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+            if span is self._root:
+                self._root = None
+            if self.trace_path is None:
+                return
+            try:
+                if self._file is None:
+                    self.trace_path.parent.mkdir(parents=True, exist_ok=True)
+                    self._file = open(self.trace_path, 'a', encoding='utf-8')
+                # 逐行写入并刷新，进程异常退出时也保留已结束的区间
+                self._file.write(json.dumps(span.to_dict(), ensure_ascii=False) + "\n")
+                self._file.flush()
+            except OSError:
+                self.trace_path = None
+
+    def summary_rows(self) -> List[Dict]:
+        """按区间名称汇总：次数、总耗时、最长耗时、字节数、失败次数"""
+        rows: Dict[str, Dict] = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            row = rows.setdefault(span.name, {'name': span.name, 'count': 0, 'total': 0.0,
+                                              'max': 0.0, 'bytes': 0, 'failed': 0, 'first_start': span.start})
+            row['count'] += 1
+            row['total'] += span.duration or 0.0
+            row['max'] = max(row['max'], span.duration or 0.0)
+            row['bytes'] += span.bytes
+            row['failed'] += span.outcome != OUTCOME_OK
+            row['first_start'] = min(row['first_start'], span.start)
+        return sorted(rows.values(), key=lambda r: r['first_start'])
+
+    def format_summary(self) -> str:
+        """生成按环节汇总的耗时表"""
+        widths = (18, 6, 12, 10, 10, 6)
+        header = ("环节", "次数", "总耗时(s)", "最长(s)", "数据(MB)", "失败")
+        lines = [_format_row(header, widths)]
+        for row in self.summary_rows():
+            lines.append(_format_row((row['name'], row['count'], f"{row['total']:.2f}", f"{row['max']:.2f}",
+                                      f"{row['bytes'] / 1024 / 1024:.1f}", row['failed']), widths))
+        return "\n".join(lines)
+
+    def upload(self, url: Optional[str] = None, timeout: float = UPLOAD_TIMEOUT) -> bool:
+        """
+        以JSON-lines格式上传所有已结束的区间
+
+        Args:
+            url: 上传地址，默认使用初始化时的地址
+
+        Returns:
+            上传是否成功
+        """
+        url = url or self.upload_url
+        if not url:
+            return False
+
+        with self._lock:
+            body = "".join(json.dumps(span.to_dict(), ensure_ascii=False) + "\n" for span in self.spans)
+        try:
+            req = urllib.request.Request(url, data=body.encode('utf-8'), method='POST')
+            req.add_header('Content-Type', 'application/x-ndjson')
+            req.add_header('X-Trace-Id', self.trace_id)
+            with urllib.request.urlopen(req, timeout=timeout) as response:
+                return 200 <= response.status < 300
+        except Exception:
+            return False
+
+    def close(self):
+        """关闭追踪文件"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def _create_tracer(trace_path: Optional[str], upload_url: Optional[str]) -> Tracer:
+    if trace_path in ("1", "true", "on"):
+        trace_path = str(_get_application_path() / TRACE_FILE_NAME)
+    return Tracer(Path(trace_path) if trace_path else None, upload_url)
+
+
+def configure_tracing(trace_path: Optional[str] = None, upload_url: Optional[str] = None) -> Tracer:
+    """
+    创建全局追踪器（替换已有的追踪器）
+
+    Args:
+        trace_path: 追踪文件路径，"1"表示应用程序目录下的默认文件，None表示不写文件
+        upload_url: 追踪上传地址
+    """
+    global _tracer
+    with _tracer_lock:
+        if _tracer is not None:
+            _tracer.close()
+        _tracer = _create_tracer(trace_path, upload_url)
+        return _tracer
+
+
+def get_tracer() -> Tracer:
+    """获取全局追踪器，首次调用时按环境变量配置"""
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = _create_tracer(os.environ.get(TRACE_ENV) or None,
+                                         os.environ.get(TRACE_UPLOAD_ENV) or None)
+    return _tracer
+
+
+def current_span():
+    """当前线程的活动区间，没有时返回空对象"""
+    return get_tracer().current() or _NullSpan()
@@ -0,0 +1,458 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ZIP中央目录模块 - 以列存储方式读取ZIP中央目录，供解压和增量比较使用
+
+zipfile为每个条目创建ZipInfo对象，条目数达到几十万（打包的虚拟环境、模型文件）时，
+打开压缩包就要占用大量内存和时间；这里内存映射压缩包，把条目解析到array列中
+（数据偏移、压缩/原始大小、CRC、压缩方式、文件名位置），所有文件名保存在一个bytes中，
+解压时按列读取，不为每个条目创建对象
+
+也可以解析通过Range请求下载的中央目录（远程ZIP索引）
+"""
+
+import mmap
+import os
+import struct
+import zipfile
+import zlib
+from array import array
+from collections import namedtuple
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+# 中央目录结束记录
+_END_RECORD = struct.Struct("<4s4H2LH")
+_END_SIGNATURE = b"PK\x05\x06"
+# ZIP64中央目录结束记录及其定位记录
+_END_RECORD64 = struct.Struct("<4sQ2H2L4Q")
+_END_SIGNATURE64 = b"PK\x06\x06"
+_END_LOCATOR64 = struct.Struct("<4sLQL")
+_END_LOCATOR_SIGNATURE64 = b"PK\x06\x07"
+# 中央目录条目和本地文件头
+_CENTRAL_HEADER = struct.Struct("<4s4B4HL2L5H2L")
+_CENTRAL_SIGNATURE = b"PK\x01\x02"
+_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+_LOCAL_SIGNATURE = b"PK\x03\x04"
+_ZIP64_EXTRA_ID = 0x0001
+
+# 结束记录之后的注释最长64KB，查找结束记录时从文件末尾读取的长度
+END_SEARCH_SIZE = _END_RECORD.size + 0xFFFF
+
+# 解压时每次处理的压缩数据量
+EXTRACT_BLOCK_SIZE = 1024 * 1024
+
+# 保存的中央目录文件：标识、中央目录偏移、条目数、前附加数据长度，之后是中央目录原始数据
+_SAVED_HEADER = struct.Struct("<4s3Q")
+_SAVED_MAGIC = b"KZD1"
+
+# 条目标志位：加密、文件名为UTF-8
+_FLAG_ENCRYPTED = 0x1
+_FLAG_UTF8 = 0x800
+
+CentralDirectoryInfo = namedtuple("CentralDirectoryInfo", "offset size count concat")
+
+
+def find_central_directory(buffer, buffer_offset: int, archive_size: int) -> CentralDirectoryInfo:
+    """
+    在压缩包末尾的数据中查找中央目录的位置
+
+    Args:
+        buffer: 压缩包从 buffer_offset 到文件末尾的数据
+        buffer_offset: buffer在压缩包中的起始位置
+        archive_size: 压缩包大小
+
+    Returns:
+        中央目录在压缩包中的偏移、长度、条目数，以及压缩包前附加数据的长度（自解压程序等）
+
+    Raises:
+        zipfile.BadZipFile: 没有找到结束记录
+    """
+    # 出错时也释放对内存映射的引用，否则映射无法关闭
+    with memoryview(buffer) as view:
+        search_from = max(0, len(view) - END_SEARCH_SIZE)
+        position = bytes(view[search_from:]).rfind(_END_SIGNATURE)
+        while position >= 0:
+            end = search_from + position
+            if end + _END_RECORD.size <= len(view):
+                record = _END_RECORD.unpack_from(view, end)
+                # 注释长度与结束记录到文件末尾的长度一致时才是真正的结束记录
+                if end + _END_RECORD.size + record[7] == len(view):
+                    break
+            position = bytes(view[search_from:search_from + position]).rfind(_END_SIGNATURE)
+        else:
+            raise zipfile.BadZipFile("没有找到ZIP中央目录结束记录")
+
+        count, size, offset = record[4], record[5], record[6]
+        record_start = end
+        locator = end - _END_LOCATOR64.size
+        if locator >= 0 and bytes(view[locator:locator + 4]) == _END_LOCATOR_SIGNATURE64:
+            # 与zipfile相同，ZIP64结束记录紧挨在定位记录之前（定位记录中的偏移不含前附加数据）
+            end64 = locator - _END_RECORD64.size
+            if end64 < 0 or bytes(view[end64:end64 + 4]) != _END_SIGNATURE64:
+                raise zipfile.BadZipFile("ZIP64结束记录不完整")
+            record64 = _END_RECORD64.unpack_from(view, end64)
+            count, size, offset = record64[7], record64[8], record64[9]
+            record_start = end64
+
+        concat = buffer_offset + record_start - size - offset
+        if concat < 0 or offset + concat + size > archive_size:
+            raise zipfile.BadZipFile("ZIP中央目录位置无效")
+        return CentralDirectoryInfo(offset, size, count, concat)
+
+
+class ZipDirectory:
+    """ZIP中央目录（列存储）"""
+
+    def __init__(self):
+        # 本地文件头在压缩包中的位置（已加上前附加数据的长度）
+        self.header_offsets = array('Q')
+        self.compressed_sizes = array('Q')
+        self.file_sizes = array('Q')
+        self.crcs = array('I')
+        self.methods = array('H')
+        self.flags = array('H')
+        # 文件名在 self.names_blob 中的位置和长度
+        self.name_starts = array('Q')
+        self.name_lengths = array('H')
+        self.names_blob = b""
+
+        self.info: Optional[CentralDirectoryInfo] = None
+        self.path: Optional[Path] = None
+        self._file = None
+        self._map: Optional[mmap.mmap] = None
+        self._zipfile: Optional[zipfile.ZipFile] = None
+        self._name_index: Optional[Dict[bytes, int]] = None
+        # 解压时已创建的目录（每个目录只创建一次）
+        self._made_dirs = set()
+
+    @classmethod
+    def parse(cls, buffer, buffer_offset: int, info: CentralDirectoryInfo) -> 'ZipDirectory':
+        """
+        解析中央目录
+
+        Args:
+            buffer: 包含整个中央目录的数据
+            buffer_offset: buffer在压缩包中的起始位置
+            info: find_central_directory() 的结果
+
+        Raises:
+            zipfile.BadZipFile: 中央目录损坏
+        """
+        directory = cls()
+        with memoryview(buffer) as view:
+            position = info.offset + info.concat - buffer_offset
+            end = position + info.size
+            if position < 0 or end > len(view):
+                raise zipfile.BadZipFile("中央目录数据不完整")
+
+            header_size = _CENTRAL_HEADER.size
+            unpack = _CENTRAL_HEADER.unpack_from
+            names = bytearray()
+            for _ in range(info.count):
+                if position + header_size > end:
+                    raise zipfile.BadZipFile("中央目录条目数与长度不符")
+                header = unpack(view, position)
+                if header[0] != _CENTRAL_SIGNATURE:
+                    raise zipfile.BadZipFile("中央目录条目签名错误")
+                name_length, extra_length, comment_length = header[12], header[13], header[14]
+                name_start = position + header_size
+                compressed_size, file_size, header_offset = header[10], header[11], header[18]
+
+                if 0xFFFFFFFF in (compressed_size, file_size, header_offset):
+                    compressed_size, file_size, header_offset = _read_zip64_extra(
+                        bytes(view[name_start + name_length:name_start + name_length + extra_length]),
+                        compressed_size, file_size, header_offset)
+
+                directory.header_offsets.append(header_offset + info.concat)
+                directory.compressed_sizes.append(compressed_size)
+                directory.file_sizes.append(file_size)
+                directory.crcs.append(header[9])
+                directory.methods.append(header[6])
+                directory.flags.append(header[5])
+                directory.name_starts.append(len(names))
+                directory.name_lengths.append(name_length)
+                names += view[name_start:name_start + name_length]
+                position = name_start + name_length + extra_length + comment_length
+
+        directory.names_blob = bytes(names)
+        directory.info = info
+        return directory
+
+    @classmethod
+    def load(cls, path: Path) -> 'ZipDirectory':
+        """
+        读取 save_central_directory() 保存的中央目录（只能用于比较，不能解压）
+
+        Raises:
+            zipfile.BadZipFile: 文件格式错误
+        """
+        data = Path(path).read_bytes()
+        if len(data) < _SAVED_HEADER.size:
+            raise zipfile.BadZipFile("中央目录文件不完整")
+        magic, offset, count, concat = _SAVED_HEADER.unpack_from(data)
+        if magic != _SAVED_MAGIC:
+            raise zipfile.BadZipFile("不是中央目录文件")
+        info = CentralDirectoryInfo(offset, len(data) - _SAVED_HEADER.size, count, concat)
+        return cls.parse(data, offset + concat - _SAVED_HEADER.size, info)
+
+    @classmethod
+    def open(cls, path: Path) -> 'ZipDirectory':
+        """
+        内存映射本地压缩包并解析中央目录（之后可直接解压条目，用完需close）
+
+        Raises:
+            zipfile.BadZipFile: 不是有效的ZIP文件
+        """
+        f = open(path, 'rb')
+        try:
+            size = os.fstat(f.fileno()).st_size
+            if size < _END_RECORD.size:
+                raise zipfile.BadZipFile("文件过小，不是ZIP文件")
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            f.close()
+            raise
+        try:
+            directory = cls.parse(mapped, 0, find_central_directory(mapped, 0, size))
+        except BaseException:
+            mapped.close()
+            f.close()
+            raise
+        directory.path = Path(path)
+        directory._file = f
+        directory._map = mapped
+        return directory
+
+    def close(self):
+        """释放内存映射（Windows下映射未释放时无法删除压缩包）"""
+        if self._zipfile is not None:
+            self._zipfile.close()
+            self._zipfile = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> 'ZipDirectory':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.header_offsets)
+
+    def save(self, path: Path):
+        """保存中央目录（从内存映射中复制原始数据），供下次升级时比较"""
+        save_central_directory(path, self._map, 0, self.info)
+
+    def raw_name(self, index: int) -> bytes:
+        start = self.name_starts[index]
+        return self.names_blob[start:start + self.name_lengths[index]]
+
+    def name(self, index: int) -> str:
+        """条目名称（与zipfile相同：设置了UTF-8标志时按UTF-8，否则按cp437解码）"""
+        encoding = 'utf-8' if self.flags[index] & _FLAG_UTF8 else 'cp437'
+        return self.raw_name(index).decode(encoding)
+
+    def names(self) -> Iterator[str]:
+        for index in range(len(self)):
+            yield self.name(index)
+
+    def is_dir(self, index: int) -> bool:
+        return self.raw_name(index).endswith(b"/")
+
+    def total_size(self) -> int:
+        """所有条目解压后的总大小"""
+        return sum(self.file_sizes)
+
+    def index_of(self, name: str) -> Optional[int]:
+        """按名称查找条目（首次调用时建立索引）"""
+        if self._name_index is None:
+            self._name_index = {}
+            for index in range(len(self)):
+                self._name_index.setdefault(self.name(index).encode('utf-8'), index)
+        return self._name_index.get(name.encode('utf-8'))
+
+    def diff(self, other: 'ZipDirectory') -> List[int]:
+        """
+        与另一个版本的中央目录比较
+
+        Returns:
+            本目录中新增或内容变化（CRC或大小不同）的条目序号
+        """
+        changed = []
+        for index in range(len(self)):
+            old = other.index_of(self.name(index))
+            if (old is None or other.crcs[old] != self.crcs[index]
+                    or other.file_sizes[old] != self.file_sizes[index]):
+                changed.append(index)
+        return changed
+
+    def target_path(self, index: int, target_dir: Path) -> Path:
+        """
+        条目的解压路径，与zipfile.extract相同地去掉盘符、绝对路径和 ".."，不会写到目标目录之外
+        """
+        arcname = self.name(index).replace('/', os.path.sep)
+        if os.path.altsep:
+            arcname = arcname.replace(os.path.altsep, os.path.sep)
+        arcname = os.path.splitdrive(arcname)[1]
+        invalid = ('', os.path.curdir, os.path.pardir)
+        arcname = os.path.sep.join(part for part in arcname.split(os.path.sep) if part not in invalid)
+        if os.path.sep == '\\':
+            arcname = zipfile.ZipFile._sanitize_windows_name(arcname, os.path.sep)
+        return Path(target_dir) / arcname
+
+    def data_offset(self, index: int) -> int:
+        """条目压缩数据在压缩包中的位置（读取本地文件头）"""
+        return local_data_offset(self._map, self.header_offsets[index], self.name(index))
+
+    def is_supported(self, index: int) -> bool:
+        """条目能否直接解压（未加密，压缩方式为stored/deflated）"""
+        return (not self.flags[index] & _FLAG_ENCRYPTED
+                and self.methods[index] in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED))
+
+    def extract(self, index: int, target_dir: Path) -> Path:
+        """
+        解压单个条目（从内存映射中按块读取并校验CRC）
+
+        加密或使用deflate以外压缩方式的条目交给zipfile处理
+
+        Returns:
+            解压后的路径
+
+        Raises:
+            zipfile.BadZipFile: 数据损坏或CRC校验失败
+        """
+        path = self.target_path(index, target_dir)
+        if self.is_dir(index):
+            path.mkdir(parents=True, exist_ok=True)
+            return path
+
+        method = self.methods[index]
+        if not self.is_supported(index):
+            if self._zipfile is None:
+                self._zipfile = zipfile.ZipFile(self.path)
+            return Path(self._zipfile.extract(self.name(index), target_dir))
+
+        start = self.data_offset(index)
+        data = memoryview(self._map)[start:start + self.compressed_sizes[index]]
+        parent = path.parent
+        if parent not in self._made_dirs:
+            parent.mkdir(parents=True, exist_ok=True)
+            self._made_dirs.add(parent)
+        try:
+            with open(path, 'wb') as out:
+                written, crc = write_member(data, method, out)
+        finally:
+            data.release()
+        if written != self.file_sizes[index] or crc != self.crcs[index]:
+            raise zipfile.BadZipFile(f"CRC校验失败: {self.name(index)}")
+        return path
+
+
+def local_data_offset(buffer, offset: int, name: str = "") -> int:
+    """
+    读取本地文件头，返回条目压缩数据的位置
+
+    Args:
+        buffer: 包含本地文件头的数据
+        offset: 本地文件头在buffer中的位置
+        name: 条目名称（用于错误信息）
+
+    Raises:
+        zipfile.BadZipFile: 本地文件头不完整或签名错误
+    """
+    if offset < 0 or offset + _LOCAL_HEADER.size > len(buffer):
+        raise zipfile.BadZipFile(f"本地文件头不完整: {name}")
+    header = _LOCAL_HEADER.unpack_from(buffer, offset)
+    if header[0] != _LOCAL_SIGNATURE:
+        raise zipfile.BadZipFile(f"本地文件头签名错误: {name}")
+    return offset + _LOCAL_HEADER.size + header[10] + header[11]
+
+
+def save_central_directory(path: Path, buffer, buffer_offset: int, info: CentralDirectoryInfo):
+    """
+    把中央目录原始数据保存到文件（先写临时文件再替换）
+
+    Args:
+        path: 保存路径
+        buffer: 包含整个中央目录的数据
+        buffer_offset: buffer在压缩包中的起始位置
+        info: find_central_directory() 的结果
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    start = info.offset + info.concat - buffer_offset
+    tmp_path = path.with_name(path.name + ".tmp")
+    with memoryview(buffer) as view, open(tmp_path, 'wb') as f:
+        f.write(_SAVED_HEADER.pack(_SAVED_MAGIC, info.offset, info.count, info.concat))
+        f.write(view[start:start + info.size])
+    os.replace(tmp_path, path)
+
+
+def write_member(data, method: int, out) -> Tuple[int, int]:
+    """
+    解压一个条目的压缩数据并写入文件
+
+    Args:
+        data: 条目的压缩数据（bytes或memoryview）
+        method: 压缩方式（ZIP_STORED / ZIP_DEFLATED）
+        out: 输出文件
+
+    Returns:
+        (写入的字节数, CRC32)
+    """
+    written = 0
+    crc = 0
+    if method == zipfile.ZIP_STORED:
+        for position in range(0, len(data), EXTRACT_BLOCK_SIZE):
+            block = data[position:position + EXTRACT_BLOCK_SIZE]
+            out.write(block)
+            crc = zlib.crc32(block, crc)
+            written += len(block)
+        return written, crc
+
+    if method != zipfile.ZIP_DEFLATED:
+        raise NotImplementedError(f"不支持的压缩方式: {method}")
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+    try:
+        for position in range(0, len(data), EXTRACT_BLOCK_SIZE):
+            block = data[position:position + EXTRACT_BLOCK_SIZE]
+            while block:
+                output = decompressor.decompress(block, EXTRACT_BLOCK_SIZE)
+                out.write(output)
+                crc = zlib.crc32(output, crc)
+                written += len(output)
+                block = decompressor.unconsumed_tail
+        output = decompressor.flush()
+    except zlib.error as e:
+        raise zipfile.BadZipFile(f"压缩数据损坏: {e}")
+    out.write(output)
+    crc = zlib.crc32(output, crc)
+    return written + len(output), crc
+
+
+def _read_zip64_extra(extra, compressed_size: int, file_size: int, header_offset: int):
+    """从ZIP64扩展字段中读取超过4GB的大小和偏移（只包含值为0xFFFFFFFF的字段，按固定顺序）"""
+    position = 0
+    while position + 4 <= len(extra):
+        field_id, length = struct.unpack_from("<2H", extra, position)
+        if field_id == _ZIP64_EXTRA_ID:
+            values = iter(struct.unpack_from(f"<{length // 8}Q", extra, position + 4))
+            try:
+                if file_size == 0xFFFFFFFF:
+                    file_size = next(values)
+                if compressed_size == 0xFFFFFFFF:
+                    compressed_size = next(values)
+                if header_offset == 0xFFFFFFFF:
+                    header_offset = next(values)
+            except StopIteration:
+                raise zipfile.BadZipFile("ZIP64扩展字段不完整")
+            return compressed_size, file_size, header_offset
+        position += 4 + length
+    raise zipfile.BadZipFile("缺少ZIP64扩展字段")
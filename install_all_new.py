@@ -8,7 +8,8 @@
 import sys
 import ctypes
 import os
-from main_controller import InstallationController
+import argparse
+import subprocess
 
 
 def is_admin():
@@ -19,8 +20,27 @@ def is_admin():
         return False
 
 
+def parse_args(argv=None):
+    """解析命令行参数（未识别的参数忽略）"""
+    parser = argparse.ArgumentParser(description="KouriChat云端安装器")
+    parser.add_argument("--trace", nargs="?", const="1", metavar="PATH",
+                        help="记录各环节耗时追踪（JSON-lines），可指定文件路径")
+    parser.add_argument("--trace-upload", metavar="URL", help="安装结束后将追踪数据上传到该地址")
+    parser.add_argument("--profile", nargs="?", const="1", metavar="PATH",
+                        help="采样所有线程的调用栈并输出折叠栈文件（用于生成火焰图），可指定文件路径")
+    parser.add_argument("--profile-interval", type=float, metavar="MS", help="采样间隔（毫秒），默认5")
+    parser.add_argument("--metrics", nargs="?", const="1", metavar="DIR",
+                        help="退出时导出性能指标（Prometheus文本和JSON），可指定目录")
+    parser.add_argument("--peer", nargs="?", const="auto", metavar="HOST:PORT",
+                        help="优先从局域网缓存节点下载，不指定地址时通过广播查找")
+    parser.add_argument("--peer-serve", action="store_true", help="向局域网中的其他安装器提供已下载的安装包")
+    parser.add_argument("--rollback", action="store_true", help="把解压的项目目录换回上一版本后退出")
+    return parser.parse_known_args(argv)[0]
+
+
 def run_as_admin():
-    """以管理员权限重新运行程序"""
+    """以管理员权限重新运行程序（保留命令行参数）"""
+    args = subprocess.list2cmdline(sys.argv[1:])
     try:
         if getattr(sys, 'frozen', False):
             # 如果是打包后的exe文件
@@ -28,7 +48,7 @@ def run_as_admin():
                 None,
                 "runas",
                 sys.executable,
-                "",
+                args,
                 None,
                 1
             )
@@ -38,7 +58,7 @@ def run_as_admin():
                 None,
                 "runas",
                 sys.executable,
-                f'"{os.path.abspath(__file__)}"',
+                f'"{os.path.abspath(__file__)}" {args}'.rstrip(),
                 None,
                 1
             )
@@ -50,6 +70,13 @@ def run_as_admin():
 
 def main():
     """主函数"""
+    args = parse_args()
+
+    # 回滚只替换项目目录，不需要管理员权限和安装界面
+    if args.rollback:
+        from core.cloud_downloader import CloudDownloader
+        return 0 if CloudDownloader().rollback_packages() else 1
+
     # 检查管理员权限
     if not is_admin():
         print("程序需要管理员权限才能正常运行...")
@@ -64,7 +91,28 @@ def main():
 
     controller = None
 
+    # 性能指标（参数或KOURI_METRICS环境变量开启），退出时导出
+    from core.metrics import export_metrics_at_exit
+    export_metrics_at_exit(args.metrics)
+
+    # 采样分析（参数或KOURI_PROFILE环境变量开启），从导入控制器之前开始以覆盖启动过程
+    from core.sampling_profiler import create_profiler
+    profiler = create_profiler(args.profile, args.profile_interval)
+    if profiler:
+        profiler.start()
+
     try:
+        # 在获取权限之后再导入控制器，避免重启前加载tkinter等模块
+        from main_controller import InstallationController
+
+        if args.trace or args.trace_upload:
+            from core.tracing import configure_tracing
+            configure_tracing(args.trace, args.trace_upload)
+
+        if args.peer or args.peer_serve:
+            from core.peer_cache import configure_peer_cache
+            configure_peer_cache(args.peer, args.peer_serve)
+
         # 创建安装控制器
         controller = InstallationController()
 
@@ -101,6 +149,10 @@ def main():
         # 清理资源
         if controller:
             controller.cleanup()
+        if profiler:
+            profiler.stop()
+            print(profiler.format_summary())
+            print(f"折叠栈已保存到: {profiler.output_path}")
 
 
 if __name__ == "__main__":
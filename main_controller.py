@@ -7,51 +7,91 @@
 import sys
 import time
 import ctypes
+import importlib
+import queue
+import threading
+from functools import partial
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Tuple
 
-# 导入各个模块
+# 只导入窗口模块和调度器，核心模块在首次使用时才导入，保证窗口尽快显示
 from ui.progress_window import ProgressWindow
-from core.cloud_downloader import CloudDownloader
-from core.system_checker import SystemChecker
-from core.installer import SoftwareInstaller
-from core.launcher import ScriptLauncher
-from core.hot_updater import HotUpdater
+from core.stage_scheduler import (Stage, StageScheduler, RESOURCE_NETWORK, RESOURCE_DISK, RESOURCE_INSTALLER,
+                                  STATUS_DONE)
 
 
 class InstallationController:
     """安装控制器 - 负责协调整个安装流程"""
+
+    # 懒加载组件: 属性名 -> (模块路径, 类名)
+    _LAZY_COMPONENTS = {
+        'cloud_downloader': ('core.cloud_downloader', 'CloudDownloader'),
+        'system_checker': ('core.system_checker', 'SystemChecker'),
+        'installer': ('core.installer', 'SoftwareInstaller'),
+        'launcher': ('core.launcher', 'ScriptLauncher'),
+        'hot_updater': ('core.hot_updater', 'HotUpdater'),
+    }
+
+    # 组件依赖: 属性名 -> 构造参数名列表，同名组件作为参数传入，保证检测结果在各组件间共享
+    _COMPONENT_DEPENDENCIES = {
+        'installer': ('system_checker',),
+        'launcher': ('system_checker',),
+    }
+    
+    # 安装流程模式（cloud_config.json中的install_flow）
+    FLOW_GRAPH = 'graph'          # 按阶段依赖图并发执行（默认）
+    FLOW_PIPELINED = 'pipelined'  # 顺序检测，下载与安装流水线执行
+    FLOW_SERIAL = 'serial'        # 全部下载完成后再安装
     
-    def __init__(self):
-        """初始化控制器"""
-        self.progress_window = None
-        self.cloud_downloader = None
-        self.system_checker = None
-        self.installer = None
-        self.launcher = None
-        self.hot_updater = None
+    def __init__(self, progress_window=None):
+        """
+        初始化控制器
+
+        Args:
+            progress_window: 进度窗口，默认创建ProgressWindow（基准测试等无界面场景可传入替代对象）
+        """
+        self.progress_window = progress_window
+        # 组件可能在多个阶段线程中首次访问
+        self._component_lock = threading.Lock()
         
         self._setup_components()
     
+    def __getattr__(self, name: str):
+        """首次访问组件时导入对应模块并创建实例"""
+        component_spec = InstallationController._LAZY_COMPONENTS.get(name)
+        if component_spec is None:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+        # 依赖的组件在加锁前创建，避免重入
+        dependencies = {dep: getattr(self, dep)
+                        for dep in InstallationController._COMPONENT_DEPENDENCIES.get(name, ())}
+
+        with self._component_lock:
+            if name in self.__dict__:
+                return self.__dict__[name]
+
+            module_name, class_name = component_spec
+            component_class = getattr(importlib.import_module(module_name), class_name)
+            component = component_class(self._progress_callback, **dependencies)
+            setattr(self, name, component)
+            return component
+
+    def _progress_callback(self, callback_type: str, data):
+        """各模块共用的进度回调函数"""
+        if callback_type == 'progress':
+            progress, status = data
+            self.progress_window.set_progress(progress, status)
+        elif callback_type == 'detail':
+            self.progress_window.update_detail(data)
+        elif callback_type == 'heartbeat':
+            # 长时间运行的操作仍在进行，保持界面响应（非UI线程调用时忽略）
+            self.progress_window.keep_alive()
+
     def _setup_components(self):
         """设置各个组件"""
-        # 创建进度窗口
-        self.progress_window = ProgressWindow("KouriChat安装向导")
-        
-        # 创建进度回调函数
-        def progress_callback(callback_type: str, data):
-            if callback_type == 'progress':
-                progress, status = data
-                self.progress_window.set_progress(progress, status)
-            elif callback_type == 'detail':
-                self.progress_window.update_detail(data)
-        
-        # 初始化各个模块
-        self.cloud_downloader = CloudDownloader(progress_callback)
-        self.system_checker = SystemChecker(progress_callback)
-        self.installer = SoftwareInstaller(progress_callback)
-        self.launcher = ScriptLauncher(progress_callback)
-        self.hot_updater = HotUpdater(progress_callback)
+        # 创建进度窗口，其余组件在首次使用时创建
+        if self.progress_window is None:
+            self.progress_window = ProgressWindow("KouriChat安装向导")
         
         # 初始状态
         self.progress_window.set_progress(0, "正在初始化云端安装程序...")
@@ -85,7 +125,8 @@ class InstallationController:
         self.progress_window.update_detail("开始云端下载流程")
 
         try:
-            downloaded_files = self.cloud_downloader.download_packages(skip_python, skip_wechat)
+            downloaded_files = self.cloud_downloader.download_packages(skip_python, skip_wechat,
+                                                                       evidence=self._skip_evidence())
             if downloaded_files:
                 self.progress_window.update_detail(f"✓ 云端下载成功，获得 {len(downloaded_files)} 个安装包")
                 return downloaded_files
@@ -132,30 +173,40 @@ class InstallationController:
         ordered_exes = ([python_exe] if python_exe else []) + other_exes
 
         for i, exe_file in enumerate(ordered_exes):
-            # 计算进度 (从20%开始，到85%结束)
-            base_progress = 20
-            install_progress = (i / total_count) * 65
-            current_progress = base_progress + install_progress
+            if self._install_one(exe_file, i, total_count):
+                success_count += 1
+        
+        return self._report_install_result(success_count, total_count)
 
-            progress_text = f"正在处理: {exe_file.name} ({i+1}/{total_count})"
-            self.progress_window.set_progress(current_progress, progress_text)
-            self.progress_window.update_detail(f"开始处理 {exe_file.name}")
+    def _install_one(self, exe_file: Path, index: int, total_count: int) -> bool:
+        """安装单个程序，进度位于20%-85%区间"""
+        # 计算进度 (从20%开始，到85%结束)
+        base_progress = 20
+        install_progress = (index / total_count) * 65
+        current_progress = base_progress + install_progress
 
-            install_successful = self.installer.install_software(exe_file)
+        progress_text = f"正在处理: {exe_file.name} ({index+1}/{total_count})"
+        self.progress_window.set_progress(current_progress, progress_text)
+        self.progress_window.update_detail(f"开始处理 {exe_file.name}")
 
-            if install_successful:
-                success_count += 1
-                self.progress_window.update_detail(f"✓ {exe_file.name} 处理成功")
-            else:
-                self.progress_window.update_detail(f"✗ {exe_file.name} 处理失败")
+        install_successful = self.installer.install_software(exe_file)
+        self.cloud_downloader.record_install_result(exe_file.name, install_successful)
 
-            # 更新完成进度
-            completed_progress = base_progress + ((i + 1) / total_count) * 65
-            self.progress_window.set_progress(completed_progress)
+        if install_successful:
+            self.progress_window.update_detail(f"✓ {exe_file.name} 处理成功")
+        else:
+            self.progress_window.update_detail(f"✗ {exe_file.name} 处理失败")
 
-            # 确保UI保持响应
-            self.progress_window.force_update()
-        
+        # 更新完成进度
+        completed_progress = base_progress + ((index + 1) / total_count) * 65
+        self.progress_window.set_progress(completed_progress)
+
+        # 确保UI保持响应
+        self.progress_window.force_update()
+        return install_successful
+
+    def _report_install_result(self, success_count: int, total_count: int) -> bool:
+        """显示安装结果"""
         # 最终状态
         all_success = success_count == total_count
         if all_success:
@@ -174,6 +225,98 @@ class InstallationController:
                 break
         
         return all_success
+
+    def install_packages_pipelined(self, skip_python: bool = False,
+                                   skip_wechat: bool = False) -> Tuple[List[Path], bool]:
+        """
+        流水线模式下载并安装：下载线程每完成并校验一个安装程序，
+        立即通过工作队列交给安装器，其余文件继续下载
+
+        Args:
+            skip_python: 是否跳过Python安装包下载
+            skip_wechat: 是否跳过微信安装包下载
+
+        Returns:
+            Tuple[获取到的项目列表, 安装是否全部成功]
+        """
+        self.progress_window.update_detail("开始云端下载流程（流水线安装模式）")
+
+        # 预计需要安装的程序数量，用于计算20%-85%的安装进度
+        evidence = self._skip_evidence()
+        planned_exes = [p.get("name", "") for p in self.cloud_downloader.filter_packages(skip_python, skip_wechat, quiet=True,
+                                                                                          evidence=evidence)
+                        if p.get("url", "") and p.get("name", "").lower().endswith('.exe')]
+        python_pending = any("python" in name.lower() for name in planned_exes)
+        total_count = max(len(planned_exes), 1)
+
+        work_queue = queue.Queue()
+        downloaded_items: List[Path] = []
+
+        def on_package_done(package: Dict, item):
+            work_queue.put((package, item))
+
+        def download_worker():
+            try:
+                downloaded_items.extend(self.cloud_downloader.download_packages(
+                    skip_python, skip_wechat,
+                    on_package_done=on_package_done,
+                    report_progress=False,
+                    evidence=evidence))
+            except Exception as e:
+                self.progress_window.update_detail(f"✗ 云端下载错误: {str(e)}")
+            finally:
+                # 结束标记
+                work_queue.put(None)
+
+        threading.Thread(target=download_worker, name="pipeline-download", daemon=True).start()
+
+        self.progress_window.set_progress(20, "正在下载并安装...")
+
+        installed_count = 0
+        success_count = 0
+        held_exes: List[Path] = []
+
+        while True:
+            try:
+                entry = work_queue.get(timeout=0.05)
+            except queue.Empty:
+                self.progress_window.force_update()
+                continue
+
+            if entry is None:
+                # 下载全部结束，不再等待Python
+                python_pending = False
+            else:
+                package, item = entry
+                if "python" in package.get("name", "").lower():
+                    # Python下载失败时也不再阻塞其他安装程序
+                    python_pending = False
+                if item and item.is_file() and item.suffix.lower() == '.exe':
+                    held_exes.append(item)
+
+            if python_pending:
+                # 优先安装Python，其他安装程序等待Python下载完成
+                continue
+
+            ready_exes = sorted(held_exes, key=lambda f: "python" not in f.name.lower())
+            held_exes = []
+            for exe_file in ready_exes:
+                if self._install_one(exe_file, installed_count, max(total_count, installed_count + 1)):
+                    success_count += 1
+                installed_count += 1
+
+            if entry is None:
+                break
+
+        if not downloaded_items:
+            return downloaded_items, False
+
+        if not installed_count:
+            self.progress_window.set_progress(90, "没有需要安装的程序")
+            self.progress_window.update_detail("所有下载项目都是数据文件，跳过安装步骤")
+            return downloaded_items, True
+
+        return downloaded_items, self._report_install_result(success_count, installed_count)
     
     def post_install_tasks(self):
         """安装后任务"""
@@ -182,6 +325,10 @@ class InstallationController:
             self.progress_window.update_detail("Python安装/检查成功，等待环境变量生效...")
             self.installer.wait_for_python_env_vars()
 
+        return self._launch_project()
+
+    def _launch_project(self) -> bool:
+        """查找并启动项目脚本"""
         # 无论Python是否安装，都尝试查找并启动脚本
         self.progress_window.update_detail("查找并启动 run.bat 脚本...")
         if self.launcher.find_and_launch_script():
@@ -193,87 +340,441 @@ class InstallationController:
                 self.launcher.show_completion_dialog()
             return True
     
-    def run_installation(self) -> bool:
-        """运行完整的安装流程"""
+    def _stage_fetch_config(self) -> bool:
+        """阶段: 执行热更新检查并重新加载配置"""
         try:
-            # 检查管理员权限
-            if not self.check_admin_privileges():
-                return False
+            hot_update_success = self.hot_updater.perform_hot_update()
+            if hot_update_success:
+                self.progress_window.set_progress(8, "热更新检查完成")
+                self.progress_window.update_detail("✓ 热更新检查完成")
+                # 重新加载云端下载器的配置
+                self.cloud_downloader.reload_config()
+                self.progress_window.update_detail("✓ 配置已重新加载")
+            else:
+                self.progress_window.set_progress(8, "使用本地版本")
+                self.progress_window.update_detail("⚠ 热更新检查失败，继续使用本地版本")
+        except Exception as e:
+            self.progress_window.set_progress(8, "使用本地版本")
+            self.progress_window.update_detail(f"⚠ 热更新异常: {str(e)}，继续使用本地版本")
 
-            self.progress_window.update_detail("=== 开始云端自动安装程序 ===")
+        # 热更新失败不影响后续流程
+        return True
 
-            # 执行热更新检查
-            self.progress_window.set_progress(1, "检查项目包体更新...")
-            try:
-                hot_update_success = self.hot_updater.perform_hot_update()
-                if hot_update_success:
-                    self.progress_window.set_progress(8, "热更新检查完成")
-                    self.progress_window.update_detail("✓ 热更新检查完成")
-                    # 重新加载云端下载器的配置
-                    self.cloud_downloader.reload_config()
-                    self.progress_window.update_detail("✓ 配置已重新加载")
-                else:
-                    self.progress_window.set_progress(8, "使用本地版本")
-                    self.progress_window.update_detail("⚠ 热更新检查失败，继续使用本地版本")
-            except Exception as e:
-                self.progress_window.set_progress(8, "使用本地版本")
-                self.progress_window.update_detail(f"⚠ 热更新异常: {str(e)}，继续使用本地版本")
+    def _stage_probe_python(self) -> Dict:
+        """阶段: 检测Python"""
+        python_suitable, python_in_path, python_version = self.system_checker.check_python_version()
+        skip_python = python_suitable and python_in_path
 
-            # 检测系统环境，决定是否需要下载Python和微信
-            self.progress_window.set_progress(10, "检测系统环境...")
-            self.progress_window.update_detail("正在检测Python和微信安装状态")
+        if skip_python:
+            self.progress_window.update_detail(f"✓ 检测到合适的Python版本: {python_version}，跳过下载")
+        else:
+            self.progress_window.update_detail("✗ 未检测到合适的Python版本，将下载安装")
+
+        return {'skip': skip_python, 'version': python_version}
+
+    def _stage_probe_wechat(self) -> Dict:
+        """阶段: 检测微信"""
+        wechat_suitable, wechat_version = self.system_checker.check_wechat_version()
+
+        if wechat_suitable:
+            self.progress_window.update_detail(f"✓ 检测到合适的微信版本: {wechat_version}，跳过下载")
+        else:
+            self.progress_window.update_detail("✗ 未检测到合适的微信版本，将下载安装")
+
+        return {'skip': wechat_suitable, 'version': wechat_version}
+
+    def _skip_evidence(self) -> Dict[str, str]:
+        """检测到的已安装Python和微信程序文件，随跳过的包记录到安装清单"""
+        from core.system_checker import PROBE_PYTHON, PROBE_WECHAT
 
-            # 检测Python
-            python_suitable, python_in_path, python_version = self.system_checker.check_python_version()
-            skip_python = python_suitable and python_in_path
+        return {kind: self.system_checker.get_installed_path(probe)
+                for kind, probe in (("python", PROBE_PYTHON), ("wechat", PROBE_WECHAT))}
+
+    def _stage_plan_packages(self, scheduler) -> bool:
+        """阶段: 根据配置和检测结果添加各个包的下载、校验、解压和安装阶段"""
+        skip_python = (scheduler.get_value('probe_python') or {}).get('skip', False)
+        skip_wechat = (scheduler.get_value('probe_wechat') or {}).get('skip', False)
+
+        self.progress_window.set_progress(12, "准备从云端下载安装包...")
+        self.progress_window.update_detail("开始云端下载流程")
 
-            if skip_python:
-                self.progress_window.update_detail(f"✓ 检测到合适的Python版本: {python_version}，跳过下载")
+        packages = []
+        for package in self.cloud_downloader.filter_packages(skip_python, skip_wechat,
+                                                             evidence=self._skip_evidence()):
+            if not package.get("url", ""):
+                self.progress_window.update_detail(f"跳过无效的包配置: {package.get('name', '')}")
+            elif self.cloud_downloader.is_package_complete(package):
+                # 上次运行已完成的包不再添加阶段
+                self.progress_window.update_detail(f"✓ {package.get('name', '')} 已处理完成，跳过")
+                self._completed_items.append(self.cloud_downloader.get_completed_item(package))
             else:
-                self.progress_window.update_detail("✗ 未检测到合适的Python版本，将下载安装")
+                packages.append(package)
+
+        if not packages and not self._completed_items:
+            self.progress_window.update_detail("根据系统检测结果，没有需要下载的安装包")
+
+        # 完成上次中断的解压替换（按条目更新和解压都在替换完成后的目录上进行）
+        self.cloud_downloader.recover_interrupted_swaps(packages)
+
+        # 读取远程ZIP目录（缓存在下载器中），空间预检和下载阶段的按条目更新使用同一份结果
+        self.cloud_downloader.fetch_zip_indexes(packages)
+
+        # 空间不足或目录不可写时不开始任何下载
+        scheduler.add_stage(Stage('preflight', partial(self._stage_preflight, packages),
+                                  description="检查磁盘空间和目录权限"))
+        self._package_stages = self._add_package_stages(scheduler, packages)
+
+        # 环境变量等待和启动在所有包处理结束后执行
+        install_stages = [stages['install'] for stages in self._package_stages.values() if 'install' in stages]
+        terminal_stages = [stages.get('install') or stages.get('extract') or stages['verify']
+                           for stages in self._package_stages.values()]
+
+        scheduler.add_stage(Stage('env_wait', self._stage_env_wait,
+                                  depends_on=install_stages,
+                                  requires_success=False,
+                                  description="等待Python环境变量生效"))
+        scheduler.add_stage(Stage('launch', self._stage_launch,
+                                  depends_on=terminal_stages + ['preflight', 'env_wait'],
+                                  requires_success=False,
+                                  description="启动项目"))
+        return True
+
+    def _add_package_stages(self, scheduler, packages: List[Dict]) -> Dict[str, Dict[str, str]]:
+        """
+        为每个包添加阶段: 下载 -> 校验 -> 解压(ZIP) / 安装(EXE)
+
+        Returns:
+            包名称到各阶段名称的映射
+        """
+        package_stages = {}
+        python_install_stage = None
+
+        # 优先安装Python：先添加Python包，并让其他安装程序排在其后
+        ordered = sorted(packages, key=lambda p: "python" not in p.get("name", "").lower())
+
+        for package in ordered:
+            package_name = package.get("name", "")
+            is_python = "python" in package_name.lower()
+            priority = 1 if is_python else 0
+
+            stages = {
+                'download': f"download:{package_name}",
+                'verify': f"verify:{package_name}",
+            }
+            scheduler.add_stage(Stage(stages['download'],
+                                      partial(self._stage_download, package),
+                                      depends_on=['preflight'],
+                                      resources=[RESOURCE_NETWORK],
+                                      priority=priority))
+            scheduler.add_stage(Stage(stages['verify'],
+                                      partial(self._stage_verify, package, scheduler, stages['download']),
+                                      depends_on=[stages['download']],
+                                      resources=[RESOURCE_DISK],
+                                      priority=priority))
+
+            if self.cloud_downloader.needs_extract(package):
+                stages['extract'] = f"extract:{package_name}"
+                scheduler.add_stage(Stage(stages['extract'],
+                                          partial(self._stage_extract, package, scheduler, stages['verify']),
+                                          depends_on=[stages['verify']],
+                                          resources=[RESOURCE_DISK]))
+            elif package_name.lower().endswith('.exe'):
+                stages['install'] = f"install:{package_name}"
+                # 配置标记为concurrent_install的安装程序之间可以同时运行，
+                # 但不与独占安装程序的阶段同时运行
+                concurrent = bool(package.get("concurrent_install", False))
+                scheduler.add_stage(Stage(stages['install'],
+                                          partial(self._stage_install, scheduler, stages['verify']),
+                                          depends_on=[stages['verify']],
+                                          after=[python_install_stage] if python_install_stage else [],
+                                          resources=[] if concurrent else [RESOURCE_INSTALLER],
+                                          shared_resources=[RESOURCE_INSTALLER] if concurrent else [],
+                                          priority=priority))
+                if is_python:
+                    python_install_stage = stages['install']
+
+            package_stages[package_name] = stages
+
+        return package_stages
+
+    def _stage_preflight(self, packages: List[Dict]) -> bool:
+        """阶段: 下载前检查磁盘空间和目录权限（下载目录空间不足时改存到其他卷）"""
+        return self.cloud_downloader.preflight(packages)
 
-            # 检测微信
-            wechat_suitable, wechat_version = self.system_checker.check_wechat_version()
-            skip_wechat = wechat_suitable
+    def _stage_download(self, package: Dict):
+        """阶段: 下载单个包，已缓存的有效文件直接使用"""
+        if self.cloud_downloader.is_cached(package):
+            package_name = package.get("name", "")
+            self.progress_window.update_detail(f"✓ 文件已存在: {package_name}")
+            return self.cloud_downloader.local_path(package_name), True
 
-            if skip_wechat:
-                self.progress_window.update_detail(f"✓ 检测到合适的微信版本: {wechat_version}，跳过下载")
+        # ZIP包先按远程中央目录只下载有变化的条目，其次尝试分块增量更新，
+        # 两者都直接写入解压目录，后续阶段直接使用
+        target_dir = (self.cloud_downloader.download_members(package)
+                      or self.cloud_downloader.download_delta(package))
+        if target_dir:
+            return target_dir, True
+
+        local_path = self.cloud_downloader.download_package(package)
+        if local_path:
+            return local_path, False
+        return None
+
+    def _stage_verify(self, package: Dict, scheduler, download_stage: str):
+        """阶段: 校验下载的文件"""
+        local_path, cached = scheduler.get_value(download_stage)
+        if cached or self.cloud_downloader.verify_package(package, local_path):
+            return local_path
+        return None
+
+    def _stage_extract(self, package: Dict, scheduler, verify_stage: str):
+        """阶段: 解压ZIP包"""
+        local_path = scheduler.get_value(verify_stage)
+        if local_path.is_dir():
+            # 已通过增量更新组装
+            return local_path
+        return self.cloud_downloader.extract_package(package, local_path)
+
+    def _stage_install(self, scheduler, verify_stage: str) -> bool:
+        """阶段: 执行安装程序"""
+        exe_file = scheduler.get_value(verify_stage)
+        self.progress_window.update_detail(f"开始处理 {exe_file.name}")
+
+        success = self.installer.install_software(exe_file)
+        self.cloud_downloader.record_install_result(exe_file.name, success)
+        if success:
+            self.progress_window.update_detail(f"✓ {exe_file.name} 处理成功")
+            return True
+
+        self.progress_window.update_detail(f"✗ {exe_file.name} 处理失败")
+        return False
+
+    def _stage_env_wait(self) -> bool:
+        """阶段: 等待Python环境变量生效（如果Python被安装了）"""
+        if self.installer.python_installed:
+            self.progress_window.update_detail("Python安装/检查成功，等待环境变量生效...")
+            self.installer.wait_for_python_env_vars()
+        return True
+
+    def _summarize_packages(self, scheduler) -> Tuple[List[Path], int, int]:
+        """
+        汇总各个包的阶段结果
+
+        Returns:
+            Tuple[获取到的项目列表, 安装程序数量, 安装成功数量]
+        """
+        items = list(self._completed_items)
+        install_total = 0
+        install_success = 0
+
+        for stages in self._package_stages.values():
+            verified = scheduler.get_value(stages['verify'])
+            if not verified:
+                continue
+
+            if 'extract' in stages:
+                # 解压失败时仍然返回ZIP文件
+                items.append(scheduler.get_value(stages['extract']) or verified)
             else:
-                self.progress_window.update_detail("✗ 未检测到合适的微信版本，将下载安装")
+                items.append(verified)
+
+            if 'install' in stages:
+                install_total += 1
+                if scheduler.get_value(stages['install']):
+                    install_success += 1
+
+        return items, install_total, install_success
+
+    def _stage_launch(self) -> bool:
+        """阶段: 汇总结果并启动项目"""
+        if self._preflight_failed(self._scheduler):
+            self.progress_window.set_progress(0, "磁盘空间不足或目录不可写")
+            return False
+
+        items, install_total, install_success = self._summarize_packages(self._scheduler)
+
+        if not items:
+            self.progress_window.update_detail("错误: 云端下载失败，没有获取到任何文件")
+            self.progress_window.set_progress(0, "云端下载失败")
+            return False
+
+        self.progress_window.update_detail(f"云端下载完成，成功获取 {len(items)} 个项目")
+
+        if install_success < install_total:
+            self.progress_window.set_progress(90, "安装完成（部分失败）")
+            self.progress_window.update_detail(f"⚠ 安装完成: {install_success}/{install_total} 个程序成功处理")
+            return False
+
+        if install_total:
+            self.progress_window.set_progress(100, "所有程序安装完成")
+            self.progress_window.update_detail(f"✓ 安装完成: {install_success}/{install_total} 个程序成功处理")
+        else:
+            self.progress_window.set_progress(90, "没有需要安装的程序")
+            self.progress_window.update_detail("所有下载项目都是数据文件，跳过安装步骤")
+
+        self.progress_window.update_detail("所有必要的程序已成功安装或确认已存在")
+        return self._launch_project()
+
+    @staticmethod
+    def _preflight_failed(scheduler) -> bool:
+        """下载前检查是否未通过（未通过时不下载任何包，整个安装流程失败）"""
+        result = scheduler.get_result('preflight')
+        return bool(result) and result.finished and result.status != STATUS_DONE
+
+    def _on_stage_finished(self, stage, result):
+        """阶段结束回调（主线程），按包阶段完成比例更新20%-85%的进度"""
+        if stage.name.split(':', 1)[0] not in ('download', 'verify', 'extract', 'install'):
+            return
+
+        package_results = [r for name, r in self._scheduler.results.items() if ':' in name]
+        finished = sum(1 for r in package_results if r.finished)
+        progress = 20 + (finished / len(package_results)) * 65
+        self.progress_window.set_progress(progress, f"已完成 {finished}/{len(package_results)} 个安装阶段")
+
+    def _build_stage_graph(self):
+        """构建安装阶段依赖图"""
+        scheduler = StageScheduler(max_workers=6,
+                                   poll_callback=self.progress_window.force_update,
+                                   stage_callback=self._on_stage_finished)
+        self._scheduler = scheduler
+        self._package_stages = {}
+        self._completed_items = []
+
+        scheduler.add_stage(Stage('fetch_config', self._stage_fetch_config,
+                                  resources=[RESOURCE_NETWORK],
+                                  description="获取云端配置"))
+        scheduler.add_stage(Stage('probe_python', self._stage_probe_python,
+                                  description="检测Python"))
+        scheduler.add_stage(Stage('probe_wechat', self._stage_probe_wechat,
+                                  description="检测微信"))
+        scheduler.add_stage(Stage('plan', partial(self._stage_plan_packages, scheduler),
+                                  depends_on=['fetch_config', 'probe_python', 'probe_wechat'],
+                                  requires_success=False,
+                                  description="规划安装阶段"))
+        return scheduler
+
+    def _show_install_failure(self):
+        """提示部分程序安装失败"""
+        self.progress_window.update_detail("部分程序安装失败")
+        if getattr(sys, 'frozen', False):
+            try:
+                ctypes.windll.user32.MessageBoxW(
+                    0, 
+                    "部分程序安装失败，请检查详细信息", 
+                    "安装失败", 
+                    0x10
+                )
+            except:
+                pass
+
+    def _is_install_complete(self) -> bool:
+        """根据安装清单判断本地配置中的所有包是否都已处理完成"""
+        packages = [p for p in self.cloud_downloader.get_packages_info() if p.get("url", "")]
+        return bool(packages) and all(self.cloud_downloader.is_package_complete(p) for p in packages)
+
+    def _refresh_config_in_background(self):
+        """后台检查云端配置更新，新配置在下次运行时生效"""
+        from core.hot_updater import HotUpdater
+
+        updater = HotUpdater(lambda callback_type, data: None)
+        threading.Thread(target=updater.download_cloud_config, daemon=True).start()
+
+    def _run_completed_flow(self) -> bool:
+        """所有包都已处理完成：跳过检测、下载和安装，直接启动项目"""
+        self.progress_window.set_progress(90, "所有组件已安装，直接启动")
+        self.progress_window.update_detail("✓ 安装清单显示所有组件均已安装完成，跳过检测、下载和安装")
+        self._refresh_config_in_background()
+        return self._launch_project()
 
-            # 下载安装包和项目文件
+    def _run_sequential_flow(self, pipelined: bool) -> bool:
+        """
+        顺序执行热更新和环境检测，然后下载并安装
+
+        Args:
+            pipelined: 是否使用流水线模式（下载完成一个安装一个）
+        """
+        # 执行热更新检查
+        self.progress_window.set_progress(1, "检查项目包体更新...")
+        self._stage_fetch_config()
+
+        # 检测系统环境，决定是否需要下载Python和微信
+        self.progress_window.set_progress(10, "检测系统环境...")
+        self.progress_window.update_detail("正在检测Python和微信安装状态")
+        self.system_checker.probe_all()
+        skip_python = self._stage_probe_python()['skip']
+        skip_wechat = self._stage_probe_wechat()['skip']
+
+        # 下载并安装
+        if pipelined:
+            downloaded_items, install_success = self.install_packages_pipelined(skip_python, skip_wechat)
+        else:
             downloaded_items = self.download_packages(skip_python, skip_wechat)
-            if not downloaded_items:
-                self.progress_window.update_detail("错误: 云端下载失败，没有获取到任何文件")
-                self.progress_window.set_progress(0, "云端下载失败")
+            install_success = bool(downloaded_items) and self.install_packages(downloaded_items)
+
+        if not downloaded_items:
+            self.progress_window.update_detail("错误: 云端下载失败，没有获取到任何文件")
+            self.progress_window.set_progress(0, "云端下载失败")
+            return False
+
+        if not install_success:
+            self._show_install_failure()
+            return False
+
+        self.progress_window.update_detail("所有必要的程序已成功安装或确认已存在")
+        return self.post_install_tasks()
+
+    def run_installation(self) -> bool:
+        """运行完整的安装流程，结束后输出各环节耗时汇总"""
+        from core.tracing import get_tracer
+
+        tracer = get_tracer()
+        try:
+            with tracer.span("install_run", root=True) as span:
+                success = self._run_installation()
+                if not success:
+                    span.fail()
+            return success
+        finally:
+            self._report_trace(tracer)
+            self._close_window()
+
+    def _run_installation(self) -> bool:
+        """执行安装流程"""
+        try:
+            # 检查管理员权限
+            if not self.check_admin_privileges():
                 return False
 
-            # 安装软件包
-            install_success = self.install_packages(downloaded_items)
-            
-            if install_success:
-                self.progress_window.update_detail("所有必要的程序已成功安装或确认已存在")
-                
-                # 执行安装后任务
-                post_success = self.post_install_tasks()
-                
-                if not post_success and getattr(sys, 'frozen', False):
-                    self.launcher.show_completion_dialog()
-                
+            self.progress_window.update_detail("=== 开始云端自动安装程序 ===")
+
+            # 上次运行已全部完成时直接启动
+            if self._is_install_complete():
+                return self._run_completed_flow()
+
+            install_flow = self.cloud_downloader.config.get("install_flow", self.FLOW_GRAPH)
+            if install_flow in (self.FLOW_PIPELINED, self.FLOW_SERIAL):
+                return self._run_sequential_flow(pipelined=install_flow == self.FLOW_PIPELINED)
+
+            self.progress_window.set_progress(1, "检查项目包体更新，检测系统环境...")
+            self.progress_window.update_detail("正在检测Python和微信安装状态")
+
+            # 按依赖关系并发执行各个阶段：热更新与环境检测并行，
+            # 每个包下载校验完成后立即解压或安装，不等待其他包下载
+            scheduler = self._build_stage_graph()
+            scheduler.run()
+
+            launch_result = scheduler.get_result('launch')
+            if launch_result and launch_result.value:
                 return True
-            else:
-                self.progress_window.update_detail("部分程序安装失败")
-                if getattr(sys, 'frozen', False):
-                    try:
-                        ctypes.windll.user32.MessageBoxW(
-                            0, 
-                            "部分程序安装失败，请检查详细信息", 
-                            "安装失败", 
-                            0x10
-                        )
-                    except:
-                        pass
+            if self._preflight_failed(scheduler):
+                return False
+
+            items, _, _ = self._summarize_packages(scheduler)
+            if not items:
                 return False
+
+            self._show_install_failure()
+            return False
                 
         except Exception as e:
             self.progress_window.update_detail(f"安装过程中发生异常: {e}")
@@ -292,17 +793,33 @@ class InstallationController:
             
             print(f"\n安装过程中发生错误: {str(e)}")
             return False
-        finally:
-            # 确保窗口被关闭
-            if self.progress_window and not self.progress_window.closed:
-                # 给用户一点时间看结果，但保持UI响应
-                for _ in range(20):  # 2秒分成20个100ms的片段
-                    if self.progress_window and not self.progress_window.closed:
-                        self.progress_window.force_update()
-                        time.sleep(0.1)
-                    else:
-                        break
-                self.progress_window.close()
+
+    def _report_trace(self, tracer):
+        """输出各环节耗时汇总，配置了上传地址时上传追踪数据"""
+        print("\n各环节耗时汇总:")
+        print(tracer.format_summary())
+
+        if tracer.trace_path:
+            self.progress_window.update_detail(f"追踪数据已保存到: {tracer.trace_path}")
+        if tracer.upload_url:
+            if tracer.upload():
+                self.progress_window.update_detail("✓ 追踪数据已上传")
+            else:
+                self.progress_window.update_detail("⚠ 追踪数据上传失败")
+        tracer.close()
+
+    def _close_window(self):
+        """关闭进度窗口"""
+        # 确保窗口被关闭
+        if self.progress_window and not self.progress_window.closed:
+            # 给用户一点时间看结果，但保持UI响应
+            for _ in range(20):  # 2秒分成20个100ms的片段
+                if self.progress_window and not self.progress_window.closed:
+                    self.progress_window.force_update()
+                    time.sleep(0.1)
+                else:
+                    break
+            self.progress_window.close()
     
     def cleanup(self):
         """清理资源"""
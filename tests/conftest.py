@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试公用夹具 - 本地镜像服务器（基准测试中的mirror_server）和指向临时目录的下载器
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(os.path.abspath(__file__)).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(PROJECT_ROOT / "benchmarks"))
+
+from mirror_server import MirrorServer  # noqa: E402
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    """在127.0.0.1上提供 tmp_path/mirror 目录的镜像服务器"""
+    root = tmp_path / "mirror"
+    root.mkdir()
+    server = MirrorServer(str(root)).start()
+    server.root_path = root
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def make_downloader():
+    """创建安装目录和下载目录都在指定目录中的下载器（测试结束时关闭安装清单）"""
+    from core.cloud_downloader import CloudDownloader
+    from core.install_manifest import InstallManifest
+
+    created = []
+
+    def make(work_dir: Path, config: dict) -> CloudDownloader:
+        work_dir.mkdir(parents=True, exist_ok=True)
+        downloader = CloudDownloader(lambda *args: None)
+        downloader.app_path = work_dir
+        downloader.download_dir = work_dir / "downloads"
+        downloader.download_dir.mkdir(exist_ok=True)
+        downloader.manifest = InstallManifest(work_dir)
+        downloader.config = config
+        created.append(downloader)
+        return downloader
+
+    yield make
+    for downloader in created:
+        downloader.manifest.close()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+二进制补丁测试 - 生成补丁后应用得到相同的新文件，以及拒绝文件头错误、控制数据截断或损坏的补丁
+"""
+
+import bz2
+import hashlib
+import os
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(os.path.abspath(__file__)).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from core import binary_patch  # noqa: E402
+from core.binary_patch import (PATCH_HEADER_SIZE, PATCH_MAGIC, PatchError, _decode_offset,  # noqa: E402
+                               _encode_offset, apply_patch, create_patch)
+
+# 旧文件大小
+OLD_SIZE = 2 * 1024 * 1024
+
+
+def _new_version(old: bytes) -> bytes:
+    """新版本：中间插入数据、修改少量字节、删除一段并在末尾追加数据"""
+    middle = len(old) // 2
+    changed = bytearray(old[:middle] + b"release 2" * 100 + old[middle:])
+    for offset in range(100_000, 100_000 + 4096, 64):
+        changed[offset] ^= 0x01
+    del changed[1_500_000:1_520_000]
+    return bytes(changed) + random.Random(2).randbytes(10_000)
+
+
+@pytest.fixture
+def versions(tmp_path):
+    old = random.Random(1).randbytes(OLD_SIZE)
+    old_path, new_path = tmp_path / "old.bin", tmp_path / "new.bin"
+    old_path.write_bytes(old)
+    new_path.write_bytes(_new_version(old))
+    return old_path, new_path
+
+
+@pytest.mark.parametrize("by_chunks", [False, True])
+def test_round_trip(tmp_path, versions, monkeypatch, by_chunks):
+    old_path, new_path = versions
+    if by_chunks:
+        # 不使用bsdiff4，按内容分块生成
+        monkeypatch.setitem(sys.modules, "bsdiff4", None)
+    patch_path = tmp_path / "new.bin.bsdiff"
+    method = create_patch(old_path, new_path, patch_path)
+    if by_chunks:
+        assert method == "chunks"
+    # 未变化的分块不进入补丁
+    assert patch_path.stat().st_size < new_path.stat().st_size // 2
+
+    out_path = tmp_path / "patched.bin"
+    md5 = apply_patch(old_path, patch_path, out_path)
+    assert out_path.read_bytes() == new_path.read_bytes()
+    assert md5 == hashlib.md5(new_path.read_bytes()).hexdigest()
+
+
+def test_round_trip_small_blocks(tmp_path, versions, monkeypatch):
+    """补丁中的差异和新增数据跨越多个处理块"""
+    monkeypatch.setattr(binary_patch, "PATCH_BLOCK_SIZE", 1000)
+    old_path, new_path = versions
+    patch_path = tmp_path / "new.bin.bsdiff"
+    create_patch(old_path, new_path, patch_path)
+    apply_patch(old_path, patch_path, tmp_path / "patched.bin")
+    assert (tmp_path / "patched.bin").read_bytes() == new_path.read_bytes()
+
+
+def _split(patch: bytes):
+    """拆分补丁为 (新文件大小, 控制块, 差异块, 新增块)，各块为bzip2压缩数据"""
+    ctrl_length, diff_length, new_size = (_decode_offset(patch[i:i + 8]) for i in (8, 16, 24))
+    diff_start = PATCH_HEADER_SIZE + ctrl_length
+    extra_start = diff_start + diff_length
+    return new_size, patch[PATCH_HEADER_SIZE:diff_start], patch[diff_start:extra_start], patch[extra_start:]
+
+
+def _join(new_size: int, ctrl: bytes, diff: bytes, extra: bytes) -> bytes:
+    header = PATCH_MAGIC + _encode_offset(len(ctrl)) + _encode_offset(len(diff)) + _encode_offset(new_size)
+    return header + ctrl + diff + extra
+
+
+@pytest.fixture
+def patch_parts(tmp_path, versions):
+    old_path, new_path = versions
+    patch_path = tmp_path / "new.bin.bsdiff"
+    create_patch(old_path, new_path, patch_path)
+    return _split(patch_path.read_bytes())
+
+
+def _apply(tmp_path, versions, patch: bytes):
+    patch_path = tmp_path / "broken.bsdiff"
+    patch_path.write_bytes(patch)
+    return apply_patch(versions[0], patch_path, tmp_path / "out.bin")
+
+
+@pytest.mark.parametrize("header", [
+    b"",
+    b"BSDIFF40",
+    b"BSDIFF41" + bytes(24),
+    b"BSDIFF40" + _encode_offset(-1) + bytes(16),
+    b"BSDIFF40" + bytes(8) + bytes(8) + _encode_offset(-5),
+])
+def test_bad_header(tmp_path, versions, header):
+    with pytest.raises(PatchError):
+        _apply(tmp_path, versions, header)
+
+
+def test_header_longer_than_patch(tmp_path, versions, patch_parts):
+    new_size, ctrl, diff, extra = patch_parts
+    patch = _join(new_size, ctrl, diff, extra)
+    with pytest.raises(PatchError):
+        _apply(tmp_path, versions, patch[:PATCH_HEADER_SIZE + len(ctrl) // 2])
+
+
+def test_truncated_control_stream(tmp_path, versions, patch_parts):
+    new_size, ctrl, diff, extra = patch_parts
+    triples = bz2.decompress(ctrl)
+    assert len(triples) % 24 == 0 and len(triples) >= 24
+
+    # 控制数据在三元组中间结束
+    with pytest.raises(PatchError):
+        _apply(tmp_path, versions, _join(new_size, bz2.compress(triples[:-10]), diff, extra))
+    # 缺少最后一个三元组，新文件不完整
+    with pytest.raises(PatchError):
+        _apply(tmp_path, versions, _join(new_size, bz2.compress(triples[:-24]), diff, extra))
+    # bzip2流本身被截断
+    with pytest.raises(PatchError):
+        _apply(tmp_path, versions, _join(new_size, ctrl[:len(ctrl) // 2], diff, extra))
+
+
+def test_invalid_control_data(tmp_path, versions, patch_parts):
+    new_size, ctrl, diff, extra = patch_parts
+    # 三元组声明的长度超过新文件大小
+    triple = _encode_offset(new_size + 1) + _encode_offset(0) + _encode_offset(0)
+    with pytest.raises(PatchError):
+        _apply(tmp_path, versions, _join(new_size, bz2.compress(triple), diff, extra))
+    # 负的差异长度
+    triple = _encode_offset(-1) + _encode_offset(0) + _encode_offset(0)
+    with pytest.raises(PatchError):
+        _apply(tmp_path, versions, _join(new_size, bz2.compress(triple), diff, extra))
+
+
+def test_corrupt_diff_stream(tmp_path, versions, patch_parts):
+    new_size, ctrl, diff, extra = patch_parts
+    corrupt = bytearray(diff)
+    for offset in range(10, len(corrupt), 97):
+        corrupt[offset] ^= 0xFF
+    with pytest.raises(PatchError):
+        _apply(tmp_path, versions, _join(new_size, ctrl, bytes(corrupt), extra))
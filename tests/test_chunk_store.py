@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分块增量更新测试 - 检查内容切分的分块边界，以及从第一版增量升级到在大文件中间插入数据的第二版
+"""
+
+import io
+import os
+import random
+import sys
+import zipfile
+from pathlib import Path
+
+PROJECT_ROOT = Path(os.path.abspath(__file__)).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from core.chunk_store import CHUNK_MAX_SIZE, CHUNK_MIN_SIZE, chunk_digest, iter_chunks  # noqa: E402
+
+# 大文件大小
+MODEL_SIZE = 3 * 1024 * 1024
+
+# 第二版在大文件中间插入的数据
+INSERTION = b"inserted in release 2" * 16
+
+
+def _digests(data: bytes) -> list:
+    return [chunk_digest(chunk) for chunk in iter_chunks(io.BytesIO(data))]
+
+
+def test_chunk_boundaries_follow_content():
+    data = random.Random(1).randbytes(MODEL_SIZE)
+    chunks = [bytes(chunk) for chunk in iter_chunks(io.BytesIO(data))]
+    assert b"".join(chunks) == data
+    assert all(CHUNK_MIN_SIZE <= len(chunk) <= CHUNK_MAX_SIZE for chunk in chunks[:-1])
+
+    # 插入数据只影响插入位置所在的分块，其后的边界随内容一起偏移
+    middle = len(data) // 2
+    before, after = _digests(data), _digests(data[:middle] + INSERTION + data[middle:])
+    assert len(set(after) - set(before)) <= 2
+    assert after[0] == before[0] and after[-1] == before[-1]
+
+
+def _build_release(path: Path, model: bytes, version: int):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("kourichat/run.bat", b"@echo off\r\npython run.py\r\n")
+        for i in range(20):
+            zf.writestr(f"kourichat/src/file_{i:02d}.py", f"VALUE = {i * version}\n".encode() * 50)
+        zf.writestr(zipfile.ZipInfo("kourichat/data/model.bin"), model, compress_type=zipfile.ZIP_STORED)
+
+
+def test_delta_round_trip(tmp_path, mirror, make_downloader):
+    from cloud_config_manager import PackagePublisher
+
+    model = os.urandom(MODEL_SIZE)
+    middle = len(model) // 2
+    models = {1: model, 2: model[:middle] + INSERTION + model[middle:]}
+
+    configs, releases = [], []
+    for version, model_data in models.items():
+        path = tmp_path / f"kourichat-{version}.zip"
+        _build_release(path, model_data, version)
+        config = PackagePublisher(progress_callback=lambda *a: None).publish(
+            [path], {"version": str(version), "packages": []}, mirror.root_path / f"v{version}",
+            base_url=mirror.url(f"v{version}/"))
+        (mirror.root_path / f"v{version}" / path.name).write_bytes(path.read_bytes())
+        for package in config["packages"]:
+            package["extract_to"] = "project"
+        configs.append(config)
+        releases.append(path)
+
+    # 完整安装第一版
+    downloader = make_downloader(tmp_path / "app", configs[0])
+    assert len(downloader.download_packages()) == 1
+
+    # 增量升级到第二版
+    downloader = make_downloader(tmp_path / "app", configs[1])
+    package = configs[1]["packages"][0]
+    sent_before = mirror.bytes_sent
+    target_dir = downloader.download_delta(package)
+    assert target_dir == tmp_path / "app" / "project"
+
+    with zipfile.ZipFile(releases[1]) as zf:
+        for info in zf.infolist():
+            assert (target_dir / info.filename).read_bytes() == zf.read(info), info.filename
+
+    # 只下载了分块清单和插入位置附近的分块
+    assert mirror.bytes_sent - sent_before < package["size"] // 4
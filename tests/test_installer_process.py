@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+安装进程测试 - 用Python子进程模拟安装程序，检查输出读取、失败返回码、存活汇报和超时结束进程
+"""
+
+import os
+import sys
+import textwrap
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(os.path.abspath(__file__)).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from core import installer as installer_module  # noqa: E402
+from core.env_source import EnvironmentSource  # noqa: E402
+from core.installer import InstallerProcess, SoftwareInstaller  # noqa: E402
+
+pytestmark = pytest.mark.skipif(os.name == 'nt', reason="模拟安装程序使用shebang脚本，只在Linux上运行")
+
+
+def _python(script: str) -> list:
+    return [sys.executable, "-c", textwrap.dedent(script)]
+
+
+def _dummy_installer(tmp_path: Path, script: str) -> Path:
+    """生成可直接执行的模拟安装程序"""
+    path = tmp_path / "dummy-setup.exe"
+    path.write_text(f"#!{sys.executable}\n" + textwrap.dedent(script), encoding='utf-8')
+    path.chmod(0o755)
+    return path
+
+
+class _Events:
+    """记录安装器的进度回调"""
+
+    def __init__(self):
+        self.details = []
+        self.heartbeats = []
+
+    def __call__(self, callback_type, data):
+        if callback_type == 'detail':
+            self.details.append(data)
+        elif callback_type == 'heartbeat':
+            self.heartbeats.append(data)
+
+    def text(self) -> str:
+        return "\n".join(self.details)
+
+
+def _installer(events: _Events) -> SoftwareInstaller:
+    return SoftwareInstaller(events, env_source=EnvironmentSource())
+
+
+def test_output_lines_are_streamed_while_running(tmp_path):
+    received = []
+    first_lines = threading.Event()
+    release = tmp_path / "release"
+
+    def on_output(stream, line):
+        received.append((stream, line))
+        if len(received) == 2:
+            first_lines.set()
+
+    # 子进程输出前两行后一直等待，直到测试确认已收到这两行
+    process = InstallerProcess(_python(f"""
+        import os, sys, time
+        print("step 1", flush=True)
+        print("warning 1", file=sys.stderr, flush=True)
+        while not os.path.exists({str(release)!r}):
+            time.sleep(0.02)
+        print("step 2", flush=True)
+    """), encoding='utf-8', on_output=on_output)
+    process.start()
+
+    try:
+        assert first_lines.wait(30)
+        assert sorted(received) == [('stderr', 'warning 1'), ('stdout', 'step 1')]
+        assert process.is_alive()
+    finally:
+        release.touch()
+
+    assert process.wait(30)
+    assert process.returncode == 0
+    assert process.stdout == "step 1\nstep 2"
+    assert process.stderr == "warning 1"
+
+
+def test_output_keeps_only_recent_lines(monkeypatch):
+    monkeypatch.setattr(installer_module, "MAX_OUTPUT_LINES", 5)
+    process = InstallerProcess(_python("""
+        for i in range(50):
+            print(f"line {i}")
+    """), encoding='utf-8')
+    process.start()
+    assert process.wait(10)
+    assert process.stdout.splitlines() == [f"line {i}" for i in range(45, 50)]
+
+
+def test_nonzero_exit_fails_install(tmp_path):
+    exe = _dummy_installer(tmp_path, """
+        import sys
+        print("extracting")
+        print("disk full", file=sys.stderr)
+        sys.exit(3)
+    """)
+    events = _Events()
+
+    assert _installer(events).install_software(exe) is False
+    text = events.text()
+    assert "[dummy-setup.exe] extracting" in text
+    assert "[dummy-setup.exe] disk full" in text
+    assert "返回码: 3" in text
+
+
+def test_successful_install(tmp_path):
+    exe = _dummy_installer(tmp_path, """
+        print("done")
+    """)
+    events = _Events()
+
+    assert _installer(events).install_software(exe) is True
+    assert "返回码: 0" in events.text()
+
+
+def test_heartbeat_reported_while_waiting(tmp_path, monkeypatch):
+    monkeypatch.setattr(installer_module, "POLL_INTERVAL", 0.05)
+    monkeypatch.setattr(installer_module, "LIVENESS_REPORT_INTERVAL", 0.2)
+    exe = _dummy_installer(tmp_path, """
+        import time
+        time.sleep(1)
+    """)
+    events = _Events()
+
+    assert _installer(events).install_software(exe) is True
+    assert len(events.heartbeats) >= 5
+    assert all(name == "dummy-setup.exe" for name, _ in events.heartbeats)
+    elapsed = [seconds for _, seconds in events.heartbeats]
+    assert elapsed == sorted(elapsed)
+    assert any("正在安装 (PID" in detail for detail in events.details)
+
+
+def test_process_killed_on_timeout(monkeypatch):
+    monkeypatch.setattr(installer_module, "POLL_INTERVAL", 0.05)
+    events = _Events()
+    process = InstallerProcess(_python("""
+        import time
+        print("started", flush=True)
+        time.sleep(60)
+    """), encoding='utf-8')
+    process.start()
+
+    start = time.time()
+    assert _installer(events)._wait_for_process(process, "dummy-setup.exe", 0.5) is False
+    assert time.time() - start < 10
+    assert not process.is_alive()
+    assert process.returncode is not None
+
+
+def test_install_times_out(tmp_path, monkeypatch):
+    monkeypatch.setattr(installer_module, "POLL_INTERVAL", 0.05)
+    monkeypatch.setattr(installer_module, "INSTALL_TIMEOUT", 0.5)
+    exe = _dummy_installer(tmp_path, """
+        import time
+        print("waiting for user", flush=True)
+        time.sleep(60)
+    """)
+    events = _Events()
+
+    start = time.time()
+    assert _installer(events).install_software(exe) is False
+    assert time.time() - start < 10
+    text = events.text()
+    assert "安装超时" in text
+    assert "waiting for user" in text
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PE文件版本读取测试 - 生成带VS_FIXEDFILEINFO版本资源的最小PE文件，以及截断、非PE和没有版本资源的文件
+"""
+
+import os
+import struct
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(os.path.abspath(__file__)).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from core.pe_version import (FIXED_FILE_INFO_SIGNATURE, RT_VERSION, PEFormatError,  # noqa: E402
+                             clear_version_cache, parse_fixed_file_version, read_file_version)
+
+# 资源节的文件偏移和相对虚拟地址
+RAW_OFFSET = 0x200
+SECTION_RVA = 0x1000
+
+RT_ICON = 3
+
+
+def _resource_section(version, resource_type: int = RT_VERSION, signature: int = FIXED_FILE_INFO_SIGNATURE) -> bytes:
+    """资源节：类型/名称/语言三层目录、数据项和VS_VERSIONINFO"""
+    major, minor, patch, build = version
+
+    def directory(entry_id: int, offset: int) -> bytes:
+        return struct.pack('<IIHHHH', 0, 0, 0, 0, 0, 1) + struct.pack('<II', entry_id, offset)
+
+    key = "VS_VERSION_INFO\0".encode('utf-16-le')
+    fixed = struct.pack('<IIIIII', signature, 0x10000, (major << 16) | minor, (patch << 16) | build,
+                        (major << 16) | minor, (patch << 16) | build) + bytes(28)
+    header_length = 6 + len(key)
+    padding = bytes((4 - header_length % 4) % 4)
+    info = struct.pack('<HHH', header_length + len(padding) + len(fixed), len(fixed), 0) + key + padding + fixed
+
+    section = directory(resource_type, 0x80000000 | 0x18)
+    section += directory(1, 0x80000000 | 0x30)
+    section += directory(0x409, 0x48)
+    section += struct.pack('<IIII', SECTION_RVA + 0x58, len(info), 0, 0)
+    section += bytes(0x58 - len(section)) + info
+    return section
+
+
+def build_pe(version=(3, 9, 12, 17), pe32_plus: bool = False, with_resource: bool = True, **resource) -> bytes:
+    """生成只有一个资源节的最小PE文件"""
+    section = _resource_section(version, **resource)
+    directory_count = 16
+    optional_size = (112 if pe32_plus else 96) + directory_count * 8
+
+    dos = bytearray(64)
+    dos[0:2] = b'MZ'
+    struct.pack_into('<I', dos, 0x3C, 64)
+
+    coff = struct.pack('<HHIIIHH', 0x8664 if pe32_plus else 0x14C, 1, 0, 0, 0, optional_size, 0x0102)
+
+    optional = bytearray(optional_size)
+    struct.pack_into('<H', optional, 0, 0x20B if pe32_plus else 0x10B)
+    directories = 112 if pe32_plus else 96
+    struct.pack_into('<I', optional, directories - 4, directory_count)
+    if with_resource:
+        struct.pack_into('<II', optional, directories + 2 * 8, SECTION_RVA, len(section))
+
+    section_header = struct.pack('<8sIIIIIIHHI', b'.rsrc', len(section), SECTION_RVA, len(section), RAW_OFFSET,
+                                 0, 0, 0, 0, 0x40000040)
+
+    headers = bytes(dos) + b'PE\0\0' + coff + bytes(optional) + section_header
+    return headers + bytes(RAW_OFFSET - len(headers)) + section
+
+
+@pytest.mark.parametrize("pe32_plus", [False, True])
+def test_parse_version(pe32_plus):
+    assert parse_fixed_file_version(build_pe((3, 9, 12, 17), pe32_plus=pe32_plus)) == "3.9.12.17"
+    assert parse_fixed_file_version(build_pe((65535, 0, 1, 65535), pe32_plus=pe32_plus)) == "65535.0.1.65535"
+
+
+def test_read_file_version(tmp_path):
+    path = tmp_path / "WeChat.exe"
+    path.write_bytes(build_pe((3, 9, 12, 17)))
+    assert read_file_version(str(path)) == "3.9.12.17"
+
+    # 文件变化后重新读取
+    path.write_bytes(build_pe((3, 9, 12, 51)) + b"\0")
+    assert read_file_version(str(path)) == "3.9.12.51"
+    clear_version_cache()
+
+
+@pytest.mark.parametrize("pe32_plus", [False, True])
+def test_truncated_files(pe32_plus):
+    data = build_pe(pe32_plus=pe32_plus)
+    for length in range(len(data)):
+        try:
+            version = parse_fixed_file_version(data[:length])
+        except PEFormatError:
+            continue
+        # 截断在VS_FIXEDFILEINFO的版本号之后时仍可解析
+        assert version == "3.9.12.17"
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    b"MZ",
+    b"#!/bin/sh\necho not a pe file\n" * 10,
+    b"MZ" + bytes(58) + struct.pack('<I', 0xFFFFFF00),
+    b"MZ" + bytes(58) + struct.pack('<I', 64) + b"NE\0\0" + bytes(300),
+    os.urandom(4096),
+])
+def test_not_pe(data):
+    with pytest.raises(PEFormatError):
+        parse_fixed_file_version(data)
+
+
+@pytest.mark.parametrize("options", [
+    {"with_resource": False},
+    {"resource_type": RT_ICON},
+    {"signature": 0x12345678},
+])
+def test_no_version_resource(options):
+    with pytest.raises(PEFormatError):
+        parse_fixed_file_version(build_pe(**options))
+
+
+def test_read_file_version_malformed(tmp_path):
+    samples = {
+        "empty.exe": b"",
+        "text.exe": b"not a pe file",
+        "truncated.exe": build_pe()[:RAW_OFFSET + 0x20],
+        "no_resource.exe": build_pe(with_resource=False),
+        "icon_only.exe": build_pe(resource_type=RT_ICON),
+    }
+    for name, data in samples.items():
+        path = tmp_path / name
+        path.write_bytes(data)
+        assert read_file_version(str(path)) is None, name
+    assert read_file_version(str(tmp_path / "missing.exe")) is None
+    clear_version_cache()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+局域网缓存测试 - 在127.0.0.1上启动缓存服务并从节点下载，节点文件MD5不符时回退到云端，以及节点发现超时
+"""
+
+import hashlib
+import os
+import socket
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(os.path.abspath(__file__)).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from core import peer_cache as peer_cache_module  # noqa: E402
+from core.peer_cache import (CONTENT_PATH_PREFIX, PeerCacheServer, PeerContentStore,  # noqa: E402
+                             configure_peer_cache, discover_peers)
+
+PACKAGE_NAME = "WeChatSetup.exe"
+
+
+def _free_udp_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def package_file():
+    """云端镜像上的安装包（返回内容和包配置）"""
+    data = os.urandom(256 * 1024)
+    return data, {"name": PACKAGE_NAME, "md5": hashlib.md5(data).hexdigest(), "size": len(data)}
+
+
+@pytest.fixture
+def origin(mirror, package_file):
+    data, package = package_file
+    (mirror.root_path / PACKAGE_NAME).write_bytes(data)
+    package["url"] = mirror.url(PACKAGE_NAME)
+    return mirror
+
+
+@pytest.fixture
+def peer_config(monkeypatch):
+    """配置全局局域网缓存，测试结束时关闭并恢复为未配置"""
+    monkeypatch.setattr(peer_cache_module, "_peer_cache", None)
+    monkeypatch.setattr(peer_cache_module, "_peer_cache_configured", False)
+    yield configure_peer_cache
+    configure_peer_cache(None)
+
+
+@pytest.fixture
+def peer_server(tmp_path):
+    """只在127.0.0.1上提供HTTP服务的缓存节点"""
+    store = PeerContentStore()
+    with PeerCacheServer(store, host="127.0.0.1", discovery_port=None) as server:
+        server.files_dir = tmp_path / "peer"
+        server.files_dir.mkdir()
+        yield server
+
+
+def _share(server: PeerCacheServer, md5: str, data: bytes) -> Path:
+    """节点以给定的MD5提供data"""
+    path = server.files_dir / f"{md5}.bin"
+    path.write_bytes(data)
+    server.store.add(md5, path)
+    return path
+
+
+def test_serve_by_md5(peer_server, package_file):
+    data, package = package_file
+    path = _share(peer_server, package["md5"], data)
+    url = f"{peer_server.url}{CONTENT_PATH_PREFIX}{package['md5']}"
+
+    with urllib.request.urlopen(url, timeout=10) as response:
+        assert response.read() == data
+    request = urllib.request.Request(url, method="HEAD")
+    with urllib.request.urlopen(request, timeout=10) as response:
+        assert int(response.headers["Content-Length"]) == len(data)
+    assert peer_server.counters == {'bytes_sent': len(data), 'files_sent': 1}
+
+    # 未登记的MD5、非法路径和登记后被修改的文件都不提供
+    for bad_url in (f"{peer_server.url}{CONTENT_PATH_PREFIX}{'0' * 32}", f"{peer_server.url}/etc/passwd"):
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(bad_url, timeout=10)
+        assert error.value.code == 404
+    path.write_bytes(data + b"changed")
+    with pytest.raises(urllib.error.HTTPError):
+        urllib.request.urlopen(url, timeout=10)
+
+
+def test_download_from_peer(tmp_path, origin, peer_server, peer_config, package_file, make_downloader):
+    data, package = package_file
+    _share(peer_server, package["md5"], data)
+    peer_config(peer_server.url)
+
+    downloader = make_downloader(tmp_path / "app", {"packages": [package]})
+    local_path = downloader.download_dir / PACKAGE_NAME
+    assert downloader.download_file_with_fallback(PACKAGE_NAME, local_path, package["size"])
+    assert local_path.read_bytes() == data
+    assert origin.request_counts.get(PACKAGE_NAME, 0) == 0
+
+
+def test_corrupt_peer_file_falls_back_to_origin(tmp_path, origin, peer_server, peer_config, package_file,
+                                                make_downloader):
+    data, package = package_file
+    # 节点以正确的MD5提供了长度相同但内容不同的文件
+    _share(peer_server, package["md5"], os.urandom(len(data)))
+    cache = peer_config(peer_server.url.replace("http://", ""))
+
+    downloader = make_downloader(tmp_path / "app", {"packages": [package]})
+    local_path = downloader.download_dir / PACKAGE_NAME
+    assert downloader.download_file_with_fallback(PACKAGE_NAME, local_path, package["size"])
+    assert local_path.read_bytes() == data
+    assert peer_server.counters['files_sent'] == 1
+    assert origin.request_counts.get(PACKAGE_NAME, 0) == 1
+    # 不再使用提供错误内容的节点
+    assert cache.peers() == []
+
+
+def test_discovery(peer_server):
+    port = _free_udp_port()
+    with PeerCacheServer(peer_server.store, host="127.0.0.1", discovery_port=port) as server:
+        assert discover_peers(port, timeout=5, addresses=("127.0.0.1",)) == [server.url]
+        assert discover_peers(port, timeout=0.3, addresses=("127.0.0.1",), exclude_id=server.instance_id) == []
+
+
+def test_discovery_timeout_falls_back_to_origin(tmp_path, origin, peer_config, package_file, make_downloader):
+    port = _free_udp_port()
+    start = time.monotonic()
+    assert discover_peers(port, timeout=0.3, addresses=("127.0.0.1",)) == []
+    assert 0.3 <= time.monotonic() - start < 5
+
+    # 没有节点回复时直接从云端下载
+    cache = peer_config("auto", discovery_port=port, discovery_addresses=("127.0.0.1",))
+    data, package = package_file
+    downloader = make_downloader(tmp_path / "app", {"packages": [package]})
+    local_path = downloader.download_dir / PACKAGE_NAME
+
+    start = time.monotonic()
+    assert downloader.download_file_with_fallback(PACKAGE_NAME, local_path, package["size"])
+    assert time.monotonic() - start < 10
+    assert local_path.read_bytes() == data
+    assert cache.peers() == []
+    assert origin.request_counts.get(PACKAGE_NAME, 0) == 1
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Python就绪检测测试 - 用模拟的环境数据源检查PATH变化通知、超时、应用商店占位别名和PATH合并
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(os.path.abspath(__file__)).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from core.env_source import EnvironmentSource  # noqa: E402
+from core.python_env import PythonReadinessProbe, find_python, merge_path  # noqa: E402
+
+pytestmark = pytest.mark.skipif(os.name == 'nt', reason="模拟解释器使用可执行脚本，只在Linux上运行")
+
+
+class FakeEnvironmentSource(EnvironmentSource):
+    """模拟环境数据源：按顺序返回PATH，每次等待都立即报告一次变化"""
+
+    def __init__(self, paths, notify: bool = True):
+        self.paths = list(paths)
+        self.notify = notify
+        self.reads = 0
+        self.notifications = 0
+
+    def read_path(self) -> str:
+        path = self.paths[min(self.reads, len(self.paths) - 1)]
+        self.reads += 1
+        return path
+
+    def wait_for_change(self, timeout: float) -> bool:
+        if self.notify:
+            self.notifications += 1
+            return True
+        time.sleep(timeout)
+        return False
+
+
+def _interpreter(directory: Path, size: int = 64) -> Path:
+    """生成模拟解释器（size为0时模拟应用商店的占位别名）"""
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / "python"
+    path.write_bytes(b"#!/bin/sh\n" + b"#" * size if size else b"")
+    path.chmod(0o755)
+    return path
+
+
+@pytest.fixture
+def process_path(monkeypatch):
+    """当前进程PATH（测试结束后恢复）"""
+    monkeypatch.setenv("PATH", os.pathsep.join(["/opt/bundle", "/usr/bin"]))
+    return os.environ
+
+
+def test_path_appears_after_notifications(tmp_path, process_path):
+    python = _interpreter(tmp_path / "Python311")
+    empty = str(tmp_path / "empty")
+    source = FakeEnvironmentSource([empty, empty, empty, ";".join([empty, str(python.parent)])])
+
+    probe = PythonReadinessProbe(source)
+    assert probe.wait_until_ready(timeout=30) == str(python)
+    assert source.notifications == 3
+
+
+def test_wait_times_out(tmp_path, monkeypatch, process_path):
+    monkeypatch.setattr("core.python_env.RECHECK_INTERVAL", 0.05)
+    source = FakeEnvironmentSource([str(tmp_path / "empty")], notify=False)
+
+    start = time.time()
+    assert PythonReadinessProbe(source).wait_until_ready(timeout=0.3) is None
+    assert 0.3 <= time.time() - start < 10
+    assert source.reads > 1
+
+
+def test_store_alias_is_skipped(tmp_path, process_path):
+    _interpreter(tmp_path / "WindowsApps", size=0)
+    python = _interpreter(tmp_path / "Python311")
+    alias_only = str(tmp_path / "WindowsApps")
+
+    assert find_python([alias_only]) is None
+    assert PythonReadinessProbe(FakeEnvironmentSource([alias_only])).resolve() is None
+    source = FakeEnvironmentSource([";".join([alias_only, str(python.parent)])])
+    assert PythonReadinessProbe(source).resolve() == str(python)
+
+
+def test_known_dir_used_before_path_updates(tmp_path, process_path):
+    python = _interpreter(tmp_path / "Python311")
+    probe = PythonReadinessProbe(FakeEnvironmentSource([str(tmp_path / "empty")]),
+                                 known_dirs=[str(python.parent)])
+
+    assert probe.resolve() == str(python)
+    entries = process_path["PATH"].split(os.pathsep)
+    assert entries[:2] == [str(python.parent), os.path.join(str(python.parent), "Scripts")]
+    assert "/opt/bundle" in entries
+
+
+def test_refresh_merges_instead_of_replacing(tmp_path, process_path):
+    python = _interpreter(tmp_path / "Python311")
+    registry_path = ";".join(["/usr/bin", str(python.parent), "/usr/local/bin"])
+
+    assert PythonReadinessProbe(FakeEnvironmentSource([registry_path])).resolve() == str(python)
+    assert process_path["PATH"].split(os.pathsep) == [
+        "/opt/bundle", "/usr/bin", str(python.parent), "/usr/local/bin"]
+
+    # 再次刷新不重复添加
+    PythonReadinessProbe(FakeEnvironmentSource([registry_path])).resolve()
+    assert process_path["PATH"].split(os.pathsep) == [
+        "/opt/bundle", "/usr/bin", str(python.parent), "/usr/local/bin"]
+
+
+def test_merge_path():
+    sep = os.pathsep
+    assert merge_path(sep.join(["/a", "/b", "/a"]), ["/b", "", "/c", "/a/"]) == sep.join(["/a", "/b", "/c"])
+    assert merge_path("", ["/c"], prepend=["/p", "/c"]) == sep.join(["/p", "/c"])
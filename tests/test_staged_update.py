@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量更新替换测试 - 按条目和分块增量更新先写入暂存目录再整体替换：删除新版本中没有的文件、
+保留用户数据、可以回滚到上一版本，以及在替换过程中结束进程后下次运行得到完整的一个版本
+"""
+
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import textwrap
+import zipfile
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(os.path.abspath(__file__)).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from core.staged_extract import BACKUP_PREFIX, JOURNAL_PREFIX, STAGING_PREFIX  # noqa: E402
+
+pytestmark = pytest.mark.skipif(os.name == 'nt', reason="结束进程使用SIGKILL，只在Linux上运行")
+
+# 用户在解压目录中创建的文件（不在压缩包中，升级和回滚后都应保留）
+USER_FILE = "kourichat/data/user.json"
+
+# 子进程：运行一次增量更新，在第N次重命名或链接文件时结束自己（N为0时不结束，输出调用次数）
+CRASH_SCRIPT = textwrap.dedent("""
+    import json, os, signal, sys
+    from pathlib import Path
+    sys.path.insert(0, sys.argv[1])
+    from core.cloud_downloader import CloudDownloader
+    from core.install_manifest import InstallManifest
+
+    mode, operation, kill_at, work_dir, config_path = sys.argv[2:7]
+    calls = {"rename": 0, "link": 0}
+
+    def crashing(name, original):
+        def call(*args, **kwargs):
+            calls[name] += 1
+            if name == operation and calls[name] == int(kill_at):
+                os.kill(os.getpid(), signal.SIGKILL)
+            return original(*args, **kwargs)
+        return call
+
+    os.rename = crashing("rename", os.rename)
+    os.link = crashing("link", os.link)
+
+    work_dir = Path(work_dir)
+    downloader = CloudDownloader(lambda *args: None)
+    downloader.app_path = work_dir
+    downloader.download_dir = work_dir / "downloads"
+    downloader.manifest = InstallManifest(work_dir)
+    downloader.config = json.loads(Path(config_path).read_text(encoding='utf-8'))
+    package = downloader.config["packages"][0]
+    result = getattr(downloader, "download_" + mode)(package)
+    downloader.manifest.close()
+    print(json.dumps({"applied": result is not None, **calls}))
+""")
+
+
+def _release(version: int) -> dict:
+    """版本内容：第二版修改和新增源码，删除一个源码文件、一个顶层文件和一个只含该文件的顶层目录"""
+    files = {"kourichat/run.bat": b"@echo off\r\npython run.py\r\n",
+             "kourichat/data/model.bin": random.Random(1).randbytes(512 * 1024)}
+    for i in range(20):
+        files[f"kourichat/src/file_{i:02d}.py"] = f"VALUE = {i}\n".encode() * 50
+    if version == 1:
+        files["kourichat/src/old_module.py"] = b"OLD = True\n"
+        files["README.txt"] = b"release 1\n"
+        files["legacy/only.txt"] = b"legacy\n"
+    else:
+        files["kourichat/src/file_00.py"] += b"# patched in release 2\n"
+        files["kourichat/src/new_feature.py"] = b"FEATURE = True\n"
+    return files
+
+
+@pytest.fixture
+def releases(tmp_path, mirror):
+    """发布两个版本到本地镜像，返回 (各版本配置, 各版本文件内容)"""
+    from cloud_config_manager import PackagePublisher
+
+    configs, contents = [], []
+    for version in (1, 2):
+        files = _release(version)
+        path = tmp_path / f"kourichat-{version}.zip"
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for name, data in files.items():
+                compress = zipfile.ZIP_STORED if name.endswith(".bin") else zipfile.ZIP_DEFLATED
+                zf.writestr(name, data, compress_type=compress)
+        release_dir = mirror.root_path / f"v{version}"
+        config = PackagePublisher(progress_callback=lambda *a: None).publish(
+            [path], {"version": str(version), "packages": []}, release_dir, base_url=mirror.url(f"v{version}/"))
+        (release_dir / path.name).write_bytes(path.read_bytes())
+        config["packages"][0]["extract_to"] = "project"
+        configs.append(config)
+        contents.append(files)
+    return configs, contents
+
+
+def _tree(root: Path) -> dict:
+    """解压目录中的文件（不含暂存、备份和替换记录）"""
+    hidden = (STAGING_PREFIX, BACKUP_PREFIX, JOURNAL_PREFIX)
+    files = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [name for name in dirnames if not name.startswith(hidden)]
+        for filename in filenames:
+            if filename.startswith(hidden):
+                continue
+            path = Path(dirpath) / filename
+            files[path.relative_to(root).as_posix()] = path.read_bytes()
+    return files
+
+
+def _expected(files: dict) -> dict:
+    return {**files, USER_FILE: b"{}"}
+
+
+def _install_first(tmp_path: Path, configs, make_downloader) -> Path:
+    """完整安装第一版并创建用户数据"""
+    work_dir = tmp_path / "app"
+    assert len(make_downloader(work_dir, configs[0]).download_packages()) == 1
+    (work_dir / "project" / USER_FILE).write_bytes(b"{}")
+    return work_dir
+
+
+@pytest.mark.parametrize("mode", ["members", "delta"])
+def test_update_removes_deleted_files_and_rolls_back(tmp_path, releases, make_downloader, mode):
+    configs, contents = releases
+    work_dir = _install_first(tmp_path, configs, make_downloader)
+    target_dir = work_dir / "project"
+    assert _tree(target_dir) == _expected(contents[0])
+
+    downloader = make_downloader(work_dir, configs[1])
+    package = configs[1]["packages"][0]
+    assert getattr(downloader, "download_" + mode)(package) == target_dir
+    assert _tree(target_dir) == _expected(contents[1])
+    assert not (target_dir / "legacy").exists()
+
+    # 未变化的文件从旧版本链接，备份目录中是完整的上一版本
+    assert os.path.samefile(target_dir / "kourichat/run.bat",
+                            next(target_dir.glob(BACKUP_PREFIX + "*/kourichat/run.bat")))
+
+    assert downloader.rollback_package(package)
+    assert _tree(target_dir) == _expected(contents[0])
+
+
+def _run_crashing(work_dir: Path, config: dict, mode: str, operation: str, kill_at: int):
+    config_path = work_dir / "config.json"
+    config_path.write_text(json.dumps(config), encoding='utf-8')
+    return subprocess.run([sys.executable, "-c", CRASH_SCRIPT, str(PROJECT_ROOT), mode, operation, str(kill_at),
+                           str(work_dir), str(config_path)], capture_output=True, text=True, timeout=120)
+
+
+@pytest.mark.parametrize("mode", ["members", "delta"])
+def test_killed_during_update(tmp_path, releases, make_downloader, mode):
+    configs, contents = releases
+    package = configs[1]["packages"][0]
+
+    # 不结束进程时统计替换过程中的重命名次数
+    work_dir = _install_first(tmp_path / "count", configs, make_downloader)
+    result = _run_crashing(work_dir, configs[1], mode, "rename", 0)
+    assert result.returncode == 0, result.stderr
+    calls = json.loads(result.stdout)
+    assert calls["applied"] and calls["rename"] >= 3 and calls["link"] >= 1
+
+    kill_points = [("link", 1)] + [("rename", i) for i in range(1, calls["rename"] + 1)]
+    for operation, kill_at in kill_points:
+        work_dir = _install_first(tmp_path / f"{operation}-{kill_at}", configs, make_downloader)
+        target_dir = work_dir / "project"
+        result = _run_crashing(work_dir, configs[1], mode, operation, kill_at)
+        assert result.returncode == -signal.SIGKILL, result.stderr
+
+        # 下次运行先完成中断的替换：写入替换记录之前中断时保持第一版，之后中断时完成第二版
+        downloader = make_downloader(work_dir, configs[1])
+        downloader.recover_interrupted_swaps([package])
+        expected = contents[0] if operation == "link" else contents[1]
+        assert _tree(target_dir) == _expected(expected), (operation, kill_at)
+
+        if operation == "link":
+            # 重新运行增量更新
+            assert getattr(downloader, "download_" + mode)(package) == target_dir
+            assert _tree(target_dir) == _expected(contents[1])
+        assert downloader.rollback_package(package)
+        assert _tree(target_dir) == _expected(contents[0]), (operation, kill_at)
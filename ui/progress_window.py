@@ -9,15 +9,32 @@ from tkinter import ttk
 from tkinter import font as tkfont
 import ctypes
 import datetime
+import queue
+import threading
 import time
 import sys
 import os
 from pathlib import Path
-try:
-    from PIL import Image, ImageTk
-    PIL_AVAILABLE = True
-except ImportError:
-    PIL_AVAILABLE = False
+
+from core.metrics import get_registry, QUEUE_DEPTH_BUCKETS
+
+# 标题图标尺寸
+TITLE_ICON_SIZE = 175
+
+# 延迟加载资源的时间（毫秒），保证窗口先完成首次绘制
+DEFERRED_ASSET_DELAY_MS = 50
+
+# 标题图标候选文件（按优先级）
+TITLE_IMAGE_FILES = [
+    "final_exe/MenuZhizhi.png",  # 菜单指示图标
+    "final_exe/KouriInstaller.ico",  # 窗口图标
+    "final_exe/KouriInstaller_ico.ico",  # 打包图标
+    "favicon.ico"
+]
+
+_metrics = get_registry()
+UI_QUEUE_DEPTH = _metrics.histogram("ui_queue_depth", "其他线程提交UI操作时的队列长度", QUEUE_DEPTH_BUCKETS)
+UI_QUEUE_DEPTH_CURRENT = _metrics.gauge("ui_queue_depth_current", "UI操作队列的当前长度")
 
 
 def get_resource_path(relative_path):
@@ -34,6 +51,15 @@ def get_resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 
 
+def get_cache_dir() -> Path:
+    """获取UI资源缓存目录（打包后_MEIPASS为临时目录，不能用于持久缓存）"""
+    base_dir = os.environ.get('LOCALAPPDATA')
+    if not base_dir:
+        import tempfile
+        base_dir = tempfile.gettempdir()
+    return Path(base_dir) / "KouriInstaller" / "cache"
+
+
 class ProgressWindow:
     """进度窗口类"""
     
@@ -65,6 +91,10 @@ class ProgressWindow:
         self.root.configure(bg='#f8f9fa')
         self.closed = False
 
+        # Tk只能在创建窗口的线程中操作，其他线程的UI调用放入队列
+        self._ui_thread_id = threading.get_ident()
+        self._pending_ui_calls = queue.Queue()
+
         try:
             self.root.attributes('-topmost', True)
             self._center_window()
@@ -100,33 +130,75 @@ class ProgressWindow:
         except Exception:
             pass
 
+    def _find_title_image(self):
+        """查找标题图标源文件，只检查文件是否存在，不解码图片"""
+        for image_file in TITLE_IMAGE_FILES:
+            image_path = get_resource_path(image_file)
+            if os.path.exists(image_path):
+                return image_path
+        return None
+
+    def _get_scaled_icon_path(self, image_path) -> Path:
+        """获取预缩放图标的缓存路径，以源文件大小和修改时间作为缓存键"""
+        stat = os.stat(image_path)
+        stem = Path(image_path).stem
+        cache_name = f"{stem}_{stat.st_size}_{stat.st_mtime_ns}_{TITLE_ICON_SIZE}.png"
+        return get_cache_dir() / cache_name
+
     def _load_title_icon(self):
-        """加载标题中使用的图标"""
-        if not PIL_AVAILABLE:
+        """加载标题中使用的图标
+
+        优先使用缓存中已缩放好的PNG（Tk可直接加载，无需PIL）；
+        缓存不存在时才导入PIL进行解码和缩放，并写入缓存供下次启动使用。
+        """
+        image_path = self._title_image_path
+        if not image_path:
             return None
 
         try:
-            # 优先使用指定的PNG图片
-            title_image_files = [
-                "final_exe/MenuZhizhi.png",  # 菜单指示图标
-                "final_exe/KouriInstaller.ico",  # 窗口图标
-                "final_exe/KouriInstaller_ico.ico",  # 打包图标
-                "favicon.ico"
-            ]
+            cached_path = self._get_scaled_icon_path(image_path)
+            if cached_path.exists():
+                return tk.PhotoImage(master=self.root, file=str(cached_path))
 
-            for image_file in title_image_files:
-                image_path = get_resource_path(image_file)
-                if os.path.exists(image_path):
-                    # 加载图片并调整大小
-                    image = Image.open(image_path)
-                    # 调整为适合标题的大小
-                    image = image.resize((175, 175), Image.Resampling.LANCZOS)
-                    return ImageTk.PhotoImage(image)
+            try:
+                from PIL import Image, ImageTk
+            except ImportError:
+                return None
 
-            return None
+            # 加载图片并调整为适合标题的大小
+            image = Image.open(image_path)
+            image = image.resize((TITLE_ICON_SIZE, TITLE_ICON_SIZE), Image.Resampling.LANCZOS)
+
+            try:
+                cached_path.parent.mkdir(parents=True, exist_ok=True)
+                temp_path = cached_path.with_suffix('.tmp')
+                image.save(temp_path, format='PNG')
+                os.replace(temp_path, cached_path)
+            except Exception:
+                pass
+
+            return ImageTk.PhotoImage(image, master=self.root)
         except Exception:
             return None
-    
+
+    def _load_deferred_assets(self):
+        """窗口首次绘制后加载图标等耗时资源"""
+        if self.closed or not self._icon_label:
+            return
+
+        try:
+            title_icon = self._load_title_icon()
+            if title_icon:
+                self._icon_label.config(image=title_icon)
+                # 保持图标引用，防止被垃圾回收
+                self._icon_label.image = title_icon
+            else:
+                # 图标加载失败时移除占位区域
+                self._icon_label.master.pack_forget()
+        except Exception as e:
+            if isinstance(e, tk.TclError) and "invalid command name" in str(e):
+                self.closed = True
+
     def _setup_fonts(self):
         """设置字体"""
         try:
@@ -228,22 +300,25 @@ class ProgressWindow:
         header_frame = tk.Frame(title_frame, bg=self.colors['bg_card'])
         header_frame.pack(fill=tk.X)
 
-        # 尝试加载图标
-        title_icon = self._load_title_icon()
+        # 只检查图标是否存在，图片解码推迟到窗口首次绘制之后
+        self._title_image_path = self._find_title_image()
+        self._icon_label = None
 
-        if title_icon:
-            # 如果有图标，创建包含图标的标题
+        if self._title_image_path:
+            # 如果有图标，创建包含图标占位的标题
             icon_title_frame = tk.Frame(header_frame, bg=self.colors['bg_card'])
             icon_title_frame.pack()
 
-            # 图标标签
-            icon_label = tk.Label(icon_title_frame,
-                                image=title_icon,
-                                bg=self.colors['bg_card'])
-            icon_label.pack(side=tk.LEFT, padx=(0, 5))
+            # 图标占位标签，按图标尺寸预留空间，避免加载后布局跳动
+            placeholder = tk.Frame(icon_title_frame,
+                                   width=TITLE_ICON_SIZE,
+                                   height=TITLE_ICON_SIZE,
+                                   bg=self.colors['bg_card'])
+            placeholder.pack_propagate(False)
+            placeholder.pack(side=tk.LEFT, padx=(0, 5))
 
-            # 保持图标引用，防止被垃圾回收
-            icon_label.image = title_icon
+            self._icon_label = tk.Label(placeholder, bg=self.colors['bg_card'])
+            self._icon_label.pack(fill=tk.BOTH, expand=True)
 
             # 主标题
             self.title_label = tk.Label(icon_title_frame,
@@ -252,6 +327,9 @@ class ProgressWindow:
                                        bg=self.colors['bg_card'],
                                        fg=self.colors['text_primary'])
             self.title_label.pack(side=tk.LEFT)
+
+            # 首次绘制完成后再解码图标
+            self.root.after(DEFERRED_ASSET_DELAY_MS, self._load_deferred_assets)
         else:
             # 如果没有图标，使用纯文本标题
             self.title_label = tk.Label(header_frame,
@@ -423,12 +501,41 @@ class ProgressWindow:
         # 简化：不需要复杂的动画循环
         pass
 
+    def _defer_to_ui_thread(self, func, *args) -> bool:
+        """
+        非UI线程调用时，将操作放入队列交给UI线程执行
+
+        Returns:
+            是否已放入队列（调用方应直接返回）
+        """
+        if threading.get_ident() == self._ui_thread_id:
+            return False
+        self._pending_ui_calls.put((func, args))
+        depth = self._pending_ui_calls.qsize()
+        UI_QUEUE_DEPTH.observe(depth)
+        UI_QUEUE_DEPTH_CURRENT.set(depth)
+        return True
+
+    def _process_pending_calls(self):
+        """在UI线程中执行其他线程提交的UI操作"""
+        processed = False
+        while not self.closed:
+            try:
+                func, args = self._pending_ui_calls.get_nowait()
+            except queue.Empty:
+                break
+            func(*args)
+            processed = True
+        if processed:
+            UI_QUEUE_DEPTH_CURRENT.set(self._pending_ui_calls.qsize())
+
     def _schedule_ui_update(self):
         """定期更新UI以保持响应性"""
         if not self.closed and hasattr(self, 'root') and self.root:
             try:
                 # 每20ms处理一次事件，确保UI高响应性
                 self.root.after(20, self._schedule_ui_update)
+                self._process_pending_calls()
                 # 处理用户交互事件，但不阻塞
                 self.root.update_idletasks()
                 # 定期进行完整更新以防止卡死
@@ -464,6 +571,8 @@ class ProgressWindow:
     # 公共接口
     def update_status(self, message: str):
         """更新状态消息"""
+        if self._defer_to_ui_thread(self.update_status, message):
+            return
         if not self.closed and hasattr(self, 'status_label'):
             try:
                 self.status_label.config(text=message)
@@ -475,6 +584,8 @@ class ProgressWindow:
     
     def update_detail(self, message: str):
         """更新详细信息"""
+        if self._defer_to_ui_thread(self.update_detail, message):
+            return
         if not self.closed and hasattr(self, 'detail_text'):
             try:
                 self.detail_text.config(state=tk.NORMAL)
@@ -499,6 +610,8 @@ class ProgressWindow:
     
     def set_progress(self, value: float, status: str = None):
         """设置进度条值（改进版本，更好的同步和响应性）"""
+        if self._defer_to_ui_thread(self.set_progress, value, status):
+            return
         if not self.closed:
             self.current_progress = max(0, min(100, float(value)))
 
@@ -538,8 +651,11 @@ class ProgressWindow:
     
     def keep_alive(self):
         """保持窗口响应（改进版本，防止卡死）"""
+        if threading.get_ident() != self._ui_thread_id:
+            return
         if not self.closed and hasattr(self, 'root') and self.root:
             try:
+                self._process_pending_calls()
                 current_time = time.time()
                 # 更频繁的UI更新以防止卡死
                 if current_time - self.last_update_time > 0.02:  # 最多每20ms更新一次
@@ -557,8 +673,11 @@ class ProgressWindow:
 
     def force_update(self):
         """强制更新UI，用于长时间操作中保持响应性"""
+        if threading.get_ident() != self._ui_thread_id:
+            return
         if not self.closed and hasattr(self, 'root') and self.root:
             try:
+                self._process_pending_calls()
                 self.root.update()
                 self.last_update_time = time.time()
             except Exception as e:
@@ -567,6 +686,8 @@ class ProgressWindow:
     
     def close(self):
         """关闭窗口"""
+        if self._defer_to_ui_thread(self.close):
+            return
         if not self.closed and hasattr(self, 'root') and self.root:
             self.closed = True
             try: